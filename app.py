@@ -1,17 +1,62 @@
 import logging
 import os
 import sys
+from contextlib import nullcontext
+from typing import Optional
 
-from flashbots import flashbot
 from web3 import Web3
 from web3._utils.filters import BlockFilter
 
-from simple_arbitrage.arbitrage.arbitrage import Arbitrage, evaluate_markets
+from simple_arbitrage.arbitrage.arbitrage import Arbitrage
+from simple_arbitrage.arbitrage.bundle_submitter import (
+    BundleSubmitter,
+    parse_relay_urls,
+    parse_target_block_offsets,
+)
+from simple_arbitrage.arbitrage.failure_cache import DEFAULT_TTL, FailureCache
+from simple_arbitrage.arbitrage.funnel import FunnelTracer
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.backtest.recorder import ReserveRecorder
+from simple_arbitrage.markets.market_loaders.market_state import (
+    DEFAULT_STATE_EVERY_BLOCKS,
+    MarketStateWriter,
+    resume_market_state,
+)
 from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
     GroupedMarkets,
-    get_uniswap_markets_by_token,
-    update_reserves,
+    load_market_state,
+)
+from simple_arbitrage.markets.market_loaders.uniswappy_v3_loader import (
+    PoolLogFollower,
+    load_uniswappy_v3_pool,
+)
+from simple_arbitrage.runtime.distributed import (
+    DistributedSearcher,
+    parse_worker_addresses,
+)
+from simple_arbitrage.runtime.events import DEFAULT_SAMPLE_EVERY, EVENTS
+from simple_arbitrage.runtime.mempool import (
+    DEFAULT_PREDICT_INTERVAL,
+    Backrunner,
+    MempoolPredictor,
+    PendingTransactionFeed,
+)
+from simple_arbitrage.runtime.metrics import REGISTRY, MetricsServer
+from simple_arbitrage.runtime.multiprocess import MultiprocessSearcher
+from simple_arbitrage.runtime.pipeline import DEFAULT_QUEUE_SIZE, BlockPipeline
+from simple_arbitrage.runtime.profiler import SlowBlockProfiler
+from simple_arbitrage.runtime.providers import ThreadLocalProvider, provider_for_url
+from simple_arbitrage.runtime.rpc_accounting import (
+    ACCOUNTING,
+    flashbot,
+    instrument_provider,
+)
+from simple_arbitrage.runtime.scheduler import (
+    DEFAULT_BLOCK_BUDGET,
+    BlockScheduler,
+    HeadWatcher,
 )
+from simple_arbitrage.runtime.searcher import Searcher
 from simple_arbitrage.utils.abi import BUNDLE_EXECUTOR_ABI
 from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES
 
@@ -32,11 +77,90 @@ FLASHBOTS_RELAY_SIGNING_KEY = os.environ.get("FLASHBOTS_RELAY_SIGNING_KEY")
 
 MINER_REWARD_PERCENTAGE = os.environ.get("MINER_REWARD_PERCENTAGE") or 80
 
+# estimate and simulate the top K candidates concurrently, 0 keeps them sequential
+CONCURRENT_CANDIDATES = int(os.environ.get("CONCURRENT_CANDIDATES") or 0)
+CANDIDATE_DEADLINE = float(os.environ.get("CANDIDATE_DEADLINE") or 2.0)
+
+# tokens and pools that keep failing estimate_gas or simulation are skipped for a
+# TTL that doubles per failure, remembered across restarts when a file is set
+FAILURE_CACHE_FILE = os.environ.get("FAILURE_CACHE_FILE")
+FAILURE_CACHE_TTL = float(os.environ.get("FAILURE_CACHE_TTL") or DEFAULT_TTL)
+
+# seconds of work allowed per block before it is abandoned as stale
+BLOCK_BUDGET = float(os.environ.get("BLOCK_BUDGET") or DEFAULT_BLOCK_BUDGET)
+
+# run fetch, evaluate and execute as overlapping stages instead of one after the other
+PIPELINE = os.environ.get("PIPELINE", "").lower() in ("1", "true", "yes")
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE") or DEFAULT_QUEUE_SIZE)
+
+# when set, every block's reserves are recorded here for replay backtests
+RECORD_DIR = os.environ.get("RECORD_DIR")
+RECORD_COMPACT = os.environ.get("RECORD_COMPACT", "").lower() in ("1", "true", "yes")
+
+# comma separated, bundles go to every relay for every target block concurrently
+RELAY_URLS = parse_relay_urls(os.environ.get("RELAY_URLS"))
+TARGET_BLOCK_OFFSETS = parse_target_block_offsets(
+    os.environ.get("TARGET_BLOCK_OFFSETS")
+)
+
+# every candidate's path through evaluation and execution, one JSON line each
+FUNNEL_TRACE_FILE = os.environ.get("FUNNEL_TRACE_FILE")
+
+# hot loop events as JSON lines instead of log lines, one in N per-token events kept
+EVENT_LOG_FILE = os.environ.get("EVENT_LOG_FILE")
+EVENT_SAMPLE_EVERY = int(
+    os.environ.get("EVENT_SAMPLE_EVERY") or DEFAULT_SAMPLE_EVERY["crossed_markets"]
+)
+
+# serve Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics when set
+METRICS_PORT = os.environ.get("METRICS_PORT")
+METRICS_HOST = os.environ.get("METRICS_HOST") or "127.0.0.1"
+
+# sample stacks continuously, write a profile here for every slow block
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+# seconds, unset compares each block to the median of recent ones
+PROFILE_SLOW_BLOCK_SECONDS = os.environ.get("PROFILE_SLOW_BLOCK_SECONDS")
+
+# predict the next block's reserves from pending swaps and evaluate them ahead
+MEMPOOL = os.environ.get("MEMPOOL", "").lower() in ("1", "true", "yes")
+# seconds between predictions, each one competes with block work for the GIL
+MEMPOOL_PREDICT_INTERVAL = float(
+    os.environ.get("MEMPOOL_PREDICT_INTERVAL") or DEFAULT_PREDICT_INTERVAL
+)
+# submit the best predicted crossed markets as bundles behind their pending swaps
+MEMPOOL_BACKRUN = os.environ.get("MEMPOOL_BACKRUN", "").lower() in ("1", "true", "yes")
+
+# comma separated concentrated liquidity pools priced against the V2 pairs
+UNISWAP_V3_POOLS = [
+    address.strip()
+    for address in (os.environ.get("UNISWAP_V3_POOLS") or "").split(",")
+    if address.strip()
+]
+
+# fetch in one process and evaluate in this many, 0 runs everything in this process
+EVALUATOR_PROCESSES = int(os.environ.get("EVALUATOR_PROCESSES") or 0)
+
+# comma separated host:port of evaluation workers, each evaluates a share of the tokens
+WORKER_ADDRESSES = parse_worker_addresses(os.environ.get("WORKER_ADDRESSES"))
+
+# when set, the loaded markets and reserves are snapshotted here and resumed on start
+STATE_FILE = os.environ.get("STATE_FILE")
+STATE_EVERY_BLOCKS = int(
+    os.environ.get("STATE_EVERY_BLOCKS") or DEFAULT_STATE_EVERY_BLOCKS
+)
+
 # HEALTHCHECK_URL = process.env.HEALTHCHECK_URL || ""
 
 USE_GOERLI = False
 
-provider = Web3.WebsocketProvider(ETHEREUM_RPC_URL)
+
+def _node_provider():
+    """a new instrumented connection to ETHEREUM_RPC_URL, websocket or HTTP"""
+    return instrument_provider(provider_for_url(ETHEREUM_RPC_URL))
+
+
+# a connection per thread, concurrent candidates and pipeline stages share this one
+provider = ThreadLocalProvider(_node_provider)
 w3 = Web3(provider)
 
 
@@ -61,35 +185,200 @@ def main():
         f"Flashbots Relay Signing Wallet Address: {flashbots_relay_signing_wallet}",
     )
 
+    EVENTS.configure(
+        open(EVENT_LOG_FILE, "a") if EVENT_LOG_FILE else None,
+        {"crossed_markets": EVENT_SAMPLE_EVERY},
+    )
+    if METRICS_PORT:
+        MetricsServer(REGISTRY, METRICS_HOST, int(METRICS_PORT)).start()
+
+    bundle_submitter = None
+    if RELAY_URLS:
+        bundle_submitter = BundleSubmitter(
+            flashbots_relay_signing_wallet, RELAY_URLS, TARGET_BLOCK_OFFSETS
+        )
+
     arbitrage = Arbitrage(
         arbitrage_signing_wallet,
         w3.flashbots,
         w3.eth.contract(BUNDLE_EXECUTOR_ADDRESS, abi=BUNDLE_EXECUTOR_ABI),
+        concurrent_candidates=CONCURRENT_CANDIDATES,
+        candidate_deadline=CANDIDATE_DEADLINE,
+        bundle_submitter=bundle_submitter,
+        failure_cache=FailureCache(FAILURE_CACHE_FILE, ttl=FAILURE_CACHE_TTL),
     )
-    markets: GroupedMarkets = get_uniswap_markets_by_token(
-        provider,
-        FACTORY_ADDRESSES,
+    transaction_contexts = TransactionContextProvider(
+        w3, arbitrage_signing_wallet.address
+    )
+    state = (
+        resume_market_state(provider, FACTORY_ADDRESSES, STATE_FILE)
+        if STATE_FILE
+        else load_market_state(provider, FACTORY_ADDRESSES)
+    )
+    markets: GroupedMarkets = state.markets
+
+    searcher = _new_searcher(
+        markets,
+        arbitrage,
+        transaction_contexts,
+        ReserveRecorder(RECORD_DIR, RECORD_COMPACT) if RECORD_DIR else None,
+        FunnelTracer(open(FUNNEL_TRACE_FILE, "a") if FUNNEL_TRACE_FILE else None),
+        (
+            MarketStateWriter(STATE_FILE, state, STATE_EVERY_BLOCKS)
+            if STATE_FILE
+            else None
+        ),
+    )
+
+    scheduler = BlockScheduler(BLOCK_BUDGET)
+    # own connection, so polling for heads never waits behind block work
+    head_w3 = Web3(_node_provider())
+    head_watcher = HeadWatcher(scheduler, _new_head_poller(head_w3))
+    head_watcher.start()
+
+    pipeline = (
+        BlockPipeline(searcher, PIPELINE_QUEUE_SIZE).start() if PIPELINE else None
     )
 
-    block_filter: BlockFilter = w3.eth.filter("latest")
-    while True:
-        for event in block_filter.get_new_entries():
+    profiler = None
+    if PROFILE_DIR:
+        profiler = SlowBlockProfiler(
+            PROFILE_DIR,
+            float(PROFILE_SLOW_BLOCK_SECONDS) if PROFILE_SLOW_BLOCK_SECONDS else None,
+        ).start()
+
+    block_number = 0
+    try:
+        while True:
+            block_number = scheduler.wait_for_head(block_number)
             logger.info("NEW BLOCK")
-            block_number = w3.eth.block_number
             logger.info(f"Block Number: {block_number}")
 
-            update_reserves(provider, markets.all_market_pairs)
+            deadline = scheduler.start_block(block_number)
+            finished_rollup = ACCOUNTING.start_block(block_number)
+            if finished_rollup is not None:
+                logger.info(f"RPC: {finished_rollup.summary()}")
+            if pipeline is not None:
+                pipeline.submit(deadline)
+                logger.info(f"Pipeline: {pipeline.stats_summary()}")
+                continue
+
+            with (
+                profiler.block(block_number, len(markets.all_market_pairs))
+                if profiler is not None
+                else nullcontext()
+            ):
+                processed = searcher.process_block(deadline)
+            if not processed:
+                logger.info(f"Stale work: {scheduler.cutoff_summary()}")
+    finally:
+        arbitrage.close()
+
+
+def _new_searcher(
+    markets: GroupedMarkets,
+    arbitrage: Arbitrage,
+    transaction_contexts: TransactionContextProvider,
+    recorder: Optional[ReserveRecorder],
+    funnel: FunnelTracer,
+    state_writer: Optional[MarketStateWriter],
+) -> Searcher:
+    if EVALUATOR_PROCESSES:
+        if UNISWAP_V3_POOLS:
+            logger.warning("UNISWAP_V3_POOLS are not evaluated by EVALUATOR_PROCESSES")
+        if MEMPOOL:
+            logger.warning("MEMPOOL is not used by EVALUATOR_PROCESSES")
+        # a reserve bank for every block a stage or a queue between stages may hold
+        banks = 3 + 2 * PIPELINE_QUEUE_SIZE if PIPELINE else 3
+        return MultiprocessSearcher(
+            ETHEREUM_RPC_URL,
+            markets,
+            arbitrage,
+            MINER_REWARD_PERCENTAGE,
+            transaction_contexts,
+            recorder,
+            funnel,
+            evaluators=EVALUATOR_PROCESSES,
+            banks=banks,
+            state_writer=state_writer,
+        ).start()
+
+    # pipelined fetching runs next to execution, so it gets its own connection
+    reserves_provider = _node_provider() if PIPELINE else provider
+    if WORKER_ADDRESSES:
+        if UNISWAP_V3_POOLS:
+            logger.warning("UNISWAP_V3_POOLS are not evaluated by WORKER_ADDRESSES")
+        if MEMPOOL:
+            logger.warning("MEMPOOL is not used by WORKER_ADDRESSES")
+        return DistributedSearcher(
+            reserves_provider,
+            markets,
+            arbitrage,
+            MINER_REWARD_PERCENTAGE,
+            WORKER_ADDRESSES,
+            transaction_contexts,
+            recorder,
+            funnel,
+            state_writer=state_writer,
+        )
+
+    pool_follower = None
+    if UNISWAP_V3_POOLS and PIPELINE:
+        logger.warning("UNISWAP_V3_POOLS are not evaluated with PIPELINE")
+    elif UNISWAP_V3_POOLS:
+        loaded_block = w3.eth.block_number
+        pool_follower = PoolLogFollower(
+            reserves_provider,
+            [
+                load_uniswappy_v3_pool(provider, address, loaded_block)
+                for address in UNISWAP_V3_POOLS
+            ],
+            loaded_block,
+        )
+    return Searcher(
+        reserves_provider,
+        markets,
+        arbitrage,
+        MINER_REWARD_PERCENTAGE,
+        transaction_contexts,
+        recorder,
+        funnel,
+        pool_follower,
+        state_writer,
+        _new_mempool(markets, arbitrage, transaction_contexts) if MEMPOOL else None,
+    )
+
+
+def _new_mempool(
+    markets: GroupedMarkets,
+    arbitrage: Arbitrage,
+    transaction_contexts: TransactionContextProvider,
+) -> MempoolPredictor:
+    backrunner = None
+    if MEMPOOL_BACKRUN:
+        backrunner = Backrunner(
+            arbitrage, MINER_REWARD_PERCENTAGE, transaction_contexts
+        )
+    # own connection, so polling pending transactions never waits behind block work
+    mempool = MempoolPredictor(
+        PendingTransactionFeed(_node_provider()),
+        markets,
+        predict_interval=MEMPOOL_PREDICT_INTERVAL,
+        backrunner=backrunner,
+    )
+    mempool.start()
+    return mempool
+
+
+def _new_head_poller(head_w3: Web3):
+    block_filter: BlockFilter = head_w3.eth.filter("latest")
 
-            best_crossed_markets = evaluate_markets(
-                markets.markets_by_token,
-            )
+    def poll():
+        if block_filter.get_new_entries():
+            return head_w3.eth.block_number
+        return None
 
-            if len(best_crossed_markets) == 0:
-                logger.info("No crossed markets")
-            else:
-                arbitrage.take_crossed_markets(
-                    best_crossed_markets, block_number, MINER_REWARD_PERCENTAGE
-                )
+    return poll
 
 
 if __name__ == "__main__":
@@ -1,19 +1,66 @@
 import logging
-from asyncio.log import logger
-from collections.abc import Iterable
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from typing import Optional
 
-import sympy
 from flashbots import Flashbots
-from web3 import Web3, middleware
+from web3 import Web3
 from web3.contract import Contract
-from web3.gas_strategies.time_based import construct_time_based_gas_price_strategy
-
+from web3.exceptions import ContractLogicError
+
+from simple_arbitrage.arbitrage.bundle_submitter import BundleSubmitter, acknowledged
+from simple_arbitrage.arbitrage.failure_cache import FailureCache
+from simple_arbitrage.arbitrage.funnel import (
+    ABANDONED,
+    BELOW_THRESHOLD,
+    ESTIMATE_GAS_FAILED,
+    GAS_CAP,
+    LOCAL_SIMULATION_FAILED,
+    NOT_BEST,
+    QUARANTINED,
+    SELECTED,
+    SIMULATED,
+    SIMULATION_REVERTED,
+    SOLVED,
+    SUBMITTED,
+    FunnelTrace,
+)
+from simple_arbitrage.arbitrage.local_simulator import (
+    MAX_BUNDLE_GAS,
+    REMOTE_CALLS_PER_CANDIDATE,
+    LocalSimulationResult,
+    LocalSimulationStats,
+    simulate_swap_legs,
+    swap_legs_from_calldata,
+)
+from simple_arbitrage.arbitrage.optimizer import optimal_trade_size
+from simple_arbitrage.arbitrage.price_cache import PRICE_CACHE, PriceCache
+from simple_arbitrage.arbitrage.transaction_context import (
+    TransactionBuildStats,
+    TransactionContext,
+)
+from simple_arbitrage.markets.reserve_snapshots import (
+    ReserveSnapshot,
+    pinned,
+    pinned_snapshot,
+)
 from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.runtime.events import EVENTS
+from simple_arbitrage.runtime.metrics import (
+    BUNDLES_SUBMITTED,
+    REMOTE_CALLS_AVOIDED,
+    SIMULATIONS,
+    SOLVER_CALLS,
+)
+from simple_arbitrage.runtime.scheduler import BlockDeadline
 from simple_arbitrage.utils.addresses import WETH_ADDRESS
 from simple_arbitrage.utils.util import ETHER
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass()
 class CrossedMarketDetails:
@@ -22,6 +69,8 @@ class CrossedMarketDetails:
     token_address: str
     buy_from_market: EthMarket
     sell_to_market: EthMarket
+    # follows the crossed market through the block's FunnelTrace
+    candidate_id: Optional[int] = None
 
     def __repr__(self):
         buy_tokens = self.buy_from_market.tokens
@@ -41,6 +90,12 @@ class MarketsByToken:
     markets_by_token: dict[str, list[EthMarket]]
 
 
+# gas limit headroom over estimate_gas for the bundle transaction
+GAS_LIMIT_MULTIPLIER = 2
+
+# how often the concurrent candidate mode checks for a new block while waiting
+CANCEL_POLL_INTERVAL = 0.05
+
 TEST_VOLUMES = [
     ETHER / 100,
     ETHER / 10,
@@ -54,178 +109,814 @@ TEST_VOLUMES = [
 ]
 
 
+@dataclass()
+class ArbitrageCandidate:
+    crossed_market: CrossedMarketDetails
+    intermediate_amount: int
+    miner_reward: int
+    # the uniswapWeth calls, encoded once and simulated locally before they are sent
+    targets: list[str] = field(default_factory=list)
+    payloads: list = field(default_factory=list)
+
+
+@dataclass()
+class SimulatedBundle:
+    candidate: ArbitrageCandidate
+    signed_bundle: list
+    simulation: dict
+
+
 class Arbitrage:
-    def __init__(self, executor_wallet, flashbots_provider, bundle_executor_contract):
+    def __init__(
+        self,
+        executor_wallet,
+        flashbots_provider,
+        bundle_executor_contract,
+        concurrent_candidates: int = 0,
+        candidate_deadline: float = 2.0,
+        bundle_submitter: Optional[BundleSubmitter] = None,
+        failure_cache: Optional[FailureCache] = None,
+    ):
+        """
+        Args:
+            concurrent_candidates (int): when > 0, estimate and simulate this many of the
+                top candidates concurrently instead of one by one. The workers call the
+                node through the bundle executor contract's provider at the same time,
+                so it must be safe to share across threads, like ThreadLocalProvider
+            candidate_deadline (float): seconds the concurrent mode waits for the top
+                candidates before submitting the best one that succeeded
+            bundle_submitter (Optional[BundleSubmitter]): fans bundles out to several
+                relays and target blocks, the flashbots provider's relay is used if None
+            failure_cache (Optional[FailureCache]): learns the tokens and pools whose
+                candidates fail estimate_gas or the relay simulation, and skips them
+        """
         self.executor_wallet = executor_wallet
         self.flashbots_provider: Flashbots = flashbots_provider
         self.bundle_executor_contract: Contract = bundle_executor_contract
-        w3 = Web3()
-        gas_price_stragegy = construct_time_based_gas_price_strategy(1)
-        w3.eth.set_gas_price_strategy(gas_price_stragegy)
-        w3.middleware_onion.add(middleware.time_based_cache_middleware)
+        self.local_simulation_stats = LocalSimulationStats(0)
+        self.transaction_build_stats = TransactionBuildStats(0, "node")
+        self.concurrent_candidates = concurrent_candidates
+        self.candidate_deadline = candidate_deadline
+        self.bundle_submitter = bundle_submitter
+        self.failure_cache = failure_cache
+        self.quarantined_candidates = 0
+        self.funnel_trace: Optional[FunnelTrace] = None
+        self._candidate_executor: Optional[ThreadPoolExecutor] = None
+        if concurrent_candidates > 0:
+            self._candidate_executor = ThreadPoolExecutor(
+                max_workers=concurrent_candidates,
+                thread_name_prefix="candidate",
+            )
 
     def take_crossed_markets(
         self,
         best_crossed_markets: list[CrossedMarketDetails],
         block_number: int,
         miner_reward_percentage: int,
+        deadline: Optional[BlockDeadline] = None,
+        transaction_context: Optional[TransactionContext] = None,
+        trace: Optional[FunnelTrace] = None,
     ):
-
-        for best_crossed_market in best_crossed_markets:
-            logging.info(f"Best Crossed Market: {best_crossed_market}\n")
+        """submit a bundle for the most profitable crossed market that simulates
+
+        Args:
+            deadline (Optional[BlockDeadline]): checked between candidates and before
+                submitting, raises StaleBlockError once a newer block arrives or the
+                block's time budget is spent
+            transaction_context (Optional[TransactionContext]): nonce, chain id and fees
+                for block_number, transactions are built without asking the node
+            trace (Optional[FunnelTrace]): the block's trace from evaluate_markets,
+                records where each candidate drops out
+        """
+        self.funnel_trace = trace
+        self.local_simulation_stats = LocalSimulationStats(block_number)
+        self.quarantined_candidates = 0
+        self.transaction_build_stats = TransactionBuildStats(
+            block_number, "node" if transaction_context is None else "context"
+        )
+        try:
+            candidates = self._prepare_candidates(
+                best_crossed_markets, miner_reward_percentage, transaction_context
+            )
+            if self._candidate_executor is not None:
+                simulated_bundle = self._simulate_candidates_concurrently(
+                    candidates, block_number, transaction_context, deadline
+                )
+            else:
+                simulated_bundle = self._simulate_candidates(
+                    candidates, block_number, transaction_context, deadline
+                )
+            if simulated_bundle is not None:
+                if deadline is not None:
+                    deadline.check("submit_bundle")
+                self._submit_bundle(simulated_bundle, block_number)
+        finally:
+            stats = self.local_simulation_stats
+            logging.info(
+                f"Local simulation rejected {stats.rejected}/{stats.candidates} candidates "
+                f"for block {block_number}, remote calls avoided: {stats.remote_calls_avoided} "
+                f"{dict(stats.rejections_by_reason)}"
+            )
+            if self.failure_cache is not None:
+                logging.info(
+                    f"Failure cache skipped {self.quarantined_candidates} candidates "
+                    f"for block {block_number}, remote calls avoided: "
+                    f"{self.quarantined_candidates * REMOTE_CALLS_PER_CANDIDATE}, "
+                    f"quarantined {self.failure_cache.summary()}"
+                )
+            build_stats = self.transaction_build_stats
             logging.info(
-                f"Send this much WETH {best_crossed_market.volume}, get this much profit {best_crossed_market.profit}"
+                f"Built {len(build_stats.build_seconds)} transactions from {build_stats.source}, "
+                f"average {build_stats.average_ms:.2f} ms per build"
             )
 
-            buy_calls = best_crossed_market.buy_from_market.sell_tokens_to_next_market(
-                WETH_ADDRESS,
-                best_crossed_market.volume,
-                best_crossed_market.sell_to_market,
+    def _prepare_candidates(
+        self,
+        best_crossed_markets: list[CrossedMarketDetails],
+        miner_reward_percentage: int,
+        transaction_context: Optional[TransactionContext] = None,
+    ) -> Iterable[ArbitrageCandidate]:
+        gas_price = _gas_price(transaction_context)
+        for best_crossed_market in best_crossed_markets:
+            EVENTS.emit(
+                "candidate",
+                token=best_crossed_market.token_address,
+                buy=best_crossed_market.buy_from_market.market_address,
+                sell=best_crossed_market.sell_to_market.market_address,
+                volume=best_crossed_market.volume,
+                profit=best_crossed_market.profit,
             )
-            inter = best_crossed_market.buy_from_market.get_tokens_out(
+            if self.failure_cache is not None:
+                blocked_by = self.failure_cache.blocked_by(
+                    best_crossed_market.token_address,
+                    best_crossed_market.buy_from_market.market_address,
+                    best_crossed_market.sell_to_market.market_address,
+                )
+                if blocked_by is not None:
+                    self.quarantined_candidates += 1
+                    REMOTE_CALLS_AVOIDED.inc(
+                        REMOTE_CALLS_PER_CANDIDATE, reason="quarantined"
+                    )
+                    self._trace(best_crossed_market, QUARANTINED, detail=blocked_by)
+                    continue
+
+            inter = best_crossed_market.buy_from_market.get_tokens_out_exact(
                 WETH_ADDRESS,
                 best_crossed_market.token_address,
-                best_crossed_market.volume,
+                int(best_crossed_market.volume),
             )
-            sell_call_data = best_crossed_market.sell_to_market.sell_tokens(
-                best_crossed_market.token_address,
-                inter,
+            miner_reward = (best_crossed_market.profit * miner_reward_percentage) / 100
+            targets, payloads = encode_bundle_calls(
+                best_crossed_market, inter, self.bundle_executor_contract.address
+            )
+
+            local_simulation = simulate_crossed_market(
+                best_crossed_market,
+                targets,
+                payloads,
                 self.bundle_executor_contract.address,
+                int(miner_reward),
+                gas_price,
             )
-            targets: list[str] = buy_calls.targets + [
-                best_crossed_market.sell_to_market.market_address
-            ]
-            payloads: list[str] = buy_calls.data + [sell_call_data]
-            logging.info(f"Targets: {targets}, Payloads: {payloads}")
-            miner_reward = (best_crossed_market.profit * miner_reward_percentage) / 100
+            self.local_simulation_stats.record(local_simulation)
+            if not local_simulation.success:
+                REMOTE_CALLS_AVOIDED.inc(
+                    REMOTE_CALLS_PER_CANDIDATE, reason="local_simulation"
+                )
+                self._trace(
+                    best_crossed_market,
+                    LOCAL_SIMULATION_FAILED,
+                    detail=local_simulation.reason,
+                )
+                EVENTS.emit(
+                    "local_simulation_failed",
+                    token=best_crossed_market.token_address,
+                    reason=local_simulation.reason,
+                )
+                continue
 
-            transaction = self.bundle_executor_contract.functions.uniswapWeth(
-                int(best_crossed_market.volume), int(miner_reward), targets, payloads
+            yield ArbitrageCandidate(
+                best_crossed_market, inter, int(miner_reward), targets, payloads
             )
 
-            try:
-                estimate_gas = transaction.estimate_gas()
-                if estimate_gas > 1400000:
+    def _simulate_candidates(
+        self,
+        candidates: Iterable[ArbitrageCandidate],
+        block_number: int,
+        transaction_context: Optional[TransactionContext],
+        deadline: Optional[BlockDeadline],
+    ) -> Optional[SimulatedBundle]:
+        for candidate in candidates:
+            abandon = None
+            if deadline is not None:
+                deadline.check("take_crossed_markets")
+                abandon = deadline.cancel_event
+            simulated_bundle = self._estimate_and_simulate(
+                candidate, block_number, transaction_context, abandon
+            )
+            if simulated_bundle is not None:
+                return simulated_bundle
+        return None
+
+    def _simulate_candidates_concurrently(
+        self,
+        candidates: Iterable[ArbitrageCandidate],
+        block_number: int,
+        transaction_context: Optional[TransactionContext],
+        deadline: Optional[BlockDeadline],
+    ) -> Optional[SimulatedBundle]:
+        """estimate and simulate the top candidates at once, keep the best that succeeds
+
+        Candidates arrive sorted by profit, so the best success is the one with the
+        lowest index. It is returned as soon as every candidate ranked above it has
+        failed, otherwise when candidate_deadline passes. A failed candidate's slot goes
+        to the next one in line until one succeeds, so candidates past the top are only
+        prepared when needed. Whatever is still outstanding is cancelled, and a stale
+        block deadline abandons the round.
+        """
+        candidates = iter(candidates)
+        abandon = threading.Event()
+        # worker threads read the same reserve snapshot as the calling thread
+        snapshot = pinned_snapshot()
+        futures: list[Future] = []
+
+        def submit_next() -> bool:
+            candidate = next(candidates, None)
+            if candidate is None:
+                return False
+            futures.append(
+                self._candidate_executor.submit(
+                    self._estimate_and_simulate_pinned,
+                    snapshot,
+                    candidate,
+                    block_number,
+                    transaction_context,
+                    abandon,
+                )
+            )
+            return True
+
+        candidate_deadline = time.monotonic() + self.candidate_deadline
+        try:
+            while True:
+                if deadline is not None:
+                    deadline.check("take_crossed_markets")
+
+                for future in futures:
+                    if not future.done():
+                        break
+                    if _succeeded(future):
+                        return future.result()
+
+                # a success ranks above every candidate still to come
+                if not any(_succeeded(future) for future in futures):
+                    running = sum(not future.done() for future in futures)
+                    while running < self.concurrent_candidates and submit_next():
+                        running += 1
+                    if not running:
+                        return None
+
+                remaining = candidate_deadline - time.monotonic()
+                if remaining <= 0:
                     logging.info(
-                        f"EstimateGas succeeded, but suspiciously large: {estimate_gas}"
+                        f"Candidate deadline of {self.candidate_deadline}s reached"
                     )
-                    continue
-
-                estimate_gas * 2
+                    return _best_completed(futures)
+                wait(
+                    futures,
+                    timeout=min(remaining, CANCEL_POLL_INTERVAL),
+                    return_when=FIRST_COMPLETED,
+                )
+        finally:
+            abandon.set()
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._candidate_executor is not None:
+            self._candidate_executor.shutdown(wait=False, cancel_futures=True)
+        if self.failure_cache is not None:
+            self.failure_cache.close()
+
+    def _estimate_and_simulate_pinned(
+        self, snapshot: Optional[ReserveSnapshot], *args
+    ) -> Optional[SimulatedBundle]:
+        if snapshot is None:
+            return self._estimate_and_simulate(*args)
+        with pinned(snapshot):
+            return self._estimate_and_simulate(*args)
+
+    def _estimate_and_simulate(
+        self,
+        candidate: ArbitrageCandidate,
+        block_number: int,
+        transaction_context: Optional[TransactionContext] = None,
+        abandon: Optional[threading.Event] = None,
+    ) -> Optional[SimulatedBundle]:
+        best_crossed_market = candidate.crossed_market
+        EVENTS.emit(
+            "bundle_calls",
+            token=best_crossed_market.token_address,
+            targets=candidate.targets,
+            payloads=candidate.payloads,
+        )
 
-            except Exception:
-                logging.warning(f"Estimate gas failure for {best_crossed_market}")
-                continue
+        transaction = self.bundle_executor_contract.functions.uniswapWeth(
+            int(best_crossed_market.volume),
+            candidate.miner_reward,
+            candidate.targets,
+            candidate.payloads,
+        )
 
-            bundled_transactions = [
-                {
-                    "signer": self.executor_wallet,
-                    "transaction": transaction.build_transaction(),
-                }
-            ]
-            logger.info(f"Bundled transactions: {bundled_transactions}")
-            signed_bundle = self.flashbots_provider.sign_bundle(bundled_transactions)
-            simulation = self.flashbots_provider.simulate(
-                bundled_transactions, block_number + 1
+        # uniswapWeth is onlyExecutor, estimated from anyone else it always reverts
+        sender = (
+            self.executor_wallet.address
+            if transaction_context is None
+            else transaction_context.sender
+        )
+        try:
+            estimate_gas = transaction.estimate_gas({"from": sender})
+            if estimate_gas > MAX_BUNDLE_GAS:
+                self._trace(best_crossed_market, GAS_CAP, detail=str(estimate_gas))
+                logging.info(
+                    f"EstimateGas succeeded, but suspiciously large: {estimate_gas}"
+                )
+                return None
+
+        except Exception as e:
+            self._trace(best_crossed_market, ESTIMATE_GAS_FAILED, detail=str(e))
+            # a timeout or a dropped connection says nothing about the candidate
+            if _reverted(e):
+                self._record_failure(best_crossed_market, ESTIMATE_GAS_FAILED)
+            EVENTS.emit(
+                "estimate_gas_failed",
+                token=best_crossed_market.token_address,
+                buy=best_crossed_market.buy_from_market.market_address,
+                sell=best_crossed_market.sell_to_market.market_address,
+                error=e,
             )
+            return None
 
-            if "error" in simulation or simulation["firstRevert"] is not None:
-                logger.error(
-                    f"Simulation error on token {best_crossed_market.token_address}, skipping..."
+        if abandon is not None and abandon.is_set():
+            self._trace(best_crossed_market, ABANDONED)
+            return None
+
+        build_start = time.perf_counter()
+        if transaction_context is None:
+            built_transaction = transaction.build_transaction()
+        else:
+            built_transaction = transaction.build_transaction(
+                transaction_context.transaction_params(
+                    estimate_gas * GAS_LIMIT_MULTIPLIER
                 )
-                continue
+            )
+        self.transaction_build_stats.build_seconds.append(
+            time.perf_counter() - build_start
+        )
 
+        bundled_transactions = [
+            {
+                "signer": self.executor_wallet,
+                "transaction": built_transaction,
+            }
+        ]
+        EVENTS.emit(
+            "bundle_built",
+            token=best_crossed_market.token_address,
+            signer=getattr(self.executor_wallet, "address", None),
+            nonce=built_transaction.get("nonce"),
+            gas=built_transaction.get("gas"),
+        )
+        signed_bundle = self.flashbots_provider.sign_bundle(bundled_transactions)
+        simulation = self._simulate_bundle(
+            bundled_transactions, block_number, transaction_context
+        )
+
+        if _simulation_failed(simulation):
+            SIMULATIONS.inc(result="failure")
+            self._trace(best_crossed_market, SIMULATION_REVERTED)
+            self._record_failure(best_crossed_market, SIMULATION_REVERTED)
+            logger.error(
+                f"Simulation error on token {best_crossed_market.token_address}, skipping..."
+            )
+            return None
+
+        SIMULATIONS.inc(result="success")
+        self._trace(best_crossed_market, SIMULATED)
+        if self.failure_cache is not None:
+            self.failure_cache.record_success(
+                best_crossed_market.token_address,
+                best_crossed_market.buy_from_market.market_address,
+                best_crossed_market.sell_to_market.market_address,
+            )
+        return SimulatedBundle(candidate, signed_bundle, simulation)
+
+    def backrun(
+        self,
+        crossed_market: CrossedMarketDetails,
+        pending_transactions: list[Mapping],
+        block_number: int,
+        miner_reward_percentage: int,
+        transaction_context: Optional[TransactionContext] = None,
+    ) -> Optional[SimulatedBundle]:
+        """submit the pending transactions with the trade taking crossed_market right
+        behind them, for the block after block_number
+
+        crossed_market is priced on the reserves the pending transactions lead to,
+        which must be pinned. estimate_gas would run without them, so the gas limit
+        comes from local simulation and the relay simulates the whole bundle.
+        """
+        intermediate_amount = crossed_market.buy_from_market.get_tokens_out_exact(
+            WETH_ADDRESS, crossed_market.token_address, int(crossed_market.volume)
+        )
+        miner_reward = int(crossed_market.profit * miner_reward_percentage / 100)
+        targets, payloads = encode_bundle_calls(
+            crossed_market, intermediate_amount, self.bundle_executor_contract.address
+        )
+        local_simulation = simulate_crossed_market(
+            crossed_market,
+            targets,
+            payloads,
+            self.bundle_executor_contract.address,
+            miner_reward,
+            _gas_price(transaction_context),
+        )
+        if not local_simulation.success:
+            REMOTE_CALLS_AVOIDED.inc(1, reason="local_simulation")
+            return None
+
+        gas = local_simulation.gas_estimate * GAS_LIMIT_MULTIPLIER
+        transaction = self.bundle_executor_contract.functions.uniswapWeth(
+            int(crossed_market.volume), miner_reward, targets, payloads
+        )
+        if transaction_context is None:
+            built_transaction = transaction.build_transaction({"gas": gas})
+        else:
+            built_transaction = transaction.build_transaction(
+                transaction_context.transaction_params(gas)
+            )
+        bundled_transactions = [
+            *pending_transactions,
+            {"signer": self.executor_wallet, "transaction": built_transaction},
+        ]
+        signed_bundle = self.flashbots_provider.sign_bundle(bundled_transactions)
+        simulation = self._simulate_bundle(
+            bundled_transactions, block_number, transaction_context
+        )
+        if _simulation_failed(simulation):
+            SIMULATIONS.inc(result="failure")
             logger.info(
-                f"Submitting bundle, profit sent to miner: {simulation['coinbaseDiff']},\
-                 effective gas price: {simulation['coinbaseDiff']/simulation['totalGasUsed']} GWEI"
+                f"Backrun of {len(pending_transactions)} pending transactions on token "
+                f"{crossed_market.token_address} failed to simulate"
             )
+            return None
+
+        SIMULATIONS.inc(result="success")
+        simulated_bundle = SimulatedBundle(
+            ArbitrageCandidate(
+                crossed_market, intermediate_amount, miner_reward, targets, payloads
+            ),
+            signed_bundle,
+            simulation,
+        )
+        self._submit_bundle(simulated_bundle, block_number)
+        return simulated_bundle
 
-            for target_block_number in [block_number + 1, block_number + 2]:
-                self.flashbots_provider.sendRawBundle(
-                    signed_bundle, target_block_number
-                )
+    def _simulate_bundle(
+        self,
+        bundled_transactions: list,
+        block_number: int,
+        transaction_context: Optional[TransactionContext],
+    ) -> dict:
+        if transaction_context is None:
+            return self.flashbots_provider.simulate(
+                bundled_transactions, block_number + 1
+            )
+        return self.flashbots_provider.simulate(
+            bundled_transactions,
+            block_number + 1,
+            state_block_tag=hex(block_number),
+            block_timestamp=transaction_context.simulation_timestamp(block_number + 1),
+        )
+
+    def _submit_bundle(self, simulated_bundle: SimulatedBundle, block_number: int):
+        simulation = simulated_bundle.simulation
+        BUNDLES_SUBMITTED.inc()
+        self._trace(simulated_bundle.candidate.crossed_market, SUBMITTED)
+        logger.info(
+            f"Submitting bundle, profit sent to miner: {simulation['coinbaseDiff']},\
+             effective gas price: {int(simulation['coinbaseDiff'])/simulation['totalGasUsed']} GWEI"
+        )
+
+        if self.bundle_submitter is not None:
+            acknowledgements = self.bundle_submitter.submit(
+                simulated_bundle.signed_bundle, block_number
+            )
+            logger.info(
+                f"Bundle acknowledged by {acknowledged(acknowledgements)}/{len(acknowledgements)} relay requests"
+            )
             return
 
+        for target_block_number in [block_number + 1, block_number + 2]:
+            self.flashbots_provider.sendRawBundle(
+                simulated_bundle.signed_bundle, target_block_number
+            )
+
+    def _record_failure(self, crossed_market: CrossedMarketDetails, reason: str):
+        if self.failure_cache is not None:
+            self.failure_cache.record_failure(
+                crossed_market.token_address,
+                crossed_market.buy_from_market.market_address,
+                crossed_market.sell_to_market.market_address,
+                reason,
+            )
+
+    def _trace(self, crossed_market: CrossedMarketDetails, stage: str, **kwargs):
+        if self.funnel_trace is not None:
+            self.funnel_trace.record(crossed_market.candidate_id, stage, **kwargs)
+
+
+def _succeeded(future: Future) -> bool:
+    return (
+        future.done()
+        and not future.cancelled()
+        and future.exception() is None
+        and future.result() is not None
+    )
+
+
+def _best_completed(futures: list[Future]) -> Optional[SimulatedBundle]:
+    for future in futures:
+        if _succeeded(future):
+            return future.result()
+    return None
+
+
+def _gas_price(transaction_context: Optional[TransactionContext]) -> int:
+    # gas is only priced once the block's fees are known
+    if transaction_context is None:
+        return 0
+    return (
+        transaction_context.base_fee_per_gas
+        + transaction_context.max_priority_fee_per_gas
+    )
+
+
+def _reverted(error: Exception) -> bool:
+    """whether estimate_gas failed because the transaction reverts, the node reports
+    that as a ContractLogicError or a ValueError carrying its "execution reverted" """
+    return isinstance(error, ContractLogicError) or (
+        isinstance(error, ValueError) and "revert" in str(error).lower()
+    )
+
+
+def _simulation_failed(simulation: dict) -> bool:
+    if "error" in simulation or simulation.get("firstRevert") is not None:
+        return True
+    return any(
+        "error" in result or "revert" in result
+        for result in simulation.get("results", [])
+    )
+
+
+def encode_bundle_calls(
+    crossed_market: CrossedMarketDetails, intermediate_amount: int, recipient: str
+) -> tuple[list[str], list]:
+    """targets and payloads of the uniswapWeth call taking a crossed market, both
+    empty when the buy market cannot pay the sell market directly"""
+    buy_calls = crossed_market.buy_from_market.sell_tokens_to_next_market(
+        WETH_ADDRESS,
+        crossed_market.volume,
+        crossed_market.sell_to_market,
+    )
+    if buy_calls is None:
+        return [], []
+    sell_call_data = crossed_market.sell_to_market.sell_tokens(
+        crossed_market.token_address, intermediate_amount, recipient
+    )
+    return (
+        buy_calls.targets + [crossed_market.sell_to_market.market_address],
+        buy_calls.data + [sell_call_data],
+    )
+
+
+def simulate_crossed_market(
+    crossed_market: CrossedMarketDetails,
+    targets: list[str],
+    payloads: list,
+    recipient: str,
+    miner_reward: int,
+    gas_price: int = 0,
+) -> LocalSimulationResult:
+    """replay the swaps encoded for a crossed market, as uniswapWeth would run them
+
+    Args:
+        recipient (str): the executor, which the last swap must pay
+        gas_price (int): wei per gas of the bundle transaction, 0 skips the gas cost
+    """
+    # the executor pays both markets by transfer before calling their swap
+    for market, token_in in (
+        (crossed_market.buy_from_market, WETH_ADDRESS),
+        (crossed_market.sell_to_market, crossed_market.token_address),
+    ):
+        if not market.receive_directly(token_in):
+            return LocalSimulationResult(False, "receive", 0, 0, 0)
+
+    markets = {
+        market.market_address: market
+        for market in (crossed_market.buy_from_market, crossed_market.sell_to_market)
+    }
+    legs = swap_legs_from_calldata(markets, targets, payloads, recipient)
+    if legs is None:
+        return LocalSimulationResult(False, "calldata", 0, 0, 0)
+    return simulate_swap_legs(
+        legs,
+        int(crossed_market.volume),
+        miner_reward,
+        gas_price=gas_price,
+        calldata=b"".join(
+            Web3.toBytes(hexstr=payload) if isinstance(payload, str) else payload
+            for payload in payloads
+        ),
+    )
+
 
 def evaluate_markets(
     markets_by_token: dict[str, list[EthMarket]],
+    deadline: Optional[BlockDeadline] = None,
+    trace: Optional[FunnelTrace] = None,
+    price_cache: PriceCache = PRICE_CACHE,
+    skip: frozenset[str] = frozenset(),
+    quarantined: frozenset[str] = frozenset(),
 ) -> Iterable[CrossedMarketDetails]:
-    """get best crossed markets for each non WETH token, sorted by profit desc"""
+    """get best crossed markets for each non WETH token, sorted by profit desc
+
+    Args:
+        trace (Optional[FunnelTrace]): opens a candidate for every crossed market
+        price_cache (PriceCache): token prices of the markets whose reserves are unchanged
+        skip (frozenset[str]): token and market addresses left out
+        quarantined (frozenset[str]): token and market addresses quarantined by the
+            FailureCache, their crossed markets are counted and left out; a token
+            left without any is solved only to tell if its candidate was blocked
+    """
     best_crossed_markets: list[CrossedMarketDetails] = []
+    quarantined_crossed_markets = 0
+    quarantined_tokens = 0
+    if skip:
+        markets_by_token = {
+            token_address: [
+                market for market in markets if market.market_address not in skip
+            ]
+            for token_address, markets in markets_by_token.items()
+            if token_address not in skip
+        }
 
     for token_address in markets_by_token:
+        if deadline is not None:
+            deadline.check("evaluate_markets")
         markets: list[EthMarket] = markets_by_token[token_address]
-        priced_markets = list(_get_priced_markets(markets, token_address))
-
-        crossed_markets: list[tuple[EthMarket, EthMarket]] = []
-
-        for priced_market in priced_markets:
-            for pm in priced_markets:
-                if pm["sell_token_price"] > priced_market["buy_token_price"]:
-                    crossed_markets.append(
-                        (priced_market["eth_market"], pm["eth_market"]),
-                    )
+        priced_markets = price_cache.priced_markets(markets, token_address)
+
+        # the executor pays every market by transfer, so only markets that take one
+        # can be sold to (receiving the token) or bought from (receiving WETH)
+        crossed_markets: list[tuple[EthMarket, EthMarket]] = [
+            (market, other_market)
+            for market, buy_token_price, _ in priced_markets
+            if market.receive_directly(token_address)
+            for other_market, _, sell_token_price in priced_markets
+            if sell_token_price > buy_token_price
+            and other_market.receive_directly(WETH_ADDRESS)
+        ]
+        if quarantined and crossed_markets:
+            unquarantined = _without_quarantined(
+                crossed_markets, token_address, quarantined
+            )
+            quarantined_crossed_markets += len(crossed_markets) - len(unquarantined)
+            if not unquarantined:
+                # the token's candidate, if above the threshold, would have been
+                # blocked before execution
+                blocked = get_best_crossed_market(crossed_markets, token_address)
+                quarantined_tokens += (
+                    blocked is not None and blocked.profit > ETHER / 1000
+                )
+            crossed_markets = unquarantined
 
-        logger.info(f"crossed markets len: {len(crossed_markets)}")
+        EVENTS.emit("crossed_markets", token=token_address, count=len(crossed_markets))
         best_crossed_market: Optional[CrossedMarketDetails] = get_best_crossed_market(
             crossed_markets,
             token_address,
+            trace,
         )
         if best_crossed_market and best_crossed_market.profit > ETHER / 1000:
             best_crossed_markets.append(best_crossed_market)
-
+            if trace is not None:
+                trace.record(best_crossed_market.candidate_id, SELECTED)
+        elif best_crossed_market and trace is not None:
+            trace.record(best_crossed_market.candidate_id, BELOW_THRESHOLD)
+
+    if quarantined_crossed_markets:
+        REMOTE_CALLS_AVOIDED.inc(
+            quarantined_tokens * REMOTE_CALLS_PER_CANDIDATE, reason="quarantined"
+        )
+        logger.info(
+            f"Failure cache skipped {quarantined_crossed_markets} crossed markets, "
+            f"all of them for {quarantined_tokens} tokens, remote calls avoided: "
+            f"{quarantined_tokens * REMOTE_CALLS_PER_CANDIDATE}"
+        )
     best_crossed_markets.sort(key=lambda x: x.profit, reverse=True)
     return best_crossed_markets
 
 
-def _calc_optimal_size_and_profit(
-    buy_from_market: EthMarket, sell_to_market: EthMarket, token_address: str
-) -> tuple[float, float]:
+def evaluate_pool_crossings(
+    markets_by_token: Mapping[str, list[EthMarket]],
+    pools_by_token: Mapping[str, list[EthMarket]],
+    deadline: Optional[BlockDeadline] = None,
+    price_cache: PriceCache = PRICE_CACHE,
+) -> list[CrossedMarketDetails]:
+    """each token's best crossed market through one of its pools, for reporting
 
-    size = sympy.Symbol("size")
-    tokens_out_from_buying_size = buy_from_market.get_tokens_out(
-        WETH_ADDRESS,
-        token_address,
-        size,
-    )
+    The executor pays markets by transfer and pools need a swap callback, so these
+    are never executed; evaluate_markets leaves the pools out.
+    """
+    best_crossed_markets: list[CrossedMarketDetails] = []
+    for token_address, pools in pools_by_token.items():
+        if deadline is not None:
+            deadline.check("evaluate_markets")
+        priced_markets = price_cache.priced_markets(
+            [*markets_by_token.get(token_address, []), *pools], token_address
+        )
+        crossed_markets = [
+            (market, other_market)
+            for market, buy_token_price, _ in priced_markets
+            for other_market, _, sell_token_price in priced_markets
+            if sell_token_price > buy_token_price
+            and (market in pools or other_market in pools)
+        ]
+        best_crossed_market = get_best_crossed_market(crossed_markets, token_address)
+        if best_crossed_market and best_crossed_market.profit > ETHER / 1000:
+            best_crossed_markets.append(best_crossed_market)
+    best_crossed_markets.sort(key=lambda x: x.profit, reverse=True)
+    return best_crossed_markets
 
-    proceeds_from_selling_tokens = sell_to_market.get_tokens_out(
-        token_address,
-        WETH_ADDRESS,
-        tokens_out_from_buying_size,
-    )
 
-    objective = proceeds_from_selling_tokens - size
-    obj_diff = sympy.diff(objective, size)
-    result: list = sympy.solve(obj_diff, size)
-    optimal_size = sympy.N(max([sympy.re(i) for i in result]))
-    profit = sympy.N(objective.subs({size: optimal_size}))
+def _without_quarantined(
+    crossed_markets: list[tuple[EthMarket, EthMarket]],
+    token_address: str,
+    quarantined: frozenset[str],
+) -> list[tuple[EthMarket, EthMarket]]:
+    if token_address in quarantined:
+        return []
+    return [
+        (market, other_market)
+        for market, other_market in crossed_markets
+        if market.market_address not in quarantined
+        and other_market.market_address not in quarantined
+    ]
+
 
-    return optimal_size, profit
+def _calc_optimal_size_and_profit(
+    buy_from_market: EthMarket, sell_to_market: EthMarket, token_address: str
+) -> tuple[float, float]:
+    SOLVER_CALLS.inc()
+    trade_size = optimal_trade_size(buy_from_market, sell_to_market, token_address)
+    return trade_size.volume, trade_size.profit
 
 
 def get_best_crossed_market(
     crossed_markets: list[tuple[EthMarket, EthMarket]],
     token_address: str,
+    trace: Optional[FunnelTrace] = None,
 ) -> Optional[CrossedMarketDetails]:
     """get the most profitable crossed market for a single non WETH token
 
     Args:
         crossed_markets (list[tuple[EthMarket, EthMarket]]): profitable crossed markets for a single non WETH token
         token_address (str): non WETH token
+        trace (Optional[FunnelTrace]): records each crossed market as a candidate
     """
     best_crossed_market: Optional[CrossedMarketDetails] = None
 
     for crossed_market in crossed_markets:
         sell_to_market = crossed_market[0]
         buy_from_market = crossed_market[1]
+        candidate_id = None
+        if trace is not None:
+            candidate_id = trace.open(
+                token_address,
+                buy_from_market.market_address,
+                sell_to_market.market_address,
+            )
 
         optimal_size, profit = _calc_optimal_size_and_profit(
             buy_from_market, sell_to_market, token_address
         )
+        if trace is not None:
+            trace.record(candidate_id, SOLVED, profit=profit)
 
         if best_crossed_market:
             if profit > best_crossed_market.profit:
+                if trace is not None:
+                    trace.record(best_crossed_market.candidate_id, NOT_BEST)
 
                 best_crossed_market = CrossedMarketDetails(
                     volume=optimal_size,
@@ -233,7 +924,10 @@ def get_best_crossed_market(
                     token_address=token_address,
                     sell_to_market=sell_to_market,
                     buy_from_market=buy_from_market,
+                    candidate_id=candidate_id,
                 )
+            elif trace is not None:
+                trace.record(candidate_id, NOT_BEST)
         else:
 
             best_crossed_market = CrossedMarketDetails(
@@ -242,22 +936,22 @@ def get_best_crossed_market(
                 token_address=token_address,
                 sell_to_market=sell_to_market,
                 buy_from_market=buy_from_market,
+                candidate_id=candidate_id,
             )
     return best_crossed_market
 
 
-def _get_priced_markets(markets: list[EthMarket], token_address: str) -> Iterable[dict]:
-    for market in markets:
-        yield {
-            "eth_market": market,
-            "buy_token_price": market.get_tokens_in(
-                token_address,
-                WETH_ADDRESS,
-                ETHER / 100,
-            ),  # how many tokens needed to get 0.01 ETH
-            "sell_token_price": market.get_tokens_out(
-                WETH_ADDRESS,
-                token_address,
-                ETHER / 100,
-            ),  # how many tokens we get from 0.01 ETH - If sell > buy then profit
-        }
+def profit_curve(
+    buy_from_market: EthMarket,
+    sell_to_market: EthMarket,
+    token_address: str,
+    volumes: list[float] = TEST_VOLUMES,
+) -> list[float]:
+    """WETH profit of buying tokens with each volume and selling them on, batched"""
+    tokens_out = buy_from_market.get_tokens_out_batch(
+        WETH_ADDRESS, token_address, volumes
+    )
+    proceeds = sell_to_market.get_tokens_out_batch(
+        token_address, WETH_ADDRESS, tokens_out
+    )
+    return [proceed - volume for proceed, volume in zip(proceeds, volumes)]
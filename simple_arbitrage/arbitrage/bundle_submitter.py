@@ -0,0 +1,211 @@
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import count
+from typing import Any, Optional
+
+import requests
+from eth_account import Account, messages
+from hexbytes import HexBytes
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+
+from simple_arbitrage.runtime.metrics import RELAY_ACK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_BLOCK_OFFSETS = [1, 2]
+
+# acknowledgement latencies kept per relay
+LATENCY_HISTORY = 1000
+
+
+@dataclass()
+class RelayAcknowledgement:
+    relay_url: str
+    target_block_number: int
+    latency: float
+    success: bool
+    error: Optional[str] = None
+    result: Any = None
+
+
+class BundleSubmitter:
+    """send a signed bundle to every relay for every target block at once
+
+    Requests go over one pooled session so repeated submissions reuse open
+    connections, and each relay's acknowledgement latency is kept and observed in
+    searcher_relay_ack_seconds.
+    """
+
+    def __init__(
+        self,
+        signature_account,
+        relay_urls: list[str],
+        target_block_offsets: Optional[list[int]] = None,
+        timeout: float = 2.0,
+    ):
+        self.signature_account = signature_account
+        self.relay_urls = relay_urls
+        self.target_block_offsets = target_block_offsets or list(
+            DEFAULT_TARGET_BLOCK_OFFSETS
+        )
+        self.timeout = timeout
+        self.acknowledgement_latencies: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=LATENCY_HISTORY)
+        )
+
+        fan_out = len(relay_urls) * len(self.target_block_offsets)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(relay_urls), pool_maxsize=fan_out)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=fan_out, thread_name_prefix="relay"
+        )
+        self._request_ids = count()
+
+    def submit(
+        self, signed_bundle: list[HexBytes], block_number: int
+    ) -> list[RelayAcknowledgement]:
+        # every relay gets the same body per target block, so it is signed only once
+        requests_by_block = [
+            (
+                block_number + offset,
+                *self._signed_request(signed_bundle, block_number + offset),
+            )
+            for offset in self.target_block_offsets
+        ]
+        futures = [
+            self._executor.submit(
+                self._post_bundle,
+                relay_url,
+                target_block_number,
+                body,
+                signature,
+            )
+            for target_block_number, body, signature in requests_by_block
+            for relay_url in self.relay_urls
+        ]
+        wait(futures, timeout=self.timeout)
+
+        acknowledgements = []
+        for future in futures:
+            if future.done():
+                acknowledgements.append(future.result())
+            else:
+                future.cancel()
+        for acknowledgement in acknowledgements:
+            if not acknowledgement.success:
+                logger.warning(
+                    f"Relay {acknowledgement.relay_url} rejected bundle for block "
+                    f"{acknowledgement.target_block_number}: {acknowledgement.error}"
+                )
+        return acknowledgements
+
+    def latency_summary(self) -> dict[str, float]:
+        """mean acknowledgement latency per relay, in seconds"""
+        return {
+            relay_url: sum(latencies) / len(latencies)
+            for relay_url, latencies in self.acknowledgement_latencies.items()
+            if latencies
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _signed_request(
+        self, signed_bundle: list[HexBytes], target_block_number: int
+    ) -> tuple[str, str]:
+        body = json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": next(self._request_ids),
+                "method": "eth_sendBundle",
+                "params": [
+                    {
+                        "txs": [_to_hex(tx) for tx in signed_bundle],
+                        "blockNumber": hex(target_block_number),
+                        "minTimestamp": 0,
+                        "maxTimestamp": 0,
+                        "revertingTxHashes": [],
+                    }
+                ],
+            }
+        )
+        return body, self._signature(body)
+
+    def _post_bundle(
+        self, relay_url: str, target_block_number: int, body: str, signature: str
+    ) -> RelayAcknowledgement:
+        headers = {
+            "Content-Type": "application/json",
+            "X-Flashbots-Signature": signature,
+        }
+
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                relay_url, data=body, headers=headers, timeout=self.timeout
+            )
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return RelayAcknowledgement(
+                relay_url,
+                target_block_number,
+                time.perf_counter() - start,
+                False,
+                error=str(e),
+            )
+        latency = time.perf_counter() - start
+        self.acknowledgement_latencies[relay_url].append(latency)
+        RELAY_ACK_SECONDS.observe(latency, relay=relay_url)
+
+        if "error" in payload:
+            return RelayAcknowledgement(
+                relay_url,
+                target_block_number,
+                latency,
+                False,
+                error=str(payload["error"]),
+            )
+        return RelayAcknowledgement(
+            relay_url, target_block_number, latency, True, result=payload.get("result")
+        )
+
+    def _signature(self, body: str) -> str:
+        """same X-Flashbots-Signature the flashbots provider sends"""
+        message = messages.encode_defunct(text=Web3.keccak(text=body).hex())
+        signed_message = Account.sign_message(
+            message, private_key=self.signature_account.key
+        )
+        return f"{self.signature_account.address}:{signed_message.signature.hex()}"
+
+
+def _to_hex(signed_transaction: bytes) -> str:
+    tx_hex = signed_transaction.hex()
+    if tx_hex[0:2] != "0x":
+        tx_hex = f"0x{tx_hex}"
+    return tx_hex
+
+
+def parse_relay_urls(value: Optional[str]) -> list[str]:
+    if not value:
+        return []
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+def parse_target_block_offsets(value: Optional[str]) -> list[int]:
+    if not value:
+        return list(DEFAULT_TARGET_BLOCK_OFFSETS)
+    return [int(offset) for offset in value.split(",") if offset.strip()]
+
+
+def acknowledged(acknowledgements: Iterable[RelayAcknowledgement]) -> int:
+    return sum(1 for acknowledgement in acknowledgements if acknowledgement.success)
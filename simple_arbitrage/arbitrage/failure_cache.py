@@ -0,0 +1,188 @@
+"""negative cache of tokens and pools whose candidates keep failing remotely
+
+Fee-on-transfer and otherwise broken tokens price like any other, so they keep
+coming back as the best crossed market and costing an estimate_gas failure or a
+relay simulation revert every block. Each such failure counts against the
+candidate's token and both of its pools. From DEFAULT_THRESHOLD consecutive
+failures on, an address is quarantined for a TTL that doubles with every further
+failure, up to max_ttl; evaluation and execution skip quarantined addresses. A
+candidate that simulates clears its token and pools.
+
+With a path, entries are kept in a JSON file so restarts remember them. The file is
+rewritten on a background thread, changes made while it writes are coalesced into
+the next write, and close() waits for the last one.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 2
+DEFAULT_TTL = 600.0
+DEFAULT_MAX_TTL = 86400.0
+
+TOKEN = "token"
+POOL = "pool"
+
+
+@dataclass()
+class FailureEntry:
+    kind: str  # TOKEN or POOL
+    failures: int = 0  # consecutive, since the last success
+    quarantined_until: float = 0.0  # unix time
+    last_failure: float = 0.0
+    reason: str = ""
+
+
+class FailureCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: int = DEFAULT_THRESHOLD,
+        ttl: float = DEFAULT_TTL,
+        max_ttl: float = DEFAULT_MAX_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._entries: dict[str, FailureEntry] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._closed = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        if path is not None:
+            if os.path.exists(path):
+                self._load()
+            self._writer = threading.Thread(
+                target=self._write_changes, name="failure-cache-writer", daemon=True
+            )
+            self._writer.start()
+
+    def quarantined(self) -> frozenset[str]:
+        """token and pool addresses to skip right now"""
+        now = self.clock()
+        with self._lock:
+            return frozenset(
+                address
+                for address, entry in self._entries.items()
+                if entry.quarantined_until > now
+            )
+
+    def blocked_by(
+        self, token_address: str, buy_market: str, sell_market: str
+    ) -> Optional[str]:
+        """the quarantined address among a candidate's token and pools, if any"""
+        now = self.clock()
+        with self._lock:
+            for address in (token_address, buy_market, sell_market):
+                entry = self._entries.get(address)
+                if entry is not None and entry.quarantined_until > now:
+                    return address
+        return None
+
+    def record_failure(
+        self, token_address: str, buy_market: str, sell_market: str, reason: str
+    ):
+        now = self.clock()
+        with self._lock:
+            for address, kind in (
+                (token_address, TOKEN),
+                (buy_market, POOL),
+                (sell_market, POOL),
+            ):
+                entry = self._entries.setdefault(address, FailureEntry(kind))
+                entry.failures += 1
+                entry.last_failure = now
+                entry.reason = reason
+                if entry.failures >= self.threshold:
+                    ttl = min(
+                        self.ttl * 2 ** (entry.failures - self.threshold), self.max_ttl
+                    )
+                    entry.quarantined_until = now + ttl
+                    logger.info(
+                        f"Quarantined {kind} {address} for {ttl:.0f}s after "
+                        f"{entry.failures} failures: {reason}"
+                    )
+            self._prune(now)
+        self._changed.set()
+
+    def record_success(self, token_address: str, buy_market: str, sell_market: str):
+        with self._lock:
+            cleared = [
+                self._entries.pop(address, None)
+                for address in (token_address, buy_market, sell_market)
+            ]
+        if any(entry is not None for entry in cleared):
+            self._changed.set()
+
+    def summary(self) -> dict[str, int]:
+        """quarantined addresses by kind"""
+        now = self.clock()
+        counts = {TOKEN: 0, POOL: 0}
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.quarantined_until > now:
+                    counts[entry.kind] += 1
+        return counts
+
+    def close(self):
+        """writes the last changes and stops the writer"""
+        if self._writer is not None:
+            self._closed.set()
+            self._changed.set()
+            self._writer.join()
+            self._writer = None
+
+    def _prune(self, now: float):
+        """with the lock held, drops entries whose last failure is past max_ttl"""
+        for address in [
+            address
+            for address, entry in self._entries.items()
+            if entry.quarantined_until <= now
+            and now - entry.last_failure > self.max_ttl
+        ]:
+            del self._entries[address]
+
+    def _write_changes(self):
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            self._save()
+            if self._closed.is_set() and not self._changed.is_set():
+                return
+
+    def _save(self):
+        with self._lock:
+            content = {
+                address: asdict(entry) for address, entry in self._entries.items()
+            }
+        temporary_path = f"{self.path}.tmp"
+        try:
+            with open(temporary_path, "w") as f:
+                json.dump(content, f)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            logger.exception(f"Writing failure cache to {self.path} failed")
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+            self._entries = {
+                address: FailureEntry(**entry) for address, entry in content.items()
+            }
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable failure cache {self.path}: {e}")
+            return
+        logger.info(
+            f"Loaded {len(self._entries)} failure cache entries, quarantined "
+            f"{self.summary()}"
+        )
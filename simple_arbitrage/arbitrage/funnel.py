@@ -0,0 +1,161 @@
+"""per-block trace of every arbitrage candidate from pricing to submission
+
+evaluate_markets opens a candidate for each crossed market pricing finds and the
+candidate id then rides on its CrossedMarketDetails, so take_crossed_markets can
+record where it dropped out: the solver, losing to a better pair for its token, the
+ETHER/1000 profit threshold, the failure cache, local simulation, estimate_gas, the
+gas cap, the relay simulation, or submission. A candidate's outcome is the last stage it reached.
+Crossed markets taken from a confirmed mempool prediction are recorded as predicted
+instead of solved.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import IO, Optional
+
+logger = logging.getLogger(__name__)
+
+PRICED = "priced"
+SOLVED = "solved"
+PREDICTED = "predicted"
+NOT_BEST = "not_best"
+BELOW_THRESHOLD = "below_threshold"
+SELECTED = "selected"
+QUARANTINED = "quarantined"
+LOCAL_SIMULATION_FAILED = "local_simulation_failed"
+ESTIMATE_GAS_FAILED = "estimate_gas_failed"
+GAS_CAP = "gas_cap"
+ABANDONED = "abandoned"
+SIMULATION_REVERTED = "simulation_reverted"
+SIMULATED = "simulated"
+SUBMITTED = "submitted"
+
+# traces kept for blocks still moving through the pipeline
+TRACE_HISTORY = 8
+
+
+@dataclass()
+class CandidateTrace:
+    candidate_id: int
+    token_address: str
+    buy_from_market: str
+    sell_to_market: str
+    profit: Optional[float] = None
+    detail: Optional[str] = None
+    # (stage, milliseconds since the block's trace started)
+    stages: list[tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def outcome(self) -> str:
+        return self.stages[-1][0]
+
+    def record(self, block_number: int) -> dict:
+        """compact, JSON ready"""
+        record = {
+            "block": block_number,
+            "id": self.candidate_id,
+            "token": self.token_address,
+            "buy": self.buy_from_market,
+            "sell": self.sell_to_market,
+            "outcome": self.outcome,
+            "stages": [[stage, round(ms, 3)] for stage, ms in self.stages],
+        }
+        if self.profit is not None:
+            record["profit"] = self.profit
+        if self.detail is not None:
+            record["detail"] = self.detail
+        return record
+
+
+class FunnelTrace:
+    def __init__(self, block_number: int):
+        self.block_number = block_number
+        self.started = time.perf_counter()
+        self.candidates: dict[int, CandidateTrace] = {}
+        self._lock = threading.Lock()
+
+    def open(
+        self, token_address: str, buy_from_market: str, sell_to_market: str
+    ) -> int:
+        with self._lock:
+            candidate_id = len(self.candidates)
+            self.candidates[candidate_id] = CandidateTrace(
+                candidate_id,
+                token_address,
+                buy_from_market,
+                sell_to_market,
+                stages=[(PRICED, self._elapsed_ms())],
+            )
+        return candidate_id
+
+    def record(
+        self,
+        candidate_id: Optional[int],
+        stage: str,
+        profit: Optional[float] = None,
+        detail: Optional[str] = None,
+    ):
+        if candidate_id is None:
+            return
+        with self._lock:
+            candidate = self.candidates[candidate_id]
+            candidate.stages.append((stage, self._elapsed_ms()))
+            if profit is not None:
+                candidate.profit = float(profit)
+            if detail is not None:
+                candidate.detail = detail
+
+    def outcomes(self) -> Counter:
+        with self._lock:
+            return Counter(candidate.outcome for candidate in self.candidates.values())
+
+    def records(self) -> list[dict]:
+        with self._lock:
+            candidates = list(self.candidates.values())
+        return [candidate.record(self.block_number) for candidate in candidates]
+
+    def summary(self) -> str:
+        outcomes = self.outcomes()
+        return (
+            f"block {self.block_number}: {sum(outcomes.values())} candidates "
+            f"{dict(outcomes.most_common())}"
+        )
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+class FunnelTracer:
+    """hands out a trace per block and exports finished ones as JSON lines"""
+
+    def __init__(self, output: Optional[IO[str]] = None):
+        self.output = output
+        self._traces: OrderedDict[int, FunnelTrace] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_block(self, block_number: int) -> FunnelTrace:
+        with self._lock:
+            trace = self._traces.get(block_number)
+            if trace is None:
+                trace = self._traces[block_number] = FunnelTrace(block_number)
+                while len(self._traces) > TRACE_HISTORY:
+                    self._traces.popitem(last=False)
+        return trace
+
+    def trace(self, block_number: int) -> Optional[FunnelTrace]:
+        with self._lock:
+            return self._traces.get(block_number)
+
+    def finish(self, block_number: int):
+        with self._lock:
+            trace = self._traces.pop(block_number, None)
+        if trace is None:
+            return
+        logger.info(f"Funnel {trace.summary()}")
+        if self.output is not None:
+            for record in trace.records():
+                self.output.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.output.flush()
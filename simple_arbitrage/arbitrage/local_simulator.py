@@ -0,0 +1,157 @@
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from eth_abi.exceptions import DecodingError
+from eth_typing import HexStr
+from web3 import Web3
+
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.utils.abi import UNISWAP_PAIR_ABI
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+
+logger = logging.getLogger(__name__)
+
+# bundles estimating above this are treated as suspicious and dropped
+MAX_BUNDLE_GAS = 1400000
+
+# conservative upper bounds used for the local gas cost, the executor call
+# (weth transfer, balance checks, coinbase transfer) plus one pair swap per leg
+BUNDLE_EXECUTOR_BASE_GAS = 80000
+SWAP_LEG_GAS = 110000
+# EIP-2028 calldata pricing, the payloads are forwarded inside the executor call
+CALLDATA_ZERO_BYTE_GAS = 4
+CALLDATA_NONZERO_BYTE_GAS = 16
+
+_pair_interface = Web3().eth.contract(abi=UNISWAP_PAIR_ABI)
+
+# a candidate that reaches the remote path costs an estimate_gas and a relay simulation
+REMOTE_CALLS_PER_CANDIDATE = 2
+
+
+@dataclass()
+class SwapLeg:
+    market: EthMarket
+    token_in: str
+    token_out: str
+    amount_out: int  # amount requested from the pair in the swap call data
+
+
+@dataclass()
+class LocalSimulationResult:
+    success: bool
+    reason: str
+    amount_out: int
+    profit: int
+    gas_estimate: int
+
+
+@dataclass()
+class LocalSimulationStats:
+    block_number: int
+    candidates: int = 0
+    rejected: int = 0
+    rejections_by_reason: dict[str, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+
+    @property
+    def remote_calls_avoided(self) -> int:
+        return self.rejected * REMOTE_CALLS_PER_CANDIDATE
+
+    def record(self, result: LocalSimulationResult):
+        self.candidates += 1
+        if not result.success:
+            self.rejected += 1
+            self.rejections_by_reason[result.reason] += 1
+
+
+def estimate_bundle_gas(leg_count: int, calldata: bytes = b"") -> int:
+    calldata_gas = sum(
+        CALLDATA_NONZERO_BYTE_GAS if byte else CALLDATA_ZERO_BYTE_GAS
+        for byte in calldata
+    )
+    return BUNDLE_EXECUTOR_BASE_GAS + SWAP_LEG_GAS * leg_count + calldata_gas
+
+
+def swap_legs_from_calldata(
+    markets: Mapping[str, EthMarket],
+    targets: list[str],
+    payloads: list[Union[bytes, HexStr]],
+    recipient: str,
+) -> Optional[list[SwapLeg]]:
+    """the swap legs encoded in a bundle's pair swap calls, None if they do not chain
+
+    Every leg must be a pair swap(amount0Out, amount1Out, to, data) that sends exactly
+    one token to the next target, the last one to recipient, starting and ending
+    with WETH.
+
+    Args:
+        markets (Mapping[str, EthMarket]): the bundle's markets by address
+    """
+    if not targets or len(targets) != len(payloads):
+        return None
+    legs = []
+    token_in = WETH_ADDRESS
+    for index, (target, payload) in enumerate(zip(targets, payloads)):
+        market = markets.get(target)
+        if market is None:
+            return None
+        try:
+            function, arguments = _pair_interface.decode_function_input(payload)
+        except (ValueError, DecodingError):
+            return None
+        amount0_out, amount1_out = arguments["amount0Out"], arguments["amount1Out"]
+        if function.fn_name != "swap" or (amount0_out > 0) == (amount1_out > 0):
+            return None
+        token_out = market.tokens[0] if amount0_out > 0 else market.tokens[1]
+        if token_in not in market.tokens or token_out == token_in:
+            return None
+        next_recipient = targets[index + 1] if index + 1 < len(targets) else recipient
+        if arguments["to"].lower() != next_recipient.lower():
+            return None
+        legs.append(SwapLeg(market, token_in, token_out, amount0_out or amount1_out))
+        token_in = token_out
+    return legs if token_in == WETH_ADDRESS else None
+
+
+def simulate_swap_legs(
+    legs: list[SwapLeg],
+    amount_in: int,
+    miner_reward: int,
+    gas_price: int = 0,
+    calldata: bytes = b"",
+) -> LocalSimulationResult:
+    """check what the swap legs of a bundle leave after paying for it
+
+    Mirrors what BundleExecutor.uniswapWeth does on chain: the first pair receives
+    amount_in WETH, every pair forwards the amount requested in its swap call to the
+    next one, and the final WETH balance must exceed the starting balance plus the
+    miner reward. What is left must also pay for the gas the bundle burns.
+
+    The requested amounts are not replayed against the pairs: they were derived from
+    the same cached reserves, so the pairs' math could only agree with them.
+
+    Args:
+        legs (list[SwapLeg]): swaps in execution order, the first one spends WETH
+        amount_in (int): WETH sent to the first market
+        miner_reward (int): ETH sent to coinbase by the executor
+        gas_price (int): wei per gas the bundle transaction pays, 0 skips the check
+        calldata (bytes): the encoded swap payloads, priced into the gas estimate
+    """
+    gas_estimate = estimate_bundle_gas(len(legs), calldata)
+    for leg in legs:
+        if not leg.market.receive_directly(leg.token_in):
+            # the executor pays every market by transfer before calling its swap
+            return LocalSimulationResult(False, "receive", 0, 0, gas_estimate)
+
+    amount = legs[-1].amount_out
+    profit = amount - amount_in
+    if profit <= miner_reward:
+        return LocalSimulationResult(False, "profit", amount, profit, gas_estimate)
+    if profit - miner_reward <= gas_estimate * gas_price:
+        return LocalSimulationResult(False, "gas_cost", amount, profit, gas_estimate)
+
+    return LocalSimulationResult(True, "", amount, profit, gas_estimate)
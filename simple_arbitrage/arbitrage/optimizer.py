@@ -0,0 +1,187 @@
+"""numeric sizing of a crossed market's trade, for any pair of EthMarkets
+
+Buying tokens with v WETH on one market and selling them on another returns
+f(v) = sell(buy(v)) - v, concave for the constant product and concentrated
+liquidity curves, so the best volume is where f' crosses zero. The optimum is
+bracketed by doubling from INITIAL_VOLUME, then narrowed until the bracket is
+within the tolerance:
+
+- when both markets have an analytic get_marginal_tokens_out, f' is exact and the
+  root is found with secant (quasi-Newton) steps kept inside the bracket, Illinois
+  style, falling back to bisection when a step would leave it;
+- otherwise golden-section search on f itself, which needs get_tokens_out only.
+
+Each step is a handful of float operations, so a V2 pair is sized in about
+twenty evaluations.
+"""
+import math
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+# wei, the bracket is never narrowed below a few float ulps of the volume either
+DEFAULT_TOLERANCE = 1.0
+INITIAL_VOLUME = ETHER / 100
+MAX_DOUBLINGS = 128
+MAX_ITERATIONS = 200
+
+INVERSE_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+@dataclass()
+class TradeSize:
+    volume: float
+    profit: float
+    evaluations: int
+
+
+def optimal_trade_size(
+    buy_from_market: EthMarket,
+    sell_to_market: EthMarket,
+    token_address: str,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> TradeSize:
+    """volume of WETH to buy tokens with, and the WETH profit of selling them on"""
+    objective = _Objective(buy_from_market, sell_to_market, token_address)
+    if objective.marginal_profit(0.0) is None:
+        volume = _golden_section_search(objective, tolerance)
+    else:
+        volume = _bracketed_newton(objective, tolerance)
+    if volume <= 0:
+        return TradeSize(0.0, 0.0, objective.evaluations)
+    return TradeSize(volume, objective.profit(volume), objective.evaluations)
+
+
+class _Objective:
+    def __init__(
+        self, buy_from_market: EthMarket, sell_to_market: EthMarket, token_address: str
+    ):
+        self.buy_from_market = buy_from_market
+        self.sell_to_market = sell_to_market
+        self.token_address = token_address
+        self.evaluations = 0
+
+    def profit(self, volume: float) -> float:
+        self.evaluations += 1
+        tokens_out = self.buy_from_market.get_tokens_out(
+            WETH_ADDRESS, self.token_address, volume
+        )
+        proceeds = self.sell_to_market.get_tokens_out(
+            self.token_address, WETH_ADDRESS, tokens_out
+        )
+        return proceeds - volume
+
+    def marginal_profit(self, volume: float) -> Optional[float]:
+        """f'(volume) by the chain rule, None unless both markets have a closed form"""
+        self.evaluations += 1
+        buy_marginal = self.buy_from_market.get_marginal_tokens_out(
+            WETH_ADDRESS, self.token_address, volume
+        )
+        if buy_marginal is None:
+            return None
+        tokens_out = self.buy_from_market.get_tokens_out(
+            WETH_ADDRESS, self.token_address, volume
+        )
+        sell_marginal = self.sell_to_market.get_marginal_tokens_out(
+            self.token_address, WETH_ADDRESS, tokens_out
+        )
+        if sell_marginal is None:
+            return None
+        return sell_marginal * buy_marginal - 1
+
+
+def _bracketed_newton(objective: _Objective, tolerance: float) -> float:
+    marginal: Callable[[float], float] = objective.marginal_profit  # type: ignore[assignment]
+    low, marginal_low, high, marginal_high = _bracket_marginal_root(marginal)
+
+    # which end moved last, the stale end's value is halved so both ends converge
+    last_side = 0
+    for _ in range(MAX_ITERATIONS):
+        if high - low <= _resolution(high, tolerance):
+            break
+        volume = high - marginal_high * (high - low) / (marginal_high - marginal_low)
+        if not low < volume < high:
+            volume = (low + high) / 2
+        marginal_volume = marginal(volume)
+        if marginal_volume == 0:
+            return volume
+        if marginal_volume > 0:
+            low, marginal_low = volume, marginal_volume
+            if last_side == 1:
+                marginal_high /= 2
+            last_side = 1
+        else:
+            high, marginal_high = volume, marginal_volume
+            if last_side == -1:
+                marginal_low /= 2
+            last_side = -1
+    return (low + high) / 2
+
+
+def _bracket_marginal_root(
+    marginal: Callable[[float], float]
+) -> tuple[float, float, float, float]:
+    """low, f'(low), high, f'(high) around the root, collapsed when there is none"""
+    marginal_low = marginal(0.0)
+    if marginal_low <= 0:
+        return 0.0, marginal_low, 0.0, marginal_low
+
+    low, high = 0.0, INITIAL_VOLUME
+    marginal_high = marginal(high)
+    for _ in range(MAX_DOUBLINGS):
+        if marginal_high <= 0:
+            return low, marginal_low, high, marginal_high
+        low, marginal_low = high, marginal_high
+        high *= 2
+        marginal_high = marginal(high)
+    return high, marginal_high, high, marginal_high
+
+
+def _golden_section_search(objective: _Objective, tolerance: float) -> float:
+    profit = objective.profit
+    middle = INITIAL_VOLUME
+    middle_profit = profit(middle)
+    # the optimum may be below the initial volume, or not above zero at all
+    while middle_profit <= 0:
+        middle /= 2
+        if middle <= tolerance:
+            return 0.0
+        middle_profit = profit(middle)
+
+    low, high = 0.0, middle * 2
+    high_profit = profit(high)
+    for _ in range(MAX_DOUBLINGS):
+        if high_profit <= middle_profit:
+            break
+        low, middle, middle_profit = middle, high, high_profit
+        high *= 2
+        high_profit = profit(high)
+    else:
+        return high
+
+    inner_low = high - INVERSE_GOLDEN_RATIO * (high - low)
+    inner_high = low + INVERSE_GOLDEN_RATIO * (high - low)
+    inner_low_profit, inner_high_profit = profit(inner_low), profit(inner_high)
+    for _ in range(MAX_ITERATIONS):
+        if high - low <= _resolution(high, tolerance):
+            break
+        if inner_low_profit < inner_high_profit:
+            low, inner_low, inner_low_profit = inner_low, inner_high, inner_high_profit
+            inner_high = low + INVERSE_GOLDEN_RATIO * (high - low)
+            inner_high_profit = profit(inner_high)
+        else:
+            high, inner_high, inner_high_profit = (
+                inner_high,
+                inner_low,
+                inner_low_profit,
+            )
+            inner_low = high - INVERSE_GOLDEN_RATIO * (high - low)
+            inner_low_profit = profit(inner_low)
+    return (low + high) / 2
+
+
+def _resolution(volume: float, tolerance: float) -> float:
+    return max(tolerance, 4 * math.ulp(volume))
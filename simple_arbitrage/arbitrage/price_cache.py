@@ -0,0 +1,71 @@
+from collections.abc import Hashable
+from typing import Optional
+
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+# the 0.01 WETH each market's token price is quoted at
+PRICE_VOLUME = ETHER / 100
+
+# (market, buy token price, sell token price)
+PricedMarket = tuple[EthMarket, float, float]
+
+
+class PriceCache:
+    """each market's token prices, recomputed only when its price_key changes
+
+    A market's entry is one (price key, token, buy price, sell price) tuple, replaced
+    whole, so threads evaluating different blocks can share the cache: an entry is
+    only used for reserves equal to those it was priced at.
+    """
+
+    def __init__(self):
+        self._entries: dict[EthMarket, tuple[Hashable, str, float, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def priced_markets(
+        self, markets: list[EthMarket], token_address: str
+    ) -> list[PricedMarket]:
+        entries = self._entries
+        priced_markets = []
+        hits = 0
+        for market in markets:
+            key = market.price_key()
+            entry: Optional[tuple] = entries.get(market)
+            if (
+                key is not None
+                and entry is not None
+                and entry[0] == key
+                and entry[1] == token_address
+            ):
+                priced_markets.append((market, entry[2], entry[3]))
+                hits += 1
+                continue
+            # how many tokens needed to get 0.01 ETH, and how many we get from 0.01
+            # ETH - if one market's sell is above another's buy they are crossed
+            buy_token_price = market.get_tokens_in(
+                token_address, WETH_ADDRESS, PRICE_VOLUME
+            )
+            sell_token_price = market.get_tokens_out(
+                WETH_ADDRESS, token_address, PRICE_VOLUME
+            )
+            if key is not None:
+                entries[market] = (
+                    key,
+                    token_address,
+                    buy_token_price,
+                    sell_token_price,
+                )
+            priced_markets.append((market, buy_token_price, sell_token_price))
+        self.hits += hits
+        self.misses += len(markets) - hits
+        return priced_markets
+
+    def clear(self):
+        self._entries.clear()
+
+
+# shared by every evaluation in the process
+PRICE_CACHE = PriceCache()
@@ -0,0 +1,49 @@
+import unittest
+
+from eth_account import Account
+
+from simple_arbitrage.arbitrage.bundle_submitter import BundleSubmitter, acknowledged
+from simple_arbitrage.fakes.relay import FakeRelay
+from simple_arbitrage.runtime.metrics import RELAY_ACK_SECONDS
+
+
+def _signed_bundle(account) -> list:
+    transaction = {
+        "to": account.address,
+        "value": 0,
+        "gas": 21000,
+        "maxFeePerGas": 2 * 10**9,
+        "maxPriorityFeePerGas": 0,
+        "nonce": 0,
+        "chainId": 1,
+    }
+    return [account.sign_transaction(transaction).rawTransaction]
+
+
+class TestBundleSubmitter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.account = Account.create()
+        self.relays = [FakeRelay().start(), FakeRelay(failure_rate=1.0).start()]
+
+    def tearDown(self) -> None:
+        for relay in self.relays:
+            relay.stop()
+
+    def test_submits_to_every_relay_and_target_block(self):
+        healthy_relay, failing_relay = self.relays
+        submitter = BundleSubmitter(
+            self.account, [relay.url for relay in self.relays], [1, 2, 3]
+        )
+        observed = RELAY_ACK_SECONDS.count(relay=healthy_relay.url)
+
+        acknowledgements = submitter.submit(_signed_bundle(self.account), 100)
+        submitter.close()
+
+        self.assertEqual(len(acknowledgements), 6)
+        self.assertEqual(acknowledged(acknowledgements), 3)
+        self.assertEqual(sorted(healthy_relay.bundles_by_block), [101, 102, 103])
+        self.assertEqual(failing_relay.request_counts["eth_sendBundle"], 3)
+        self.assertEqual(
+            set(submitter.latency_summary()), {relay.url for relay in self.relays}
+        )
+        self.assertEqual(RELAY_ACK_SECONDS.count(relay=healthy_relay.url) - observed, 3)
@@ -0,0 +1,140 @@
+import threading
+import time
+import unittest
+from typing import Optional
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    ArbitrageCandidate,
+    SimulatedBundle,
+)
+from simple_arbitrage.arbitrage.transaction_context import TransactionContext
+from simple_arbitrage.runtime.scheduler import BlockScheduler, StaleBlockError
+
+
+class FakeArbitrage(Arbitrage):
+    """candidate outcomes and latencies are scripted instead of hitting a node"""
+
+    def __init__(
+        self,
+        outcomes: list[tuple[float, bool]],
+        deadline: float,
+        concurrent: Optional[int] = None,
+    ):
+        super().__init__(None, None, None, concurrent or len(outcomes), deadline)
+        self.outcomes = outcomes
+
+    def _estimate_and_simulate(
+        self,
+        candidate: ArbitrageCandidate,
+        block_number: int,
+        transaction_context: Optional[TransactionContext] = None,
+        abandon: Optional[threading.Event] = None,
+    ) -> Optional[SimulatedBundle]:
+        delay, success = self.outcomes[candidate.intermediate_amount]
+        time.sleep(delay)
+        if not success:
+            return None
+        return SimulatedBundle(candidate, [], {})
+
+
+def _candidates(count: int) -> list[ArbitrageCandidate]:
+    # intermediate_amount doubles as the index into the scripted outcomes
+    return [ArbitrageCandidate(None, index, 0) for index in range(count)]
+
+
+class TestConcurrentCandidates(unittest.TestCase):
+    def _arbitrage(
+        self,
+        outcomes: list[tuple[float, bool]],
+        deadline: float,
+        concurrent: Optional[int] = None,
+    ) -> FakeArbitrage:
+        arbitrage = FakeArbitrage(outcomes, deadline, concurrent)
+        self.addCleanup(arbitrage.close)
+        return arbitrage
+
+    def test_slow_reject_does_not_block_next_candidate(self):
+        arbitrage = self._arbitrage([(0.2, False), (0.0, True), (1.0, True)], 5.0)
+
+        start = time.monotonic()
+        result = arbitrage._simulate_candidates_concurrently(
+            _candidates(3), 1, None, None
+        )
+
+        self.assertEqual(result.candidate.intermediate_amount, 1)
+        self.assertLess(time.monotonic() - start, 0.8)
+
+    def test_best_success_preferred_over_faster_success(self):
+        arbitrage = self._arbitrage([(0.2, True), (0.0, True)], 5.0)
+
+        result = arbitrage._simulate_candidates_concurrently(
+            _candidates(2), 1, None, None
+        )
+
+        self.assertEqual(result.candidate.intermediate_amount, 0)
+
+    def test_deadline_submits_best_completed(self):
+        arbitrage = self._arbitrage([(2.0, True), (0.0, True)], 0.2)
+
+        start = time.monotonic()
+        result = arbitrage._simulate_candidates_concurrently(
+            _candidates(2), 1, None, None
+        )
+
+        self.assertEqual(result.candidate.intermediate_amount, 1)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_new_block_abandons_candidates(self):
+        arbitrage = self._arbitrage([(2.0, True), (2.0, True)], 5.0)
+        scheduler = BlockScheduler()
+        deadline = scheduler.start_block(1)
+        threading.Timer(0.1, scheduler.observe_head, [2]).start()
+
+        start = time.monotonic()
+        with self.assertRaises(StaleBlockError):
+            arbitrage._simulate_candidates_concurrently(
+                _candidates(2), 1, None, deadline
+            )
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(scheduler.cutoffs, {("take_crossed_markets", "new_head"): 1})
+
+    def test_all_rejected(self):
+        arbitrage = self._arbitrage([(0.0, False), (0.0, False)], 5.0)
+
+        result = arbitrage._simulate_candidates_concurrently(
+            _candidates(2), 1, None, None
+        )
+
+        self.assertIsNone(result)
+
+    def test_failed_candidates_replaced_by_the_next(self):
+        arbitrage = self._arbitrage(
+            [(0.0, False), (0.1, False), (0.0, False), (0.0, True), (0.0, True)],
+            5.0,
+            concurrent=2,
+        )
+
+        result = arbitrage._simulate_candidates_concurrently(
+            _candidates(5), 1, None, None
+        )
+
+        self.assertEqual(result.candidate.intermediate_amount, 3)
+
+    def test_candidates_past_the_top_prepared_only_when_needed(self):
+        arbitrage = self._arbitrage([(0.0, True)] * 3, 5.0, concurrent=1)
+        prepared = []
+
+        def candidates():
+            # stands in for _prepare_candidates, which simulates as it yields
+            for candidate in _candidates(3):
+                prepared.append(candidate.intermediate_amount)
+                yield candidate
+
+        result = arbitrage._simulate_candidates_concurrently(
+            candidates(), 1, None, None
+        )
+
+        self.assertEqual(result.candidate.intermediate_amount, 0)
+        self.assertEqual(prepared, [0])
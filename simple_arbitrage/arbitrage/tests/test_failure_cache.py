@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from eth_account import Account
+from web3.exceptions import ContractLogicError
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    ArbitrageCandidate,
+    CrossedMarketDetails,
+    evaluate_markets,
+)
+from simple_arbitrage.arbitrage.failure_cache import FailureCache
+from simple_arbitrage.arbitrage.local_simulator import REMOTE_CALLS_PER_CANDIDATE
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime.metrics import REMOTE_CALLS_AVOIDED
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+BUY_MARKET = "0x000000000000000000000000000000000000000b"
+SELL_MARKET = "0x000000000000000000000000000000000000000c"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestFailureCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache = FailureCache(ttl=60, max_ttl=200, clock=self.clock)
+
+    def test_quarantined_from_the_threshold_on(self):
+        self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+        self.assertEqual(self.cache.quarantined(), frozenset())
+
+        self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+
+        self.assertEqual(
+            self.cache.quarantined(), {TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET}
+        )
+        self.assertEqual(self.cache.summary(), {"token": 1, "pool": 2})
+        self.assertEqual(
+            self.cache.blocked_by(TOKEN_ADDRESS, "0x01", "0x02"), TOKEN_ADDRESS
+        )
+        self.assertIsNone(self.cache.blocked_by("0x03", "0x01", "0x02"))
+
+    def test_ttl_doubles_up_to_max_ttl_and_expires(self):
+        # the first failure only counts
+        self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+        for expected_ttl in (60, 120, 200, 200):
+            self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+            self.clock.now += expected_ttl - 1
+            self.assertIn(TOKEN_ADDRESS, self.cache.quarantined())
+            self.clock.now += 1
+            self.assertNotIn(TOKEN_ADDRESS, self.cache.quarantined())
+
+    def test_success_clears_token_and_pools(self):
+        for _ in range(2):
+            self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+
+        self.cache.record_success(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET)
+        self.cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+
+        self.assertEqual(self.cache.quarantined(), frozenset())
+
+    def test_entries_survive_a_restart(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "failures.json")
+        cache = FailureCache(path, ttl=60, clock=self.clock)
+        for _ in range(2):
+            cache.record_failure(TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET, "revert")
+        # written on the writer thread, close waits for the last write
+        cache.close()
+
+        restarted = FailureCache(path, ttl=60, clock=self.clock)
+
+        self.assertEqual(restarted.quarantined(), cache.quarantined())
+        with open(path, "w") as f:
+            f.write("[")
+        with self.assertLogs("simple_arbitrage.arbitrage.failure_cache", "WARNING"):
+            self.assertEqual(FailureCache(path).quarantined(), frozenset())
+
+    def test_quarantined_candidate_skipped_before_simulation(self):
+        arbitrage = Arbitrage(None, None, None, failure_cache=self.cache)
+        buy_market = UniswappyV2EthPair(BUY_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        sell_market = UniswappyV2EthPair(SELL_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        for _ in range(2):
+            self.cache.record_failure(TOKEN_ADDRESS, "0x01", SELL_MARKET, "revert")
+
+        candidates = list(
+            arbitrage._prepare_candidates(
+                [CrossedMarketDetails(1, 1, TOKEN_ADDRESS, buy_market, sell_market)], 80
+            )
+        )
+
+        self.assertEqual(candidates, [])
+        self.assertEqual(arbitrage.quarantined_candidates, 1)
+
+    def test_only_reverting_estimates_recorded(self):
+        contract = mock.MagicMock()
+        contract.address = "0x0000000000000000000000000000000000000099"
+        estimate_gas = contract.functions.uniswapWeth.return_value.estimate_gas
+        arbitrage = Arbitrage(
+            Account.from_key("0x" + "11" * 32),
+            None,
+            contract,
+            failure_cache=self.cache,
+        )
+        buy_market = UniswappyV2EthPair(BUY_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        sell_market = UniswappyV2EthPair(SELL_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        candidate = ArbitrageCandidate(
+            CrossedMarketDetails(1, 1, TOKEN_ADDRESS, buy_market, sell_market), 0, 0
+        )
+
+        for error in (
+            TimeoutError("timed out"),
+            ConnectionError("connection reset"),
+            ValueError({"code": -32000, "message": "header not found"}),
+        ):
+            estimate_gas.side_effect = error
+            for _ in range(2):
+                arbitrage._estimate_and_simulate(candidate, 100)
+        self.assertEqual(self.cache.quarantined(), frozenset())
+
+        for error in (
+            ValueError({"code": -32000, "message": "execution reverted"}),
+            ContractLogicError("execution reverted: UniswapV2: K"),
+        ):
+            estimate_gas.side_effect = error
+            arbitrage._estimate_and_simulate(candidate, 100)
+        self.assertEqual(
+            self.cache.quarantined(), {TOKEN_ADDRESS, BUY_MARKET, SELL_MARKET}
+        )
+
+    def test_evaluation_skips_quarantined_tokens_and_pools(self):
+        universe = SyntheticUniverse.generate(10, markets_per_token=3, spread=0.2)
+        pairs = [
+            UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+            for pair in universe.pairs
+        ]
+        markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+        for market in pairs:
+            token_address = (
+                market.tokens[1]
+                if market.tokens[0] == WETH_ADDRESS
+                else market.tokens[0]
+            )
+            markets_by_token.setdefault(token_address, []).append(market)
+        snapshot = DoubleBufferedReserves(pairs).publish(
+            1, [[pair.reserve0, pair.reserve1] for pair in universe.pairs]
+        )
+        with pinned(snapshot):
+            crossed_markets = evaluate_markets(markets_by_token)
+        self.assertGreater(len(crossed_markets), 1)
+        quarantined_token = crossed_markets[0].token_address
+        quarantined_pool = crossed_markets[1].buy_from_market.market_address
+
+        avoided = REMOTE_CALLS_AVOIDED.value(reason="quarantined")
+
+        with pinned(snapshot):
+            skipped = evaluate_markets(
+                markets_by_token,
+                quarantined=frozenset([quarantined_token, quarantined_pool]),
+            )
+
+        # at least the quarantined token's candidate never reaches execution
+        self.assertGreaterEqual(
+            REMOTE_CALLS_AVOIDED.value(reason="quarantined") - avoided,
+            REMOTE_CALLS_PER_CANDIDATE,
+        )
+
+        self.assertNotIn(quarantined_token, {c.token_address for c in skipped})
+        self.assertNotIn(
+            quarantined_pool,
+            {
+                market.market_address
+                for crossed_market in skipped
+                for market in (
+                    crossed_market.buy_from_market,
+                    crossed_market.sell_to_market,
+                )
+            },
+        )
+
+    def test_quarantined_token_below_the_threshold_not_counted(self):
+        pair = UniswappyV2EthPair(BUY_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        pair.set_reserves_via_ordered_balances([ETHER, ETHER])
+        other_pair = UniswappyV2EthPair(SELL_MARKET, [TOKEN_ADDRESS, WETH_ADDRESS], "")
+        other_pair.set_reserves_via_ordered_balances([ETHER, 105 * ETHER // 100])
+        markets_by_token = {TOKEN_ADDRESS: [pair, other_pair]}
+        # crossed, but not by enough to become a candidate
+        self.assertEqual(evaluate_markets(markets_by_token), [])
+
+        avoided = REMOTE_CALLS_AVOIDED.value(reason="quarantined")
+        evaluate_markets(markets_by_token, quarantined=frozenset([TOKEN_ADDRESS]))
+
+        self.assertEqual(REMOTE_CALLS_AVOIDED.value(reason="quarantined"), avoided)
@@ -0,0 +1,99 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+from eth_account import Account
+
+from simple_arbitrage.arbitrage.arbitrage import Arbitrage, evaluate_markets
+from simple_arbitrage.arbitrage.funnel import (
+    BELOW_THRESHOLD,
+    ESTIMATE_GAS_FAILED,
+    NOT_BEST,
+    PRICED,
+    SELECTED,
+    SOLVED,
+    FunnelTrace,
+    FunnelTracer,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS_1 = "0x000000000000000000000000000000000000000a"
+TOKEN_ADDRESS_2 = "0x000000000000000000000000000000000000000b"
+BUNDLE_EXECUTOR_ADDRESS = "0x0000000000000000000000000000000000000099"
+EXECUTOR_WALLET = Account.from_key("0x" + "11" * 32)
+
+
+def _pair(index: int, token_address: str, balances: list[int]) -> UniswappyV2EthPair:
+    pair = UniswappyV2EthPair(
+        f"0x{index:040x}", [token_address, WETH_ADDRESS], f"TEST_{index}"
+    )
+    pair.set_reserves_via_ordered_balances(balances)
+    return pair
+
+
+class TestFunnel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.markets_by_token = {
+            TOKEN_ADDRESS_1: [
+                _pair(1, TOKEN_ADDRESS_1, [ETHER * 2, ETHER]),
+                _pair(2, TOKEN_ADDRESS_1, [ETHER, ETHER]),
+            ],
+            # barely crossed, profit stays under the ETHER / 1000 threshold
+            TOKEN_ADDRESS_2: [
+                _pair(3, TOKEN_ADDRESS_2, [ETHER * 101, ETHER * 100]),
+                _pair(4, TOKEN_ADDRESS_2, [ETHER * 100, ETHER * 100]),
+            ],
+        }
+        self.trace = FunnelTrace(100)
+
+    def test_evaluate_records_each_crossed_market(self):
+        best_crossed_markets = evaluate_markets(self.markets_by_token, trace=self.trace)
+
+        self.assertEqual(len(best_crossed_markets), 1)
+        best = best_crossed_markets[0]
+        self.assertEqual(self.trace.candidates[best.candidate_id].outcome, SELECTED)
+        self.assertEqual(
+            [stage for stage, _ in self.trace.candidates[best.candidate_id].stages],
+            [PRICED, SOLVED, SELECTED],
+        )
+        self.assertEqual(self.trace.outcomes()[BELOW_THRESHOLD], 1)
+        self.assertEqual(
+            sum(self.trace.outcomes().values()), len(self.trace.candidates)
+        )
+        self.assertNotIn(NOT_BEST, self.trace.outcomes())
+
+    def test_estimate_gas_failure_recorded(self):
+        best_crossed_markets = evaluate_markets(self.markets_by_token, trace=self.trace)
+        contract = mock.MagicMock()
+        contract.address = BUNDLE_EXECUTOR_ADDRESS
+        contract.functions.uniswapWeth.return_value.estimate_gas.side_effect = (
+            ValueError("execution reverted")
+        )
+        arbitrage = Arbitrage(EXECUTOR_WALLET, None, contract)
+
+        arbitrage.take_crossed_markets(best_crossed_markets, 100, 80, trace=self.trace)
+
+        candidate = self.trace.candidates[best_crossed_markets[0].candidate_id]
+        self.assertEqual(candidate.outcome, ESTIMATE_GAS_FAILED)
+        self.assertEqual(candidate.detail, "execution reverted")
+        # uniswapWeth only runs for the executor
+        contract.functions.uniswapWeth.return_value.estimate_gas.assert_called_with(
+            {"from": EXECUTOR_WALLET.address}
+        )
+
+    def test_tracer_exports_compact_records(self):
+        output = io.StringIO()
+        tracer = FunnelTracer(output)
+        trace = tracer.start_block(100)
+        evaluate_markets(self.markets_by_token, trace=trace)
+
+        tracer.finish(100)
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), len(trace.candidates))
+        self.assertEqual({record["block"] for record in records}, {100})
+        self.assertIn(SELECTED, {record["outcome"] for record in records})
+        self.assertIsNone(tracer.trace(100))
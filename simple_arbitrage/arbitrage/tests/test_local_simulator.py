@@ -0,0 +1,142 @@
+import unittest
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    CrossedMarketDetails,
+    encode_bundle_calls,
+    simulate_crossed_market,
+)
+from simple_arbitrage.arbitrage.local_simulator import (
+    LocalSimulationStats,
+    SwapLeg,
+    estimate_bundle_gas,
+    simulate_swap_legs,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+EXECUTOR_ADDRESS = "0x0000000000000000000000000000000000000099"
+
+
+class TestLocalSimulator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.buy_from_market = UniswappyV2EthPair(
+            "0x0000000000000000000000000000000000000001",
+            [TOKEN_ADDRESS, WETH_ADDRESS],
+            "TEST_1",
+        )
+        self.sell_to_market = UniswappyV2EthPair(
+            "0x0000000000000000000000000000000000000002",
+            [TOKEN_ADDRESS, WETH_ADDRESS],
+            "TEST_2",
+        )
+        self.buy_from_market.set_reserves_via_ordered_balances([ETHER * 2, ETHER])
+        self.sell_to_market.set_reserves_via_ordered_balances([ETHER, ETHER])
+        self.amount_in = ETHER // 10
+
+    def _legs(self, token_amount_out: int, weth_amount_out: int) -> list[SwapLeg]:
+        return [
+            SwapLeg(
+                self.buy_from_market, WETH_ADDRESS, TOKEN_ADDRESS, token_amount_out
+            ),
+            SwapLeg(self.sell_to_market, TOKEN_ADDRESS, WETH_ADDRESS, weth_amount_out),
+        ]
+
+    def _exact_amounts(self) -> tuple[int, int]:
+        token_amount_out = self.buy_from_market.get_tokens_out_exact(
+            WETH_ADDRESS, TOKEN_ADDRESS, self.amount_in
+        )
+        weth_amount_out = self.sell_to_market.get_tokens_out_exact(
+            TOKEN_ADDRESS, WETH_ADDRESS, token_amount_out
+        )
+        return token_amount_out, weth_amount_out
+
+    def test_exact_amounts_pass(self):
+        token_amount_out, weth_amount_out = self._exact_amounts()
+        result = simulate_swap_legs(
+            self._legs(token_amount_out, weth_amount_out), self.amount_in, 0
+        )
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.profit, weth_amount_out - self.amount_in)
+
+    def test_miner_reward_above_profit_rejected(self):
+        token_amount_out, weth_amount_out = self._exact_amounts()
+        profit = weth_amount_out - self.amount_in
+        result = simulate_swap_legs(
+            self._legs(token_amount_out, weth_amount_out), self.amount_in, profit
+        )
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.reason, "profit")
+
+    def test_gas_cost_above_profit_rejected(self):
+        token_amount_out, weth_amount_out = self._exact_amounts()
+        legs = self._legs(token_amount_out, weth_amount_out)
+        result = simulate_swap_legs(legs, self.amount_in, 0)
+        gas_price = result.profit // result.gas_estimate
+
+        self.assertTrue(
+            simulate_swap_legs(legs, self.amount_in, 0, gas_price=gas_price).success
+        )
+        result = simulate_swap_legs(legs, self.amount_in, 0, gas_price=gas_price + 1)
+        self.assertFalse(result.success)
+        self.assertEqual(result.reason, "gas_cost")
+
+    def _crossed_market(self) -> CrossedMarketDetails:
+        return CrossedMarketDetails(
+            0, self.amount_in, TOKEN_ADDRESS, self.buy_from_market, self.sell_to_market
+        )
+
+    def test_encoded_calls_simulated(self):
+        token_amount_out, weth_amount_out = self._exact_amounts()
+        targets, payloads = encode_bundle_calls(
+            self._crossed_market(), token_amount_out, EXECUTOR_ADDRESS
+        )
+
+        result = simulate_crossed_market(
+            self._crossed_market(), targets, payloads, EXECUTOR_ADDRESS, 0
+        )
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.amount_out, weth_amount_out)
+        # the 2 swap payloads are priced on top of the executor and swap gas
+        self.assertGreater(result.gas_estimate, estimate_bundle_gas(2))
+
+    def test_encoded_calls_paying_someone_else_rejected(self):
+        token_amount_out, _ = self._exact_amounts()
+        targets, payloads = encode_bundle_calls(
+            self._crossed_market(), token_amount_out, EXECUTOR_ADDRESS
+        )
+
+        for recipient, calls in (
+            ("0x" + "42" * 20, (targets, payloads)),
+            (EXECUTOR_ADDRESS, (targets[::-1], payloads[::-1])),
+            (EXECUTOR_ADDRESS, (targets, payloads[:1])),
+        ):
+            result = simulate_crossed_market(
+                self._crossed_market(), *calls, recipient, 0
+            )
+            self.assertEqual((result.success, result.reason), (False, "calldata"))
+
+    def test_stats_count_avoided_remote_calls(self):
+        token_amount_out, weth_amount_out = self._exact_amounts()
+        stats = LocalSimulationStats(block_number=1)
+        stats.record(
+            simulate_swap_legs(
+                self._legs(token_amount_out, weth_amount_out), self.amount_in, 0
+            )
+        )
+        stats.record(
+            simulate_swap_legs(
+                self._legs(token_amount_out, weth_amount_out),
+                self.amount_in,
+                weth_amount_out - self.amount_in,
+            )
+        )
+
+        self.assertEqual(stats.candidates, 2)
+        self.assertEqual(stats.rejected, 1)
+        self.assertEqual(stats.remote_calls_avoided, 2)
+        self.assertEqual(stats.rejections_by_reason, {"profit": 1})
@@ -0,0 +1,99 @@
+import unittest
+
+from simple_arbitrage.arbitrage.optimizer import optimal_trade_size
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+class NoClosedFormPair(UniswappyV2EthPair):
+    """a market type the optimizer can only evaluate, not differentiate"""
+
+    def get_marginal_tokens_out(self, token_in, token_out, amount_in):
+        return None
+
+
+def _pair(index: int, balances: list[int], pair_type=UniswappyV2EthPair):
+    pair = pair_type(f"0x{index:040x}", [TOKEN_ADDRESS, WETH_ADDRESS], "TEST")
+    pair.set_reserves_via_ordered_balances(balances)
+    return pair
+
+
+def _profit(buy_from_market, sell_to_market, volume: float) -> float:
+    tokens_out = buy_from_market.get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, volume)
+    return (
+        sell_to_market.get_tokens_out(TOKEN_ADDRESS, WETH_ADDRESS, tokens_out) - volume
+    )
+
+
+class TestOptimizer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.buy_from_market = _pair(1, [ETHER * 2, ETHER])
+        self.sell_to_market = _pair(2, [ETHER, ETHER])
+
+    def test_newton_finds_the_maximum(self):
+        trade_size = optimal_trade_size(
+            self.buy_from_market, self.sell_to_market, TOKEN_ADDRESS
+        )
+
+        self.assertAlmostEqual(trade_size.volume, 1.3734286415893498e17, delta=32)
+        self.assertAlmostEqual(trade_size.profit, 5.63065806062303e16, delta=32)
+        self.assertLess(trade_size.evaluations, 40)
+        for volume in (trade_size.volume * 0.999, trade_size.volume * 1.001):
+            self.assertLess(
+                _profit(self.buy_from_market, self.sell_to_market, volume),
+                trade_size.profit,
+            )
+
+    def test_golden_section_without_closed_form(self):
+        buy_from_market = _pair(1, [ETHER * 2, ETHER], NoClosedFormPair)
+        sell_to_market = _pair(2, [ETHER, ETHER], NoClosedFormPair)
+
+        trade_size = optimal_trade_size(buy_from_market, sell_to_market, TOKEN_ADDRESS)
+
+        self.assertAlmostEqual(
+            trade_size.volume, 1.3734286415893498e17, delta=1.3734286415893498e17 * 1e-6
+        )
+        self.assertAlmostEqual(trade_size.profit, 5.63065806062303e16, delta=1000)
+
+    def test_tolerance_bounds_the_volume(self):
+        exact = optimal_trade_size(
+            self.buy_from_market, self.sell_to_market, TOKEN_ADDRESS
+        )
+        for pair_type in (UniswappyV2EthPair, NoClosedFormPair):
+            coarse = optimal_trade_size(
+                _pair(1, [ETHER * 2, ETHER], pair_type),
+                _pair(2, [ETHER, ETHER], pair_type),
+                TOKEN_ADDRESS,
+                tolerance=ETHER / 1000,
+            )
+            self.assertLessEqual(abs(coarse.volume - exact.volume), ETHER / 1000)
+
+    def test_not_crossed_sizes_to_zero(self):
+        trade_size = optimal_trade_size(
+            self.sell_to_market, self.buy_from_market, TOKEN_ADDRESS
+        )
+
+        self.assertEqual((trade_size.volume, trade_size.profit), (0.0, 0.0))
+
+    def test_marginal_matches_finite_difference(self):
+        volume = ETHER / 10
+        step = ETHER / 10**6
+        finite_difference = (
+            self.buy_from_market.get_tokens_out(
+                WETH_ADDRESS, TOKEN_ADDRESS, volume + step
+            )
+            - self.buy_from_market.get_tokens_out(
+                WETH_ADDRESS, TOKEN_ADDRESS, volume - step
+            )
+        ) / (2 * step)
+
+        self.assertAlmostEqual(
+            self.buy_from_market.get_marginal_tokens_out(
+                WETH_ADDRESS, TOKEN_ADDRESS, volume
+            ),
+            finite_difference,
+            places=6,
+        )
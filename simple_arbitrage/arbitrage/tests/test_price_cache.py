@@ -0,0 +1,105 @@
+import unittest
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.arbitrage.price_cache import PRICE_VOLUME, PriceCache
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.markets.types.uniswappy_v3_pool import UniswappyV3Pool
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+def _uncached_prices(markets, token_address) -> list[tuple]:
+    return [
+        (
+            market,
+            market.get_tokens_in(token_address, WETH_ADDRESS, PRICE_VOLUME),
+            market.get_tokens_out(WETH_ADDRESS, token_address, PRICE_VOLUME),
+        )
+        for market in markets
+    ]
+
+
+class TestPriceCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.markets = [
+            UniswappyV2EthPair(f"0x{index:040x}", [TOKEN_ADDRESS, WETH_ADDRESS], "")
+            for index in range(3)
+        ]
+        self.reserves = DoubleBufferedReserves(self.markets)
+        self.cache = PriceCache()
+
+    def test_prices_reused_until_reserves_change(self):
+        first = self.reserves.publish(1, [[ETHER * 100, ETHER]] * 3)
+        second = self.reserves.publish(
+            2, [[ETHER * 100, ETHER], [ETHER * 90, ETHER], [ETHER * 100, ETHER]]
+        )
+
+        with pinned(first):
+            self.assertEqual(
+                self.cache.priced_markets(self.markets, TOKEN_ADDRESS),
+                _uncached_prices(self.markets, TOKEN_ADDRESS),
+            )
+        with pinned(second):
+            self.assertEqual(
+                self.cache.priced_markets(self.markets, TOKEN_ADDRESS),
+                _uncached_prices(self.markets, TOKEN_ADDRESS),
+            )
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 4))
+
+        # a thread still on the first block gets the first block's prices
+        with pinned(first):
+            self.assertEqual(
+                self.cache.priced_markets(self.markets[1:2], TOKEN_ADDRESS),
+                _uncached_prices(self.markets[1:2], TOKEN_ADDRESS),
+            )
+
+    def test_pool_repriced_when_a_tick_changes(self):
+        pool = UniswappyV3Pool(
+            "0x" + "03" * 20, [TOKEN_ADDRESS, WETH_ADDRESS], "", 3000, 60
+        )
+        pool.set_state(2**96, 0, 10**21)
+        pool.set_tick(-887220, 10**21, 10**21)
+        pool.set_tick(887220, 10**21, -(10**21))
+        self.cache.priced_markets([pool], TOKEN_ADDRESS)
+        self.cache.priced_markets([pool], TOKEN_ADDRESS)
+        self.assertEqual(self.cache.hits, 1)
+
+        pool.update_position(-600, 600, 10**20)
+        self.assertEqual(
+            self.cache.priced_markets([pool], TOKEN_ADDRESS),
+            _uncached_prices([pool], TOKEN_ADDRESS),
+        )
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_evaluation_matches_a_cold_cache(self):
+        universe = SyntheticUniverse.generate(30, markets_per_token=3, spread=0.2)
+        pairs = [
+            UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+            for pair in universe.pairs
+        ]
+        markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+        for market in pairs:
+            token_address = (
+                market.tokens[1]
+                if market.tokens[0] == WETH_ADDRESS
+                else market.tokens[0]
+            )
+            markets_by_token.setdefault(token_address, []).append(market)
+        reserves = DoubleBufferedReserves(pairs)
+
+        for block_number in range(3):
+            universe.advance(changed_fraction=0.2)
+            snapshot = reserves.publish(
+                block_number,
+                [[pair.reserve0, pair.reserve1] for pair in universe.pairs],
+            )
+            with pinned(snapshot):
+                self.assertEqual(
+                    evaluate_markets(markets_by_token, price_cache=self.cache),
+                    evaluate_markets(markets_by_token, price_cache=PriceCache()),
+                )
+        self.assertGreater(self.cache.hits, self.cache.misses)
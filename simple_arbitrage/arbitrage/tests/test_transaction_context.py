@@ -0,0 +1,75 @@
+import unittest
+
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from simple_arbitrage.arbitrage.transaction_context import (
+    TransactionContext,
+    TransactionContextProvider,
+)
+from simple_arbitrage.utils.abi import BUNDLE_EXECUTOR_ABI
+
+SENDER = "0x3333333333333333333333333333333333333333"
+EXECUTOR_ADDRESS = "0x1111111111111111111111111111111111111111"
+MARKET_ADDRESS = "0x2222222222222222222222222222222222222222"
+EMPTY_HASH = "0x" + "00" * 32
+
+
+class RecordingProvider(BaseProvider):
+    """answers the handful of calls a transaction context needs and records them"""
+
+    def __init__(self):
+        self.methods: list[str] = []
+
+    def make_request(self, method, params):
+        self.methods.append(method)
+        results = {
+            "eth_chainId": "0x1",
+            "eth_getTransactionCount": "0x7",
+            "eth_getBlockByNumber": {
+                "number": "0xa",
+                "hash": EMPTY_HASH,
+                "parentHash": EMPTY_HASH,
+                "timestamp": "0x64",
+                "baseFeePerGas": "0x3b9aca00",
+                "transactions": [],
+            },
+        }
+        return {"jsonrpc": "2.0", "id": 1, "result": results[method]}
+
+
+class TestTransactionContext(unittest.TestCase):
+    def test_refresh_fetches_chain_id_once(self):
+        provider = RecordingProvider()
+        transaction_contexts = TransactionContextProvider(Web3(provider), SENDER)
+
+        transaction_contexts.refresh(10)
+        context = transaction_contexts.refresh(11)
+
+        self.assertEqual(provider.methods.count("eth_chainId"), 1)
+        self.assertEqual(context.nonce, 7)
+        self.assertEqual(context.base_fee_per_gas, 10**9)
+        self.assertEqual(context.simulation_timestamp(12), 100 + 12)
+
+    def test_build_transaction_without_rpc(self):
+        provider = RecordingProvider()
+        contract = Web3(provider).eth.contract(
+            EXECUTOR_ADDRESS, abi=BUNDLE_EXECUTOR_ABI
+        )
+        context = TransactionContext(
+            block_number=10,
+            timestamp=100,
+            base_fee_per_gas=10**9,
+            chain_id=1,
+            nonce=7,
+            sender=SENDER,
+        )
+
+        transaction = contract.functions.uniswapWeth(
+            1, 1, [MARKET_ADDRESS], [b""]
+        ).build_transaction(context.transaction_params(500000))
+
+        self.assertEqual(provider.methods, [])
+        self.assertEqual(transaction["nonce"], 7)
+        self.assertEqual(transaction["gas"], 500000)
+        self.assertEqual(transaction["maxFeePerGas"], 2 * 10**9)
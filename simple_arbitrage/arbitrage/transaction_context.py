@@ -0,0 +1,92 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+from web3 import Web3
+from web3.types import TxParams
+
+logger = logging.getLogger(__name__)
+
+# same headroom web3 uses for its default maxFeePerGas, covers the base fee rising
+# for the two blocks a bundle targets
+BASE_FEE_MULTIPLIER = 2
+
+# flashbots simulations extrapolate the next block's timestamp from the head
+SECONDS_PER_BLOCK = 12
+
+
+@dataclass(frozen=True)
+class TransactionContext:
+    """everything needed to fill a transaction, fetched once per block"""
+
+    block_number: int
+    timestamp: int
+    base_fee_per_gas: int
+    chain_id: int
+    nonce: int
+    sender: str
+    max_priority_fee_per_gas: int = 0
+
+    @property
+    def max_fee_per_gas(self) -> int:
+        return (
+            self.base_fee_per_gas * BASE_FEE_MULTIPLIER + self.max_priority_fee_per_gas
+        )
+
+    def transaction_params(self, gas: int) -> TxParams:
+        """complete params, build_transaction does not need the node to fill any"""
+        return {
+            "from": self.sender,
+            "chainId": self.chain_id,
+            "nonce": self.nonce,
+            "gas": gas,
+            "maxFeePerGas": self.max_fee_per_gas,
+            "maxPriorityFeePerGas": self.max_priority_fee_per_gas,
+        }
+
+    def simulation_timestamp(self, target_block_number: int) -> int:
+        return self.timestamp + (target_block_number - self.block_number) * (
+            SECONDS_PER_BLOCK
+        )
+
+
+class TransactionContextProvider:
+    """fetches a TransactionContext from each new head
+
+    The chain id never changes and is fetched once. The nonce is read at the head
+    block, so it accounts for any of our bundles that landed in it.
+    """
+
+    def __init__(self, w3: Web3, sender: str, max_priority_fee_per_gas: int = 0):
+        self.w3 = w3
+        self.sender = sender
+        self.max_priority_fee_per_gas = max_priority_fee_per_gas
+        self._chain_id: Optional[int] = None
+
+    def refresh(self, block_number: int) -> TransactionContext:
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        block = self.w3.eth.get_block(block_number)
+        nonce = self.w3.eth.get_transaction_count(self.sender, block_number)
+        return TransactionContext(
+            block_number=block_number,
+            timestamp=block["timestamp"],
+            base_fee_per_gas=block["baseFeePerGas"],
+            chain_id=self._chain_id,
+            nonce=nonce,
+            sender=self.sender,
+            max_priority_fee_per_gas=self.max_priority_fee_per_gas,
+        )
+
+
+@dataclass()
+class TransactionBuildStats:
+    block_number: int
+    source: str  # "context" when built locally, "node" when the node fills the params
+    build_seconds: list[float] = field(default_factory=list)
+
+    @property
+    def average_ms(self) -> float:
+        if not self.build_seconds:
+            return 0.0
+        return sum(self.build_seconds) / len(self.build_seconds) * 1000
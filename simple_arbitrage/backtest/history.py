@@ -0,0 +1,346 @@
+"""compact on-disk reserve history
+
+reserves.bin starts with a header, then holds one record per block in a columnar
+layout over a fixed pair index (the order of markets.json):
+
+    block_number u64 | flags u8 | count u32 | indexes u32[count]
+    | reserve0 uint112[count] | reserve1 uint112[count]
+
+A keyframe (flags & 1) stores every pair. Every other block stores only the pairs
+whose reserves changed since the previous block. reserves.idx has one fixed-size
+entry per block (block number, record offset, offset of the keyframe the record
+builds on), so both files can be memory mapped and any block is reached with a
+binary search plus at most keyframe_interval delta records.
+
+python -m simple_arbitrage.backtest.history RECORDING_DIR [--convert] reports bytes
+per block and random access latency, --convert first re-encodes blocks.jsonl.
+"""
+import argparse
+import bisect
+import logging
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from typing import Optional
+
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = "reserves.bin"
+INDEX_FILE = "reserves.idx"
+
+MAGIC = b"SARH"
+VERSION = 1
+DEFAULT_KEYFRAME_INTERVAL = 256
+
+# Uniswap V2 reserves are uint112
+RESERVE_BYTES = 14
+
+HEADER = struct.Struct("<4sHII")  # magic, version, pair count, keyframe interval
+RECORD_HEADER = struct.Struct("<QBI")  # block number, flags, changed pair count
+INDEX_ENTRY = struct.Struct("<QQQ")  # block number, record offset, keyframe offset
+PAIR_INDEX = struct.Struct("<I")
+
+KEYFRAME = 1
+
+
+class HistoryWriter:
+    def __init__(
+        self,
+        directory: str,
+        pair_count: int,
+        keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+    ):
+        self.pair_count = pair_count
+        self.keyframe_interval = keyframe_interval
+        history_path = os.path.join(directory, HISTORY_FILE)
+        index_path = os.path.join(directory, INDEX_FILE)
+        exists = os.path.exists(history_path) and os.path.getsize(history_path) > 0
+        self._previous: Optional[list[tuple[int, int]]] = None
+        self._blocks_since_keyframe = 0
+        self._keyframe_offset = 0
+        self._last_block_number = -1
+        if exists:
+            # appending starts over with a keyframe, the old file only gives the
+            # header to check and the last block number to continue after
+            with open(history_path, "rb") as f:
+                _check_header(f.read(HEADER.size), pair_count)
+            self._last_block_number = _truncate_torn_tail(history_path, index_path)
+        self._history = open(history_path, "ab")
+        self._index = open(index_path, "ab")
+        if not exists:
+            self._history.write(
+                HEADER.pack(MAGIC, VERSION, pair_count, keyframe_interval)
+            )
+
+    def append(self, block_number: int, reserves: list[list[float]]):
+        if block_number <= self._last_block_number:
+            raise ValueError(
+                f"Block {block_number} is not after {self._last_block_number}"
+            )
+        if len(reserves) != self.pair_count:
+            raise ValueError(
+                f"Expected {self.pair_count} reserves, got {len(reserves)}"
+            )
+        current = [(int(reserve[0]), int(reserve[1])) for reserve in reserves]
+
+        keyframe = (
+            self._previous is None
+            or self._blocks_since_keyframe >= self.keyframe_interval
+        )
+        if keyframe:
+            indexes = list(range(self.pair_count))
+        else:
+            previous = self._previous
+            indexes = [
+                index
+                for index, reserve in enumerate(current)
+                if reserve != previous[index]
+            ]
+
+        offset = self._history.tell()
+        if keyframe:
+            self._keyframe_offset = offset
+            self._blocks_since_keyframe = 0
+
+        self._history.write(encode_record(block_number, keyframe, indexes, current))
+        self._index.write(INDEX_ENTRY.pack(block_number, offset, self._keyframe_offset))
+
+        self._previous = current
+        self._blocks_since_keyframe += 1
+        self._last_block_number = block_number
+
+    def flush(self):
+        self._history.flush()
+        self._index.flush()
+
+    def close(self):
+        self._history.close()
+        self._index.close()
+
+
+class HistoryReader:
+    def __init__(self, directory: str):
+        self._history_file = open(os.path.join(directory, HISTORY_FILE), "rb")
+        self._index_file = open(os.path.join(directory, INDEX_FILE), "rb")
+        self._history = mmap.mmap(
+            self._history_file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+        self.pair_count, self.keyframe_interval = _check_header(
+            self._history[: HEADER.size]
+        )
+        index_size = os.fstat(self._index_file.fileno()).st_size
+        self.block_count = index_size // INDEX_ENTRY.size
+        self._index = (
+            mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if index_size
+            else b""
+        )
+        self._block_numbers = _BlockNumbers(self._index, self.block_count)
+
+    @property
+    def bytes_per_block(self) -> float:
+        if not self.block_count:
+            return 0.0
+        total = len(self._history) + self.block_count * INDEX_ENTRY.size
+        return total / self.block_count
+
+    def block_numbers(self) -> list[int]:
+        return [self._block_numbers[i] for i in range(self.block_count)]
+
+    def reserves_at(self, block_number: int) -> list[list[int]]:
+        """reserves as of block_number, from the latest recorded block at or before it"""
+        position = bisect.bisect_right(self._block_numbers, block_number) - 1
+        if position < 0:
+            raise KeyError(f"No reserves recorded at or before block {block_number}")
+        _, record_offset, keyframe_offset = INDEX_ENTRY.unpack_from(
+            self._index, position * INDEX_ENTRY.size
+        )
+
+        reserves = [[0, 0] for _ in range(self.pair_count)]
+        offset = keyframe_offset
+        while True:
+            offset = apply_record(self._history, offset, reserves)
+            if offset > record_offset:
+                return reserves
+
+    def iter_blocks(self) -> Iterator[tuple[int, list[list[int]]]]:
+        """every recorded block in order, decoding each record once"""
+        reserves = [[0, 0] for _ in range(self.pair_count)]
+        offset = HEADER.size
+        for position in range(self.block_count):
+            offset = apply_record(self._history, offset, reserves)
+            yield self._block_numbers[position], [list(pair) for pair in reserves]
+
+    def close(self):
+        if isinstance(self._index, mmap.mmap):
+            self._index.close()
+        self._history.close()
+        self._history_file.close()
+        self._index_file.close()
+
+
+def _truncate_torn_tail(history_path: str, index_path: str) -> int:
+    """cut both files back to the last block whose index entry and record are whole,
+    returns its block number, -1 without one
+
+    A writer stopped mid append leaves a partial record or index entry behind. Records
+    appended after it would be out of step for iter_blocks, which decodes them in a row.
+    """
+    if not os.path.exists(index_path):
+        open(index_path, "wb").close()
+    with open(history_path, "r+b") as history, open(index_path, "r+b") as index:
+        history_size = os.fstat(history.fileno()).st_size
+        index_size = os.fstat(index.fileno()).st_size
+        entries = index_size // INDEX_ENTRY.size
+        end = HEADER.size
+        last_block_number = -1
+        while entries:
+            index.seek((entries - 1) * INDEX_ENTRY.size)
+            block_number, record_offset, _ = INDEX_ENTRY.unpack(
+                index.read(INDEX_ENTRY.size)
+            )
+            history.seek(record_offset)
+            header = history.read(RECORD_HEADER.size)
+            if len(header) == RECORD_HEADER.size:
+                _, _, count = RECORD_HEADER.unpack(header)
+                record_end = (
+                    record_offset
+                    + RECORD_HEADER.size
+                    + count * (PAIR_INDEX.size + 2 * RESERVE_BYTES)
+                )
+                if record_end <= history_size:
+                    end, last_block_number = record_end, block_number
+                    break
+            entries -= 1
+        if (end, entries * INDEX_ENTRY.size) != (history_size, index_size):
+            logger.warning(
+                f"Truncating a torn tail of {history_size - end} history and "
+                f"{index_size - entries * INDEX_ENTRY.size} index bytes"
+            )
+            history.truncate(end)
+            index.truncate(entries * INDEX_ENTRY.size)
+    return last_block_number
+
+
+def encode_record(
+    block_number: int,
+    keyframe: bool,
+    indexes: list[int],
+    reserves: Sequence[Sequence[int]],
+) -> bytes:
+    """one record holding reserves[index] for every index, in the columnar layout"""
+    return (
+        RECORD_HEADER.pack(block_number, KEYFRAME if keyframe else 0, len(indexes))
+        + b"".join(PAIR_INDEX.pack(index) for index in indexes)
+        + b"".join(
+            int(reserves[index][0]).to_bytes(RESERVE_BYTES, "little")
+            for index in indexes
+        )
+        + b"".join(
+            int(reserves[index][1]).to_bytes(RESERVE_BYTES, "little")
+            for index in indexes
+        )
+    )
+
+
+def apply_record(buffer, offset: int, reserves) -> int:
+    """decode the record at offset into reserves, returns the next record's offset"""
+    _, _, count = RECORD_HEADER.unpack_from(buffer, offset)
+    indexes_offset = offset + RECORD_HEADER.size
+    reserve0_offset = indexes_offset + count * PAIR_INDEX.size
+    reserve1_offset = reserve0_offset + count * RESERVE_BYTES
+    indexes = struct.unpack_from(f"<{count}I", buffer, indexes_offset)
+    for position, index in enumerate(indexes):
+        start = position * RESERVE_BYTES
+        reserves[index][0] = int.from_bytes(
+            buffer[reserve0_offset + start : reserve0_offset + start + RESERVE_BYTES],
+            "little",
+        )
+        reserves[index][1] = int.from_bytes(
+            buffer[reserve1_offset + start : reserve1_offset + start + RESERVE_BYTES],
+            "little",
+        )
+    return reserve1_offset + count * RESERVE_BYTES
+
+
+class _BlockNumbers:
+    """block number column of the mapped index, sequence view for bisect"""
+
+    def __init__(self, index, block_count: int):
+        self._index = index
+        self._block_count = block_count
+
+    def __len__(self) -> int:
+        return self._block_count
+
+    def __getitem__(self, position: int) -> int:
+        return struct.unpack_from("<Q", self._index, position * INDEX_ENTRY.size)[0]
+
+
+def _check_header(header: bytes, pair_count: Optional[int] = None) -> tuple[int, int]:
+    magic, version, stored_pair_count, keyframe_interval = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a reserve history file")
+    if pair_count is not None and pair_count != stored_pair_count:
+        raise ValueError(
+            f"History holds {stored_pair_count} pairs, writer has {pair_count}"
+        )
+    return stored_pair_count, keyframe_interval
+
+
+def measure_random_access(
+    reader: HistoryReader, samples: int = 1000, seed: int = 0
+) -> list[float]:
+    block_numbers = reader.block_numbers()
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(samples):
+        block_number = rng.choice(block_numbers)
+        start = time.perf_counter()
+        reader.reserves_at(block_number)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--convert", action="store_true")
+    parser.add_argument(
+        "--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL
+    )
+    args = parser.parse_args()
+
+    if args.convert:
+        # the recorder builds on this module, so it is only needed here
+        from simple_arbitrage.backtest.recorder import BLOCKS_FILE, compact_recording
+
+        json_bytes = os.path.getsize(os.path.join(args.directory, BLOCKS_FILE))
+        blocks = compact_recording(args.directory, args.keyframe_interval)
+        logger.info(f"{BLOCKS_FILE}: {json_bytes / max(blocks, 1):.0f} bytes per block")
+
+    reader = HistoryReader(args.directory)
+    latencies = measure_random_access(reader, args.samples)
+    logger.info(
+        f"{reader.block_count} blocks x {reader.pair_count} pairs, "
+        f"{reader.bytes_per_block:.0f} bytes per block, random access "
+        f"p50 {percentile(latencies, 50) * 1000:.3f} ms "
+        f"p99 {percentile(latencies, 99) * 1000:.3f} ms"
+    )
+    reader.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Optional
+
+from simple_arbitrage.backtest.history import (
+    DEFAULT_KEYFRAME_INTERVAL,
+    HISTORY_FILE,
+    INDEX_FILE,
+    HistoryReader,
+    HistoryWriter,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import (
+    GroupedMarkets,
+    UniswappyV2EthPair,
+)
+
+logger = logging.getLogger(__name__)
+
+MARKETS_FILE = "markets.json"
+BLOCKS_FILE = "blocks.jsonl"
+
+
+@dataclass()
+class RecordedMarkets:
+    """the tracked universe: every pair, in reserve order, and the evaluated grouping"""
+
+    pairs: list[UniswappyV2EthPair]
+    markets_by_token: dict[str, list[UniswappyV2EthPair]]
+
+    @property
+    def grouped_markets(self) -> GroupedMarkets:
+        return GroupedMarkets(self.markets_by_token, self.pairs)
+
+
+class ReserveRecorder:
+    """writes the tracked markets once and then every block's reserves to a directory
+
+    markets.json holds the pairs and which of them are grouped for evaluation, so a
+    replay evaluates exactly what the live bot did. A restart with the same markets
+    appends to the recording, one with other markets needs a new directory.
+    blocks.jsonl gets one line per block with the reserves of every pair in
+    markets.json order. With compact set, blocks go to the delta-encoded history in
+    backtest.history instead.
+    """
+
+    def __init__(self, directory: str, compact: bool = False):
+        self.directory = directory
+        self.compact = compact
+        os.makedirs(directory, exist_ok=True)
+        self._blocks_file = (
+            None if compact else open(os.path.join(directory, BLOCKS_FILE), "a")
+        )
+        self._history: Optional[HistoryWriter] = None
+
+    def write_markets(self, markets: GroupedMarkets):
+        """start the recording, or continue the one in directory if it has the same
+        markets
+
+        Raises:
+            RuntimeError: directory holds blocks recorded for other markets, which
+                new blocks would be read against
+        """
+        content = markets_content(markets)
+        path = os.path.join(self.directory, MARKETS_FILE)
+        if os.path.exists(path) and self._has_blocks():
+            with open(path) as f:
+                recorded_content = json.load(f)
+            # through json, like the recorded content, so tuples compare as lists
+            if recorded_content != json.loads(json.dumps(content)):
+                raise RuntimeError(
+                    f"{self.directory} holds a recording of other markets, "
+                    "record to a new directory"
+                )
+        else:
+            with open(path, "w") as f:
+                json.dump(content, f)
+        if self.compact:
+            self._history = HistoryWriter(self.directory, len(content["pairs"]))
+
+    def record(self, block_number: int, reserves: list[list[float]]):
+        if self._history is not None:
+            self._history.append(block_number, reserves)
+            self._history.flush()
+            return
+        line = json.dumps(
+            {
+                "block": block_number,
+                "reserves": [
+                    [int(reserve[0]), int(reserve[1])] for reserve in reserves
+                ],
+            }
+        )
+        self._blocks_file.write(line + "\n")
+        self._blocks_file.flush()
+
+    def _has_blocks(self) -> bool:
+        return any(
+            os.path.exists(path) and os.path.getsize(path) > 0
+            for path in (
+                os.path.join(self.directory, BLOCKS_FILE),
+                os.path.join(self.directory, HISTORY_FILE),
+            )
+        )
+
+    def close(self):
+        if self._history is not None:
+            self._history.close()
+        if self._blocks_file is not None:
+            self._blocks_file.close()
+
+
+def markets_content(markets: GroupedMarkets) -> dict:
+    """the pairs, in reserve order, and the grouping as pair indexes, for json"""
+    pairs = list(markets.all_market_pairs)
+    index_by_pair = {id(pair): index for index, pair in enumerate(pairs)}
+    return {
+        "pairs": [
+            {
+                "market_address": pair.market_address,
+                "tokens": pair.tokens,
+                "protocol": pair.protocol,
+            }
+            for pair in pairs
+        ],
+        "markets_by_token": {
+            token: [index_by_pair[id(pair)] for pair in token_pairs]
+            for token, token_pairs in markets.markets_by_token.items()
+        },
+    }
+
+
+def markets_from_content(content: dict) -> RecordedMarkets:
+    pairs = [
+        UniswappyV2EthPair(pair["market_address"], pair["tokens"], pair["protocol"])
+        for pair in content["pairs"]
+    ]
+    markets_by_token = {
+        token: [pairs[index] for index in indexes]
+        for token, indexes in content["markets_by_token"].items()
+    }
+    return RecordedMarkets(pairs, markets_by_token)
+
+
+def load_markets(directory: str) -> RecordedMarkets:
+    with open(os.path.join(directory, MARKETS_FILE)) as f:
+        return markets_from_content(json.load(f))
+
+
+def read_blocks(directory: str) -> Iterator[tuple[int, list[list[int]]]]:
+    if os.path.exists(os.path.join(directory, HISTORY_FILE)):
+        reader = HistoryReader(directory)
+        try:
+            yield from reader.iter_blocks()
+        finally:
+            reader.close()
+        return
+    with open(os.path.join(directory, BLOCKS_FILE)) as f:
+        for line in f:
+            if line.strip():
+                block = json.loads(line)
+                yield block["block"], block["reserves"]
+
+
+def compact_recording(
+    directory: str, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL
+) -> int:
+    """re-encode blocks.jsonl as compact history next to it, returns blocks written"""
+    pair_count = len(load_markets(directory).pairs)
+    for name in (HISTORY_FILE, INDEX_FILE):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    writer = HistoryWriter(directory, pair_count, keyframe_interval)
+    blocks = 0
+    with open(os.path.join(directory, BLOCKS_FILE)) as f:
+        for line in f:
+            if line.strip():
+                block = json.loads(line)
+                writer.append(block["block"], block["reserves"])
+                blocks += 1
+    writer.close()
+    return blocks
@@ -0,0 +1,127 @@
+"""replay recorded reserves through evaluate_markets
+
+python -m simple_arbitrage.backtest.replay RECORDING_DIR [--limit N]
+"""
+import argparse
+import logging
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Optional
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.backtest.recorder import (
+    RecordedMarkets,
+    load_markets,
+    read_blocks,
+)
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.utils.util import ETHER, percentile
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_BLOCK = 12
+
+
+@dataclass()
+class Opportunity:
+    block_number: int
+    token_address: str
+    profit: float
+    volume: float
+    buy_from_market: str
+    sell_to_market: str
+
+
+@dataclass()
+class BacktestReport:
+    blocks: int = 0
+    opportunities: list[Opportunity] = field(default_factory=list)
+    evaluation_seconds: list[float] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def total_profit(self) -> float:
+        return sum(opportunity.profit for opportunity in self.opportunities)
+
+    @property
+    def speedup(self) -> float:
+        """recorded chain time over replay time"""
+        if self.wall_seconds == 0:
+            return 0.0
+        return self.blocks * SECONDS_PER_BLOCK / self.wall_seconds
+
+    def summary(self) -> str:
+        return (
+            f"{self.blocks} blocks, {len(self.opportunities)} opportunities, "
+            f"profit {self.total_profit / ETHER:.6f} ETH, evaluation per block "
+            f"p50 {percentile(self.evaluation_seconds, 50) * 1000:.2f} ms "
+            f"p99 {percentile(self.evaluation_seconds, 99) * 1000:.2f} ms, "
+            f"{self.speedup:.0f}x real time"
+        )
+
+
+def replay(
+    markets: RecordedMarkets,
+    blocks: Iterable[tuple[int, list[list[int]]]],
+) -> BacktestReport:
+    reserves = DoubleBufferedReserves(markets.pairs)
+    report = BacktestReport()
+
+    start = time.perf_counter()
+    for block_number, block_reserves in blocks:
+        snapshot = reserves.publish(block_number, block_reserves)
+
+        evaluation_start = time.perf_counter()
+        with pinned(snapshot):
+            best_crossed_markets = evaluate_markets(markets.markets_by_token)
+        report.evaluation_seconds.append(time.perf_counter() - evaluation_start)
+
+        report.blocks += 1
+        for crossed_market in best_crossed_markets:
+            report.opportunities.append(
+                Opportunity(
+                    block_number,
+                    crossed_market.token_address,
+                    float(crossed_market.profit),
+                    float(crossed_market.volume),
+                    crossed_market.buy_from_market.market_address,
+                    crossed_market.sell_to_market.market_address,
+                )
+            )
+    report.wall_seconds = time.perf_counter() - start
+    return report
+
+
+def replay_directory(directory: str, limit: Optional[int] = None) -> BacktestReport:
+    blocks: Iterator = read_blocks(directory)
+    if limit is not None:
+        blocks = islice(blocks, limit)
+    return replay(load_markets(directory), blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    report = replay_directory(args.directory, args.limit)
+    for opportunity in report.opportunities:
+        logger.info(
+            f"Block {opportunity.block_number} token {opportunity.token_address}: "
+            f"profit {opportunity.profit / ETHER:.6f} ETH "
+            f"volume {opportunity.volume / ETHER:.6f} ETH"
+        )
+    logger.info(report.summary())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
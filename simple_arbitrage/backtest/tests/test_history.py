@@ -0,0 +1,152 @@
+import os
+import random
+import tempfile
+import unittest
+
+from simple_arbitrage.backtest.history import (
+    HISTORY_FILE,
+    INDEX_FILE,
+    HistoryReader,
+    HistoryWriter,
+)
+from simple_arbitrage.backtest.recorder import (
+    ReserveRecorder,
+    compact_recording,
+    read_blocks,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import (
+    GroupedMarkets,
+    UniswappyV2EthPair,
+)
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+PAIR_COUNT = 20
+
+
+def _blocks(count: int) -> list[tuple[int, list[list[int]]]]:
+    rng = random.Random(1)
+    reserves = [
+        [rng.randrange(2**112), rng.randrange(2**112)] for _ in range(PAIR_COUNT)
+    ]
+    blocks = []
+    for block_number in range(1000, 1000 + count):
+        for index in rng.sample(range(PAIR_COUNT), 3):
+            reserves[index] = [rng.randrange(2**112), rng.randrange(2**112)]
+        blocks.append((block_number, [list(reserve) for reserve in reserves]))
+    return blocks
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.blocks = _blocks(50)
+        writer = HistoryWriter(self.directory.name, PAIR_COUNT, keyframe_interval=8)
+        for block_number, reserves in self.blocks:
+            writer.append(block_number, reserves)
+        writer.close()
+        self.reader = HistoryReader(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.reader.close()
+        self.directory.cleanup()
+
+    def test_iter_blocks_round_trip(self):
+        self.assertEqual(list(self.reader.iter_blocks()), self.blocks)
+
+    def test_random_access(self):
+        for block_number, reserves in random.Random(2).sample(self.blocks, 10):
+            self.assertEqual(self.reader.reserves_at(block_number), reserves)
+
+    def test_random_access_between_blocks_uses_earlier_block(self):
+        self.assertEqual(self.reader.reserves_at(10**9), self.blocks[-1][1])
+        with self.assertRaises(KeyError):
+            self.reader.reserves_at(999)
+
+    def test_deltas_smaller_than_keyframes(self):
+        with tempfile.TemporaryDirectory() as keyframes_directory:
+            writer = HistoryWriter(keyframes_directory, PAIR_COUNT, keyframe_interval=1)
+            for block_number, reserves in self.blocks:
+                writer.append(block_number, reserves)
+            writer.close()
+            keyframes = HistoryReader(keyframes_directory)
+            keyframe_bytes = keyframes.bytes_per_block
+            keyframes.close()
+
+        self.assertLess(self.reader.bytes_per_block, keyframe_bytes)
+
+    def test_blocks_must_increase(self):
+        writer = HistoryWriter(self.directory.name, PAIR_COUNT)
+        writer.append(5000, self.blocks[0][1])
+        with self.assertRaises(ValueError):
+            writer.append(5000, self.blocks[0][1])
+        writer.close()
+
+    def test_reopened_history_continues_after_its_last_block(self):
+        writer = HistoryWriter(self.directory.name, PAIR_COUNT)
+        with self.assertRaises(ValueError):
+            writer.append(self.blocks[-1][0], self.blocks[-1][1])
+        writer.append(self.blocks[-1][0] + 1, self.blocks[0][1])
+        writer.close()
+
+        reader = HistoryReader(self.directory.name)
+        self.addCleanup(reader.close)
+        self.assertEqual(
+            list(reader.iter_blocks()),
+            self.blocks + [(self.blocks[-1][0] + 1, self.blocks[0][1])],
+        )
+
+    def test_append_after_a_torn_tail(self):
+        history_path = os.path.join(self.directory.name, HISTORY_FILE)
+        index_path = os.path.join(self.directory.name, INDEX_FILE)
+        # the last block's record and index entry were only partly written
+        with open(history_path, "ab") as f:
+            f.truncate(os.path.getsize(history_path) - 5)
+        with open(index_path, "ab") as f:
+            f.truncate(os.path.getsize(index_path) - 3)
+
+        with self.assertLogs("simple_arbitrage.backtest.history", "WARNING"):
+            writer = HistoryWriter(self.directory.name, PAIR_COUNT)
+        appended = [
+            (self.blocks[-1][0], self.blocks[0][1]),
+            (self.blocks[-1][0] + 1, self.blocks[1][1]),
+        ]
+        for block_number, reserves in appended:
+            writer.append(block_number, reserves)
+        writer.close()
+
+        reader = HistoryReader(self.directory.name)
+        self.addCleanup(reader.close)
+        expected = self.blocks[:-1] + appended
+        self.assertEqual(list(reader.iter_blocks()), expected)
+        for block_number, reserves in expected[-3:]:
+            self.assertEqual(reader.reserves_at(block_number), reserves)
+
+
+class TestCompactRecording(unittest.TestCase):
+    def test_compact_recorder_and_conversion_read_back(self):
+        pairs = [
+            UniswappyV2EthPair(f"0x{index:040x}", [TOKEN_ADDRESS, WETH_ADDRESS], "TEST")
+            for index in range(1, PAIR_COUNT + 1)
+        ]
+        markets = GroupedMarkets({TOKEN_ADDRESS: pairs}, pairs)
+        blocks = _blocks(12)
+
+        with tempfile.TemporaryDirectory() as json_directory:
+            recorder = ReserveRecorder(json_directory)
+            recorder.write_markets(markets)
+            for block_number, reserves in blocks:
+                recorder.record(block_number, reserves)
+            recorder.close()
+
+            self.assertEqual(compact_recording(json_directory), len(blocks))
+            self.assertEqual(list(read_blocks(json_directory)), blocks)
+
+        with tempfile.TemporaryDirectory() as compact_directory:
+            recorder = ReserveRecorder(compact_directory, compact=True)
+            recorder.write_markets(markets)
+            for block_number, reserves in blocks:
+                recorder.record(block_number, reserves)
+            recorder.close()
+
+            self.assertEqual(list(read_blocks(compact_directory)), blocks)
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+
+from simple_arbitrage.backtest.recorder import ReserveRecorder, load_markets
+from simple_arbitrage.backtest.replay import replay_directory
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import (
+    GroupedMarkets,
+    UniswappyV2EthPair,
+)
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.pairs = pairs = [
+            UniswappyV2EthPair(
+                "0x0000000000000000000000000000000000000001",
+                [TOKEN_ADDRESS, WETH_ADDRESS],
+                "TEST_1",
+            ),
+            UniswappyV2EthPair(
+                "0x0000000000000000000000000000000000000002",
+                [TOKEN_ADDRESS, WETH_ADDRESS],
+                "TEST_2",
+            ),
+        ]
+        recorder = ReserveRecorder(self.directory.name)
+        recorder.write_markets(GroupedMarkets({TOKEN_ADDRESS: pairs}, pairs))
+        recorder.record(100, [[ETHER, ETHER], [ETHER, ETHER]])
+        recorder.record(101, [[ETHER * 2, ETHER], [ETHER, ETHER]])
+        recorder.close()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_markets_round_trip(self):
+        markets = load_markets(self.directory.name)
+
+        self.assertEqual(len(markets.pairs), 2)
+        self.assertEqual(markets.markets_by_token[TOKEN_ADDRESS][1].protocol, "TEST_2")
+
+    def test_restart_appends_to_the_same_markets(self):
+        recorder = ReserveRecorder(self.directory.name)
+        recorder.write_markets(
+            GroupedMarkets({TOKEN_ADDRESS: self.pairs}, tuple(self.pairs))
+        )
+        recorder.record(102, [[ETHER, ETHER], [ETHER, ETHER]])
+        recorder.close()
+
+        self.assertEqual(replay_directory(self.directory.name).blocks, 3)
+
+    def test_restart_with_other_markets_refused(self):
+        pairs = self.pairs[:1]
+        recorder = ReserveRecorder(self.directory.name)
+        self.addCleanup(recorder.close)
+
+        with self.assertRaises(RuntimeError):
+            recorder.write_markets(GroupedMarkets({TOKEN_ADDRESS: pairs}, pairs))
+
+        self.assertEqual(len(load_markets(self.directory.name).pairs), 2)
+
+    def test_replay_finds_recorded_opportunity(self):
+        report = replay_directory(self.directory.name)
+
+        self.assertEqual(report.blocks, 2)
+        self.assertEqual(len(report.evaluation_seconds), 2)
+        self.assertEqual(len(report.opportunities), 1)
+        opportunity = report.opportunities[0]
+        self.assertEqual(opportunity.block_number, 101)
+        self.assertAlmostEqual(opportunity.profit, 5.63065806062303e16, delta=32)
@@ -0,0 +1,90 @@
+"""load test bundle submission against local stand-in relays
+
+python -m simple_arbitrage.benchmarks.bundle_submission --relays 3 --latency 0.05
+"""
+import argparse
+import logging
+import sys
+import time
+
+from eth_account import Account
+
+from simple_arbitrage.arbitrage.bundle_submitter import BundleSubmitter
+from simple_arbitrage.fakes.relay import FakeRelay
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+
+def _signed_bundle(account, nonce: int) -> list:
+    transaction = {
+        "to": account.address,
+        "value": 0,
+        "gas": 21000,
+        "maxFeePerGas": 2 * 10**9,
+        "maxPriorityFeePerGas": 0,
+        "nonce": nonce,
+        "chainId": 1,
+    }
+    return [account.sign_transaction(transaction).rawTransaction]
+
+
+def run(relay_count: int, bundles: int, latency: float, latency_jitter: float):
+    relays = [
+        FakeRelay(latency=latency, latency_jitter=latency_jitter, seed=index).start()
+        for index in range(relay_count)
+    ]
+    account = Account.create()
+    submitter = BundleSubmitter(account, [relay.url for relay in relays])
+    signed_bundles = [_signed_bundle(account, nonce) for nonce in range(bundles)]
+
+    try:
+        start = time.perf_counter()
+        block_seconds = []
+        for block_number, signed_bundle in enumerate(signed_bundles):
+            block_start = time.perf_counter()
+            submitter.submit(signed_bundle, block_number)
+            block_seconds.append(time.perf_counter() - block_start)
+        elapsed = time.perf_counter() - start
+
+        logger.info(
+            f"{bundles} bundles x {len(submitter.target_block_offsets)} blocks x "
+            f"{relay_count} relays in {elapsed:.3f}s, per bundle "
+            f"p50 {percentile(block_seconds, 50) * 1000:.1f} ms "
+            f"p99 {percentile(block_seconds, 99) * 1000:.1f} ms"
+        )
+        for relay_url, latencies in submitter.acknowledgement_latencies.items():
+            logger.info(
+                f"{relay_url}: acks {len(latencies)} "
+                f"p50 {percentile(list(latencies), 50) * 1000:.1f} ms "
+                f"p99 {percentile(list(latencies), 99) * 1000:.1f} ms"
+            )
+        sequential_estimate = sum(
+            sum(latencies) for latencies in submitter.acknowledgement_latencies.values()
+        )
+        logger.info(
+            f"Sum of acknowledgement latencies (one request at a time): {sequential_estimate:.3f}s"
+        )
+    finally:
+        submitter.close()
+        for relay in relays:
+            relay.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--relays", type=int, default=3)
+    parser.add_argument("--bundles", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--latency-jitter", type=float, default=0.01)
+    args = parser.parse_args()
+    run(args.relays, args.bundles, args.latency, args.latency_jitter)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
@@ -0,0 +1,127 @@
+"""what evaluating on remote workers adds per block over evaluating locally
+
+Every block, a synthetic universe is advanced and published as a reserve
+snapshot: "single" runs evaluate_markets on it in this process, "N workers" hands
+it to a DistributedEvaluator leading N workers in local processes over TCP. Per
+block it reports the round trip from the first send to the last reply, the
+overhead of the round trip over the slowest worker's own evaluation (framing,
+encoding, the network and decoding) and the bytes sent. Workers on one host share
+its cores, so only the overhead carries over to workers on separate hosts.
+
+python -m simple_arbitrage.benchmarks.distributed_overhead --tokens 2000 --blocks 20
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime.distributed import (
+    DistributedEvaluator,
+    ExchangeStats,
+    start_worker_process,
+    summarize,
+)
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    token_count: int,
+    markets_per_token: int,
+    blocks: int,
+    worker_counts: list[int],
+    changed_fraction: float,
+) -> tuple[list[float], dict[int, list[ExchangeStats]]]:
+    """single process seconds per block, and each worker count's exchanges"""
+    universe = SyntheticUniverse.generate(
+        token_count, markets_per_token=markets_per_token
+    )
+    pairs = [
+        UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+        for pair in universe.pairs
+    ]
+    markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+    for market in pairs:
+        token_address = (
+            market.tokens[1] if market.tokens[0] == WETH_ADDRESS else market.tokens[0]
+        )
+        markets_by_token.setdefault(token_address, []).append(market)
+    reserves = DoubleBufferedReserves(pairs)
+    snapshots = []
+    for block_number in range(blocks + 1):
+        universe.advance(changed_fraction)
+        snapshots.append(
+            reserves.publish(
+                block_number,
+                [[pair.reserve0, pair.reserve1] for pair in universe.pairs],
+            )
+        )
+
+    single = []
+    for snapshot in snapshots[1:]:
+        start = time.perf_counter()
+        with pinned(snapshot):
+            evaluate_markets(markets_by_token)
+        single.append(time.perf_counter() - start)
+
+    stats = {}
+    for worker_count in worker_counts:
+        processes, addresses = zip(
+            *(start_worker_process() for _ in range(worker_count))
+        )
+        evaluator = DistributedEvaluator(pairs, markets_by_token, list(addresses))
+        try:
+            evaluator.connect()
+            # the first block sends every pair's reserves
+            for snapshot in snapshots:
+                evaluator.evaluate(snapshot.block_number, snapshot)
+            stats[worker_count] = evaluator.stats[1:]
+        finally:
+            evaluator.close()
+            for process in processes:
+                process.terminate()
+                process.join()
+    return single, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--markets-per-token", type=int, default=3)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--changed-fraction", type=float, default=0.1)
+    parser.add_argument(
+        "--workers",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[1, 2, 4],
+    )
+    args = parser.parse_args()
+
+    single, stats = run(
+        args.tokens,
+        args.markets_per_token,
+        args.blocks,
+        args.workers,
+        args.changed_fraction,
+    )
+    logger.info(f"{os.cpu_count()} cores, {args.tokens} tokens")
+    logger.info(f"single: p50 {percentile(single, 50) * 1000:.1f} ms per block")
+    for worker_count, exchanges in stats.items():
+        logger.info(f"{worker_count} workers: {summarize(exchanges)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
@@ -0,0 +1,324 @@
+"""per-block throughput of the whole bot against a local stand-in node and relay
+
+The real Searcher, Arbitrage, BundleSubmitter, BlockScheduler and HeadWatcher run
+unchanged against a FakeNode serving a synthetic universe and a FakeRelay. Blocks
+are mined at a fixed interval; the report has the head-to-done latency of every
+processed block and the block-to-submit latency of every block whose bundle reached
+the relay. --sweep doubles the universe from --tokens until blocks stop fitting in
+the block interval and reports the largest size that kept up.
+
+python -m simple_arbitrage.benchmarks.end_to_end --tokens 10 --blocks 10 --block-interval 12
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from eth_account import Account
+from flashbots import flashbot
+from web3 import Web3
+
+from simple_arbitrage.arbitrage.arbitrage import Arbitrage
+from simple_arbitrage.arbitrage.bundle_submitter import BundleSubmitter
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.relay import FakeRelay
+from simple_arbitrage.fakes.universe import SyntheticUniverse, synthetic_address
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    get_uniswap_markets_by_token,
+)
+from simple_arbitrage.runtime.pipeline import BlockPipeline
+from simple_arbitrage.runtime.scheduler import BlockScheduler, HeadWatcher
+from simple_arbitrage.runtime.searcher import Searcher
+from simple_arbitrage.utils.abi import BUNDLE_EXECUTOR_ABI
+from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KEY = "0x" + "11" * 32
+RELAY_SIGNING_KEY = "0x" + "22" * 32
+MINER_REWARD_PERCENTAGE = 80
+HEAD_POLL_INTERVAL = 0.01
+# low enough that the synthetic universe's crossings pay for their gas and pass
+# local simulation, so blocks end in a submission
+DEFAULT_BASE_FEE_PER_GAS = 10**9
+
+
+@dataclass()
+class EndToEndReport:
+    token_count: int
+    pair_count: int
+    block_interval: float
+    blocks_mined: int = 0
+    blocks_started: int = 0
+    blocks_cut_off: int = 0
+    block_seconds: list[float] = field(default_factory=list)
+    submit_seconds: list[float] = field(default_factory=list)
+
+    @property
+    def sustainable(self) -> bool:
+        """every mined block was started, finished in time and none were cut off, and
+        bundles reached the relay in time"""
+        return (
+            self.blocks_started >= self.blocks_mined
+            and self.blocks_cut_off == 0
+            and bool(self.submit_seconds)
+            and percentile(self.submit_seconds, 99) < self.block_interval
+            and (
+                not self.block_seconds
+                or percentile(self.block_seconds, 99) < self.block_interval
+            )
+        )
+
+    def summary(self) -> str:
+        def milliseconds(values: list[float], pct: int) -> str:
+            return f"{percentile(values, pct) * 1000:.0f}" if values else "-"
+
+        return (
+            f"{self.token_count} tokens / {self.pair_count} pairs: "
+            f"{self.blocks_started}/{self.blocks_mined} blocks started, "
+            f"{self.blocks_cut_off} cut off, head to done "
+            f"p50 {milliseconds(self.block_seconds, 50)} ms "
+            f"p99 {milliseconds(self.block_seconds, 99)} ms, block to submit "
+            f"p50 {milliseconds(self.submit_seconds, 50)} ms "
+            f"p99 {milliseconds(self.submit_seconds, 99)} ms "
+            f"({len(self.submit_seconds)} submitted), "
+            f"{'sustainable' if self.sustainable else 'falling behind'}"
+        )
+
+
+def run(
+    token_count: int,
+    blocks: int,
+    block_interval: float,
+    markets_per_token: int = 2,
+    changed_fraction: float = 0.05,
+    concurrent_candidates: int = 0,
+    pipeline: bool = False,
+    node_latency: float = 0.0,
+    relay_latency: float = 0.0,
+    base_fee_per_gas: int = DEFAULT_BASE_FEE_PER_GAS,
+) -> EndToEndReport:
+    universe = SyntheticUniverse.generate(token_count, markets_per_token)
+    node = FakeNode(
+        universe, base_fee_per_gas=base_fee_per_gas, latency=node_latency
+    ).start()
+    relay = FakeRelay(latency=relay_latency).start()
+    try:
+        return _run(
+            node,
+            relay,
+            token_count,
+            blocks,
+            block_interval,
+            changed_fraction,
+            concurrent_candidates,
+            pipeline,
+        )
+    finally:
+        relay.stop()
+        node.stop()
+
+
+def _run(
+    node: FakeNode,
+    relay: FakeRelay,
+    token_count: int,
+    blocks: int,
+    block_interval: float,
+    changed_fraction: float,
+    concurrent_candidates: int,
+    pipeline: bool,
+) -> EndToEndReport:
+    searcher, bundle_submitter = _searcher(node, relay, concurrent_candidates, pipeline)
+    report = EndToEndReport(
+        token_count, len(searcher.markets.all_market_pairs), block_interval
+    )
+
+    scheduler = BlockScheduler(block_interval)
+    head_watcher = HeadWatcher(
+        scheduler, _new_head_poller(node.url), HEAD_POLL_INTERVAL
+    )
+    head_watcher.start()
+    block_pipeline = BlockPipeline(searcher).start() if pipeline else None
+
+    mined_at: dict[int, float] = {}
+    done_at: dict[int, float] = {}
+    producer_done = threading.Event()
+
+    def produce():
+        for _ in range(blocks):
+            time.sleep(block_interval)
+            mined = time.perf_counter()
+            mined_at[node.mine(changed_fraction=changed_fraction)] = mined
+        producer_done.set()
+
+    producer = threading.Thread(target=produce, name="producer", daemon=True)
+    producer.start()
+
+    block_number = node.universe.block_number
+    last_block_number = block_number + blocks
+    try:
+        while block_number < last_block_number:
+            head = scheduler.wait_for_head(block_number, timeout=block_interval * 2)
+            if head is None:
+                if producer_done.is_set():
+                    break
+                continue
+            block_number = head
+            deadline = scheduler.start_block(block_number)
+            if block_pipeline is not None:
+                block_pipeline.submit(deadline)
+            elif searcher.process_block(deadline):
+                done_at[block_number] = time.perf_counter()
+        if block_pipeline is not None:
+            # let the last block drain before reading the relay
+            time.sleep(block_interval)
+    finally:
+        producer.join()
+        head_watcher.stop()
+        if block_pipeline is not None:
+            block_pipeline.stop()
+        bundle_submitter.close()
+
+    report.blocks_mined = blocks
+    report.blocks_started = scheduler.blocks_started
+    report.blocks_cut_off = sum(scheduler.cutoffs.values())
+    report.block_seconds = [
+        done - mined_at[done_block_number]
+        for done_block_number, done in done_at.items()
+    ]
+    report.submit_seconds = _submit_seconds(mined_at, relay)
+    return report
+
+
+def _searcher(
+    node: FakeNode, relay: FakeRelay, concurrent_candidates: int, pipeline: bool
+) -> tuple[Searcher, BundleSubmitter]:
+    """the bot as app.py wires it, pointed at the stand-ins"""
+    provider = Web3.HTTPProvider(node.url)
+    w3 = Web3(provider)
+    executor_wallet = Account.from_key(EXECUTOR_KEY)
+    relay_signing_wallet = Account.from_key(RELAY_SIGNING_KEY)
+    flashbot(w3, relay_signing_wallet, relay.url)
+
+    bundle_submitter = BundleSubmitter(relay_signing_wallet, [relay.url])
+    arbitrage = Arbitrage(
+        executor_wallet,
+        w3.flashbots,
+        w3.eth.contract(synthetic_address("bundle_executor"), abi=BUNDLE_EXECUTOR_ABI),
+        concurrent_candidates=concurrent_candidates,
+        bundle_submitter=bundle_submitter,
+    )
+    markets = get_uniswap_markets_by_token(provider, FACTORY_ADDRESSES)
+    searcher = Searcher(
+        # the pipeline fetches next to execution, like app.py it gets its own provider
+        Web3.HTTPProvider(node.url) if pipeline else provider,
+        markets,
+        arbitrage,
+        MINER_REWARD_PERCENTAGE,
+        TransactionContextProvider(w3, executor_wallet.address),
+    )
+    return searcher, bundle_submitter
+
+
+def _new_head_poller(url: str):
+    head_w3 = Web3(Web3.HTTPProvider(url))
+    block_filter = head_w3.eth.filter("latest")
+
+    def poll() -> Optional[int]:
+        if block_filter.get_new_entries():
+            return head_w3.eth.block_number
+        return None
+
+    return poll
+
+
+def _submit_seconds(mined_at: dict[int, float], relay: FakeRelay) -> list[float]:
+    submit_seconds = []
+    for block_number, mined in mined_at.items():
+        # bundles for the next block also arrive from the block before, targeting +2
+        received = [
+            received_at
+            for received_at in relay.received_at.get(block_number + 1, [])
+            if received_at >= mined
+        ]
+        if received:
+            submit_seconds.append(min(received) - mined)
+    return submit_seconds
+
+
+def sweep(
+    token_count: int, max_token_count: int, **kwargs
+) -> tuple[Optional[EndToEndReport], list[EndToEndReport]]:
+    """double the universe until it falls behind, returns the largest that kept up"""
+    best = None
+    reports = []
+    while token_count <= max_token_count:
+        report = run(token_count, **kwargs)
+        reports.append(report)
+        logger.info(report.summary())
+        if not report.sustainable:
+            break
+        best = report
+        token_count *= 2
+    return best, reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=10)
+    parser.add_argument("--markets-per-token", type=int, default=2)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--block-interval", type=float, default=12.0)
+    parser.add_argument("--changed-fraction", type=float, default=0.05)
+    parser.add_argument("--concurrent-candidates", type=int, default=0)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--node-latency", type=float, default=0.0)
+    parser.add_argument("--relay-latency", type=float, default=0.0)
+    parser.add_argument(
+        "--base-fee-gwei", type=float, default=DEFAULT_BASE_FEE_PER_GAS / 10**9
+    )
+    parser.add_argument("--sweep", action="store_true")
+    parser.add_argument("--max-tokens", type=int, default=10000)
+    args = parser.parse_args()
+
+    kwargs = dict(
+        blocks=args.blocks,
+        block_interval=args.block_interval,
+        markets_per_token=args.markets_per_token,
+        changed_fraction=args.changed_fraction,
+        concurrent_candidates=args.concurrent_candidates,
+        pipeline=args.pipeline,
+        node_latency=args.node_latency,
+        relay_latency=args.relay_latency,
+        base_fee_per_gas=int(args.base_fee_gwei * 10**9),
+    )
+    if not args.sweep:
+        logger.info(run(args.tokens, **kwargs).summary())
+        return
+
+    best, _ = sweep(args.tokens, args.max_tokens, **kwargs)
+    if best is None:
+        logger.info(
+            f"No universe size kept up, smallest tried was {args.tokens} tokens"
+        )
+    else:
+        logger.info(
+            f"Max sustainable universe: {best.token_count} tokens / "
+            f"{best.pair_count} pairs at one block per {args.block_interval}s"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
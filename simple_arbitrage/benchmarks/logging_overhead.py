@@ -0,0 +1,191 @@
+"""critical-path cost of the hot loop's logging per block, eager versus events
+
+"eager" replays what a block logged before the event logger: the crossed-market
+count of every token and, for every candidate, the crossed market, its Targets and
+Payloads and the bundled transactions including the signer, all as INFO f-strings.
+"events" emits the same records through an EventLogger, which samples the per-token
+counts and formats everything on its background thread. Both write to os.devnull
+with app.py's log format; only the time spent on the calling thread is reported.
+
+python -m simple_arbitrage.benchmarks.logging_overhead --tokens 1000 --candidates 5
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from eth_account import Account
+
+from simple_arbitrage.arbitrage.arbitrage import CrossedMarketDetails
+from simple_arbitrage.fakes.universe import SyntheticUniverse, synthetic_address
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime.events import EventLogger
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER, percentile
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s %(module)-20s %(message)s"
+EXECUTOR_KEY = "0x" + "11" * 32
+
+
+@dataclass()
+class LoggedCandidate:
+    crossed_market: CrossedMarketDetails
+    targets: list[str]
+    payloads: list[str]
+    transaction: dict
+
+
+def run(token_count: int, candidate_count: int, blocks: int) -> dict[str, list[float]]:
+    """seconds on the calling thread per block, by logging style"""
+    crossed_counts, candidates = _block_contents(token_count, candidate_count)
+    signer = Account.from_key(EXECUTOR_KEY)
+    sink = open(os.devnull, "w")
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    eager_logger = _sink_logger("eager", handler)
+    events = EventLogger(record_logger=_sink_logger("events", handler))
+
+    seconds = defaultdict(list)
+    try:
+        for _ in range(blocks):
+            start = time.perf_counter()
+            _log_eagerly(eager_logger, crossed_counts, candidates, signer)
+            seconds["eager"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _emit_events(events, crossed_counts, candidates, signer)
+            seconds["events"].append(time.perf_counter() - start)
+            # drain between blocks, the writer has a whole block to catch up
+            events.flush()
+    finally:
+        events.close()
+        sink.close()
+    return seconds
+
+
+def _log_eagerly(log, crossed_counts, candidates, signer):
+    for crossed_count in crossed_counts.values():
+        log.info(f"crossed markets len: {crossed_count}")
+    for candidate in candidates:
+        crossed_market = candidate.crossed_market
+        log.info(f"Best Crossed Market: {crossed_market}\n")
+        log.info(
+            f"Send this much WETH {crossed_market.volume}, get this much profit {crossed_market.profit}"
+        )
+        log.info(f"Targets: {candidate.targets}, Payloads: {candidate.payloads}")
+        bundled_transactions = [
+            {"signer": signer, "transaction": candidate.transaction}
+        ]
+        log.info(f"Bundled transactions: {bundled_transactions}")
+
+
+def _emit_events(events: EventLogger, crossed_counts, candidates, signer):
+    for token_address, crossed_count in crossed_counts.items():
+        events.emit("crossed_markets", token=token_address, count=crossed_count)
+    for candidate in candidates:
+        crossed_market = candidate.crossed_market
+        events.emit(
+            "candidate",
+            token=crossed_market.token_address,
+            buy=crossed_market.buy_from_market.market_address,
+            sell=crossed_market.sell_to_market.market_address,
+            volume=crossed_market.volume,
+            profit=crossed_market.profit,
+        )
+        events.emit(
+            "bundle_calls",
+            token=crossed_market.token_address,
+            targets=candidate.targets,
+            payloads=candidate.payloads,
+        )
+        events.emit(
+            "bundle_built",
+            token=crossed_market.token_address,
+            signer=signer.address,
+            nonce=candidate.transaction["nonce"],
+            gas=candidate.transaction["gas"],
+        )
+
+
+def _block_contents(
+    token_count: int, candidate_count: int
+) -> tuple[dict[str, int], list[LoggedCandidate]]:
+    universe = SyntheticUniverse.generate(token_count)
+    markets_by_token: dict[str, list[UniswappyV2EthPair]] = defaultdict(list)
+    for pair in universe.pairs:
+        market = UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+        market.set_reserves_via_ordered_balances([pair.reserve0, pair.reserve1])
+        token_address = pair.token1 if pair.token0 == WETH_ADDRESS else pair.token0
+        markets_by_token[token_address].append(market)
+
+    rng = random.Random(0)
+    crossed_counts = {token: rng.randint(0, 2) for token in markets_by_token}
+    executor_address = synthetic_address("bundle_executor")
+    candidates = []
+    for token_address, (buy, sell) in list(markets_by_token.items())[:candidate_count]:
+        volume = ETHER // 10
+        crossed_market = CrossedMarketDetails(
+            ETHER / 100, volume, token_address, buy, sell
+        )
+        inter = buy.get_tokens_out_exact(WETH_ADDRESS, token_address, volume)
+        buy_calls = buy.sell_tokens_to_next_market(WETH_ADDRESS, volume, sell)
+        transaction = {
+            "chainId": 1,
+            "nonce": rng.randint(0, 1000),
+            "gas": 300000,
+            "maxFeePerGas": 30 * 10**9,
+            "maxPriorityFeePerGas": 10**9,
+            "to": executor_address,
+            "value": 0,
+            "data": "0x" + os.urandom(640).hex(),
+        }
+        candidates.append(
+            LoggedCandidate(
+                crossed_market,
+                buy_calls.targets + [sell.market_address],
+                buy_calls.data
+                + [sell.sell_tokens(token_address, inter, executor_address)],
+                transaction,
+            )
+        )
+    return crossed_counts, candidates
+
+
+def _sink_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    sink_logger = logging.getLogger(f"{__name__}.{name}")
+    sink_logger.handlers = [handler]
+    sink_logger.setLevel(logging.INFO)
+    sink_logger.propagate = False
+    return sink_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--blocks", type=int, default=20)
+    args = parser.parse_args()
+
+    seconds = run(args.tokens, args.candidates, args.blocks)
+    for style, values in seconds.items():
+        logger.info(
+            f"{style}: p50 {percentile(values, 50) * 1000:.2f} ms "
+            f"p99 {percentile(values, 99) * 1000:.2f} ms per block "
+            f"({args.tokens} tokens, {args.candidates} candidates)"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format=LOG_FORMAT,
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
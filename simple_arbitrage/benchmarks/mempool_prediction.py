@@ -0,0 +1,169 @@
+"""what predicting from pending swaps costs the block it runs next to
+
+A FakeNode serves a synthetic universe and announces random pending swaps at a
+steady rate, and a block is mined every --block-interval. Each block is fetched and
+evaluated by a Searcher, without a mempool, and with a MempoolPredictor polling every
+50 ms and predicting at most once per each --predict-intervals. The predictor runs on
+its own thread, so every prediction holds the GIL while the block is being evaluated.
+Reported per block are the time fetching reserves and evaluating them take, and how
+many predictions ran. The node runs in this process too, so fetching competes for
+the GIL with it as well; evaluation is the bot's own work.
+
+python -m simple_arbitrage.benchmarks.mempool_prediction --tokens 2000 --blocks 10
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from typing import Optional
+
+from web3 import Web3
+
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    get_uniswap_markets_by_token,
+)
+from simple_arbitrage.runtime.mempool import MempoolPredictor, PendingTransactionFeed
+from simple_arbitrage.runtime.scheduler import BlockScheduler
+from simple_arbitrage.runtime.searcher import Searcher
+from simple_arbitrage.utils.addresses import (
+    CRO_FACTORY_ADDRESS,
+    FACTORY_ADDRESSES,
+    UNISWAP_FACTORY_ADDRESS,
+)
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+# how often pending swaps are announced
+SEND_INTERVAL = 0.05
+
+
+def run(
+    token_count: int,
+    blocks: int,
+    block_interval: float,
+    swaps_per_second: float,
+    predict_interval: Optional[float],
+) -> tuple[dict[str, list[float]], int]:
+    """seconds per block by phase, and the predictions made, without a mempool when
+    predict_interval is None"""
+    # the first market of every token is a Uniswap pair the router swaps through
+    universe = SyntheticUniverse.generate(
+        token_count,
+        markets_per_token=2,
+        factory_addresses=[UNISWAP_FACTORY_ADDRESS, CRO_FACTORY_ADDRESS],
+    )
+    node = FakeNode(universe).start()
+    stopped = threading.Event()
+
+    def send():
+        per_send = max(1, round(swaps_per_second * SEND_INTERVAL))
+        while not stopped.wait(SEND_INTERVAL):
+            node.send_random_swaps(per_send)
+
+    sender = threading.Thread(target=send, name="sender", daemon=True)
+    predictor = None
+    predictions = 0
+    try:
+        provider = Web3.HTTPProvider(node.url)
+        markets = get_uniswap_markets_by_token(provider, FACTORY_ADDRESSES)
+        if predict_interval is not None:
+            predictor = MempoolPredictor(
+                PendingTransactionFeed(Web3.HTTPProvider(node.url)),
+                markets,
+                predict_interval=predict_interval,
+            )
+            predict = predictor.predict
+
+            def counted(*args):
+                nonlocal predictions
+                predictions += 1
+                return predict(*args)
+
+            predictor.predict = counted  # type: ignore[assignment]
+        searcher = Searcher(provider, markets, None, 80, mempool=predictor)
+        # no time budget, the node shares this process and fetches slowly
+        scheduler = BlockScheduler(float("inf"))
+        _evaluate(searcher, scheduler, universe.block_number, {})
+        if predictor is not None:
+            predictor.start()
+        sender.start()
+
+        seconds: dict[str, list[float]] = {"fetch": [], "evaluate": []}
+        for _ in range(blocks):
+            time.sleep(block_interval)
+            block_number = node.mine()
+            _evaluate(searcher, scheduler, block_number, seconds)
+        return seconds, predictions
+    finally:
+        stopped.set()
+        if predictor is not None:
+            predictor.stop()
+        node.stop()
+
+
+def _evaluate(
+    searcher: Searcher,
+    scheduler: BlockScheduler,
+    block_number: int,
+    seconds: dict[str, list[float]],
+):
+    deadline = scheduler.start_block(block_number)
+    start = time.perf_counter()
+    snapshot = searcher.fetch_reserves(deadline)
+    fetched = time.perf_counter()
+    searcher.evaluate(deadline, snapshot)
+    seconds.setdefault("fetch", []).append(fetched - start)
+    seconds.setdefault("evaluate", []).append(time.perf_counter() - fetched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument("--block-interval", type=float, default=2.0)
+    parser.add_argument("--swaps-per-second", type=float, default=100)
+    parser.add_argument(
+        "--predict-intervals",
+        default="0,0.5",
+        help="comma separated seconds between predictions",
+    )
+    args = parser.parse_args()
+
+    for predict_interval in [None] + [
+        float(interval) for interval in args.predict_intervals.split(",")
+    ]:
+        seconds, predictions = run(
+            args.tokens,
+            args.blocks,
+            args.block_interval,
+            args.swaps_per_second,
+            predict_interval,
+        )
+        mode = (
+            "no mempool"
+            if predict_interval is None
+            else f"predict every {predict_interval}s"
+        )
+        logger.info(
+            f"{mode}: "
+            + ", ".join(
+                f"{phase} p50 {percentile(values, 50) * 1000:.1f} ms "
+                f"p99 {percentile(values, 99) * 1000:.1f} ms"
+                for phase, values in seconds.items()
+            )
+            + f", {predictions} predictions"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
@@ -0,0 +1,118 @@
+"""evaluation throughput of the multi-process searcher against evaluator count
+
+Every block, a synthetic universe is advanced, its reserves are written to a
+SharedReserveTable bank and the block is evaluated: "single" runs evaluate_markets
+in this process on a pinned snapshot, "N processes" hands the bank to an
+EvaluatorPool of N evaluators and merges their candidates. Reported per block is
+the wall time from handing out the block to having the merged candidates, and the
+speedup over single; scaling stops at the machine's core count.
+
+python -m simple_arbitrage.benchmarks.multiprocess_scaling --tokens 2000 --blocks 10
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime.multiprocess import EvaluatorPool, SharedReserveTable
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    token_count: int,
+    markets_per_token: int,
+    blocks: int,
+    process_counts: list[int],
+) -> dict[str, list[float]]:
+    """seconds per block, by evaluation mode"""
+    universe = SyntheticUniverse.generate(
+        token_count, markets_per_token=markets_per_token
+    )
+    pairs = [
+        UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+        for pair in universe.pairs
+    ]
+    markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+    for market in pairs:
+        token_address = (
+            market.tokens[1] if market.tokens[0] == WETH_ADDRESS else market.tokens[0]
+        )
+        markets_by_token.setdefault(token_address, []).append(market)
+    block_reserves = []
+    for _ in range(blocks):
+        universe.advance()
+        block_reserves.append(
+            [[pair.reserve0, pair.reserve1] for pair in universe.pairs]
+        )
+
+    seconds: dict[str, list[float]] = {}
+    reserves = DoubleBufferedReserves(pairs)
+    seconds["single"] = []
+    for block_number, block in enumerate(block_reserves):
+        snapshot = reserves.publish(block_number, block)
+        start = time.perf_counter()
+        with pinned(snapshot):
+            evaluate_markets(markets_by_token)
+        seconds["single"].append(time.perf_counter() - start)
+
+    table = SharedReserveTable(len(pairs), 1)
+    try:
+        for process_count in process_counts:
+            pool = EvaluatorPool(table, pairs, markets_by_token, process_count).start()
+            label = f"{process_count} processes"
+            seconds[label] = []
+            try:
+                # the first block pays for the children's imports
+                table.write(0, 0, block_reserves[0])
+                pool.evaluate(0, 0)
+                for block_number, block in enumerate(block_reserves):
+                    table.write(0, block_number, block)
+                    start = time.perf_counter()
+                    pool.evaluate(block_number, 0)
+                    seconds[label].append(time.perf_counter() - start)
+            finally:
+                pool.close()
+    finally:
+        table.close()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--markets-per-token", type=int, default=3)
+    parser.add_argument("--blocks", type=int, default=10)
+    parser.add_argument(
+        "--processes",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[1, 2, 4, 8],
+    )
+    args = parser.parse_args()
+
+    seconds = run(args.tokens, args.markets_per_token, args.blocks, args.processes)
+    single = percentile(seconds["single"], 50)
+    logger.info(f"{os.cpu_count()} cores, {args.tokens} tokens")
+    for mode, values in seconds.items():
+        p50 = percentile(values, 50)
+        logger.info(
+            f"{mode}: p50 {p50 * 1000:.1f} ms p99 {percentile(values, 99) * 1000:.1f} ms "
+            f"per block, {1 / p50:.1f} blocks/s, {single / p50:.2f}x single"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
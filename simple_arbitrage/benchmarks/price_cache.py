@@ -0,0 +1,109 @@
+"""what caching token prices per market saves in evaluation per block
+
+Every block, a synthetic universe is advanced, changing the reserves of a share
+of the pairs, and published as a reserve snapshot. "cold" prices every market
+every block, with a cache cleared before each block; "cached" keeps the cache
+across blocks, so only the markets whose reserves changed are priced again.
+Reported per block are the time pricing takes alone and the whole evaluation.
+
+python -m simple_arbitrage.benchmarks.price_cache --tokens 2000 --blocks 20
+"""
+import argparse
+import logging
+import sys
+import time
+from collections import defaultdict
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.arbitrage.price_cache import PriceCache
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    token_count: int,
+    markets_per_token: int,
+    blocks: int,
+    changed_fraction: float,
+) -> dict[str, list[float]]:
+    """seconds per block, by mode and what was timed"""
+    universe = SyntheticUniverse.generate(
+        token_count, markets_per_token=markets_per_token
+    )
+    pairs = [
+        UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+        for pair in universe.pairs
+    ]
+    markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+    for market in pairs:
+        token_address = (
+            market.tokens[1] if market.tokens[0] == WETH_ADDRESS else market.tokens[0]
+        )
+        markets_by_token.setdefault(token_address, []).append(market)
+    reserves = DoubleBufferedReserves(pairs)
+    snapshots = []
+    for block_number in range(blocks + 1):
+        universe.advance(changed_fraction)
+        snapshots.append(
+            reserves.publish(
+                block_number,
+                [[pair.reserve0, pair.reserve1] for pair in universe.pairs],
+            )
+        )
+
+    seconds = defaultdict(list)
+    for mode in ("cold", "cached"):
+        for timed in ("pricing", "evaluation"):
+            price_cache = PriceCache()
+            # the first block fills the cache
+            for snapshot in snapshots:
+                if mode == "cold":
+                    price_cache.clear()
+                with pinned(snapshot):
+                    start = time.perf_counter()
+                    if timed == "pricing":
+                        for token_address, markets in markets_by_token.items():
+                            price_cache.priced_markets(markets, token_address)
+                    else:
+                        evaluate_markets(markets_by_token, price_cache=price_cache)
+                    elapsed = time.perf_counter() - start
+                if snapshot.block_number > 0:
+                    seconds[f"{mode} {timed}"].append(elapsed)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--markets-per-token", type=int, default=3)
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--changed-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+
+    seconds = run(
+        args.tokens, args.markets_per_token, args.blocks, args.changed_fraction
+    )
+    logger.info(
+        f"{args.tokens} tokens, {args.markets_per_token} markets per token, "
+        f"{args.changed_fraction:.0%} of pairs changing per block"
+    )
+    for mode, values in seconds.items():
+        logger.info(
+            f"{mode}: p50 {percentile(values, 50) * 1000:.2f} ms "
+            f"p99 {percentile(values, 99) * 1000:.2f} ms per block"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    logger.setLevel(logging.INFO)
+    main()
@@ -0,0 +1,153 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+INJECTED_FAILURE_CODE = -32000
+METHOD_NOT_FOUND_CODE = -32601
+
+
+class JsonRpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class JsonRpcServer:
+    """minimal JSON-RPC 2.0 server over HTTP for offline tests and benchmarks
+
+    Handlers are registered per method and receive the params list. Every request
+    can be delayed by latency (plus up to latency_jitter) and fail with probability
+    failure_rate; the random draws come from a seeded generator so runs repeat.
+    Requests can also be dispatched in-process through handle() without HTTP.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.handlers: dict[str, Callable[[list], Any]] = {}
+        self.request_counts: Counter = Counter()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._http_server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, method: str, handler: Callable[[list], Any]):
+        self.handlers[method] = handler
+
+    @property
+    def url(self) -> str:
+        if self._http_server is None:
+            raise RuntimeError("Server is not running")
+        host, port = self._http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "JsonRpcServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self.send_error(400, "Invalid JSON")
+                    return
+                body = json.dumps(server.handle(request)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._http_server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._http_server.serve_forever,
+            name=type(self).__name__,
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, request: Union[dict, list]) -> Union[dict, list]:
+        if isinstance(request, list):
+            return [self._handle_one(item) for item in request]
+        return self._handle_one(request)
+
+    def _handle_one(self, request: dict) -> dict:
+        method = request.get("method", "")
+        request_id = request.get("id")
+        self.request_counts[method] += 1
+
+        delay, fail = self._draw_faults()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return _error_response(
+                request_id, INJECTED_FAILURE_CODE, "injected failure"
+            )
+
+        handler = self.handlers.get(method)
+        if handler is None:
+            return _error_response(
+                request_id, METHOD_NOT_FOUND_CODE, f"method {method} not found"
+            )
+        try:
+            result = handler(request.get("params") or [])
+        except JsonRpcError as e:
+            return _error_response(request_id, e.code, e.message)
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _draw_faults(self) -> tuple[float, bool]:
+        if not (self.latency or self.latency_jitter or self.failure_rate):
+            return 0.0, False
+        with self._random_lock:
+            jitter = self._random.random() * self.latency_jitter
+            fail = self._random.random() < self.failure_rate
+        return self.latency + jitter, fail
+
+
+def _error_response(request_id, code: int, message: str) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
@@ -0,0 +1,545 @@
+import argparse
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from itertools import count
+from typing import Optional
+
+from eth_abi import decode_abi, encode_abi
+from eth_account import Account
+from hexbytes import HexBytes
+from web3 import Web3
+
+from simple_arbitrage.backtest.recorder import read_blocks
+from simple_arbitrage.fakes.json_rpc_server import JsonRpcError, JsonRpcServer
+from simple_arbitrage.fakes.universe import (
+    DEFAULT_CHANGED_FRACTION,
+    SECONDS_PER_BLOCK,
+    SyntheticPair,
+    SyntheticUniverse,
+    universe_from_recording,
+)
+from simple_arbitrage.markets.pending_swaps import pair_address
+from simple_arbitrage.utils.abi import UNISWAP_PAIR_ABI, UNISWAP_ROUTER_ABI
+from simple_arbitrage.utils.addresses import (
+    ROUTER_FACTORIES,
+    UNISWAP_LOOKUP_CONTRACT_ADDRESS,
+    WETH_ADDRESS,
+)
+
+logger = logging.getLogger(__name__)
+
+CHAIN_ID = 1
+DEFAULT_BASE_FEE = 20 * 10**9
+DEFAULT_GAS_ESTIMATE = 300000
+
+# blocks of Sync logs kept for eth_getLogs
+LOG_HISTORY = 256
+
+EXECUTION_REVERTED_CODE = 3
+
+GET_PAIRS_BY_INDEX_RANGE = Web3.keccak(
+    text="getPairsByIndexRange(address,uint256,uint256)"
+)[:4]
+GET_RESERVES_BY_PAIRS = Web3.keccak(text="getReservesByPairs(address[])")[:4]
+GET_RESERVES = Web3.keccak(text="getReserves()")[:4]
+TOKEN0 = Web3.keccak(text="token0()")[:4]
+TOKEN1 = Web3.keccak(text="token1()")[:4]
+SYNC_TOPIC = Web3.keccak(text="Sync(uint112,uint112)").hex()
+
+# signer and recipient of the pending swaps
+SWAPPER_KEY = "0x" + "5a" * 32
+SWAPPER_ADDRESS = Account.from_key(SWAPPER_KEY).address
+
+_router_interface = Web3().eth.contract(abi=UNISWAP_ROUTER_ABI)
+_pair_interface = Web3().eth.contract(abi=UNISWAP_PAIR_ABI)
+
+
+class FakeNode(JsonRpcServer):
+    """stand-in Ethereum node serving a SyntheticUniverse
+
+    Answers the UniswapQuery lookups (getPairsByIndexRange, getReservesByPairs) and
+    the pair contracts' getReserves/token0/token1 through eth_call, eth_getLogs for
+    Sync events, block and transaction count queries, eth_estimateGas, and new heads
+    through block filters, the way app.py watches for heads. mine() advances the
+    universe one block. Latency and failures are injected per JsonRpcServer.
+
+    send_swap() stands in for the mempool: the swap is announced to pending
+    transaction filters and served, signed, by eth_getTransactionByHash, and the next
+    mine() includes it before the block's random swaps.
+    """
+
+    def __init__(
+        self,
+        universe: SyntheticUniverse,
+        base_fee_per_gas: int = DEFAULT_BASE_FEE,
+        gas_estimate: int = DEFAULT_GAS_ESTIMATE,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.universe = universe
+        self.base_fee_per_gas = base_fee_per_gas
+        self.gas_estimate = gas_estimate
+        self.lookup_address = UNISWAP_LOOKUP_CONTRACT_ADDRESS.lower()
+        self._lock = threading.Lock()
+        self._logs: deque[tuple[int, list[dict]]] = deque(maxlen=LOG_HISTORY)
+        self._block_filters: dict[str, list[str]] = {}
+        self._pending_filters: dict[str, list[str]] = {}
+        # (transaction, SyntheticPair, token in, amount in or None, amount out)
+        self._pending: list[tuple[dict, SyntheticPair, str, Optional[int], int]] = []
+        self._transactions: dict[str, dict] = {}
+        self._block_transactions: deque[tuple[int, list[str]]] = deque(
+            maxlen=LOG_HISTORY
+        )
+        self._filter_ids = count(1)
+
+        for method, handler in {
+            "eth_chainId": lambda params: hex(CHAIN_ID),
+            "net_version": lambda params: str(CHAIN_ID),
+            "eth_blockNumber": lambda params: hex(self.universe.block_number),
+            "eth_getBlockByNumber": self.get_block_by_number,
+            "eth_getTransactionCount": lambda params: hex(0),
+            "eth_gasPrice": lambda params: hex(self.base_fee_per_gas),
+            "eth_maxPriorityFeePerGas": lambda params: hex(0),
+            "eth_estimateGas": lambda params: hex(self.gas_estimate),
+            "eth_call": self.call,
+            "eth_getLogs": self.get_logs,
+            "eth_newBlockFilter": self.new_block_filter,
+            "eth_newPendingTransactionFilter": self.new_pending_transaction_filter,
+            "eth_getTransactionByHash": self.get_transaction_by_hash,
+            "eth_getFilterChanges": self.get_filter_changes,
+            "eth_uninstallFilter": self.uninstall_filter,
+        }.items():
+            self.register(method, handler)
+
+    def mine(
+        self,
+        reserves: Optional[list[list[int]]] = None,
+        block_number: Optional[int] = None,
+        changed_fraction: float = DEFAULT_CHANGED_FRACTION,
+    ) -> int:
+        """advance one block, to the given pair-ordered reserves or by random swaps"""
+        with self._lock:
+            included, swapped = self._include_pending()
+            if reserves is None:
+                changed = self.universe.advance(changed_fraction)
+            else:
+                changed = self.universe.apply_reserves(
+                    block_number or self.universe.block_number + 1, reserves
+                )
+            block_number = self.universe.block_number
+            changed = list({pair.address: pair for pair in swapped + changed}.values())
+            self._logs.append((block_number, self._sync_logs(block_number, changed)))
+            self._block_transactions.append((block_number, included))
+            block_hash = _block_hash(block_number)
+            for hashes in self._block_filters.values():
+                hashes.append(block_hash)
+        return block_number
+
+    def send_swap(
+        self,
+        pair_address: str,
+        token_in: str,
+        amount_in: int,
+        min_amount_out: int = 0,
+        via_router: bool = True,
+    ) -> str:
+        """announce a pending swap for the next block, returns its transaction hash
+
+        Through the router exactly amount_in is swapped, reverting below
+        min_amount_out. A direct call to the pair's swap() asks for what amount_in
+        buys at the current reserves, and pays whatever that costs when mined.
+        """
+        with self._lock:
+            pair = self._pair(pair_address)
+            token_out = pair.token1 if token_in == pair.token0 else pair.token0
+            if via_router:
+                transaction = self._router_transaction(
+                    pair, token_in, token_out, amount_in, min_amount_out
+                )
+                amount_out = min_amount_out
+            else:
+                reserve_in, reserve_out = _reserves(pair, token_in)
+                amount_out = _amount_out(reserve_in, reserve_out, amount_in)
+                amounts_out = (
+                    [amount_out, 0] if token_out == pair.token0 else [0, amount_out]
+                )
+                transaction = _transaction(
+                    pair.address,
+                    _pair_interface.encodeABI(
+                        fn_name="swap", args=[*amounts_out, SWAPPER_ADDRESS, b""]
+                    ),
+                )
+                amount_in = None
+            transaction = _signed(transaction, nonce=len(self._transactions))
+            self._transactions[transaction["hash"]] = transaction
+            self._pending.append((transaction, pair, token_in, amount_in, amount_out))
+            for hashes in self._pending_filters.values():
+                hashes.append(transaction["hash"])
+        return transaction["hash"]
+
+    def send_random_swaps(self, count: int) -> list[str]:
+        """pending swaps on random pairs, through the router where it knows the pair"""
+        return [
+            self.send_swap(
+                pair.address,
+                token_in,
+                amount_in,
+                via_router=_router_for(pair) is not None,
+            )
+            for pair, token_in, amount_in in self.universe.random_swaps(count)
+        ]
+
+    def get_block_by_number(self, params: list) -> dict:
+        block_number = self._block_number(params[0])
+        return {
+            "number": hex(block_number),
+            "hash": _block_hash(block_number),
+            "parentHash": _block_hash(block_number - 1),
+            "timestamp": hex(
+                self.universe.timestamp
+                - (self.universe.block_number - block_number) * SECONDS_PER_BLOCK
+            ),
+            "baseFeePerGas": hex(self.base_fee_per_gas),
+            "gasLimit": hex(30000000),
+            "gasUsed": hex(0),
+            "miner": "0x" + "00" * 20,
+            "transactions": next(
+                (
+                    hashes
+                    for number, hashes in self._block_transactions
+                    if number == block_number
+                ),
+                [],
+            ),
+        }
+
+    def get_transaction_by_hash(self, params: list) -> Optional[dict]:
+        return self._transactions.get(params[0].lower())
+
+    def call(self, params: list) -> str:
+        transaction = params[0]
+        to = (transaction.get("to") or "").lower()
+        data = HexBytes(transaction.get("data") or transaction.get("input") or "0x")
+        selector, arguments = bytes(data[:4]), bytes(data[4:])
+
+        with self._lock:
+            if to == self.lookup_address:
+                if selector == GET_PAIRS_BY_INDEX_RANGE:
+                    return self._pairs_by_index_range(arguments)
+                if selector == GET_RESERVES_BY_PAIRS:
+                    return self._reserves_by_pairs(arguments)
+            pair = self._pair(to)
+            if pair is not None:
+                if selector == GET_RESERVES:
+                    return _encode(
+                        ["uint112", "uint112", "uint32"],
+                        [pair.reserve0, pair.reserve1, self.universe.timestamp],
+                    )
+                if selector == TOKEN0:
+                    return _encode(["address"], [pair.token0])
+                if selector == TOKEN1:
+                    return _encode(["address"], [pair.token1])
+        raise JsonRpcError(EXECUTION_REVERTED_CODE, "execution reverted")
+
+    def get_logs(self, params: list) -> list[dict]:
+        log_filter = params[0] if params else {}
+        with self._lock:
+            latest = self.universe.block_number
+            from_block = self._block_number(log_filter.get("fromBlock", "latest"))
+            to_block = self._block_number(log_filter.get("toBlock", "latest"))
+            logs = [
+                log
+                for block_number, block_logs in self._logs
+                if from_block <= block_number <= min(to_block, latest)
+                for log in block_logs
+            ]
+
+        addresses = log_filter.get("address")
+        if addresses:
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            wanted = {address.lower() for address in addresses}
+            logs = [log for log in logs if log["address"].lower() in wanted]
+        topics = log_filter.get("topics")
+        if topics and topics[0]:
+            first = topics[0] if isinstance(topics[0], list) else [topics[0]]
+            logs = [log for log in logs if log["topics"][0] in first]
+        return logs
+
+    def new_block_filter(self, params: list) -> str:
+        filter_id = hex(next(self._filter_ids))
+        with self._lock:
+            self._block_filters[filter_id] = []
+        return filter_id
+
+    def new_pending_transaction_filter(self, params: list) -> str:
+        filter_id = hex(next(self._filter_ids))
+        with self._lock:
+            self._pending_filters[filter_id] = []
+        return filter_id
+
+    def get_filter_changes(self, params: list) -> list[str]:
+        with self._lock:
+            for filters in (self._block_filters, self._pending_filters):
+                hashes = filters.get(params[0])
+                if hashes is not None:
+                    filters[params[0]] = []
+                    return hashes
+        raise JsonRpcError(-32000, "filter not found")
+
+    def uninstall_filter(self, params: list) -> bool:
+        with self._lock:
+            return (
+                self._block_filters.pop(params[0], None) is not None
+                or self._pending_filters.pop(params[0], None) is not None
+            )
+
+    def _router_transaction(
+        self,
+        pair: SyntheticPair,
+        token_in: str,
+        token_out: str,
+        amount_in: int,
+        min_amount_out: int,
+    ) -> dict:
+        router_address = _router_for(pair)
+        if router_address is None:
+            raise ValueError(f"No router swaps through {pair.address}")
+        deadline = self.universe.timestamp + 120
+        if token_in == WETH_ADDRESS:
+            data = _router_interface.encodeABI(
+                fn_name="swapExactETHForTokens",
+                args=[min_amount_out, [token_in, token_out], SWAPPER_ADDRESS, deadline],
+            )
+            return _transaction(router_address, data, amount_in)
+        data = _router_interface.encodeABI(
+            fn_name="swapExactTokensForTokens",
+            args=[
+                amount_in,
+                min_amount_out,
+                [token_in, token_out],
+                SWAPPER_ADDRESS,
+                deadline,
+            ],
+        )
+        return _transaction(router_address, data)
+
+    def _include_pending(self) -> tuple[list[str], list[SyntheticPair]]:
+        """apply the pending swaps in order, returns the included hashes and swapped pairs"""
+        included, swapped = [], []
+        for transaction, pair, token_in, amount_in, amount_out in self._pending:
+            included.append(transaction["hash"])
+            transaction["blockNumber"] = hex(self.universe.block_number + 1)
+            reserve_in, reserve_out = _reserves(pair, token_in)
+            if amount_in is None:
+                # a direct swap, the input is whatever the output costs now
+                if amount_out >= reserve_out:
+                    continue
+                amount_in = (
+                    reserve_in * amount_out * 1000 // ((reserve_out - amount_out) * 997)
+                    + 1
+                )
+            else:
+                minimum, amount_out = amount_out, _amount_out(
+                    reserve_in, reserve_out, amount_in
+                )
+                if amount_out < minimum:
+                    continue
+            if token_in == pair.token0:
+                pair.reserve0 += amount_in
+                pair.reserve1 -= amount_out
+            else:
+                pair.reserve1 += amount_in
+                pair.reserve0 -= amount_out
+            swapped.append(pair)
+        self._pending = []
+        return included, swapped
+
+    def _pairs_by_index_range(self, arguments: bytes) -> str:
+        factory_address, start, stop = decode_abi(
+            ["address", "uint256", "uint256"], arguments
+        )
+        pairs = self.universe.pairs_by_factory(factory_address)[start:stop]
+        return _encode(
+            ["address[3][]"],
+            [[[pair.token0, pair.token1, pair.address] for pair in pairs]],
+        )
+
+    def _reserves_by_pairs(self, arguments: bytes) -> str:
+        (addresses,) = decode_abi(["address[]"], arguments)
+        reserves = []
+        for address in addresses:
+            pair = self._pair(address.lower())
+            if pair is None:
+                raise JsonRpcError(EXECUTION_REVERTED_CODE, "execution reverted")
+            reserves.append([pair.reserve0, pair.reserve1, self.universe.timestamp])
+        return _encode(["uint256[3][]"], [reserves])
+
+    def _pair(self, address: str) -> Optional[SyntheticPair]:
+        return self.universe.pairs_by_address.get(address.lower())
+
+    def _block_number(self, tag) -> int:
+        if tag in (None, "latest", "pending", "safe", "finalized"):
+            return self.universe.block_number
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def _sync_logs(self, block_number: int, changed: list[SyntheticPair]) -> list[dict]:
+        block_hash = _block_hash(block_number)
+        return [
+            {
+                "address": pair.address,
+                "topics": [SYNC_TOPIC],
+                "data": _encode(["uint112", "uint112"], [pair.reserve0, pair.reserve1]),
+                "blockNumber": hex(block_number),
+                "blockHash": block_hash,
+                "transactionHash": Web3.keccak(
+                    text=f"{block_number}:{log_index}"
+                ).hex(),
+                "transactionIndex": hex(log_index),
+                "logIndex": hex(log_index),
+                "removed": False,
+            }
+            for log_index, pair in enumerate(changed)
+        ]
+
+
+def _transaction(to: str, data: str, value: int = 0) -> dict:
+    return {
+        "from": SWAPPER_ADDRESS,
+        "to": to,
+        "input": data,
+        "value": hex(value),
+        "nonce": hex(0),
+        "gas": hex(DEFAULT_GAS_ESTIMATE),
+        "gasPrice": hex(DEFAULT_BASE_FEE),
+        "blockHash": None,
+        "blockNumber": None,
+        "transactionIndex": None,
+    }
+
+
+def _signed(transaction: dict, nonce: int) -> dict:
+    """transaction signed by the swapper, with the signature and hash a node serves"""
+    signed = Account.sign_transaction(
+        {
+            "nonce": nonce,
+            "to": transaction["to"],
+            "value": int(transaction["value"], 16),
+            "data": transaction["input"],
+            "gas": int(transaction["gas"], 16),
+            "gasPrice": int(transaction["gasPrice"], 16),
+            "chainId": CHAIN_ID,
+        },
+        SWAPPER_KEY,
+    )
+    return {
+        **transaction,
+        "nonce": hex(nonce),
+        "chainId": hex(CHAIN_ID),
+        "hash": signed.hash.hex(),
+        "v": hex(signed.v),
+        "r": hex(signed.r),
+        "s": hex(signed.s),
+    }
+
+
+def _router_for(pair: SyntheticPair) -> Optional[str]:
+    """the router whose factory deployed the pair at its CREATE2 address"""
+    for router_address, factory_address in ROUTER_FACTORIES.items():
+        if factory_address.lower() == pair.factory_address.lower() and (
+            pair_address(factory_address, pair.token0, pair.token1) == pair.address
+        ):
+            return router_address
+    return None
+
+
+def _reserves(pair: SyntheticPair, token_in: str) -> tuple[int, int]:
+    if token_in == pair.token0:
+        return pair.reserve0, pair.reserve1
+    return pair.reserve1, pair.reserve0
+
+
+def _amount_out(reserve_in: int, reserve_out: int, amount_in: int) -> int:
+    amount_in_with_fee = amount_in * 997
+    return amount_in_with_fee * reserve_out // (reserve_in * 1000 + amount_in_with_fee)
+
+
+def _encode(types: list[str], values: list) -> str:
+    return "0x" + encode_abi(types, values).hex()
+
+
+def _block_hash(block_number: int) -> str:
+    return Web3.keccak(text=f"block:{block_number}").hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in node")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--markets-per-token", type=int, default=2)
+    parser.add_argument(
+        "--recording", help="serve a backtest recording instead of a synthetic universe"
+    )
+    parser.add_argument("--block-time", type=float, default=12.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--pending-swaps",
+        type=int,
+        default=0,
+        help="swaps announced as pending halfway through each block",
+    )
+    args = parser.parse_args()
+
+    if args.recording:
+        universe = universe_from_recording(args.recording)
+        recorded_blocks = read_blocks(args.recording)
+        next(recorded_blocks)
+    else:
+        universe = SyntheticUniverse.generate(args.tokens, args.markets_per_token)
+        recorded_blocks = None
+
+    node = FakeNode(
+        universe,
+        port=args.port,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+    ).start()
+    logger.info(f"Node serving {len(universe.pairs)} pairs on {node.url}")
+    try:
+        while True:
+            if args.pending_swaps:
+                time.sleep(args.block_time / 2)
+                node.send_random_swaps(args.pending_swaps)
+                time.sleep(args.block_time / 2)
+            else:
+                time.sleep(args.block_time)
+            if recorded_blocks is None:
+                block_number = node.mine()
+            else:
+                recorded = next(recorded_blocks, None)
+                if recorded is None:
+                    logger.info("Recording exhausted")
+                    break
+                block_number = node.mine(recorded[1], recorded[0])
+            logger.info(f"Mined block {block_number}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from simple_arbitrage.fakes.json_rpc_server import JsonRpcServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAS_USED = 150000
+DEFAULT_COINBASE_DIFF = 10**16
+
+
+class FakeRelay(JsonRpcServer):
+    """stand-in for the Flashbots relay answering eth_sendBundle and eth_callBundle
+
+    Every submitted bundle is kept per target block, along with when it arrived.
+    Simulations succeed and report gas_used and coinbase_diff for each bundle.
+    """
+
+    def __init__(
+        self,
+        gas_used: int = DEFAULT_GAS_USED,
+        coinbase_diff: int = DEFAULT_COINBASE_DIFF,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.gas_used = gas_used
+        self.coinbase_diff = coinbase_diff
+        self.bundles_by_block: dict[int, list[list[str]]] = defaultdict(list)
+        # time.perf_counter() of each bundle's arrival, per target block
+        self.received_at: dict[int, list[float]] = defaultdict(list)
+        self._bundles_lock = threading.Lock()
+        self.register("eth_sendBundle", self.send_bundle)
+        self.register("eth_callBundle", self.call_bundle)
+
+    def send_bundle(self, params: list) -> dict:
+        bundle = params[0]
+        target_block_number = int(bundle["blockNumber"], 16)
+        with self._bundles_lock:
+            self.bundles_by_block[target_block_number].append(bundle["txs"])
+            self.received_at[target_block_number].append(time.perf_counter())
+        return {"bundleHash": _bundle_hash(bundle["txs"])}
+
+    def call_bundle(self, params: list) -> dict:
+        bundle = params[0]
+        results = [
+            {
+                "txHash": Web3.keccak(HexBytes(tx)).hex(),
+                "gasUsed": self.gas_used,
+                "coinbaseDiff": str(self.coinbase_diff),
+            }
+            for tx in bundle["txs"]
+        ]
+        return {
+            "bundleHash": _bundle_hash(bundle["txs"]),
+            "coinbaseDiff": str(self.coinbase_diff * len(results)),
+            "results": results,
+            "stateBlockNumber": bundle.get("stateBlockNumber"),
+            "totalGasUsed": self.gas_used * len(results),
+        }
+
+    @property
+    def bundle_count(self) -> int:
+        with self._bundles_lock:
+            return sum(len(bundles) for bundles in self.bundles_by_block.values())
+
+
+def _bundle_hash(txs: list[str]) -> str:
+    return Web3.keccak(b"".join(HexBytes(tx) for tx in txs)).hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in relay")
+    parser.add_argument("--port", type=int, default=18545)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    relay = FakeRelay(
+        port=args.port,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+    ).start()
+    logger.info(f"Fake relay listening on {relay.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        relay.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
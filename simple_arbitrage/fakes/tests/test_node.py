@@ -0,0 +1,67 @@
+import unittest
+
+from web3 import Web3
+
+from simple_arbitrage.fakes.node import SYNC_TOPIC, FakeNode
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    fetch_reserves,
+    get_uniswap_markets_by_token,
+)
+from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES
+
+
+class TestFakeNode(unittest.TestCase):
+    def setUp(self) -> None:
+        self.universe = SyntheticUniverse.generate(20, markets_per_token=2)
+        self.node = FakeNode(self.universe).start()
+        self.provider = Web3.HTTPProvider(self.node.url)
+        self.w3 = Web3(self.provider)
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    def test_loader_reads_synthetic_universe(self):
+        markets = get_uniswap_markets_by_token(self.provider, FACTORY_ADDRESSES)
+
+        self.assertEqual(len(markets.all_market_pairs), 40)
+        self.assertEqual(len(markets.markets_by_token), 20)
+        pair = markets.all_market_pairs[0]
+        synthetic = self.universe.pairs_by_address[pair.market_address.lower()]
+        self.assertEqual(
+            [pair.get_balance(token) for token in pair.tokens],
+            [synthetic.reserve0, synthetic.reserve1],
+        )
+
+    def test_mine_notifies_block_filter_and_emits_sync_logs(self):
+        block_filter = self.w3.eth.filter("latest")
+        start = self.w3.eth.block_number
+
+        block_number = self.node.mine(changed_fraction=0.1)
+
+        self.assertEqual(block_number, start + 1)
+        self.assertEqual(self.w3.eth.block_number, block_number)
+        self.assertEqual(len(block_filter.get_new_entries()), 1)
+        self.assertEqual(block_filter.get_new_entries(), [])
+        logs = self.w3.eth.get_logs({"fromBlock": block_number, "topics": [SYNC_TOPIC]})
+        self.assertEqual(len(logs), 4)
+
+    def test_recorded_reserves_served(self):
+        markets = get_uniswap_markets_by_token(self.provider, FACTORY_ADDRESSES)
+        reserves = [[1000 + index, 2000 + index] for index in range(40)]
+
+        self.node.mine(reserves, block_number=self.universe.block_number + 5)
+
+        fetched = fetch_reserves(self.provider, markets.all_market_pairs)
+        by_address = {
+            pair.address: reserve
+            for pair, reserve in zip(self.universe.pairs, reserves)
+        }
+        for pair, reserve in zip(markets.all_market_pairs, fetched):
+            self.assertEqual(reserve[:2], by_address[pair.market_address])
+
+    def test_injected_failure(self):
+        self.node.failure_rate = 1.0
+
+        with self.assertRaises(ValueError):
+            self.w3.eth.block_number
@@ -0,0 +1,185 @@
+import logging
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+from web3 import Web3
+
+from simple_arbitrage.backtest.recorder import load_markets, read_blocks
+from simple_arbitrage.markets.pending_swaps import pair_address
+from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES, WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+logger = logging.getLogger(__name__)
+
+GENESIS_BLOCK_NUMBER = 15000000
+GENESIS_TIMESTAMP = 1656000000
+SECONDS_PER_BLOCK = 12
+
+# share of pairs whose reserves move in a synthetic block
+DEFAULT_CHANGED_FRACTION = 0.01
+
+
+@dataclass()
+class SyntheticPair:
+    factory_address: str
+    address: str
+    token0: str
+    token1: str
+    reserve0: int
+    reserve1: int
+
+
+class SyntheticUniverse:
+    """a set of Uniswap V2 style pairs and their reserves, advanced block by block
+
+    generate() builds a universe of WETH pairs with a few markets per token priced
+    around a common token price, so crossed markets show up the way they do on
+    mainnet. Pairs of factories with a known init code hash get their CREATE2
+    address, so router swaps resolve to them. advance() moves the chain one block
+    by swapping against a random share of the pairs, which keeps each pair's
+    constant product.
+    """
+
+    def __init__(
+        self,
+        pairs: list[SyntheticPair],
+        block_number: int = GENESIS_BLOCK_NUMBER,
+        timestamp: int = GENESIS_TIMESTAMP,
+        seed: int = 0,
+    ):
+        self.pairs = pairs
+        self.pairs_by_address = {pair.address.lower(): pair for pair in pairs}
+        self.block_number = block_number
+        self.timestamp = timestamp
+        self._random = random.Random(seed)
+
+    @classmethod
+    def generate(
+        cls,
+        token_count: int,
+        markets_per_token: int = 2,
+        factory_addresses: Optional[list[str]] = None,
+        spread: float = 0.02,
+        seed: int = 0,
+    ) -> "SyntheticUniverse":
+        factory_addresses = factory_addresses or FACTORY_ADDRESSES
+        rng = random.Random(seed)
+        pairs = []
+        for token_index in range(token_count):
+            token_address = synthetic_address("token", token_index)
+            token_price = rng.uniform(0.0001, 0.1)  # WETH per token
+            for market_index in range(markets_per_token):
+                weth_reserve = int(rng.uniform(1, 50) * ETHER)
+                price = token_price * (1 + rng.uniform(-spread, spread))
+                token_reserve = int(weth_reserve / price)
+                token0, token1 = sorted(
+                    [token_address, WETH_ADDRESS], key=lambda address: address.lower()
+                )
+                reserve0, reserve1 = (
+                    (weth_reserve, token_reserve)
+                    if token0 == WETH_ADDRESS
+                    else (token_reserve, weth_reserve)
+                )
+                factory_address = factory_addresses[
+                    market_index % len(factory_addresses)
+                ]
+                pairs.append(
+                    SyntheticPair(
+                        factory_address,
+                        # where the factory's CREATE2 address is known, the router's
+                        pair_address(factory_address, token0, token1)
+                        or synthetic_address("pair", token_index, market_index),
+                        token0,
+                        token1,
+                        reserve0,
+                        reserve1,
+                    )
+                )
+        return cls(pairs, seed=seed)
+
+    def pairs_by_factory(self, factory_address: str) -> list[SyntheticPair]:
+        return [
+            pair
+            for pair in self.pairs
+            if pair.factory_address.lower() == factory_address.lower()
+        ]
+
+    def advance(
+        self, changed_fraction: float = DEFAULT_CHANGED_FRACTION
+    ) -> list[SyntheticPair]:
+        """mine one block of random swaps, returns the pairs that changed"""
+        changed_count = (
+            min(len(self.pairs), max(1, int(len(self.pairs) * changed_fraction)))
+            if changed_fraction > 0
+            else 0
+        )
+        changed = self._random.sample(self.pairs, changed_count)
+        for pair in changed:
+            # swap up to 2% of one reserve into the pair, the other side pays out
+            if self._random.random() < 0.5:
+                amount_in = int(pair.reserve0 * self._random.uniform(0, 0.02))
+                reserve0 = pair.reserve0 + amount_in
+                pair.reserve1 = pair.reserve0 * pair.reserve1 // reserve0
+                pair.reserve0 = reserve0
+            else:
+                amount_in = int(pair.reserve1 * self._random.uniform(0, 0.02))
+                reserve1 = pair.reserve1 + amount_in
+                pair.reserve0 = pair.reserve0 * pair.reserve1 // reserve1
+                pair.reserve1 = reserve1
+        self._next_block()
+        return changed
+
+    def random_swaps(self, count: int) -> list[tuple[SyntheticPair, str, int]]:
+        """(pair, token in, amount in) of count swaps of up to 1% of a reserve"""
+        swaps = []
+        for pair in self._random.choices(self.pairs, k=count):
+            if self._random.random() < 0.5:
+                token_in, reserve_in = pair.token0, pair.reserve0
+            else:
+                token_in, reserve_in = pair.token1, pair.reserve1
+            swaps.append(
+                (pair, token_in, int(reserve_in * self._random.uniform(0, 0.01)) + 1)
+            )
+        return swaps
+
+    def apply_reserves(
+        self, block_number: int, reserves: list[list[int]]
+    ) -> list[SyntheticPair]:
+        """move to a recorded block, reserves in pair order, returns the changed pairs"""
+        changed = []
+        for pair, (reserve0, reserve1) in zip(self.pairs, reserves):
+            if (pair.reserve0, pair.reserve1) != (reserve0, reserve1):
+                pair.reserve0, pair.reserve1 = int(reserve0), int(reserve1)
+                changed.append(pair)
+        self.timestamp += (block_number - self.block_number) * SECONDS_PER_BLOCK
+        self.block_number = block_number
+        return changed
+
+    def _next_block(self):
+        self.block_number += 1
+        self.timestamp += SECONDS_PER_BLOCK
+
+
+def universe_from_recording(directory: str) -> SyntheticUniverse:
+    """the pairs of a backtest recording, all under the first factory, at its first block"""
+    markets = load_markets(directory)
+    block_number, reserves = next(read_blocks(directory))
+    pairs = [
+        SyntheticPair(
+            FACTORY_ADDRESSES[0],
+            pair.market_address,
+            pair.tokens[0],
+            pair.tokens[1],
+            int(reserve[0]),
+            int(reserve[1]),
+        )
+        for pair, reserve in zip(markets.pairs, reserves)
+    ]
+    return SyntheticUniverse(pairs, block_number)
+
+
+def synthetic_address(*parts) -> str:
+    return Web3.toChecksumAddress(
+        Web3.keccak(text=":".join(str(part) for part in parts))[-20:]
+    )
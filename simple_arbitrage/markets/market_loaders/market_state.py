@@ -0,0 +1,146 @@
+"""warm restarts from a snapshot of the loaded markets
+
+Loading scans every factory pair by pair and filters the pairs on their reserves,
+which takes minutes on mainnet. The running bot snapshots the MarketState and the
+reserves of its last fetched block to a state file every few blocks; on start,
+resume_market_state reads it back and only scans the pairs created since, then
+refreshes the reserves at the head in one call.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import replace
+from typing import Optional
+
+from eth_typing.evm import ChecksumAddress
+from web3 import HTTPProvider
+
+from simple_arbitrage.backtest.recorder import markets_content, markets_from_content
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    MarketState,
+    apply_reserves,
+    catch_up_market_state,
+    load_market_state,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+DEFAULT_STATE_EVERY_BLOCKS = 100
+
+
+def write_market_state(path: str, state: MarketState, reserves: list[list[float]]):
+    """reserves in all_market_pairs order, replaces the file atomically"""
+    content = {
+        "version": STATE_VERSION,
+        "block": state.block_number,
+        "scanned_pairs": state.scanned_pairs,
+        **markets_content(state.markets),
+        "reserves": [[int(reserve[0]), int(reserve[1])] for reserve in reserves],
+        "ungrouped_pairs": [
+            [pair.market_address, *pair.tokens] for pair in state.ungrouped_pairs
+        ],
+    }
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(content, f)
+    os.replace(temporary_path, path)
+
+
+def read_market_state(path: str) -> MarketState:
+    """the snapshot in path, with its reserves set on the pairs"""
+    with open(path) as f:
+        content = json.load(f)
+    if content.get("version") != STATE_VERSION:
+        raise ValueError(f"State version {content.get('version')} is not supported")
+    recorded = markets_from_content(content)
+    apply_reserves(recorded.pairs, content["reserves"])
+    return MarketState(
+        content["block"],
+        recorded.grouped_markets,
+        [
+            UniswappyV2EthPair(market_address, [token0, token1], "")
+            for market_address, token0, token1 in content["ungrouped_pairs"]
+        ],
+        content["scanned_pairs"],
+    )
+
+
+def resume_market_state(
+    provider: HTTPProvider,
+    factory_addresses: list[ChecksumAddress],
+    path: str,
+) -> MarketState:
+    """the state in path caught up to the head, else the markets loaded afresh"""
+    start = time.perf_counter()
+    try:
+        state = read_market_state(path)
+    except FileNotFoundError:
+        logger.info(f"No state at {path}, loading markets")
+        return load_market_state(provider, factory_addresses)
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Unreadable state at {path}, loading markets: {e}")
+        return load_market_state(provider, factory_addresses)
+
+    snapshot_block = state.block_number
+    tracked_pairs = catch_up_market_state(provider, state, factory_addresses)
+    logger.info(
+        f"Resumed from block {snapshot_block}, caught up "
+        f"{state.block_number - snapshot_block} blocks and {len(tracked_pairs)} new "
+        f"pairs in {time.perf_counter() - start:.1f}s"
+    )
+    return state
+
+
+class MarketStateWriter:
+    """snapshots the market state every every_blocks blocks, off the block's thread"""
+
+    def __init__(
+        self,
+        path: str,
+        state: MarketState,
+        every_blocks: int = DEFAULT_STATE_EVERY_BLOCKS,
+    ):
+        self.path = path
+        self.state = state
+        self.every_blocks = every_blocks
+        self._written_block: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def due(self, block_number: int) -> bool:
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        return (
+            self._written_block is None
+            or block_number - self._written_block >= self.every_blocks
+        )
+
+    def write(self, block_number: int, reserves: list[list[float]]):
+        """snapshot reserves as of block_number, which must not change afterwards"""
+        self._written_block = block_number
+        self._thread = threading.Thread(
+            target=self._write,
+            args=(replace(self.state, block_number=block_number), reserves),
+            name="market-state-writer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _write(self, state: MarketState, reserves: list[list[float]]):
+        start = time.perf_counter()
+        try:
+            write_market_state(self.path, state, reserves)
+        except OSError:
+            logger.exception(f"Writing state to {self.path} failed")
+            return
+        logger.info(
+            f"State of block {state.block_number} written in "
+            f"{time.perf_counter() - start:.2f}s"
+        )
@@ -1,6 +1,7 @@
 import logging
 from collections import defaultdict
 from collections.abc import Iterable
+from dataclasses import dataclass
 from itertools import chain
 
 from eth_typing.evm import ChecksumAddress
@@ -31,21 +32,28 @@ BLACKLIST_TOKENS = ["0xD75EA151a61d06868E31F8988D28DFE5E9df57B4"]
 def _get_uniswappy_markets(
     provider: HTTPProvider,
     factory_address: ChecksumAddress,
-) -> list[UniswappyV2EthPair]:
+    start: int = 0,
+) -> tuple[list[UniswappyV2EthPair], int]:
+    """WETH pairs from the factory's pair index start on, and the index scanned up to"""
     w3 = Web3(provider)
     uniswap_query = w3.eth.contract(  # type: ignore[call-overload]
         UNISWAP_LOOKUP_CONTRACT_ADDRESS,
         abi=UNISWAP_QUERY_ABI,
     )
     market_pairs = []
-    for i in range(0, BATCH_COUNT_LIMIT * UNISWAP_BATCH_SIZE, UNISWAP_BATCH_SIZE):
+    scanned = start
+    # the same pair index range as a fresh load, however often it is resumed
+    end = BATCH_COUNT_LIMIT * UNISWAP_BATCH_SIZE
+    for i in range(start, end, UNISWAP_BATCH_SIZE):
 
+        batch_end = min(i + UNISWAP_BATCH_SIZE, end)
         pairs = uniswap_query.caller.getPairsByIndexRange(
             factory_address,
             i,
-            i + UNISWAP_BATCH_SIZE,
+            batch_end,
         )
         logger.info(f"batch: {len(pairs)}")
+        scanned = i + len(pairs)
         for token1, token2, market_address in pairs:
 
             if token1 == WETH_ADDRESS:
@@ -63,10 +71,10 @@ def _get_uniswappy_markets(
                 )
                 market_pairs.append(uniswappy_v2_eth_pair)
 
-        if len(pairs) < UNISWAP_BATCH_SIZE:
+        if len(pairs) < batch_end - i:
             break
     logger.info(f"pairs from exchange: {len(market_pairs)}")
-    return market_pairs
+    return market_pairs, scanned
 
 
 def _group_markets_by_token(
@@ -91,10 +99,11 @@ def _get_markets_by_token_filtered_min_weth_balance(
     return markets_by_token
 
 
-def update_reserves(
+def fetch_reserves(
     provider: HTTPProvider,
     all_market_pairs: Iterable[UniswappyV2EthPair],
-):
+) -> list[list[float]]:
+    """reserves for every pair, in order, without touching the pairs"""
     w3 = Web3(provider)
     uniswap_query = w3.eth.contract(  # type: ignore[call-overload]
         UNISWAP_LOOKUP_CONTRACT_ADDRESS,
@@ -106,36 +115,109 @@ def update_reserves(
     reserves: list[list[float]] = uniswap_query.caller.getReservesByPairs(
         pair_addresses,
     )
+    return reserves
 
+
+def apply_reserves(
+    all_market_pairs: Iterable[UniswappyV2EthPair],
+    reserves: list[list[float]],
+):
     for index, pair in enumerate(all_market_pairs):
         reserve = reserves[index]
         pair.set_reserves_via_ordered_balances([reserve[0], reserve[1]])
 
 
-def get_uniswap_markets_by_token(
+def update_reserves(
+    provider: HTTPProvider,
+    all_market_pairs: Iterable[UniswappyV2EthPair],
+):
+    reserves = fetch_reserves(provider, all_market_pairs)
+    apply_reserves(all_market_pairs, reserves)
+
+
+@dataclass()
+class MarketState:
+    """what loading the markets found, kept so a restart can resume from it
+
+    ungrouped_pairs are WETH pairs whose token has no second market yet and
+    scanned_pairs how far each factory's pairs were read, so later loads only look
+    at pairs created since.
+    """
+
+    block_number: int
+    markets: GroupedMarkets
+    ungrouped_pairs: list[UniswappyV2EthPair]
+    scanned_pairs: dict[str, int]
+
+
+def load_market_state(
     provider: HTTPProvider,
     factory_addresses: list[ChecksumAddress],
-) -> GroupedMarkets:
-    all_pairs = [
-        _get_uniswappy_markets(provider, factory_address)
-        for factory_address in factory_addresses
-    ]
+) -> MarketState:
+    block_number = Web3(provider).eth.block_number
+    state = MarketState(block_number, GroupedMarkets({}, []), [], {})
+    catch_up_market_state(provider, state, factory_addresses)
+    return state
 
-    markets_by_token_all = _group_markets_by_token(
-        chain.from_iterable(all_pairs),
-    )
-    markets_by_token = {
-        token: markets
-        for token, markets in markets_by_token_all.items()
-        if len(markets) > 1
-    }
 
-    all_market_pairs = list(chain.from_iterable(markets_by_token.values()))
+def catch_up_market_state(
+    provider: HTTPProvider,
+    state: MarketState,
+    factory_addresses: list[ChecksumAddress],
+) -> list[UniswappyV2EthPair]:
+    """add the pairs created since state was loaded and refresh every reserve
+
+    Pairs already grouped keep their grouping and filtering, new pairs are grouped
+    and filtered the way loading does. Returns the newly tracked pairs.
+    """
+    block_number = Web3(provider).eth.block_number
+    new_pairs = []
+    for factory_address in factory_addresses:
+        pairs, scanned = _get_uniswappy_markets(
+            provider, factory_address, state.scanned_pairs.get(factory_address, 0)
+        )
+        state.scanned_pairs[factory_address] = scanned
+        new_pairs.extend(pairs)
+
+    all_market_pairs = list(state.markets.all_market_pairs)
+    grouped_tokens = set(_group_markets_by_token(all_market_pairs))
+    ungrouped_by_token = _group_markets_by_token(state.ungrouped_pairs)
+    for token, pairs in _group_markets_by_token(new_pairs).items():
+        ungrouped_by_token[token].extend(pairs)
+    tracked_pairs = []
+    for token, pairs in ungrouped_by_token.items():
+        if token in grouped_tokens or len(pairs) > 1:
+            tracked_pairs.extend(pairs)
+    tracked = {id(pair) for pair in tracked_pairs}
+    ungrouped_pairs = [
+        pair
+        for pair in chain(state.ungrouped_pairs, new_pairs)
+        if id(pair) not in tracked
+    ]
+    all_market_pairs.extend(tracked_pairs)
 
     update_reserves(provider, all_market_pairs)
 
-    filtered_markets_by_token = _get_markets_by_token_filtered_min_weth_balance(
-        all_market_pairs,
+    markets_by_token = {
+        token: list(markets)
+        for token, markets in state.markets.markets_by_token.items()
+    }
+    for token, markets in _get_markets_by_token_filtered_min_weth_balance(
+        tracked_pairs
+    ).items():
+        markets_by_token.setdefault(token, []).extend(markets)
+    logger.info(
+        f"new pairs: {len(new_pairs)}, newly tracked: {len(tracked_pairs)}, "
+        f"filtered markets by token: {len(markets_by_token)}"
     )
-    logger.info(f"filtered markets by token: {len(filtered_markets_by_token)}")
-    return GroupedMarkets(filtered_markets_by_token, all_market_pairs)
+    state.block_number = block_number
+    state.markets = GroupedMarkets(markets_by_token, all_market_pairs)
+    state.ungrouped_pairs = ungrouped_pairs
+    return tracked_pairs
+
+
+def get_uniswap_markets_by_token(
+    provider: HTTPProvider,
+    factory_addresses: list[ChecksumAddress],
+) -> GroupedMarkets:
+    return load_market_state(provider, factory_addresses).markets
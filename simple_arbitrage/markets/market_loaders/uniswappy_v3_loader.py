@@ -0,0 +1,119 @@
+import logging
+from collections.abc import Iterable
+from typing import Optional
+
+from web3 import HTTPProvider, Web3
+
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.markets.types.tick_math import MAX_TICK, MIN_TICK
+from simple_arbitrage.markets.types.uniswappy_v3_pool import (
+    POOL_LOG_TOPICS,
+    UniswappyV3Pool,
+)
+from simple_arbitrage.utils.abi import UNISWAP_V3_POOL_ABI
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+
+logger = logging.getLogger(__name__)
+
+
+def load_uniswappy_v3_pool(
+    provider: HTTPProvider, pool_address: str, block_number: int
+) -> UniswappyV3Pool:
+    """a pool with its price, active liquidity and every initialized tick at a block
+
+    Reads one bitmap word per 256 tick spacings, so pools with a wide spacing load
+    in a few hundred calls and 1 spacing pools in several thousand. A
+    PoolLogFollower started at the same block keeps it current from there.
+    """
+    w3 = Web3(provider)
+    caller = w3.eth.contract(  # type: ignore[call-overload]
+        Web3.toChecksumAddress(pool_address), abi=UNISWAP_V3_POOL_ABI
+    ).caller(block_identifier=block_number)
+    tick_spacing = caller.tickSpacing()
+    pool = UniswappyV3Pool(
+        pool_address,
+        [caller.token0(), caller.token1()],
+        "",
+        caller.fee(),
+        tick_spacing,
+    )
+    sqrt_price_x96, tick, *_ = caller.slot0()
+    pool.set_state(sqrt_price_x96, tick, caller.liquidity())
+
+    for word_position in range(
+        (MIN_TICK // tick_spacing) >> 8, ((MAX_TICK // tick_spacing) >> 8) + 1
+    ):
+        word = caller.tickBitmap(word_position)
+        while word:
+            bit = (word & -word).bit_length() - 1
+            word &= word - 1
+            initialized_tick = ((word_position << 8) + bit) * tick_spacing
+            liquidity_gross, liquidity_net, *_ = caller.ticks(initialized_tick)
+            pool.set_tick(initialized_tick, liquidity_gross, liquidity_net)
+    logger.info(
+        f"pool {pool_address}: {len(pool.liquidity_gross)} initialized ticks, "
+        f"liquidity {pool.liquidity}"
+    )
+    return pool
+
+
+def group_pools_by_token(
+    pools: Iterable[UniswappyV3Pool],
+) -> dict[str, list[EthMarket]]:
+    """every WETH pool under its non WETH token"""
+    pools_by_token: dict[str, list[EthMarket]] = {}
+    for pool in pools:
+        if WETH_ADDRESS not in pool.tokens:
+            continue
+        token_address = (
+            pool.tokens[1] if pool.tokens[0] == WETH_ADDRESS else pool.tokens[0]
+        )
+        pools_by_token.setdefault(token_address, []).append(pool)
+    return pools_by_token
+
+
+class PoolLogFollower:
+    """keeps pools current by applying their Swap, Mint and Burn logs block by block
+
+    One eth_getLogs per block covers every pool; each log is a constant time update.
+    """
+
+    def __init__(
+        self,
+        provider: HTTPProvider,
+        pools: Iterable[UniswappyV3Pool],
+        last_block: int,
+    ):
+        self.provider = provider
+        self.pools = list(pools)
+        self.pools_by_address = {
+            pool.market_address.lower(): pool for pool in self.pools
+        }
+        self.last_block = last_block
+
+    def update(self, block_number: int) -> int:
+        """apply logs up to block_number, returns how many were applied"""
+        if block_number <= self.last_block or not self.pools:
+            return 0
+        logs = Web3(self.provider).eth.get_logs(
+            {
+                "address": [pool.market_address for pool in self.pools],
+                "fromBlock": self.last_block + 1,
+                "toBlock": block_number,
+                "topics": [POOL_LOG_TOPICS],
+            }
+        )
+        applied = self.apply_logs(logs)
+        self.last_block = block_number
+        return applied
+
+    def apply_logs(self, logs: Iterable[dict]) -> int:
+        applied = 0
+        for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+            pool: Optional[UniswappyV3Pool] = self.pools_by_address.get(
+                log["address"].lower()
+            )
+            if pool is not None:
+                pool.apply_log(log)
+                applied += 1
+        return applied
@@ -0,0 +1,229 @@
+"""Uniswap V2 swaps decoded from pending transactions, and the reserves they lead to
+
+decode_swap() reads the router's swap functions and direct calls to a pair's own
+swap(). Fee-on-transfer router variants are left out, their input is not known from
+the calldata. predict_reserves() applies swaps in order to a copy of a snapshot,
+with the integer math of UniswapV2Library, and skips the ones that would revert on
+their slippage limit.
+"""
+from collections import ChainMap
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Optional
+
+from eth_abi.exceptions import DecodingError
+from web3 import Web3
+
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.abi import UNISWAP_PAIR_ABI, UNISWAP_ROUTER_ABI
+from simple_arbitrage.utils.addresses import (
+    PAIR_INIT_CODE_HASHES,
+    ROUTER_FACTORIES,
+    WETH_ADDRESS,
+)
+
+# no limit, for direct pair swaps whose input is paid before the call
+UNLIMITED = 2**256 - 1
+
+_router_interface = Web3().eth.contract(abi=UNISWAP_ROUTER_ABI)
+_pair_interface = Web3().eth.contract(abi=UNISWAP_PAIR_ABI)
+
+# router functions by whether the amount named in the call is the input
+_EXACT_INPUT = {
+    "swapExactETHForTokens": True,
+    "swapExactTokensForETH": True,
+    "swapExactTokensForTokens": True,
+    "swapETHForExactTokens": False,
+    "swapTokensForExactETH": False,
+    "swapTokensForExactTokens": False,
+}
+
+
+@dataclass(frozen=True)
+class PendingSwap:
+    transaction_hash: str
+    path: tuple[str, ...]  # tokens, in swap order
+    pairs: tuple[UniswappyV2EthPair, ...]  # one per hop
+    amount: int  # the exact input, or the exact output when exact_input is False
+    exact_input: bool
+    # amountOutMin for an exact input, amountInMax for an exact output
+    limit: int
+    # as the node served it, signature included, so it can lead a backrun bundle
+    transaction: Mapping = field(default_factory=dict, compare=False, repr=False)
+
+
+def pair_address(factory_address: str, token_a: str, token_b: str) -> Optional[str]:
+    """UniswapV2Library.pairFor, None for factories without a known init code hash"""
+    init_code_hash = PAIR_INIT_CODE_HASHES.get(factory_address)
+    if init_code_hash is None:
+        return None
+    token0, token1 = sorted([token_a, token_b], key=lambda address: address.lower())
+    salt = Web3.solidityKeccak(["address", "address"], [token0, token1])
+    return Web3.toChecksumAddress(
+        Web3.keccak(
+            b"\xff"
+            + bytes.fromhex(factory_address[2:])
+            + salt
+            + bytes.fromhex(init_code_hash[2:])
+        )[12:]
+    )
+
+
+class SwapDecoder:
+    """decodes the transactions that swap on tracked pairs, ignores everything else"""
+
+    def __init__(self, pairs: Iterable[UniswappyV2EthPair]):
+        self.pairs_by_address = {pair.market_address.lower(): pair for pair in pairs}
+        self.routers = {
+            router.lower(): factory for router, factory in ROUTER_FACTORIES.items()
+        }
+
+    def decode(self, transaction: Mapping) -> Optional[PendingSwap]:
+        to = (transaction.get("to") or "").lower()
+        data = transaction.get("input") or "0x"
+        try:
+            if to in self.routers:
+                return self._router_swap(transaction, self.routers[to], data)
+            pair = self.pairs_by_address.get(to)
+            if pair is not None:
+                return self._pair_swap(transaction, pair, data)
+        except (ValueError, DecodingError):
+            # not a function of the ABI, or malformed arguments
+            pass
+        return None
+
+    def _router_swap(
+        self, transaction: Mapping, factory_address: str, data
+    ) -> Optional[PendingSwap]:
+        function, arguments = _router_interface.decode_function_input(data)
+        exact_input = _EXACT_INPUT.get(function.fn_name)
+        if exact_input is None:
+            return None
+        path = tuple(arguments["path"])
+        pairs = []
+        for token_in, token_out in zip(path, path[1:]):
+            address = pair_address(factory_address, token_in, token_out)
+            pair = self.pairs_by_address.get((address or "").lower())
+            if pair is None:
+                return None
+            pairs.append(pair)
+        if not pairs:
+            return None
+
+        value = transaction.get("value") or 0
+        if exact_input:
+            amount = arguments.get("amountIn", value)
+            limit = arguments["amountOutMin"]
+        else:
+            amount = arguments["amountOut"]
+            limit = arguments.get("amountInMax", value)
+        return PendingSwap(
+            _hash(transaction),
+            path,
+            tuple(pairs),
+            amount,
+            exact_input,
+            limit,
+            transaction,
+        )
+
+    def _pair_swap(
+        self, transaction: Mapping, pair: UniswappyV2EthPair, data
+    ) -> Optional[PendingSwap]:
+        function, arguments = _pair_interface.decode_function_input(data)
+        if function.fn_name != "swap":
+            return None
+        amount0_out, amount1_out = arguments["amount0Out"], arguments["amount1Out"]
+        if (amount0_out > 0) == (amount1_out > 0):
+            return None
+        # the input was sent to the pair beforehand, at least what the router would
+        if amount0_out > 0:
+            path, amount = (pair.tokens[1], pair.tokens[0]), amount0_out
+        else:
+            path, amount = (pair.tokens[0], pair.tokens[1]), amount1_out
+        return PendingSwap(
+            _hash(transaction), path, (pair,), amount, False, UNLIMITED, transaction
+        )
+
+
+def predict_reserves(
+    snapshot: ReserveSnapshot, swaps: Iterable[PendingSwap]
+) -> tuple[ReserveSnapshot, list[PendingSwap]]:
+    """the next block's reserves if swaps land in order, and the swaps that applied
+
+    Only the pairs a swap changes are copied, the rest are read from snapshot.
+    """
+    changed: dict[UniswappyV2EthPair, dict[str, float]] = {}
+    balances = ChainMap(changed, snapshot.balances)
+    applied = []
+    for swap in swaps:
+        amounts = _amounts(swap, balances)
+        if amounts is None:
+            continue
+        for pair, token_in, token_out, amount_in, amount_out in zip(
+            swap.pairs, swap.path, swap.path[1:], amounts, amounts[1:]
+        ):
+            pair_balances = dict(_pair_balances(pair, balances))
+            pair_balances[token_in] += amount_in
+            pair_balances[token_out] -= amount_out
+            changed[pair] = pair_balances
+        applied.append(swap)
+    return (
+        ReserveSnapshot(snapshot.block_number + 1, MappingProxyType(balances)),
+        applied,
+    )
+
+
+def touched_tokens(swaps: Iterable[PendingSwap]) -> set[str]:
+    """the non WETH tokens of every pair the swaps go through"""
+    return {
+        token
+        for swap in swaps
+        for pair in swap.pairs
+        for token in pair.tokens
+        if token != WETH_ADDRESS
+    }
+
+
+def _amounts(swap: PendingSwap, balances: Mapping) -> Optional[list[int]]:
+    """UniswapV2Library.getAmountsOut or getAmountsIn, None if the swap reverts"""
+    hops = list(zip(swap.pairs, swap.path, swap.path[1:]))
+    if swap.exact_input:
+        amounts = [swap.amount]
+        for pair, token_in, token_out in hops:
+            reserves = _pair_balances(pair, balances)
+            amounts.append(
+                pair.get_amount_out_exact(
+                    int(reserves[token_in]), int(reserves[token_out]), amounts[-1]
+                )
+            )
+        if amounts[-1] <= 0 or amounts[-1] < swap.limit:
+            return None
+        return amounts
+
+    amounts = [swap.amount]
+    for pair, token_in, token_out in reversed(hops):
+        reserves = _pair_balances(pair, balances)
+        amount_in = pair.get_amount_in_exact(
+            int(reserves[token_in]), int(reserves[token_out]), amounts[0]
+        )
+        if amount_in is None:
+            return None
+        amounts.insert(0, amount_in)
+    if amounts[0] > swap.limit:
+        return None
+    return amounts
+
+
+def _pair_balances(pair: UniswappyV2EthPair, balances: Mapping) -> dict[str, float]:
+    pair_balances = balances.get(pair)
+    return pair._token_balances if pair_balances is None else pair_balances
+
+
+def _hash(transaction: Mapping) -> str:
+    transaction_hash = transaction["hash"]
+    if isinstance(transaction_hash, bytes):
+        transaction_hash = transaction_hash.hex()
+    return transaction_hash.lower()
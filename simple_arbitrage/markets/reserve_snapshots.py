@@ -0,0 +1,67 @@
+import threading
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional
+
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+
+_pinned = threading.local()
+
+
+@dataclass(frozen=True)
+class ReserveSnapshot:
+    """reserves of every tracked pair as of one block, never modified once published"""
+
+    block_number: int
+    balances: Mapping[EthMarket, dict[str, float]]
+
+
+def pinned_snapshot() -> Optional[ReserveSnapshot]:
+    """the snapshot this thread reads reserves from, None outside of pinned()"""
+    return getattr(_pinned, "snapshot", None)
+
+
+@contextmanager
+def pinned(snapshot: ReserveSnapshot) -> Iterator[ReserveSnapshot]:
+    """read every pair's reserves from snapshot on this thread until the block exits"""
+    previous = pinned_snapshot()
+    _pinned.snapshot = snapshot
+    try:
+        yield snapshot
+    finally:
+        _pinned.snapshot = previous
+
+
+class DoubleBufferedReserves:
+    """reserve table for concurrent readers and one writer
+
+    publish() fills a back buffer with the new block's reserves and swaps it in with
+    a single reference assignment. Readers pin the front snapshot for the whole
+    block, so they see one consistent block while the next one loads, without
+    taking a lock. Each pair's own balances are updated as well, for readers that
+    do not pin a snapshot.
+    """
+
+    def __init__(self, pairs: Iterable[EthMarket]):
+        self.pairs = list(pairs)
+        self._front = ReserveSnapshot(0, MappingProxyType({}))
+
+    @property
+    def current(self) -> ReserveSnapshot:
+        return self._front
+
+    def publish(
+        self, block_number: int, reserves: list[list[float]]
+    ) -> ReserveSnapshot:
+        back: dict[EthMarket, dict[str, float]] = {}
+        for pair, reserve in zip(self.pairs, reserves):
+            back[pair] = dict(zip(pair.tokens, (reserve[0], reserve[1])))
+
+        snapshot = ReserveSnapshot(block_number, MappingProxyType(back))
+        self._front = snapshot
+
+        for pair, balances in back.items():
+            pair._token_balances = balances
+        return snapshot
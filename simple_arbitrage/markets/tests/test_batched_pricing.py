@@ -0,0 +1,101 @@
+import unittest
+
+from simple_arbitrage.arbitrage.arbitrage import TEST_VOLUMES, profit_curve
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.EthMarket import (
+    EthMarket,
+    get_tokens_in_many,
+    get_tokens_out_many,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+class ScalarOnlyPair(UniswappyV2EthPair):
+    """a market type that only implements the scalar methods"""
+
+    get_tokens_out_batch = EthMarket.get_tokens_out_batch
+    get_tokens_in_batch = EthMarket.get_tokens_in_batch
+    get_tokens_out_for_markets = EthMarket.get_tokens_out_for_markets
+    get_tokens_in_for_markets = EthMarket.get_tokens_in_for_markets
+
+
+def _pair(index: int, balances: list[int], pair_type=UniswappyV2EthPair):
+    pair = pair_type(f"0x{index:040x}", [TOKEN_ADDRESS, WETH_ADDRESS], "TEST")
+    pair.set_reserves_via_ordered_balances(balances)
+    return pair
+
+
+class TestBatchedPricing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pairs = [
+            _pair(1, [ETHER * 2000, ETHER]),
+            _pair(2, [ETHER * 1900, ETHER * 3]),
+            _pair(3, [ETHER * 2100, ETHER * 2], ScalarOnlyPair),
+        ]
+
+    def test_batch_matches_scalar(self):
+        for pair in self.pairs:
+            self.assertEqual(
+                pair.get_tokens_out_batch(WETH_ADDRESS, TOKEN_ADDRESS, TEST_VOLUMES),
+                [
+                    pair.get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, volume)
+                    for volume in TEST_VOLUMES
+                ],
+            )
+            self.assertEqual(
+                pair.get_tokens_in_batch(TOKEN_ADDRESS, WETH_ADDRESS, TEST_VOLUMES[:5]),
+                [
+                    pair.get_tokens_in(TOKEN_ADDRESS, WETH_ADDRESS, volume)
+                    for volume in TEST_VOLUMES[:5]
+                ],
+            )
+
+    def test_many_markets_keep_their_order(self):
+        amounts_out = get_tokens_out_many(
+            self.pairs, WETH_ADDRESS, TOKEN_ADDRESS, TEST_VOLUMES
+        )
+        amounts_in = get_tokens_in_many(
+            self.pairs, TOKEN_ADDRESS, WETH_ADDRESS, [ETHER / 100]
+        )
+
+        for pair, pair_amounts_out, pair_amounts_in in zip(
+            self.pairs, amounts_out, amounts_in
+        ):
+            self.assertEqual(
+                pair_amounts_out,
+                pair.get_tokens_out_batch(WETH_ADDRESS, TOKEN_ADDRESS, TEST_VOLUMES),
+            )
+            self.assertEqual(
+                pair_amounts_in,
+                [pair.get_tokens_in(TOKEN_ADDRESS, WETH_ADDRESS, ETHER / 100)],
+            )
+
+    def test_many_markets_read_pinned_snapshot(self):
+        reserves = DoubleBufferedReserves(self.pairs)
+        snapshot = reserves.publish(1, [[ETHER * 1000, ETHER]] * len(self.pairs))
+        # the next block lands while this one is still being priced
+        reserves.publish(2, [[ETHER * 3000, ETHER]] * len(self.pairs))
+
+        with pinned(snapshot):
+            amounts_out = get_tokens_out_many(
+                self.pairs, WETH_ADDRESS, TOKEN_ADDRESS, [ETHER]
+            )
+            expected = self.pairs[0].get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, ETHER)
+
+        self.assertEqual(amounts_out, [[expected]] * len(self.pairs))
+        self.assertNotEqual(
+            expected, self.pairs[0].get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, ETHER)
+        )
+
+    def test_profit_curve(self):
+        buy_from_market, sell_to_market = self.pairs[0], self.pairs[1]
+
+        profits = profit_curve(buy_from_market, sell_to_market, TOKEN_ADDRESS)
+
+        self.assertEqual(len(profits), len(TEST_VOLUMES))
+        self.assertGreater(profits[0], 0)
+        self.assertLess(profits[-1], 0)
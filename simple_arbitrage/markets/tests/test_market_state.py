@@ -0,0 +1,179 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from web3 import Web3
+
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.universe import (
+    SyntheticPair,
+    SyntheticUniverse,
+    synthetic_address,
+)
+from simple_arbitrage.markets.market_loaders import uniswappy_loader
+from simple_arbitrage.markets.market_loaders.market_state import (
+    MarketStateWriter,
+    read_market_state,
+    resume_market_state,
+    write_market_state,
+)
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    fetch_reserves,
+    load_market_state,
+)
+from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES, WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+
+def _summary(state) -> tuple:
+    """what a state tracks, independent of pair order"""
+    return (
+        {
+            (
+                pair.market_address.lower(),
+                tuple(pair.get_balance(token) for token in pair.tokens),
+            )
+            for pair in state.markets.all_market_pairs
+        },
+        {
+            token.lower(): {pair.market_address.lower() for pair in pairs}
+            for token, pairs in state.markets.markets_by_token.items()
+        },
+        {pair.market_address.lower() for pair in state.ungrouped_pairs},
+    )
+
+
+class TestMarketState(unittest.TestCase):
+    def setUp(self) -> None:
+        self.universe = SyntheticUniverse.generate(20, markets_per_token=2)
+        self.node = FakeNode(self.universe).start()
+        self.provider = Web3.HTTPProvider(self.node.url)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.json")
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    def _add_pair(self, token_index: int, market_index: int, weth_reserve: int):
+        token_address = synthetic_address("token", token_index)
+        token0, token1 = sorted(
+            [token_address, WETH_ADDRESS], key=lambda address: address.lower()
+        )
+        reserves = (weth_reserve, weth_reserve * 100)
+        pair = SyntheticPair(
+            FACTORY_ADDRESSES[market_index % len(FACTORY_ADDRESSES)],
+            synthetic_address("pair", token_index, market_index),
+            token0,
+            token1,
+            *(reserves if token0 == WETH_ADDRESS else reserves[::-1]),
+        )
+        self.universe.pairs.append(pair)
+        self.universe.pairs_by_address[pair.address.lower()] = pair
+
+    def test_round_trip(self):
+        self._add_pair(100, 0, 5 * ETHER)
+        state = load_market_state(self.provider, FACTORY_ADDRESSES)
+        reserves = fetch_reserves(self.provider, state.markets.all_market_pairs)
+        write_market_state(self.path, state, reserves)
+
+        restored = read_market_state(self.path)
+
+        self.assertEqual(restored.block_number, state.block_number)
+        self.assertEqual(restored.scanned_pairs, state.scanned_pairs)
+        self.assertEqual(_summary(restored), _summary(state))
+        self.assertEqual(len(restored.ungrouped_pairs), 1)
+
+    def test_resume_catches_up_to_a_fresh_load(self):
+        self._add_pair(100, 0, 5 * ETHER)
+        state = load_market_state(self.provider, FACTORY_ADDRESSES)
+        write_market_state(
+            self.path,
+            state,
+            fetch_reserves(self.provider, state.markets.all_market_pairs),
+        )
+
+        for _ in range(3):
+            self.node.mine(changed_fraction=0.5)
+        # a second market for the lone token, one for a tracked token, a new token
+        self._add_pair(100, 1, 5 * ETHER)
+        self._add_pair(0, 2, ETHER // 2)
+        self._add_pair(101, 0, 5 * ETHER)
+        block_number = self.node.mine(changed_fraction=0.5)
+
+        resumed = resume_market_state(self.provider, FACTORY_ADDRESSES, self.path)
+
+        self.assertEqual(resumed.block_number, block_number)
+        self.assertEqual(
+            _summary(resumed),
+            _summary(load_market_state(self.provider, FACTORY_ADDRESSES)),
+        )
+        self.assertEqual(
+            sum(resumed.scanned_pairs.values()) - sum(state.scanned_pairs.values()), 3
+        )
+        tracked, markets_by_token, _ = _summary(resumed)
+        lone_pair = synthetic_address("pair", 0, 2).lower()
+        self.assertIn(lone_pair, {address for address, _ in tracked})
+        # below the WETH minimum, tracked but not evaluated
+        self.assertNotIn(
+            lone_pair, markets_by_token[synthetic_address("token", 0).lower()]
+        )
+
+    # 6 pairs per factory, fewer than the universe has
+    @mock.patch.object(uniswappy_loader, "BATCH_COUNT_LIMIT", 2)
+    @mock.patch.object(uniswappy_loader, "UNISWAP_BATCH_SIZE", 3)
+    def test_resume_stays_within_the_batch_count_limit(self):
+        state = load_market_state(self.provider, FACTORY_ADDRESSES)
+        write_market_state(
+            self.path,
+            state,
+            fetch_reserves(self.provider, state.markets.all_market_pairs),
+        )
+        self._add_pair(100, 0, 5 * ETHER)
+        self._add_pair(100, 1, 5 * ETHER)
+
+        for _ in range(2):
+            resumed = resume_market_state(self.provider, FACTORY_ADDRESSES, self.path)
+            write_market_state(
+                self.path,
+                resumed,
+                fetch_reserves(self.provider, resumed.markets.all_market_pairs),
+            )
+
+        self.assertEqual(resumed.scanned_pairs, state.scanned_pairs)
+        self.assertEqual(max(resumed.scanned_pairs.values()), 6)
+        self.assertEqual(
+            _summary(resumed),
+            _summary(load_market_state(self.provider, FACTORY_ADDRESSES)),
+        )
+
+    def test_missing_or_unreadable_state_loads_afresh(self):
+        fresh = _summary(load_market_state(self.provider, FACTORY_ADDRESSES))
+
+        self.assertEqual(
+            _summary(resume_market_state(self.provider, FACTORY_ADDRESSES, self.path)),
+            fresh,
+        )
+        with open(self.path, "w") as f:
+            f.write('{"version": 0}')
+        with self.assertLogs(
+            "simple_arbitrage.markets.market_loaders.market_state", "WARNING"
+        ):
+            resumed = resume_market_state(self.provider, FACTORY_ADDRESSES, self.path)
+        self.assertEqual(_summary(resumed), fresh)
+
+    def test_writer_snapshots_every_few_blocks(self):
+        state = load_market_state(self.provider, FACTORY_ADDRESSES)
+        reserves = fetch_reserves(self.provider, state.markets.all_market_pairs)
+        writer = MarketStateWriter(self.path, state, every_blocks=10)
+
+        self.assertTrue(writer.due(5))
+        writer.write(5, reserves)
+        writer.close()
+        self.assertFalse(writer.due(14))
+        self.assertTrue(writer.due(15))
+
+        restored = read_market_state(self.path)
+        self.assertEqual(restored.block_number, 5)
+        self.assertEqual(_summary(restored), _summary(state))
@@ -0,0 +1,120 @@
+import unittest
+
+from web3 import Web3
+
+from simple_arbitrage.markets.pending_swaps import (
+    SwapDecoder,
+    pair_address,
+    predict_reserves,
+)
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.abi import UNISWAP_ROUTER_ABI
+from simple_arbitrage.utils.addresses import (
+    UNISWAP_FACTORY_ADDRESS,
+    UNISWAP_ROUTER_ADDRESS,
+    WETH_ADDRESS,
+)
+from simple_arbitrage.utils.util import ETHER
+
+USDC_ADDRESS = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+DAI_ADDRESS = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
+RECIPIENT = "0x" + "11" * 20
+
+router = Web3().eth.contract(abi=UNISWAP_ROUTER_ABI)
+
+
+def _get_amount_in(reserve_in: int, reserve_out: int, amount_out: int) -> int:
+    return reserve_in * amount_out * 1000 // ((reserve_out - amount_out) * 997) + 1
+
+
+class TestPendingSwaps(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pairs = [
+            UniswappyV2EthPair(
+                pair_address(UNISWAP_FACTORY_ADDRESS, token, WETH_ADDRESS),
+                sorted([token, WETH_ADDRESS], key=str.lower),
+                "",
+            )
+            for token in (DAI_ADDRESS, USDC_ADDRESS)
+        ]
+        self.dai_pair, self.usdc_pair = self.pairs
+        # 2000 DAI and 2000 USDC per WETH, both tokens sort before WETH
+        self.snapshot = DoubleBufferedReserves(self.pairs).publish(
+            1, [[2000 * 100 * ETHER, 100 * ETHER], [2000 * 100 * 10**6, 100 * ETHER]]
+        )
+        self.decoder = SwapDecoder(self.pairs)
+
+    def _router_transaction(self, fn_name: str, args: list, value: int = 0) -> dict:
+        return {
+            "hash": "0x" + "ab" * 32,
+            "to": UNISWAP_ROUTER_ADDRESS,
+            "input": router.encodeABI(fn_name=fn_name, args=args),
+            "value": value,
+        }
+
+    def test_pair_address_matches_mainnet(self):
+        self.assertEqual(
+            pair_address(UNISWAP_FACTORY_ADDRESS, WETH_ADDRESS, USDC_ADDRESS),
+            "0xB4e16d0168e52d35CaCD2c6185b44281Ec28C9Dc",
+        )
+
+    def test_exact_output_through_two_pairs(self):
+        path = [DAI_ADDRESS, WETH_ADDRESS, USDC_ADDRESS]
+        amount_out = 1000 * 10**6
+        transaction = self._router_transaction(
+            "swapTokensForExactTokens",
+            [amount_out, 2000 * ETHER, path, RECIPIENT, 0],
+        )
+
+        swap = self.decoder.decode(transaction)
+        predicted, applied = predict_reserves(self.snapshot, [swap])
+
+        self.assertEqual(swap.pairs, (self.dai_pair, self.usdc_pair))
+        self.assertEqual(applied, [swap])
+        weth_in = _get_amount_in(100 * ETHER, 2000 * 100 * 10**6, amount_out)
+        dai_in = _get_amount_in(2000 * 100 * ETHER, 100 * ETHER, weth_in)
+        self.assertEqual(
+            predicted.balances[self.dai_pair],
+            {
+                DAI_ADDRESS: 2000 * 100 * ETHER + dai_in,
+                WETH_ADDRESS: 100 * ETHER - weth_in,
+            },
+        )
+        self.assertEqual(
+            predicted.balances[self.usdc_pair],
+            {
+                WETH_ADDRESS: 100 * ETHER + weth_in,
+                USDC_ADDRESS: 2000 * 100 * 10**6 - amount_out,
+            },
+        )
+        self.assertEqual(predicted.block_number, 2)
+
+    def test_swap_past_its_slippage_limit_is_not_applied(self):
+        transaction = self._router_transaction(
+            "swapExactETHForTokens",
+            [2000 * 10**6, [WETH_ADDRESS, USDC_ADDRESS], RECIPIENT, 0],
+            value=ETHER,
+        )
+
+        predicted, applied = predict_reserves(
+            self.snapshot, [self.decoder.decode(transaction)]
+        )
+
+        self.assertEqual(applied, [])
+        self.assertEqual(
+            predicted.balances[self.usdc_pair], self.snapshot.balances[self.usdc_pair]
+        )
+
+    def test_unrelated_transactions_ignored(self):
+        untracked = self._router_transaction(
+            "swapExactTokensForTokens",
+            [ETHER, 0, [DAI_ADDRESS, USDC_ADDRESS], RECIPIENT, 0],
+        )
+        liquidity = self._router_transaction(
+            "addLiquidityETH", [DAI_ADDRESS, ETHER, 0, 0, RECIPIENT, 0], value=ETHER
+        )
+        transfer = {"hash": "0x01", "to": RECIPIENT, "input": "0x", "value": ETHER}
+
+        for transaction in (untracked, liquidity, transfer):
+            self.assertIsNone(self.decoder.decode(transaction))
@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from simple_arbitrage.markets.reserve_snapshots import (
+    DoubleBufferedReserves,
+    pinned,
+    pinned_snapshot,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+class TestReserveSnapshots(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pairs = [
+            UniswappyV2EthPair(
+                "0x0000000000000000000000000000000000000001",
+                [TOKEN_ADDRESS, WETH_ADDRESS],
+                "TEST_1",
+            ),
+            UniswappyV2EthPair(
+                "0x0000000000000000000000000000000000000002",
+                [TOKEN_ADDRESS, WETH_ADDRESS],
+                "TEST_2",
+            ),
+        ]
+        self.reserves = DoubleBufferedReserves(self.pairs)
+
+    def test_publish_tags_block_and_updates_pairs(self):
+        snapshot = self.reserves.publish(10, [[ETHER, 2 * ETHER], [3, 4]])
+
+        self.assertIs(self.reserves.current, snapshot)
+        self.assertEqual(snapshot.block_number, 10)
+        self.assertEqual(self.pairs[0].get_balance(WETH_ADDRESS), 2 * ETHER)
+        self.assertEqual(self.pairs[1].get_balance(TOKEN_ADDRESS), 3)
+
+    def test_pinned_reader_keeps_its_block(self):
+        first = self.reserves.publish(10, [[ETHER, ETHER], [ETHER, ETHER]])
+        read_during_next_block = []
+
+        with pinned(first):
+            writer = threading.Thread(
+                target=self.reserves.publish,
+                args=(11, [[2 * ETHER, ETHER], [2 * ETHER, ETHER]]),
+            )
+            writer.start()
+            writer.join()
+            read_during_next_block = [
+                pair.get_balance(TOKEN_ADDRESS) for pair in self.pairs
+            ]
+
+        self.assertEqual(read_during_next_block, [ETHER, ETHER])
+        self.assertEqual(self.reserves.current.block_number, 11)
+        self.assertEqual(self.pairs[0].get_balance(TOKEN_ADDRESS), 2 * ETHER)
+        self.assertIsNone(pinned_snapshot())
+
+    def test_pin_is_per_thread(self):
+        first = self.reserves.publish(10, [[ETHER, ETHER], [ETHER, ETHER]])
+        self.reserves.publish(11, [[2 * ETHER, ETHER], [2 * ETHER, ETHER]])
+        other_thread_reads = []
+
+        with pinned(first):
+            reader = threading.Thread(
+                target=lambda: other_thread_reads.append(
+                    self.pairs[0].get_balance(TOKEN_ADDRESS)
+                )
+            )
+            reader.start()
+            reader.join()
+
+        self.assertEqual(other_thread_reads, [2 * ETHER])
@@ -0,0 +1,318 @@
+import unittest
+
+from eth_abi import encode_abi
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    encode_bundle_calls,
+    evaluate_markets,
+    evaluate_pool_crossings,
+    simulate_crossed_market,
+)
+from simple_arbitrage.markets.market_loaders.uniswappy_v3_loader import PoolLogFollower
+from simple_arbitrage.markets.types.tick_math import (
+    MAX_SQRT_RATIO,
+    MAX_TICK,
+    MIN_SQRT_RATIO,
+    MIN_TICK,
+    Q96,
+    TickBitmap,
+    get_sqrt_ratio_at_tick,
+    get_tick_at_sqrt_ratio,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.markets.types.uniswappy_v3_pool import (
+    BURN_TOPIC,
+    MINT_TOPIC,
+    SWAP_TOPIC,
+    UniswappyV3Pool,
+)
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+POOL_ADDRESS = "0x0000000000000000000000000000000000000003"
+EXECUTOR_ADDRESS = "0x0000000000000000000000000000000000000099"
+FEE = 3000
+TICK_SPACING = 60
+FULL_RANGE = (-887220, 887220)
+
+
+class WordByWordPool(UniswappyV3Pool):
+    """steps one bitmap word at a time everywhere, exactly as the pool contract does"""
+
+    def _next_tick(self, tick, zero_for_one, liquidity):
+        next_tick, initialized = self.tick_bitmap.next_initialized_tick_within_one_word(
+            tick, zero_for_one
+        )
+        return max(MIN_TICK, min(MAX_TICK, next_tick)), initialized
+
+
+def _pool(positions, tick=0, pool_type=UniswappyV3Pool) -> UniswappyV3Pool:
+    pool = pool_type(POOL_ADDRESS, [TOKEN_ADDRESS, WETH_ADDRESS], "TEST", FEE, 60)
+    pool.set_state(get_sqrt_ratio_at_tick(tick), tick, 0)
+    for tick_lower, tick_upper, liquidity in positions:
+        pool.update_position(tick_lower, tick_upper, liquidity)
+    return pool
+
+
+def _topic(value_type: str, value) -> bytes:
+    return encode_abi([value_type], [value])
+
+
+class TestTickMath(unittest.TestCase):
+    def test_sqrt_ratio_bounds(self):
+        self.assertEqual(get_sqrt_ratio_at_tick(0), Q96)
+        self.assertEqual(get_sqrt_ratio_at_tick(MIN_TICK), MIN_SQRT_RATIO)
+        self.assertEqual(get_sqrt_ratio_at_tick(MAX_TICK), MAX_SQRT_RATIO)
+        with self.assertRaises(ValueError):
+            get_sqrt_ratio_at_tick(MAX_TICK + 1)
+
+    def test_tick_at_sqrt_ratio_inverts(self):
+        for tick in (MIN_TICK, -200000, -1, 0, 1, 60, 123457, MAX_TICK - 1):
+            sqrt_price_x96 = get_sqrt_ratio_at_tick(tick)
+            self.assertEqual(get_tick_at_sqrt_ratio(sqrt_price_x96), tick)
+            self.assertEqual(get_tick_at_sqrt_ratio(sqrt_price_x96 + 1), tick)
+            if tick > MIN_TICK:
+                self.assertEqual(get_tick_at_sqrt_ratio(sqrt_price_x96 - 1), tick - 1)
+
+
+class TestTickBitmap(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bitmap = TickBitmap(TICK_SPACING)
+        for tick in (-15420, -60, 120, 30000):
+            self.bitmap.flip_tick(tick)
+
+    def test_next_tick_within_one_word(self):
+        self.assertEqual(
+            self.bitmap.next_initialized_tick_within_one_word(-1, True), (-60, True)
+        )
+        # -60 is in the word below tick 0's
+        self.assertEqual(
+            self.bitmap.next_initialized_tick_within_one_word(0, True), (0, False)
+        )
+        self.assertEqual(
+            self.bitmap.next_initialized_tick_within_one_word(0, False), (120, True)
+        )
+        # 120 is not greater than itself, the word ends at compressed tick 255
+        self.assertEqual(
+            self.bitmap.next_initialized_tick_within_one_word(120, False),
+            (255 * TICK_SPACING, False),
+        )
+        self.assertEqual(
+            self.bitmap.next_initialized_tick_within_one_word(-61, True),
+            (-256 * TICK_SPACING, False),
+        )
+
+    def test_next_tick_across_words(self):
+        self.assertEqual(self.bitmap.next_initialized_tick(120, False), 30000)
+        self.assertEqual(self.bitmap.next_initialized_tick(-61, True), -15420)
+        self.assertIsNone(self.bitmap.next_initialized_tick(-15421, True))
+        self.assertIsNone(self.bitmap.next_initialized_tick(30000, False))
+
+    def test_flip_back_empties_the_word(self):
+        self.bitmap.flip_tick(30000)
+
+        self.assertFalse(self.bitmap.is_initialized(30000))
+        self.assertIsNone(self.bitmap.next_initialized_tick(120, False))
+        with self.assertRaises(ValueError):
+            self.bitmap.flip_tick(61)
+
+
+class TestUniswappyV3Pool(unittest.TestCase):
+    def test_swap_within_one_range_matches_closed_form(self):
+        liquidity = 100 * ETHER
+        pool = _pool([(*FULL_RANGE, liquidity)])
+        amount_in = ETHER
+
+        amount_in_less_fee = amount_in * (1000000 - FEE) // 1000000
+        numerator = liquidity * Q96
+        next_sqrt_price_x96 = -(
+            -numerator * Q96 // (numerator + amount_in_less_fee * Q96)
+        )
+        expected_out = liquidity * (Q96 - next_sqrt_price_x96) // Q96
+
+        self.assertEqual(
+            pool.get_tokens_out_exact(TOKEN_ADDRESS, WETH_ADDRESS, amount_in),
+            expected_out,
+        )
+        result = pool.simulate_swap(True, amount_in)
+        self.assertEqual(result.amount0, amount_in)
+        self.assertEqual(result.sqrt_price_x96, next_sqrt_price_x96)
+        # the pool itself is untouched
+        self.assertEqual(pool.sqrt_price_x96, Q96)
+
+    def test_exact_output_round_trips(self):
+        pool = _pool([(*FULL_RANGE, 100 * ETHER)])
+        amount_out = pool.get_tokens_out_exact(WETH_ADDRESS, TOKEN_ADDRESS, ETHER)
+
+        amount_in = pool.get_tokens_in(WETH_ADDRESS, TOKEN_ADDRESS, amount_out)
+
+        self.assertLessEqual(amount_in, ETHER)
+        self.assertGreater(amount_in, ETHER * 0.999999)
+        self.assertEqual(
+            pool.get_tokens_in(WETH_ADDRESS, TOKEN_ADDRESS, 1000 * ETHER),
+            float("inf"),
+        )
+
+    def test_crossing_a_tick_drops_its_liquidity(self):
+        full_range_liquidity, narrow_liquidity = 10 * ETHER, 90 * ETHER
+        pool = _pool(
+            [(*FULL_RANGE, full_range_liquidity), (-600, 600, narrow_liquidity)]
+        )
+        self.assertEqual(pool.liquidity, full_range_liquidity + narrow_liquidity)
+
+        result = pool.simulate_swap(True, 10 * ETHER)
+
+        self.assertLess(result.tick, -600)
+        self.assertEqual(result.liquidity, full_range_liquidity)
+        wide_only = _pool([(*FULL_RANGE, full_range_liquidity)])
+        self.assertGreater(
+            -result.amount1, -wide_only.simulate_swap(True, 10 * ETHER).amount1
+        )
+
+    def test_skipping_empty_words_is_exact(self):
+        positions = [(6000, 12000, 50 * ETHER), (-30000, -24000, 70 * ETHER)]
+        for zero_for_one in (True, False):
+            fast = _pool(positions)
+            reference = _pool(positions, pool_type=WordByWordPool)
+            for amount in (ETHER // 7, 3 * ETHER, -ETHER // 3):
+                self.assertEqual(
+                    fast.simulate_swap(zero_for_one, amount),
+                    reference.simulate_swap(zero_for_one, amount),
+                )
+
+    def test_marginal_matches_finite_difference(self):
+        pool = _pool([(*FULL_RANGE, 100 * ETHER), (-600, 600, 300 * ETHER)])
+        volume, step = ETHER, ETHER // 10**4
+        finite_difference = (
+            pool.get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, volume + step)
+            - pool.get_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, volume - step)
+        ) / (2 * step)
+
+        self.assertAlmostEqual(
+            pool.get_marginal_tokens_out(WETH_ADDRESS, TOKEN_ADDRESS, volume),
+            finite_difference,
+            places=5,
+        )
+
+    def test_logs_update_state(self):
+        pool = _pool([])
+        owner = _topic("address", "0x" + "00" * 19 + "01")
+        mint = {
+            "topics": [
+                MINT_TOPIC,
+                owner,
+                _topic("int24", -600),
+                _topic("int24", 600),
+            ],
+            "data": encode_abi(
+                ["address", "uint128", "uint256", "uint256"],
+                ["0x" + "00" * 19 + "01", 5 * ETHER, 0, 0],
+            ),
+        }
+        pool.apply_log(mint)
+        self.assertEqual(pool.liquidity, 5 * ETHER)
+        self.assertEqual(pool.liquidity_net, {-600: 5 * ETHER, 600: -5 * ETHER})
+        self.assertTrue(pool.tick_bitmap.is_initialized(-600))
+
+        sqrt_price_x96 = get_sqrt_ratio_at_tick(-900)
+        pool.apply_log(
+            {
+                "topics": [SWAP_TOPIC, owner, owner],
+                "data": encode_abi(
+                    ["int256", "int256", "uint160", "uint128", "int24"],
+                    [1, -1, sqrt_price_x96, 0, -900],
+                ),
+            }
+        )
+        self.assertEqual((pool.sqrt_price_x96, pool.tick), (sqrt_price_x96, -900))
+
+        pool.apply_log(
+            {
+                "topics": [
+                    BURN_TOPIC,
+                    owner,
+                    _topic("int24", -600),
+                    _topic("int24", 600),
+                ],
+                "data": encode_abi(
+                    ["uint128", "uint256", "uint256"], [5 * ETHER, 0, 0]
+                ),
+            }
+        )
+        self.assertEqual(pool.liquidity_gross, {})
+        self.assertFalse(pool.tick_bitmap.is_initialized(-600))
+        self.assertEqual(pool.tick_bitmap.words, {})
+
+    def test_crossings_reported_apart_from_executable_ones(self):
+        # 1 WETH per token in the pool, 2 on one pair and 1.5 on the other
+        pool = _pool([(*FULL_RANGE, 100 * ETHER)])
+        pair = UniswappyV2EthPair(
+            "0x0000000000000000000000000000000000000001",
+            [TOKEN_ADDRESS, WETH_ADDRESS],
+            "TEST_1",
+        )
+        pair.set_reserves_via_ordered_balances([100 * ETHER, 200 * ETHER])
+        other_pair = UniswappyV2EthPair(
+            "0x0000000000000000000000000000000000000002",
+            [TOKEN_ADDRESS, WETH_ADDRESS],
+            "TEST_2",
+        )
+        other_pair.set_reserves_via_ordered_balances([100 * ETHER, 150 * ETHER])
+
+        markets_by_token = {TOKEN_ADDRESS: [pair, other_pair]}
+        best_crossed_markets = evaluate_markets(markets_by_token)
+        pool_crossed_markets = evaluate_pool_crossings(
+            markets_by_token, {TOKEN_ADDRESS: [pool]}
+        )
+
+        self.assertEqual(len(best_crossed_markets), 1)
+        crossed_market = best_crossed_markets[0]
+        self.assertIs(crossed_market.buy_from_market, other_pair)
+        self.assertIs(crossed_market.sell_to_market, pair)
+        # buying from the pool pays more, but the executor cannot pay the pool
+        self.assertEqual(len(pool_crossed_markets), 1)
+        through_pool = pool_crossed_markets[0]
+        self.assertIs(through_pool.buy_from_market, pool)
+        self.assertIs(through_pool.sell_to_market, pair)
+        self.assertGreater(through_pool.profit, crossed_market.profit)
+
+        intermediate_amount = pool.get_tokens_out_exact(
+            WETH_ADDRESS, TOKEN_ADDRESS, int(through_pool.volume)
+        )
+        targets, payloads = encode_bundle_calls(
+            through_pool, intermediate_amount, EXECUTOR_ADDRESS
+        )
+        result = simulate_crossed_market(
+            through_pool, targets, payloads, EXECUTOR_ADDRESS, 0
+        )
+        self.assertEqual((result.success, result.reason), (False, "receive"))
+
+    def test_follower_applies_logs_in_chain_order(self):
+        pool = _pool([(*FULL_RANGE, ETHER)])
+        owner = _topic("address", "0x" + "00" * 19 + "01")
+
+        def swap_log(block_number, log_index, tick, address=POOL_ADDRESS):
+            return {
+                "address": address,
+                "blockNumber": block_number,
+                "logIndex": log_index,
+                "topics": [SWAP_TOPIC, owner, owner],
+                "data": encode_abi(
+                    ["int256", "int256", "uint160", "uint128", "int24"],
+                    [0, 0, get_sqrt_ratio_at_tick(tick), ETHER, tick],
+                ),
+            }
+
+        follower = PoolLogFollower(None, [pool], 10)
+        applied = follower.apply_logs(
+            [
+                swap_log(12, 0, 30),
+                swap_log(11, 5, 20),
+                swap_log(12, 1, 40, "0x00000000000000000000000000000000000000ff"),
+                swap_log(11, 2, 10),
+            ]
+        )
+
+        self.assertEqual(applied, 3)
+        self.assertEqual(pool.tick, 30)
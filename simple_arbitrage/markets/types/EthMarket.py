@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import Hashable, Sequence
 from dataclasses import dataclass
 from decimal import Decimal
 from enum import Enum
+from typing import Optional
 
 
 class ProtocolType(str, Enum):
     CONSTANT_PRODUCT = "constant product"
+    CONCENTRATED_LIQUIDITY = "concentrated liquidity"
 
 
 @dataclass()
@@ -59,12 +63,82 @@ class EthMarket(ABC):
     ) -> Decimal:
         ...
 
+    @abstractmethod
+    def get_tokens_out_exact(
+        self, token_in: str, token_out: str, amount_in: int
+    ) -> int:
+        """integer amount out, rounded the same way the on-chain swap rounds"""
+        ...
+
+    def get_marginal_tokens_out(
+        self, token_in: str, token_out: str, amount_in: float
+    ) -> Optional[float]:
+        """d get_tokens_out / d amount_in at amount_in, None without a closed form
+
+        Sizing a trade uses it for exact Newton steps when both markets have one and
+        searches on get_tokens_out alone otherwise.
+        """
+        return None
+
+    def price_key(self) -> Optional[Hashable]:
+        """a value that changes whenever the market's prices may, None if unknown
+
+        Prices computed while it stays equal are reused by PriceCache.
+        """
+        return None
+
     @abstractmethod
     def get_tokens_in(
         self, token_in: str, token_out: str, amount_out: Decimal
     ) -> Decimal:
         ...
 
+    def get_tokens_out_batch(
+        self, token_in: str, token_out: str, amounts_in: Sequence[float]
+    ) -> list[float]:
+        """get_tokens_out for every amount, markets override it to price in one pass"""
+        return [
+            self.get_tokens_out(token_in, token_out, amount_in)
+            for amount_in in amounts_in
+        ]
+
+    def get_tokens_in_batch(
+        self, token_in: str, token_out: str, amounts_out: Sequence[float]
+    ) -> list[float]:
+        """get_tokens_in for every amount, markets override it to price in one pass"""
+        return [
+            self.get_tokens_in(token_in, token_out, amount_out)
+            for amount_out in amounts_out
+        ]
+
+    @classmethod
+    def get_tokens_out_for_markets(
+        cls,
+        markets: Sequence[EthMarket],
+        token_in: str,
+        token_out: str,
+        amounts_in: Sequence[float],
+    ) -> list[list[float]]:
+        """get_tokens_out_batch of many markets of this type at once"""
+        return [
+            market.get_tokens_out_batch(token_in, token_out, amounts_in)
+            for market in markets
+        ]
+
+    @classmethod
+    def get_tokens_in_for_markets(
+        cls,
+        markets: Sequence[EthMarket],
+        token_in: str,
+        token_out: str,
+        amounts_out: Sequence[float],
+    ) -> list[list[float]]:
+        """get_tokens_in_batch of many markets of this type at once"""
+        return [
+            market.get_tokens_in_batch(token_in, token_out, amounts_out)
+            for market in markets
+        ]
+
     @abstractmethod
     def sell_tokens_to_next_market(
         self, token_in: str, amount_in: Decimal, eth_market: EthMarket
@@ -84,3 +158,53 @@ class EthMarket(ABC):
         self, token_address: str, amount_in: Decimal
     ) -> list[CallDetails]:
         ...
+
+
+def get_tokens_out_many(
+    markets: Sequence[EthMarket],
+    token_in: str,
+    token_out: str,
+    amounts_in: Sequence[float],
+) -> list[list[float]]:
+    """amounts out of every market for every amount in, in the order of markets
+
+    Markets are priced with one get_tokens_out_for_markets call per market type.
+    """
+    return _for_markets_by_type(
+        markets,
+        lambda market_type, typed_markets: market_type.get_tokens_out_for_markets(
+            typed_markets, token_in, token_out, amounts_in
+        ),
+    )
+
+
+def get_tokens_in_many(
+    markets: Sequence[EthMarket],
+    token_in: str,
+    token_out: str,
+    amounts_out: Sequence[float],
+) -> list[list[float]]:
+    """amounts in to every market for every amount out, in the order of markets"""
+    return _for_markets_by_type(
+        markets,
+        lambda market_type, typed_markets: market_type.get_tokens_in_for_markets(
+            typed_markets, token_in, token_out, amounts_out
+        ),
+    )
+
+
+def _for_markets_by_type(markets: Sequence[EthMarket], price) -> list[list[float]]:
+    market_types = set(map(type, markets))
+    if len(market_types) == 1:
+        return price(market_types.pop(), markets)
+
+    indexes_by_type: dict[type, list[int]] = defaultdict(list)
+    for index, market in enumerate(markets):
+        indexes_by_type[type(market)].append(index)
+
+    results: list[list[float]] = [[] for _ in markets]
+    for market_type, indexes in indexes_by_type.items():
+        typed_results = price(market_type, [markets[index] for index in indexes])
+        for index, amounts in zip(indexes, typed_results):
+            results[index] = amounts
+    return results
@@ -0,0 +1,313 @@
+"""integer math of tick based concentrated liquidity pools, as Uniswap V3 does it
+
+Ports of TickMath, SqrtPriceMath and SwapMath that round exactly like the
+contracts, so simulated swaps match on-chain amounts to the wei, and TickBitmap,
+which indexes initialized ticks 256 to a word so the next one is found with a mask
+and a bit scan.
+"""
+import bisect
+import math
+from typing import Optional
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+
+Q96 = 1 << 96
+FEE_DENOMINATOR = 1000000
+_UINT256_MAX = (1 << 256) - 1
+
+# TickMath.getSqrtRatioAtTick multipliers, 1 / sqrt(1.0001) ** (2 ** bit) in Q128
+_TICK_RATIO_MULTIPLIERS = (
+    (0x2, 0xFFF97272373D413259A46990580E213A),
+    (0x4, 0xFFF2E50F5F656932EF12357CF3C7FDCC),
+    (0x8, 0xFFE5CACA7E10E4E61C3624EAA0941CD0),
+    (0x10, 0xFFCB9843D60F6159C9DB58835C926644),
+    (0x20, 0xFF973B41FA98C081472E6896DFB254C0),
+    (0x40, 0xFF2EA16466C96A3843EC78B326B52861),
+    (0x80, 0xFE5DEE046A99A2A811C461F1969C3053),
+    (0x100, 0xFCBE86C7900A88AEDCFFC83B479AA3A4),
+    (0x200, 0xF987A7253AC413176F2B074CF7815E54),
+    (0x400, 0xF3392B0822B70005940C7A398E4B70F3),
+    (0x800, 0xE7159475A2C29B7443B29C7FA6E889D9),
+    (0x1000, 0xD097F3BDFD2022B8845AD8F792AA5825),
+    (0x2000, 0xA9F746462D870FDF8A65DC1F90E061E5),
+    (0x4000, 0x70D869A156D2A1B890BB3DF62BAF32F7),
+    (0x8000, 0x31BE135F97D08FD981231505542FCFA6),
+    (0x10000, 0x9AA508B5B7A84E1C677DE54F3E99BC9),
+    (0x20000, 0x5D6AF8DEDB81196699C329225EE604),
+    (0x40000, 0x2216E584F5FA1EA926041BEDFE98),
+    (0x80000, 0x48A170391F7DC42444E8FA2),
+)
+
+
+def get_sqrt_ratio_at_tick(tick: int) -> int:
+    """sqrt(1.0001 ** tick) as a Q64.96"""
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"Tick {tick} out of range")
+
+    if abs_tick & 0x1:
+        ratio = 0xFFFCB933BD6FAD37AA2D162D1A594001
+    else:
+        ratio = 0x100000000000000000000000000000000
+    for bit, multiplier in _TICK_RATIO_MULTIPLIERS:
+        if abs_tick & bit:
+            ratio = (ratio * multiplier) >> 128
+    if tick > 0:
+        ratio = _UINT256_MAX // ratio
+    return (ratio >> 32) + (1 if ratio & 0xFFFFFFFF else 0)
+
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96: int) -> int:
+    """greatest tick whose sqrt ratio is at most sqrt_price_x96"""
+    if not MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO:
+        raise ValueError(f"Sqrt price {sqrt_price_x96} out of range")
+    # the float estimate is within a tick, the exact ratios settle it
+    tick = math.floor(2 * math.log(sqrt_price_x96 / Q96) / math.log(1.0001))
+    tick = max(MIN_TICK, min(MAX_TICK, tick))
+    while tick > MIN_TICK and get_sqrt_ratio_at_tick(tick) > sqrt_price_x96:
+        tick -= 1
+    while tick < MAX_TICK and get_sqrt_ratio_at_tick(tick + 1) <= sqrt_price_x96:
+        tick += 1
+    return tick
+
+
+def _mul_div_rounding_up(a: int, b: int, denominator: int) -> int:
+    return -(-(a * b) // denominator)
+
+
+def _div_rounding_up(a: int, denominator: int) -> int:
+    return -(-a // denominator)
+
+
+def _next_sqrt_price_from_amount0_rounding_up(
+    sqrt_price_x96: int, liquidity: int, amount: int, add: bool
+) -> int:
+    if amount == 0:
+        return sqrt_price_x96
+    numerator1 = liquidity << 96
+    product = amount * sqrt_price_x96
+    if add:
+        denominator = numerator1 + product
+        if product <= _UINT256_MAX and denominator <= _UINT256_MAX:
+            return _mul_div_rounding_up(numerator1, sqrt_price_x96, denominator)
+        return _div_rounding_up(numerator1, numerator1 // sqrt_price_x96 + amount)
+    if product > _UINT256_MAX or numerator1 <= product:
+        raise ValueError("Not enough liquidity for the output amount")
+    return _mul_div_rounding_up(numerator1, sqrt_price_x96, numerator1 - product)
+
+
+def _next_sqrt_price_from_amount1_rounding_down(
+    sqrt_price_x96: int, liquidity: int, amount: int, add: bool
+) -> int:
+    if add:
+        return sqrt_price_x96 + (amount << 96) // liquidity
+    quotient = _div_rounding_up(amount << 96, liquidity)
+    if sqrt_price_x96 <= quotient:
+        raise ValueError("Not enough liquidity for the output amount")
+    return sqrt_price_x96 - quotient
+
+
+def get_next_sqrt_price_from_input(
+    sqrt_price_x96: int, liquidity: int, amount_in: int, zero_for_one: bool
+) -> int:
+    if zero_for_one:
+        return _next_sqrt_price_from_amount0_rounding_up(
+            sqrt_price_x96, liquidity, amount_in, True
+        )
+    return _next_sqrt_price_from_amount1_rounding_down(
+        sqrt_price_x96, liquidity, amount_in, True
+    )
+
+
+def get_next_sqrt_price_from_output(
+    sqrt_price_x96: int, liquidity: int, amount_out: int, zero_for_one: bool
+) -> int:
+    if zero_for_one:
+        return _next_sqrt_price_from_amount1_rounding_down(
+            sqrt_price_x96, liquidity, amount_out, False
+        )
+    return _next_sqrt_price_from_amount0_rounding_up(
+        sqrt_price_x96, liquidity, amount_out, False
+    )
+
+
+def get_amount0_delta(
+    sqrt_ratio_a_x96: int, sqrt_ratio_b_x96: int, liquidity: int, round_up: bool
+) -> int:
+    if sqrt_ratio_a_x96 > sqrt_ratio_b_x96:
+        sqrt_ratio_a_x96, sqrt_ratio_b_x96 = sqrt_ratio_b_x96, sqrt_ratio_a_x96
+    numerator1 = liquidity << 96
+    numerator2 = sqrt_ratio_b_x96 - sqrt_ratio_a_x96
+    if round_up:
+        return _div_rounding_up(
+            _mul_div_rounding_up(numerator1, numerator2, sqrt_ratio_b_x96),
+            sqrt_ratio_a_x96,
+        )
+    return numerator1 * numerator2 // sqrt_ratio_b_x96 // sqrt_ratio_a_x96
+
+
+def get_amount1_delta(
+    sqrt_ratio_a_x96: int, sqrt_ratio_b_x96: int, liquidity: int, round_up: bool
+) -> int:
+    if sqrt_ratio_a_x96 > sqrt_ratio_b_x96:
+        sqrt_ratio_a_x96, sqrt_ratio_b_x96 = sqrt_ratio_b_x96, sqrt_ratio_a_x96
+    if round_up:
+        return _mul_div_rounding_up(liquidity, sqrt_ratio_b_x96 - sqrt_ratio_a_x96, Q96)
+    return liquidity * (sqrt_ratio_b_x96 - sqrt_ratio_a_x96) // Q96
+
+
+def compute_swap_step(
+    sqrt_ratio_current_x96: int,
+    sqrt_ratio_target_x96: int,
+    liquidity: int,
+    amount_remaining: int,
+    fee_pips: int,
+) -> tuple[int, int, int, int]:
+    """SwapMath.computeSwapStep: next sqrt price, amount in, amount out, fee
+
+    amount_remaining is positive for exact input and negative for exact output.
+    """
+    zero_for_one = sqrt_ratio_current_x96 >= sqrt_ratio_target_x96
+    exact_in = amount_remaining >= 0
+
+    if exact_in:
+        amount_remaining_less_fee = (
+            amount_remaining * (FEE_DENOMINATOR - fee_pips) // FEE_DENOMINATOR
+        )
+        amount_to_target, _ = _step_amounts(
+            sqrt_ratio_current_x96, sqrt_ratio_target_x96, liquidity, zero_for_one
+        )
+        if amount_remaining_less_fee >= amount_to_target:
+            sqrt_ratio_next_x96 = sqrt_ratio_target_x96
+        else:
+            sqrt_ratio_next_x96 = get_next_sqrt_price_from_input(
+                sqrt_ratio_current_x96,
+                liquidity,
+                amount_remaining_less_fee,
+                zero_for_one,
+            )
+    else:
+        _, amount_to_target = _step_amounts(
+            sqrt_ratio_current_x96, sqrt_ratio_target_x96, liquidity, zero_for_one
+        )
+        if -amount_remaining >= amount_to_target:
+            sqrt_ratio_next_x96 = sqrt_ratio_target_x96
+        else:
+            sqrt_ratio_next_x96 = get_next_sqrt_price_from_output(
+                sqrt_ratio_current_x96, liquidity, -amount_remaining, zero_for_one
+            )
+
+    # the contract reuses amount_to_target when the target is reached, to save gas;
+    # recomputing it from the same arguments gives the same amounts
+    amount_in, amount_out = _step_amounts(
+        sqrt_ratio_current_x96, sqrt_ratio_next_x96, liquidity, zero_for_one
+    )
+    if not exact_in and amount_out > -amount_remaining:
+        amount_out = -amount_remaining
+
+    if exact_in and sqrt_ratio_next_x96 != sqrt_ratio_target_x96:
+        fee_amount = amount_remaining - amount_in
+    else:
+        fee_amount = _mul_div_rounding_up(
+            amount_in, fee_pips, FEE_DENOMINATOR - fee_pips
+        )
+    return sqrt_ratio_next_x96, amount_in, amount_out, fee_amount
+
+
+def _step_amounts(
+    sqrt_ratio_current_x96: int,
+    sqrt_ratio_next_x96: int,
+    liquidity: int,
+    zero_for_one: bool,
+) -> tuple[int, int]:
+    """amount in, rounded up, and amount out, rounded down, of moving the price"""
+    if zero_for_one:
+        return get_amount0_delta(
+            sqrt_ratio_next_x96, sqrt_ratio_current_x96, liquidity, True
+        ), get_amount1_delta(
+            sqrt_ratio_next_x96, sqrt_ratio_current_x96, liquidity, False
+        )
+    return get_amount1_delta(
+        sqrt_ratio_current_x96, sqrt_ratio_next_x96, liquidity, True
+    ), get_amount0_delta(sqrt_ratio_current_x96, sqrt_ratio_next_x96, liquidity, False)
+
+
+class TickBitmap:
+    """initialized ticks, one bit per tick_spacing, 256 to a word as the pool stores them
+
+    next_initialized_tick_within_one_word() is the pool's own lookup, a mask and a
+    bit scan. The sorted positions of non-empty words also let a swap with no
+    liquidity in range jump straight to the next initialized tick, any distance away.
+    """
+
+    def __init__(self, tick_spacing: int):
+        self.tick_spacing = tick_spacing
+        self.words: dict[int, int] = {}
+        self._word_positions: list[int] = []
+
+    def flip_tick(self, tick: int):
+        if tick % self.tick_spacing:
+            raise ValueError(f"Tick {tick} is not a multiple of {self.tick_spacing}")
+        compressed = tick // self.tick_spacing
+        word_position, bit_position = compressed >> 8, compressed & 0xFF
+        word = self.words.get(word_position, 0) ^ (1 << bit_position)
+        if word:
+            if word_position not in self.words:
+                bisect.insort(self._word_positions, word_position)
+            self.words[word_position] = word
+        else:
+            del self.words[word_position]
+            self._word_positions.remove(word_position)
+
+    def is_initialized(self, tick: int) -> bool:
+        compressed = tick // self.tick_spacing
+        return bool(self.words.get(compressed >> 8, 0) >> (compressed & 0xFF) & 1)
+
+    def next_initialized_tick_within_one_word(
+        self, tick: int, lte: bool
+    ) -> tuple[int, bool]:
+        """TickBitmap.nextInitializedTickWithinOneWord"""
+        compressed = tick // self.tick_spacing
+        if lte:
+            word_position, bit_position = compressed >> 8, compressed & 0xFF
+            masked = self.words.get(word_position, 0) & ((2 << bit_position) - 1)
+            if masked:
+                most_significant_bit = masked.bit_length() - 1
+                return (
+                    compressed - (bit_position - most_significant_bit)
+                ) * self.tick_spacing, True
+            return (compressed - bit_position) * self.tick_spacing, False
+
+        compressed += 1
+        word_position, bit_position = compressed >> 8, compressed & 0xFF
+        masked = self.words.get(word_position, 0) & ~((1 << bit_position) - 1)
+        if masked:
+            least_significant_bit = (masked & -masked).bit_length() - 1
+            return (
+                compressed + (least_significant_bit - bit_position)
+            ) * self.tick_spacing, True
+        return (compressed + (255 - bit_position)) * self.tick_spacing, False
+
+    def next_initialized_tick(self, tick: int, lte: bool) -> Optional[int]:
+        """next initialized tick at or below tick (lte) or above it, in any word"""
+        next_tick, initialized = self.next_initialized_tick_within_one_word(tick, lte)
+        if initialized:
+            return next_tick
+        compressed = tick // self.tick_spacing
+        if lte:
+            index = bisect.bisect_left(self._word_positions, compressed >> 8) - 1
+            if index < 0:
+                return None
+            word_position = self._word_positions[index]
+            bit = self.words[word_position].bit_length() - 1
+        else:
+            index = bisect.bisect_right(self._word_positions, (compressed + 1) >> 8)
+            if index >= len(self._word_positions):
+                return None
+            word_position = self._word_positions[index]
+            word = self.words[word_position]
+            bit = (word & -word).bit_length() - 1
+        return ((word_position << 8) + bit) * self.tick_spacing
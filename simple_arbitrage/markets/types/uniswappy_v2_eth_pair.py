@@ -1,12 +1,12 @@
-import os
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
 from dataclasses import dataclass
-from typing import Union
+from typing import Optional, Union
 
 from eth_typing import HexStr
 from web3 import Web3
 from web3.contract import Contract
 
+from simple_arbitrage.markets.reserve_snapshots import pinned_snapshot
 from simple_arbitrage.markets.types.EthMarket import (
     CallDetails,
     EthMarket,
@@ -16,10 +16,8 @@ from simple_arbitrage.markets.types.EthMarket import (
 from simple_arbitrage.utils.abi import UNISWAP_PAIR_ABI
 from simple_arbitrage.utils.addresses import WETH_ADDRESS
 
-ETHEREUM_RPC_URL = os.environ.get("ETHEREUM_RPC_URL")
-
-provider = Web3.WebsocketProvider(ETHEREUM_RPC_URL)
-w3 = Web3(provider)
+# only encodes calls, so it needs no connection to the node
+w3 = Web3()
 
 
 class UniswappyV2EthPair(EthMarket):
@@ -31,15 +29,24 @@ class UniswappyV2EthPair(EthMarket):
         )
         self._token_balances: dict[str, float] = dict()
 
+    def _balances(self) -> dict[str, float]:
+        """balances from the snapshot pinned on this thread, else the latest set"""
+        snapshot = pinned_snapshot()
+        if snapshot is not None:
+            balances = snapshot.balances.get(self)
+            if balances is not None:
+                return balances
+        return self._token_balances
+
     def receive_directly(self, token_address: str) -> bool:
-        return token_address in self._token_balances
+        return token_address in self._balances()
 
     def prepare_receive(
         self,
         token_address: str,
         amount_in: float,
     ) -> list[CallDetails]:
-        if not self._token_balances[token_address]:
+        if not self._balances()[token_address]:
             raise RuntimeError(
                 f"Market does not operate on token {token_address}",
             )
@@ -51,11 +58,15 @@ class UniswappyV2EthPair(EthMarket):
         return []
 
     def get_balance(self, token_address: str) -> float:
-        balance = self._token_balances[token_address]
+        balance = self._balances()[token_address]
         if balance is None:
             raise RuntimeError(f"Bad token {token_address} balance is None")
         return balance
 
+    def price_key(self) -> tuple[float, float]:
+        balances = self._balances()
+        return balances[self.tokens[0]], balances[self.tokens[1]]
+
     def set_reserves_via_ordered_balances(self, balances: list[float]):
         self.set_reserves_via_matching_array(self.tokens, balances)
 
@@ -65,15 +76,73 @@ class UniswappyV2EthPair(EthMarket):
             self._token_balances = token_balances
 
     def get_tokens_in(self, token_in: str, token_out: str, amount_out: float) -> float:
-        reserve_in = self._token_balances[token_in]
-        reserve_out = self._token_balances[token_out]
+        balances = self._balances()
+        reserve_in = balances[token_in]
+        reserve_out = balances[token_out]
         return self.get_amount_in(reserve_in, reserve_out, amount_out)
 
     def get_tokens_out(self, token_in: str, token_out: str, amount_in: float) -> float:
-        reserve_in = self._token_balances[token_in]
-        reserve_out = self._token_balances[token_out]
+        balances = self._balances()
+        reserve_in = balances[token_in]
+        reserve_out = balances[token_out]
         return self.get_amount_out(reserve_in, reserve_out, amount_in)
 
+    def get_marginal_tokens_out(
+        self, token_in: str, token_out: str, amount_in: float
+    ) -> float:
+        balances = self._balances()
+        reserve_in_scaled = balances[token_in] * 1000
+        denominator = reserve_in_scaled + amount_in * 997
+        return (
+            reserve_in_scaled * 997 * balances[token_out] / (denominator * denominator)
+        )
+
+    def get_tokens_out_batch(
+        self, token_in: str, token_out: str, amounts_in: Sequence[float]
+    ) -> list[float]:
+        balances = self._balances()
+        return _amounts_out(balances[token_in], balances[token_out], amounts_in)
+
+    def get_tokens_in_batch(
+        self, token_in: str, token_out: str, amounts_out: Sequence[float]
+    ) -> list[float]:
+        balances = self._balances()
+        return _amounts_in(balances[token_in], balances[token_out], amounts_out)
+
+    @classmethod
+    def get_tokens_out_for_markets(
+        cls,
+        markets: Sequence["UniswappyV2EthPair"],
+        token_in: str,
+        token_out: str,
+        amounts_in: Sequence[float],
+    ) -> list[list[float]]:
+        return [
+            _amounts_out(balances[token_in], balances[token_out], amounts_in)
+            for balances in _balances_of(markets)
+        ]
+
+    @classmethod
+    def get_tokens_in_for_markets(
+        cls,
+        markets: Sequence["UniswappyV2EthPair"],
+        token_in: str,
+        token_out: str,
+        amounts_out: Sequence[float],
+    ) -> list[list[float]]:
+        return [
+            _amounts_in(balances[token_in], balances[token_out], amounts_out)
+            for balances in _balances_of(markets)
+        ]
+
+    def get_tokens_out_exact(
+        self, token_in: str, token_out: str, amount_in: int
+    ) -> int:
+        balances = self._balances()
+        reserve_in = int(balances[token_in])
+        reserve_out = int(balances[token_out])
+        return self.get_amount_out_exact(reserve_in, reserve_out, amount_in)
+
     def get_amount_in(
         self,
         reserve_in: float,
@@ -95,6 +164,33 @@ class UniswappyV2EthPair(EthMarket):
         denominator = (reserve_in * 1000) + amount_in_with_fee
         return numerator / denominator
 
+    def get_amount_out_exact(
+        self,
+        reserve_in: int,
+        reserve_out: int,
+        amount_in: int,
+    ) -> int:
+        """UniswapV2Library.getAmountOut, integer division as on chain"""
+        if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+            return 0
+        amount_in_with_fee = amount_in * 997
+        numerator = amount_in_with_fee * reserve_out
+        denominator = (reserve_in * 1000) + amount_in_with_fee
+        return numerator // denominator
+
+    def get_amount_in_exact(
+        self,
+        reserve_in: int,
+        reserve_out: int,
+        amount_out: int,
+    ) -> Optional[int]:
+        """UniswapV2Library.getAmountIn, None where the library reverts"""
+        if amount_out <= 0 or reserve_in <= 0 or amount_out >= reserve_out:
+            return None
+        numerator = reserve_in * amount_out * 1000
+        denominator = (reserve_out - amount_out) * 997
+        return numerator // denominator + 1
+
     def sell_tokens_to_next_market(
         self, token_in: str, amount_in: float, eth_market: EthMarket
     ) -> MultipleCallData:
@@ -108,27 +204,68 @@ class UniswappyV2EthPair(EthMarket):
         self, token_in: str, amount_in: float, recipient: str
     ) -> Union[bytes, HexStr]:
 
-        amount_0_out = 0.0
-        amount_1_out = 0.0
+        amount_0_out = 0
+        amount_1_out = 0
         if token_in == self.tokens[0]:
             token_out = self.tokens[1]
-            amount_1_out = self.get_tokens_out(token_in, token_out, amount_in)
+            amount_1_out = self.get_tokens_out_exact(
+                token_in, token_out, int(amount_in)
+            )
 
         elif token_in == self.tokens[1]:
             token_out = self.tokens[0]
-            amount_0_out = self.get_tokens_out(token_in, token_out, amount_in)
+            amount_0_out = self.get_tokens_out_exact(
+                token_in, token_out, int(amount_in)
+            )
 
         else:
             raise RuntimeError(f"Bad token input address: {token_in}")
 
-        populated_transaction = self.uniswap_interface.functions.swap(
-            int(amount_0_out), int(amount_1_out), recipient, bytes([])
-        ).build_transaction()
+        # encoded locally, building a transaction would have the node fill gas and chain id
+        data = self.uniswap_interface.encodeABI(
+            fn_name="swap",
+            args=[int(amount_0_out), int(amount_1_out), recipient, bytes([])],
+        )
 
-        if populated_transaction is None or populated_transaction["data"] is None:
+        if data is None:
             raise RuntimeError("Failed to build transaction")
 
-        return populated_transaction["data"]
+        return data
+
+
+def _balances_of(markets: Sequence[UniswappyV2EthPair]) -> list[dict[str, float]]:
+    """_balances of every market, looking up the pinned snapshot once"""
+    snapshot = pinned_snapshot()
+    if snapshot is None:
+        return [market._token_balances for market in markets]
+    balances = [snapshot.balances.get(market) for market in markets]
+    return [
+        market._token_balances if market_balances is None else market_balances
+        for market, market_balances in zip(markets, balances)
+    ]
+
+
+# get_amount_out and get_amount_in over many amounts with the reserve terms hoisted,
+# operations in the same order so every amount matches the scalar result exactly
+
+
+def _amounts_out(
+    reserve_in: float, reserve_out: float, amounts_in: Sequence[float]
+) -> list[float]:
+    reserve_in_scaled = reserve_in * 1000
+    return [
+        amount_in * 997 * reserve_out / (reserve_in_scaled + amount_in * 997)
+        for amount_in in amounts_in
+    ]
+
+
+def _amounts_in(
+    reserve_in: float, reserve_out: float, amounts_out: Sequence[float]
+) -> list[float]:
+    return [
+        reserve_in * amount_out * 1000 / ((reserve_out - amount_out) * 997) + 1
+        for amount_out in amounts_out
+    ]
 
 
 @dataclass()
@@ -0,0 +1,309 @@
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from eth_abi import decode_abi
+from eth_typing import HexStr
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.contract import Contract
+
+from simple_arbitrage.markets.types.EthMarket import (
+    CallDetails,
+    EthMarket,
+    MultipleCallData,
+    ProtocolType,
+)
+from simple_arbitrage.markets.types.tick_math import (
+    FEE_DENOMINATOR,
+    MAX_SQRT_RATIO,
+    MAX_TICK,
+    MIN_SQRT_RATIO,
+    MIN_TICK,
+    Q96,
+    TickBitmap,
+    compute_swap_step,
+    get_sqrt_ratio_at_tick,
+    get_tick_at_sqrt_ratio,
+)
+from simple_arbitrage.utils.abi import UNISWAP_V3_POOL_ABI
+
+SWAP_TOPIC = Web3.keccak(
+    text="Swap(address,address,int256,int256,uint160,uint128,int24)"
+)
+MINT_TOPIC = Web3.keccak(
+    text="Mint(address,address,int24,int24,uint128,uint256,uint256)"
+)
+BURN_TOPIC = Web3.keccak(text="Burn(address,int24,int24,uint128,uint256,uint256)")
+POOL_LOG_TOPICS = [SWAP_TOPIC.hex(), MINT_TOPIC.hex(), BURN_TOPIC.hex()]
+
+
+@dataclass()
+class SwapResult:
+    amount0: int  # into the pool when positive, out of it when negative
+    amount1: int
+    sqrt_price_x96: int
+    tick: int
+    liquidity: int
+
+
+class UniswappyV3Pool(EthMarket):
+    """a tick based concentrated liquidity pool, swaps simulated as UniswapV3Pool.swap
+
+    Liquidity is indexed by tick: liquidity_net holds what crossing an initialized
+    tick upwards adds to the active liquidity and the bitmap finds the next
+    initialized tick, so a swap costs one step per initialized tick or bitmap word it
+    crosses. Swap, Mint and Burn logs update the state in place, each in constant time.
+    """
+
+    pool_interface: Contract = Web3().eth.contract(abi=UNISWAP_V3_POOL_ABI)  # type: ignore[call-overload]
+
+    def __init__(
+        self,
+        market_address: str,
+        tokens: list[str],
+        protocol: str,
+        fee: int,
+        tick_spacing: int,
+    ):
+        super().__init__(
+            market_address, tokens, protocol, ProtocolType.CONCENTRATED_LIQUIDITY
+        )
+        self.fee = fee
+        self.tick_spacing = tick_spacing
+        self.sqrt_price_x96 = 0
+        self.tick = 0
+        self.liquidity = 0
+        self.liquidity_net: dict[int, int] = {}
+        self.liquidity_gross: dict[int, int] = {}
+        self.tick_bitmap = TickBitmap(tick_spacing)
+        # bumped whenever a tick changes, prices depend on the ticks past the current
+        self.ticks_version = 0
+
+    def set_state(self, sqrt_price_x96: int, tick: int, liquidity: int):
+        self.sqrt_price_x96 = sqrt_price_x96
+        self.tick = tick
+        self.liquidity = liquidity
+
+    def set_tick(self, tick: int, liquidity_gross: int, liquidity_net: int):
+        """one initialized tick as the pool's ticks() returns it, when loading"""
+        self.ticks_version += 1
+        if (liquidity_gross > 0) != (tick in self.liquidity_gross):
+            self.tick_bitmap.flip_tick(tick)
+        if liquidity_gross > 0:
+            self.liquidity_gross[tick] = liquidity_gross
+            self.liquidity_net[tick] = liquidity_net
+        else:
+            self.liquidity_gross.pop(tick, None)
+            self.liquidity_net.pop(tick, None)
+
+    def update_position(self, tick_lower: int, tick_upper: int, liquidity_delta: int):
+        """a Mint (positive delta) or Burn (negative delta) of a position"""
+        for tick, net_delta in (
+            (tick_lower, liquidity_delta),
+            (tick_upper, -liquidity_delta),
+        ):
+            self.set_tick(
+                tick,
+                self.liquidity_gross.get(tick, 0) + liquidity_delta,
+                self.liquidity_net.get(tick, 0) + net_delta,
+            )
+        if tick_lower <= self.tick < tick_upper:
+            self.liquidity += liquidity_delta
+
+    def apply_log(self, log: dict):
+        """update from a Swap, Mint or Burn log of this pool, others are ignored"""
+        topics = [HexBytes(topic) for topic in log["topics"]]
+        data = HexBytes(log["data"])
+        if topics[0] == SWAP_TOPIC:
+            _, _, sqrt_price_x96, liquidity, tick = decode_abi(
+                ["int256", "int256", "uint160", "uint128", "int24"], data
+            )
+            self.set_state(sqrt_price_x96, tick, liquidity)
+        elif topics[0] in (MINT_TOPIC, BURN_TOPIC):
+            tick_lower, tick_upper = (
+                decode_abi(["int24"], topic)[0] for topic in topics[-2:]
+            )
+            if topics[0] == MINT_TOPIC:
+                _, amount, _, _ = decode_abi(
+                    ["address", "uint128", "uint256", "uint256"], data
+                )
+            else:
+                amount, _, _ = decode_abi(["uint128", "uint256", "uint256"], data)
+                amount = -amount
+            self.update_position(tick_lower, tick_upper, amount)
+
+    def simulate_swap(
+        self,
+        zero_for_one: bool,
+        amount_specified: int,
+        sqrt_price_limit_x96: Optional[int] = None,
+    ) -> SwapResult:
+        """UniswapV3Pool.swap against the current state, without changing it
+
+        amount_specified is positive for exact input and negative for exact output.
+        """
+        if sqrt_price_limit_x96 is None:
+            sqrt_price_limit_x96 = (
+                MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+            )
+        exact_input = amount_specified > 0
+        amount_remaining = amount_specified
+        amount_calculated = 0
+        sqrt_price_x96 = self.sqrt_price_x96
+        tick = self.tick
+        liquidity = self.liquidity
+
+        while amount_remaining != 0 and sqrt_price_x96 != sqrt_price_limit_x96:
+            sqrt_price_start_x96 = sqrt_price_x96
+            tick_next, initialized = self._next_tick(tick, zero_for_one, liquidity)
+            sqrt_price_next_x96 = get_sqrt_ratio_at_tick(tick_next)
+            if (
+                sqrt_price_next_x96 < sqrt_price_limit_x96
+                if zero_for_one
+                else sqrt_price_next_x96 > sqrt_price_limit_x96
+            ):
+                sqrt_price_target_x96 = sqrt_price_limit_x96
+            else:
+                sqrt_price_target_x96 = sqrt_price_next_x96
+
+            sqrt_price_x96, amount_in, amount_out, fee_amount = compute_swap_step(
+                sqrt_price_x96,
+                sqrt_price_target_x96,
+                liquidity,
+                amount_remaining,
+                self.fee,
+            )
+            if exact_input:
+                amount_remaining -= amount_in + fee_amount
+                amount_calculated -= amount_out
+            else:
+                amount_remaining += amount_out
+                amount_calculated += amount_in + fee_amount
+
+            if sqrt_price_x96 == sqrt_price_next_x96:
+                if initialized:
+                    liquidity_net = self.liquidity_net[tick_next]
+                    liquidity += -liquidity_net if zero_for_one else liquidity_net
+                tick = tick_next - 1 if zero_for_one else tick_next
+            elif sqrt_price_x96 != sqrt_price_start_x96:
+                tick = get_tick_at_sqrt_ratio(sqrt_price_x96)
+
+        if zero_for_one == exact_input:
+            amount0, amount1 = amount_specified - amount_remaining, amount_calculated
+        else:
+            amount0, amount1 = amount_calculated, amount_specified - amount_remaining
+        return SwapResult(amount0, amount1, sqrt_price_x96, tick, liquidity)
+
+    def _next_tick(
+        self, tick: int, zero_for_one: bool, liquidity: int
+    ) -> tuple[int, bool]:
+        """the pool's next step boundary, clamped to the tick range
+
+        Out of range (no liquidity) every step the pool takes moves nothing, so the
+        search skips straight to the next initialized tick and the amounts stay exact.
+        """
+        if liquidity == 0:
+            next_tick = self.tick_bitmap.next_initialized_tick(tick, zero_for_one)
+            if next_tick is None:
+                return (MIN_TICK if zero_for_one else MAX_TICK), False
+            return next_tick, True
+        next_tick, initialized = self.tick_bitmap.next_initialized_tick_within_one_word(
+            tick, zero_for_one
+        )
+        return max(MIN_TICK, min(MAX_TICK, next_tick)), initialized
+
+    def price_key(self) -> tuple[int, int, int]:
+        return self.sqrt_price_x96, self.liquidity, self.ticks_version
+
+    def _zero_for_one(self, token_in: str, token_out: str) -> bool:
+        if [token_in, token_out] == self.tokens:
+            return True
+        if [token_out, token_in] == self.tokens:
+            return False
+        raise RuntimeError(f"Bad token pair: {token_in}, {token_out}")
+
+    def receive_directly(self, token_address: str) -> bool:
+        # the pool pulls its input through the swap callback, a transfer is not a swap
+        return False
+
+    def prepare_receive(
+        self, token_address: str, amount_in: float
+    ) -> list[CallDetails]:
+        if token_address not in self.tokens:
+            raise RuntimeError(f"Market does not operate on token {token_address}")
+        if amount_in <= 0:
+            raise RuntimeError(f"Invalid amount: {amount_in}")
+        # the input is paid in the swap callback of the calling contract
+        return []
+
+    def get_tokens_out(self, token_in: str, token_out: str, amount_in: float) -> float:
+        return float(self.get_tokens_out_exact(token_in, token_out, int(amount_in)))
+
+    def get_tokens_out_exact(
+        self, token_in: str, token_out: str, amount_in: int
+    ) -> int:
+        if amount_in <= 0 or self.sqrt_price_x96 == 0:
+            return 0
+        zero_for_one = self._zero_for_one(token_in, token_out)
+        result = self.simulate_swap(zero_for_one, amount_in)
+        return -(result.amount1 if zero_for_one else result.amount0)
+
+    def get_tokens_in(self, token_in: str, token_out: str, amount_out: float) -> float:
+        """input for amount_out, infinite when the pool cannot pay that much out"""
+        amount_out = int(amount_out)
+        if amount_out <= 0:
+            return 0.0
+        if self.sqrt_price_x96 == 0:
+            return float("inf")
+        zero_for_one = self._zero_for_one(token_in, token_out)
+        result = self.simulate_swap(zero_for_one, -amount_out)
+        amount_in, paid_out = (
+            (result.amount0, -result.amount1)
+            if zero_for_one
+            else (result.amount1, -result.amount0)
+        )
+        if paid_out < amount_out:
+            return float("inf")
+        return float(amount_in)
+
+    def get_marginal_tokens_out(
+        self, token_in: str, token_out: str, amount_in: float
+    ) -> float:
+        """price after the swap, net of the fee; zero once liquidity runs out"""
+        if self.sqrt_price_x96 == 0:
+            return 0.0
+        zero_for_one = self._zero_for_one(token_in, token_out)
+        if amount_in >= 1:
+            result = self.simulate_swap(zero_for_one, int(amount_in))
+            sqrt_price_x96, liquidity = result.sqrt_price_x96, result.liquidity
+        else:
+            sqrt_price_x96, liquidity = self.sqrt_price_x96, self.liquidity
+        if liquidity == 0:
+            return 0.0
+        # token1 per token0
+        price = (sqrt_price_x96 / Q96) ** 2
+        fee_multiplier = (FEE_DENOMINATOR - self.fee) / FEE_DENOMINATOR
+        return fee_multiplier * (price if zero_for_one else 1 / price)
+
+    def sell_tokens_to_next_market(
+        self, token_in: str, amount_in: float, eth_market: EthMarket
+    ) -> MultipleCallData:
+        exchange_call = self.sell_tokens(token_in, amount_in, eth_market.market_address)
+        return MultipleCallData(targets=[self.market_address], data=[exchange_call])
+
+    def sell_tokens(
+        self, token_in: str, amount_in: float, recipient: str
+    ) -> Union[bytes, HexStr]:
+        if token_in not in self.tokens:
+            raise RuntimeError(f"Bad token input address: {token_in}")
+        zero_for_one = token_in == self.tokens[0]
+        sqrt_price_limit_x96 = (
+            MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+        )
+        return self.pool_interface.encodeABI(
+            fn_name="swap",
+            args=[recipient, zero_for_one, int(amount_in), sqrt_price_limit_x96, b""],
+        )
+
+    def __repr__(self) -> str:
+        return f"{super().__repr__()} fee: {self.fee}"
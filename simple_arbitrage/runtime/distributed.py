@@ -0,0 +1,606 @@
+"""leader/worker evaluation across hosts over plain TCP
+
+The leader, DistributedSearcher in the bot, splits markets_by_token into one
+shard per worker with partition_tokens and sends each worker its shard once. Every
+block it streams each worker the reserves of its shard that changed since the last
+block it sent, encoded as a reserve history record (backtest.history), and the
+workers evaluate their shards concurrently and reply with their best crossed
+markets. The leader merges them by profit and executes them itself.
+
+Frames are `length u32 | kind u8 | payload`; the shard and the candidates are
+JSON. A reserves frame is `seconds left f64 | length u32 | quarantined JSON | record`,
+the block's remaining time budget, the failure cache's quarantined addresses and the
+binary record; the budget is relative so the hosts' clocks need not agree. A worker
+that runs out of it replies EXPIRED instead of candidates. A worker that fails or
+times out is dropped, its shard is evaluated by the leader until it reconnects on a
+block after the reconnect backoff.
+
+python -m simple_arbitrage.runtime.distributed --host 0.0.0.0 --port 9100 runs a
+worker; the bot leads when WORKER_ADDRESSES lists workers.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import socket
+import struct
+import sys
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import IO, Optional
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    CrossedMarketDetails,
+    evaluate_markets,
+)
+from simple_arbitrage.arbitrage.funnel import FunnelTrace, FunnelTracer
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.backtest.history import RECORD_HEADER, apply_record, encode_record
+from simple_arbitrage.backtest.recorder import ReserveRecorder
+from simple_arbitrage.markets.market_loaders.market_state import MarketStateWriter
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot, pinned
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import (
+    GroupedMarkets,
+    UniswappyV2EthPair,
+)
+from simple_arbitrage.runtime.multiprocess import partition_tokens, record_selected
+from simple_arbitrage.runtime.scheduler import (
+    DEADLINE,
+    BlockDeadline,
+    BlockScheduler,
+    StaleBlockError,
+)
+from simple_arbitrage.runtime.searcher import Searcher
+from simple_arbitrage.utils.util import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9100
+# seconds a worker may take to answer a block before its shard moves to the leader
+DEFAULT_WORKER_TIMEOUT = 10.0
+# seconds before a dropped worker is connected to again
+DEFAULT_RECONNECT_BACKOFF = 30.0
+# seconds past the block's deadline the leader waits for a worker's EXPIRED reply
+EXPIRY_GRACE = 0.1
+
+FRAME_HEADER = struct.Struct("<IB")
+RESERVES_HEADER = struct.Struct("<dI")  # seconds left, quarantined JSON length
+
+SHARD = 1
+RESERVES = 2
+CANDIDATES = 3
+FAILED = 4
+EXPIRED = 5
+
+
+def parse_worker_addresses(value: Optional[str]) -> list[tuple[str, int]]:
+    """host:port,host:port -> [(host, port), ...]"""
+    addresses = []
+    for address in (value or "").split(","):
+        address = address.strip()
+        if address:
+            host, _, port = address.rpartition(":")
+            addresses.append((host, int(port)))
+    return addresses
+
+
+def send_frame(connection: socket.socket, kind: int, payload: bytes):
+    connection.sendall(FRAME_HEADER.pack(len(payload), kind) + payload)
+
+
+def read_frame(reader: IO[bytes]) -> tuple[int, bytes]:
+    """the next frame's kind and payload, raises ConnectionError at end of stream"""
+    header = reader.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        raise ConnectionError("Connection closed")
+    length, kind = FRAME_HEADER.unpack(header)
+    payload = reader.read(length)
+    if len(payload) < length:
+        raise ConnectionError("Connection closed mid frame")
+    return kind, payload
+
+
+@dataclass()
+class ExchangeStats:
+    """one block's exchange with the workers, for the overhead they add"""
+
+    block_number: int
+    seconds: float  # from the first send to the last reply
+    worker_seconds: float  # the slowest worker's own evaluation time
+    bytes_sent: int
+    bytes_received: int
+
+    @property
+    def overhead(self) -> float:
+        return self.seconds - self.worker_seconds
+
+
+class EvaluationWorker:
+    """serves one leader at a time: receives a shard, then evaluates it every block"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self._server = socket.create_server((host, port))
+        self.address: tuple[str, int] = self._server.getsockname()[:2]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connection: Optional[socket.socket] = None
+
+    def start(self) -> "EvaluationWorker":
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="evaluation-worker", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        # shutdown wakes the blocked accept and read, close alone would not
+        for connection in (self._server, self._connection):
+            if connection is not None:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self._server.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        while not self._stop.is_set():
+            try:
+                connection, leader = self._server.accept()
+            except OSError:
+                break
+            logger.info(f"Leader {leader} connected")
+            self._connection = connection
+            with connection:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                try:
+                    self._serve_leader(connection)
+                except ConnectionError as e:
+                    logger.info(f"Leader {leader} disconnected: {e}")
+
+    def _serve_leader(self, connection: socket.socket):
+        reader = connection.makefile("rb")
+        shard: Optional[_Shard] = None
+        while True:
+            kind, payload = read_frame(reader)
+            try:
+                if kind == SHARD:
+                    shard = _Shard.from_json(payload)
+                    continue
+                if kind != RESERVES or shard is None:
+                    raise ValueError(f"Unexpected frame {kind}")
+                candidates = shard.evaluate(payload)
+                if candidates is None:
+                    send_frame(connection, EXPIRED, b"")
+                else:
+                    send_frame(connection, CANDIDATES, candidates)
+            except Exception as e:
+                logger.exception("Evaluation failed")
+                send_frame(connection, FAILED, repr(e).encode())
+
+
+class _Shard:
+    """a worker's markets, their reserves kept current from the leader's records"""
+
+    def __init__(
+        self,
+        pairs_by_index: dict[int, UniswappyV2EthPair],
+        indexes_by_token: dict[str, list[int]],
+    ):
+        self.pairs_by_index = pairs_by_index
+        self.index_by_pair = {pair: index for index, pair in pairs_by_index.items()}
+        self.markets_by_token = {
+            token_address: [pairs_by_index[index] for index in indexes]
+            for token_address, indexes in indexes_by_token.items()
+        }
+        self.reserves = {index: [0, 0] for index in pairs_by_index}
+        # only counts this worker's cutoffs, the leader reports its own
+        self.scheduler = BlockScheduler()
+
+    @classmethod
+    def from_json(cls, payload: bytes) -> "_Shard":
+        content = json.loads(payload)
+        return cls(
+            {
+                index: UniswappyV2EthPair(address, tokens, protocol)
+                for index, address, tokens, protocol in content["pairs"]
+            },
+            content["indexes_by_token"],
+        )
+
+    def evaluate(self, payload: bytes) -> Optional[bytes]:
+        """the candidates of a reserves frame, None if its time budget runs out first"""
+        start = time.perf_counter()
+        remaining, quarantined_length = RESERVES_HEADER.unpack_from(payload)
+        record_offset = RESERVES_HEADER.size + quarantined_length
+        quarantined = frozenset(
+            json.loads(payload[RESERVES_HEADER.size : record_offset])
+        )
+        block_number = RECORD_HEADER.unpack_from(payload, record_offset)[0]
+        deadline = BlockDeadline(self.scheduler, block_number, remaining)
+        changed = _RecordedIndexes(self.reserves)
+        apply_record(payload, record_offset, changed)
+        for index in changed.indexes:
+            self.pairs_by_index[index].set_reserves_via_ordered_balances(
+                self.reserves[index]
+            )
+        try:
+            best_crossed_markets = evaluate_markets(
+                self.markets_by_token, deadline, quarantined=quarantined
+            )
+        except StaleBlockError:
+            return None
+        return json.dumps(
+            {
+                "seconds": time.perf_counter() - start,
+                "candidates": [
+                    [
+                        crossed_market.profit,
+                        crossed_market.volume,
+                        crossed_market.token_address,
+                        self.index_by_pair[crossed_market.buy_from_market],
+                        self.index_by_pair[crossed_market.sell_to_market],
+                    ]
+                    for crossed_market in best_crossed_markets
+                ],
+            }
+        ).encode()
+
+
+class _RecordedIndexes:
+    """reserves for apply_record, remembering which indexes the record held"""
+
+    def __init__(self, reserves: dict[int, list[int]]):
+        self.reserves = reserves
+        self.indexes: set[int] = set()
+
+    def __getitem__(self, index: int) -> list[int]:
+        self.indexes.add(index)
+        return self.reserves[index]
+
+
+@dataclass()
+class _WorkerLink:
+    address: tuple[str, int]
+    markets_by_token: dict[str, list[EthMarket]]
+    indexes: list[int]
+    connection: Optional[socket.socket] = None
+    reader: Optional[IO[bytes]] = None
+    # reserves as last sent, by pair index
+    sent: dict[int, tuple[int, int]] = field(default_factory=dict)
+    # time.monotonic() from which a dropped worker is connected to again
+    reconnect_at: float = 0.0
+
+
+class DistributedEvaluator:
+    """the leader's side: shards markets_by_token over workers and merges their results"""
+
+    def __init__(
+        self,
+        pairs: Sequence[EthMarket],
+        markets_by_token: Mapping[str, list[EthMarket]],
+        worker_addresses: list[tuple[str, int]],
+        timeout: float = DEFAULT_WORKER_TIMEOUT,
+        reconnect_backoff: float = DEFAULT_RECONNECT_BACKOFF,
+    ):
+        self.pairs = list(pairs)
+        self.timeout = timeout
+        self.reconnect_backoff = reconnect_backoff
+        self.stats: list[ExchangeStats] = []
+        index_by_pair = {pair: index for index, pair in enumerate(self.pairs)}
+        self._workers = []
+        for address, shard in zip(
+            worker_addresses, partition_tokens(markets_by_token, len(worker_addresses))
+        ):
+            indexes = sorted(
+                {
+                    index_by_pair[market]
+                    for markets in shard.values()
+                    for market in markets
+                }
+            )
+            self._workers.append(_WorkerLink(address, shard, indexes))
+        self._index_by_pair = index_by_pair
+
+    def connect(self) -> "DistributedEvaluator":
+        for worker in self._workers:
+            try:
+                self._connect(worker)
+            except OSError as e:
+                self._drop(worker, e)
+        return self
+
+    def close(self):
+        for worker in self._workers:
+            if worker.connection is not None:
+                worker.connection.close()
+                worker.connection = None
+
+    def evaluate(
+        self,
+        block_number: int,
+        snapshot: ReserveSnapshot,
+        deadline: Optional[BlockDeadline] = None,
+        quarantined: frozenset[str] = frozenset(),
+    ) -> list[CrossedMarketDetails]:
+        """every shard's best crossed markets, sorted by profit desc
+
+        Raises StaleBlockError when the deadline passes before every shard is done.
+        """
+        start = time.perf_counter()
+        bytes_sent = bytes_received = 0
+        local_markets_by_token: dict[str, list[EthMarket]] = {}
+        waiting = []
+        for worker in self._workers:
+            self._reconnect_if_due(worker, deadline)
+            if worker.connection is not None:
+                try:
+                    bytes_sent += self._send_reserves(
+                        worker, block_number, snapshot, deadline, quarantined
+                    )
+                    waiting.append(worker)
+                    continue
+                except OSError as e:
+                    self._drop(worker, e)
+            local_markets_by_token.update(worker.markets_by_token)
+
+        best_crossed_markets = []
+        worker_seconds = 0.0
+        expired = False
+        for worker in waiting:
+            try:
+                reply = self._receive_candidates(worker, deadline)
+            except (OSError, RuntimeError) as e:
+                self._drop(worker, e)
+                local_markets_by_token.update(worker.markets_by_token)
+                continue
+            if reply is None:
+                expired = True
+                continue
+            bytes_received += len(reply)
+            content = json.loads(reply)
+            worker_seconds = max(worker_seconds, content["seconds"])
+            best_crossed_markets.extend(
+                CrossedMarketDetails(
+                    profit, volume, token_address, self.pairs[buy], self.pairs[sell]
+                )
+                for profit, volume, token_address, buy, sell in content["candidates"]
+            )
+        self.stats.append(
+            ExchangeStats(
+                block_number,
+                time.perf_counter() - start,
+                worker_seconds,
+                bytes_sent,
+                bytes_received,
+            )
+        )
+
+        if expired:
+            assert deadline is not None
+            deadline.scheduler.record_cutoff("evaluate_markets", DEADLINE)
+            raise StaleBlockError(block_number, "evaluate_markets", DEADLINE)
+        if local_markets_by_token:
+            with pinned(snapshot):
+                best_crossed_markets.extend(
+                    evaluate_markets(
+                        local_markets_by_token, deadline, quarantined=quarantined
+                    )
+                )
+        best_crossed_markets.sort(key=lambda x: x.profit, reverse=True)
+        return best_crossed_markets
+
+    def _reconnect_if_due(self, worker: _WorkerLink, deadline: Optional[BlockDeadline]):
+        if worker.connection is not None or time.monotonic() < worker.reconnect_at:
+            return
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline.remaining())
+        if timeout <= 0:
+            return
+        try:
+            self._connect(worker, timeout)
+        except OSError as e:
+            self._drop(worker, e)
+            return
+        logger.info(f"Worker {worker.address} reconnected")
+
+    def _connect(self, worker: _WorkerLink, timeout: Optional[float] = None):
+        connection = socket.create_connection(
+            worker.address, timeout=self.timeout if timeout is None else timeout
+        )
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pairs = self.pairs
+        shard = {
+            "pairs": [
+                [
+                    index,
+                    pairs[index].market_address,
+                    pairs[index].tokens,
+                    pairs[index].protocol,
+                ]
+                for index in worker.indexes
+            ],
+            "indexes_by_token": {
+                token_address: [self._index_by_pair[market] for market in markets]
+                for token_address, markets in worker.markets_by_token.items()
+            },
+        }
+        send_frame(connection, SHARD, json.dumps(shard).encode())
+        worker.connection = connection
+        worker.reader = connection.makefile("rb")
+        worker.sent = {}
+
+    def _send_reserves(
+        self,
+        worker: _WorkerLink,
+        block_number: int,
+        snapshot: ReserveSnapshot,
+        deadline: Optional[BlockDeadline],
+        quarantined: frozenset[str],
+    ) -> int:
+        """sends the shard's reserves that changed since the last block, returns bytes"""
+        reserves: dict[int, tuple[int, int]] = {}
+        for index in worker.indexes:
+            pair = self.pairs[index]
+            balances = snapshot.balances[pair]
+            reserve = (balances[pair.tokens[0]], balances[pair.tokens[1]])
+            if worker.sent.get(index) != reserve:
+                reserves[index] = reserve
+        keyframe = not worker.sent
+        record = encode_record(block_number, keyframe, sorted(reserves), reserves)
+        remaining = float("inf") if deadline is None else deadline.remaining()
+        addresses = json.dumps(sorted(quarantined)).encode()
+        payload = RESERVES_HEADER.pack(remaining, len(addresses)) + addresses + record
+        assert worker.connection is not None
+        send_frame(worker.connection, RESERVES, payload)
+        worker.sent.update(reserves)
+        return FRAME_HEADER.size + len(payload)
+
+    def _receive_candidates(
+        self, worker: _WorkerLink, deadline: Optional[BlockDeadline]
+    ) -> Optional[bytes]:
+        """the worker's candidates, None if it ran out of the block's time budget"""
+        assert worker.connection is not None and worker.reader is not None
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, max(deadline.remaining(), 0) + EXPIRY_GRACE)
+        worker.connection.settimeout(timeout)
+        kind, payload = read_frame(worker.reader)
+        if kind == EXPIRED:
+            return None
+        if kind != CANDIDATES:
+            raise RuntimeError(f"Worker {worker.address} failed: {payload.decode()}")
+        return payload
+
+    def _drop(self, worker: _WorkerLink, error: Exception):
+        logger.warning(
+            f"Worker {worker.address} dropped, its {len(worker.markets_by_token)} "
+            f"tokens are evaluated locally for {self.reconnect_backoff:.0f} s: {error}"
+        )
+        if worker.connection is not None:
+            worker.connection.close()
+        worker.connection = None
+        worker.reader = None
+        worker.reconnect_at = time.monotonic() + self.reconnect_backoff
+
+
+class DistributedSearcher(Searcher):
+    """a Searcher that leads remote workers through evaluation
+
+    Fetching and execution stay here, only evaluation is spread over the workers.
+    """
+
+    def __init__(
+        self,
+        provider,
+        markets: GroupedMarkets,
+        arbitrage: Arbitrage,
+        miner_reward_percentage: int,
+        worker_addresses: list[tuple[str, int]],
+        transaction_contexts: Optional[TransactionContextProvider] = None,
+        recorder: Optional[ReserveRecorder] = None,
+        funnel: Optional[FunnelTracer] = None,
+        timeout: float = DEFAULT_WORKER_TIMEOUT,
+        state_writer: Optional[MarketStateWriter] = None,
+    ):
+        super().__init__(
+            provider,
+            markets,
+            arbitrage,
+            miner_reward_percentage,
+            transaction_contexts,
+            recorder,
+            funnel,
+            state_writer=state_writer,
+        )
+        self.evaluator = DistributedEvaluator(
+            markets.all_market_pairs,
+            markets.markets_by_token,
+            worker_addresses,
+            timeout,
+        ).connect()
+
+    def close(self):
+        self.evaluator.close()
+
+    def _evaluate_markets(
+        self,
+        deadline: BlockDeadline,
+        snapshot: ReserveSnapshot,
+        trace: Optional[FunnelTrace],
+    ) -> list[CrossedMarketDetails]:
+        quarantined: frozenset[str] = frozenset()
+        if self.arbitrage is not None and self.arbitrage.failure_cache is not None:
+            quarantined = self.arbitrage.failure_cache.quarantined()
+        best_crossed_markets = self.evaluator.evaluate(
+            deadline.block_number, snapshot, deadline, quarantined
+        )
+        stats = self.evaluator.stats[-1]
+        logger.info(
+            f"Workers: {stats.seconds * 1000:.1f} ms, slowest evaluation "
+            f"{stats.worker_seconds * 1000:.1f} ms, overhead {stats.overhead * 1000:.1f} ms, "
+            f"{stats.bytes_sent} bytes out"
+        )
+        if trace is not None:
+            # the workers keep no funnel, selections start here
+            record_selected(trace, best_crossed_markets)
+        return best_crossed_markets
+
+
+def _serve_in_process(host: str, address_sender: Connection):
+    worker = EvaluationWorker(host, 0)
+    address_sender.send(worker.address)
+    address_sender.close()
+    worker.serve_forever()
+
+
+def start_worker_process(
+    host: str = "127.0.0.1",
+) -> tuple[multiprocessing.Process, tuple[str, int]]:
+    """a worker in a local process on a free port, for tests and benchmarks"""
+    context = multiprocessing.get_context("spawn")
+    address_receiver, address_sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_serve_in_process, args=(host, address_sender), daemon=True
+    )
+    process.start()
+    address_sender.close()
+    return process, tuple(address_receiver.recv())
+
+
+def summarize(stats: list[ExchangeStats]) -> str:
+    return (
+        f"round trip p50 {percentile([s.seconds for s in stats], 50) * 1000:.2f} ms, "
+        f"overhead p50 {percentile([s.overhead for s in stats], 50) * 1000:.2f} ms "
+        f"p99 {percentile([s.overhead for s in stats], 99) * 1000:.2f} ms, "
+        f"{percentile([s.bytes_sent for s in stats], 50):.0f} bytes out per block"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    worker = EvaluationWorker(args.host, args.port)
+    logger.info(f"Evaluation worker listening on {worker.address}")
+    worker.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s %(module)-20s %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    main()
@@ -0,0 +1,144 @@
+"""structured events for the hot loop, formatted off the critical path
+
+emit() only decides whether to sample the event and queues its raw fields, a
+background thread turns them into compact records: `event key=value ...` lines
+through the logger, or JSON lines when an output file is set. Fields are
+formatted after emit returns, so callers must not mutate what they pass in.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from typing import IO, Optional
+
+logger = logging.getLogger(__name__)
+
+# keep one in N of these, they fire for every token or candidate every block
+DEFAULT_SAMPLE_EVERY = {"crossed_markets": 100}
+
+# queued records beyond this are dropped rather than grow without bound
+MAX_PENDING = 10000
+
+_STOP = object()
+
+
+class EventLogger:
+    def __init__(
+        self,
+        output: Optional[IO[str]] = None,
+        sample_every: Optional[dict[str, int]] = None,
+        max_pending: int = MAX_PENDING,
+        record_logger: logging.Logger = logger,
+    ):
+        self.output = output
+        self.record_logger = record_logger
+        self.sample_every = dict(
+            DEFAULT_SAMPLE_EVERY if sample_every is None else sample_every
+        )
+        self.max_pending = max_pending
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._seen: dict[str, int] = {}
+        self.emitted = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        output: Optional[IO[str]] = None,
+        sample_every: Optional[dict[str, int]] = None,
+    ):
+        self.flush()
+        self.output = output
+        if sample_every is not None:
+            self.sample_every.update(sample_every)
+
+    def emit(self, event: str, **fields):
+        if self.output is None and not self.record_logger.isEnabledFor(logging.INFO):
+            return
+        every = self.sample_every.get(event, 1)
+        with self._lock:
+            if every > 1:
+                seen = self._seen.get(event, 0)
+                self._seen[event] = seen + 1
+                if seen % every:
+                    self.sampled_out += 1
+                    return
+            if self._queue.qsize() >= self.max_pending:
+                self.dropped += 1
+                return
+            self.emitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._write_records, name="events", daemon=True
+                )
+                self._thread.start()
+        self._queue.put((time.time(), event, fields))
+
+    def summary(self) -> str:
+        return (
+            f"{self.emitted} events, {self.sampled_out} sampled out, "
+            f"{self.dropped} dropped"
+        )
+
+    def flush(self, timeout: Optional[float] = None):
+        """block until everything emitted so far is written"""
+        if self._thread is None:
+            return
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait(timeout)
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _write_records(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                return
+            if isinstance(record, threading.Event):
+                if self.output is not None:
+                    self.output.flush()
+                record.set()
+                continue
+            try:
+                self._write(*record)
+            except Exception as e:
+                logger.warning(f"Could not write event {record[1]}: {e}")
+
+    def _write(self, timestamp: float, event: str, fields: dict):
+        if self.output is None:
+            self.record_logger.info(format_event(event, fields))
+            return
+        self.output.write(
+            json.dumps(
+                {"t": round(timestamp, 3), "event": event, **fields},
+                separators=(",", ":"),
+                default=str,
+            )
+            + "\n"
+        )
+
+
+def format_event(event: str, fields: dict) -> str:
+    return " ".join(
+        [event] + [f"{name}={_compact(value)}" for name, value in fields.items()]
+    )
+
+
+def _compact(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_compact(item) for item in value) + "]"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+EVENTS = EventLogger()
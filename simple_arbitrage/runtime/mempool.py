@@ -0,0 +1,353 @@
+"""reserve prediction from pending swaps, evaluated before the block lands
+
+A MempoolPredictor thread polls the node's pending transaction filter and keeps the
+swaps on tracked pairs until a block includes them or max_age_blocks pass. When
+swaps arrive or a block is published, at most once every predict_interval, they are
+applied to a speculative copy of the latest reserves and evaluate_markets runs on
+the tokens they touch. With a Backrunner, the best predicted crossed markets are
+submitted right away as bundles of the pending swaps they follow from and the trade
+taking them, for the block the swaps are expected in. Once the next block's reserves
+are fetched, a token whose markets all hold exactly the predicted reserves takes its
+crossed market from the prediction instead of being evaluated again, so its pricing
+and solver work is done before the block arrives.
+"""
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Optional
+
+from web3 import Web3
+from web3._utils.filters import TransactionFilter
+from web3.exceptions import TransactionNotFound
+from web3.providers.base import BaseProvider
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    CrossedMarketDetails,
+    SimulatedBundle,
+    evaluate_markets,
+)
+from simple_arbitrage.arbitrage.funnel import PREDICTED, SELECTED, FunnelTrace
+from simple_arbitrage.arbitrage.price_cache import PriceCache
+from simple_arbitrage.arbitrage.transaction_context import (
+    TransactionContext,
+    TransactionContextProvider,
+)
+from simple_arbitrage.markets.pending_swaps import (
+    PendingSwap,
+    SwapDecoder,
+    predict_reserves,
+    touched_tokens,
+)
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot, pinned
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import GroupedMarkets
+from simple_arbitrage.runtime.metrics import (
+    BACKRUN_BUNDLES,
+    PENDING_SWAPS,
+    PREDICTED_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 0.05
+# evaluate_markets holds the GIL, predicting after every poll slows down the block
+DEFAULT_PREDICT_INTERVAL = 0.5
+DEFAULT_MAX_AGE_BLOCKS = 2
+DEFAULT_BACKRUN_CANDIDATES = 3
+
+
+class PendingTransactionFeed:
+    """pending transactions through the node's pending transaction filter"""
+
+    def __init__(self, provider: BaseProvider):
+        self.w3 = Web3(provider)
+        self._filter: TransactionFilter = self.w3.eth.filter("pending")
+
+    def poll(self) -> list[Mapping]:
+        """transactions announced since the last poll"""
+        transactions = []
+        for transaction_hash in self._filter.get_new_entries():
+            try:
+                transactions.append(self.w3.eth.get_transaction(transaction_hash))
+            except TransactionNotFound:
+                # dropped since it was announced
+                continue
+        return transactions
+
+    def included(self, block_number: int) -> set[str]:
+        """hashes of a block's transactions"""
+        block = self.w3.eth.get_block(block_number)
+        return {
+            transaction_hash.hex().lower() for transaction_hash in block["transactions"]
+        }
+
+
+@dataclass(frozen=True)
+class Prediction:
+    block_number: int  # of the reserves the swaps were applied to
+    snapshot: ReserveSnapshot  # the predicted post-state
+    swaps: int
+    # best crossed market of every token the swaps touch, None where there is none
+    crossed_markets: Mapping[str, Optional[CrossedMarketDetails]]
+    # the swaps that applied, in arrival order
+    applied: tuple[PendingSwap, ...] = ()
+
+
+class Backrunner:
+    """bundles the best predicted crossed markets behind the pending swaps that
+    cross them, for the block the swaps are expected in
+
+    A bundle leads with every applied swap through the crossed market's pairs, in
+    arrival order, and ends with the trade, so it only lands if they do. Each set of
+    swaps is bundled once per block.
+    """
+
+    def __init__(
+        self,
+        arbitrage: Arbitrage,
+        miner_reward_percentage: int,
+        transaction_contexts: Optional[TransactionContextProvider] = None,
+        candidates: int = DEFAULT_BACKRUN_CANDIDATES,
+    ):
+        self.arbitrage = arbitrage
+        self.miner_reward_percentage = miner_reward_percentage
+        self.transaction_contexts = transaction_contexts
+        self.candidates = candidates
+        self._block_number: Optional[int] = None
+        self._transaction_context: Optional[TransactionContext] = None
+        self._bundled: set[tuple[str, tuple[str, ...]]] = set()
+
+    def backrun(self, prediction: Prediction) -> list[SimulatedBundle]:
+        """submits the bundles that simulate"""
+        if prediction.block_number != self._block_number:
+            self._block_number = prediction.block_number
+            self._transaction_context = None
+            self._bundled = set()
+        crossed_markets = sorted(
+            (market for market in prediction.crossed_markets.values() if market),
+            key=lambda crossed_market: crossed_market.profit,
+            reverse=True,
+        )[: self.candidates]
+        simulated_bundles = []
+        for crossed_market in crossed_markets:
+            pairs = {crossed_market.buy_from_market, crossed_market.sell_to_market}
+            swaps = [
+                swap for swap in prediction.applied if pairs.intersection(swap.pairs)
+            ]
+            key = (
+                crossed_market.token_address,
+                tuple(swap.transaction_hash for swap in swaps),
+            )
+            if key in self._bundled:
+                continue
+            self._bundled.add(key)
+            with pinned(prediction.snapshot):
+                simulated_bundle = self.arbitrage.backrun(
+                    crossed_market,
+                    [swap.transaction for swap in swaps],
+                    prediction.block_number,
+                    self.miner_reward_percentage,
+                    self._context(prediction.block_number),
+                )
+            if simulated_bundle is not None:
+                BACKRUN_BUNDLES.inc()
+                simulated_bundles.append(simulated_bundle)
+        if simulated_bundles:
+            logger.info(
+                f"Backran {len(simulated_bundles)} predicted crossed markets "
+                f"for block {prediction.block_number + 1}"
+            )
+        return simulated_bundles
+
+    def _context(self, block_number: int) -> Optional[TransactionContext]:
+        if self.transaction_contexts is None:
+            return None
+        if self._transaction_context is None:
+            self._transaction_context = self.transaction_contexts.refresh(block_number)
+        return self._transaction_context
+
+
+class MempoolPredictor(threading.Thread):
+    def __init__(
+        self,
+        feed: PendingTransactionFeed,
+        markets: GroupedMarkets,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_age_blocks: int = DEFAULT_MAX_AGE_BLOCKS,
+        predict_interval: float = DEFAULT_PREDICT_INTERVAL,
+        backrunner: Optional[Backrunner] = None,
+    ):
+        super().__init__(name="mempool", daemon=True)
+        self.feed = feed
+        self.decoder = SwapDecoder(markets.all_market_pairs)
+        self.markets_by_token = markets.markets_by_token
+        self.poll_interval = poll_interval
+        self.max_age_blocks = max_age_blocks
+        self.predict_interval = predict_interval
+        self.backrunner = backrunner
+        # predicted reserves priced into the shared cache would evict the fetched
+        # ones, and its hit counts are not safe across threads
+        self.price_cache = PriceCache()
+        self.prediction: Optional[Prediction] = None
+        # by transaction hash, in arrival order: (block seen at, swap)
+        self._pending: dict[str, tuple[int, PendingSwap]] = {}
+        self._snapshot: Optional[ReserveSnapshot] = None
+        self._block_number: Optional[int] = None
+        # pending swaps or the reserves changed since the last prediction
+        self._changed = False
+        self._predicted_at = float("-inf")
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Failed to predict reserves from pending swaps")
+            self._stopped.wait(self.poll_interval)
+
+    def stop(self):
+        self._stopped.set()
+
+    def publish(self, snapshot: ReserveSnapshot):
+        """the latest fetched reserves, the next prediction builds on them"""
+        self._snapshot = snapshot
+
+    def poll(self) -> Optional[Prediction]:
+        """take in new pending swaps, and predict again if anything changed and the
+        last prediction is predict_interval old"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if snapshot.block_number != self._block_number:
+            self._block_number = snapshot.block_number
+            self._prune(snapshot.block_number)
+            self._changed = True
+        for transaction in self.feed.poll():
+            swap = self.decoder.decode(transaction)
+            if swap is None or swap.transaction_hash in self._pending:
+                continue
+            self._pending[swap.transaction_hash] = (snapshot.block_number, swap)
+            PENDING_SWAPS.inc()
+            self._changed = True
+        now = time.monotonic()
+        if self._changed and now - self._predicted_at >= self.predict_interval:
+            self._changed = False
+            self._predicted_at = now
+            self.prediction = self.predict(snapshot)
+            if self.backrunner is not None:
+                self.backrunner.backrun(self.prediction)
+        return self.prediction
+
+    def predict(self, snapshot: ReserveSnapshot) -> Prediction:
+        start = time.perf_counter()
+        predicted, applied = predict_reserves(
+            snapshot, [swap for _, swap in self._pending.values()]
+        )
+        tokens = touched_tokens(applied) & self.markets_by_token.keys()
+        crossed_markets: dict[str, Optional[CrossedMarketDetails]] = dict.fromkeys(
+            tokens
+        )
+        with pinned(predicted):
+            for crossed_market in evaluate_markets(
+                {token: self.markets_by_token[token] for token in tokens},
+                price_cache=self.price_cache,
+            ):
+                crossed_markets[crossed_market.token_address] = crossed_market
+        prediction = Prediction(
+            snapshot.block_number,
+            predicted,
+            len(applied),
+            MappingProxyType(crossed_markets),
+            tuple(applied),
+        )
+        if applied:
+            logger.info(
+                f"Predicted {len(applied)} pending swaps on block {snapshot.block_number}: "
+                f"{len(tokens)} tokens, "
+                f"{sum(market is not None for market in crossed_markets.values())} "
+                f"crossed markets in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+        return prediction
+
+    def confirmed(
+        self,
+        snapshot: ReserveSnapshot,
+        markets_by_token: Mapping[str, list[EthMarket]],
+        skip: frozenset[str] = frozenset(),
+    ) -> dict[str, Optional[CrossedMarketDetails]]:
+        """predicted crossed markets of the tokens whose markets all hold the predicted
+        reserves in snapshot, by token, None for tokens predicted to have none"""
+        prediction = self.prediction
+        if prediction is None or not prediction.crossed_markets:
+            return {}
+        confirmed = {}
+        for token_address, crossed_market in prediction.crossed_markets.items():
+            markets = markets_by_token.get(token_address)
+            if (
+                markets is not None
+                and token_address not in skip
+                and all(
+                    market.market_address not in skip
+                    and _holds_predicted(market, prediction.snapshot, snapshot)
+                    for market in markets
+                )
+            ):
+                confirmed[token_address] = crossed_market
+        PREDICTED_TOKENS.inc(len(confirmed), outcome="confirmed")
+        PREDICTED_TOKENS.inc(
+            len(prediction.crossed_markets) - len(confirmed), outcome="missed"
+        )
+        logger.info(
+            f"Mempool prediction confirmed {len(confirmed)}/"
+            f"{len(prediction.crossed_markets)} tokens for block {snapshot.block_number}"
+        )
+        return confirmed
+
+    def _prune(self, block_number: int):
+        """drops the swaps the block included and those pending for too long"""
+        if not self._pending:
+            return
+        included = self.feed.included(block_number)
+        self._pending = {
+            transaction_hash: (seen, swap)
+            for transaction_hash, (seen, swap) in self._pending.items()
+            if transaction_hash not in included
+            and block_number - seen < self.max_age_blocks
+        }
+
+
+def merge_confirmed(
+    best_crossed_markets: list[CrossedMarketDetails],
+    confirmed: Mapping[str, Optional[CrossedMarketDetails]],
+    trace: Optional[FunnelTrace] = None,
+) -> list[CrossedMarketDetails]:
+    """best_crossed_markets and the confirmed predicted ones, sorted by profit desc"""
+    merged = list(best_crossed_markets)
+    for crossed_market in confirmed.values():
+        if crossed_market is None:
+            continue
+        if trace is not None:
+            candidate_id = trace.open(
+                crossed_market.token_address,
+                crossed_market.buy_from_market.market_address,
+                crossed_market.sell_to_market.market_address,
+            )
+            trace.record(candidate_id, PREDICTED, profit=crossed_market.profit)
+            trace.record(candidate_id, SELECTED)
+            crossed_market = replace(crossed_market, candidate_id=candidate_id)
+        merged.append(crossed_market)
+    merged.sort(key=lambda x: x.profit, reverse=True)
+    return merged
+
+
+def _holds_predicted(
+    market: EthMarket, predicted: ReserveSnapshot, snapshot: ReserveSnapshot
+) -> bool:
+    # markets outside the snapshots, like concentrated liquidity pools, never do
+    balances = predicted.balances.get(market)
+    return balances is not None and balances == snapshot.balances.get(market)
@@ -0,0 +1,301 @@
+"""process metrics in the Prometheus text format, served over local HTTP
+
+Counters, gauges and histograms are plain locked numbers updated inline by the
+bot, rendering only happens when /metrics is scraped. The bot's metrics are
+defined at the bottom of this module so every instrumented module shares them.
+"""
+import bisect
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds, from a fast RPC round trip to a whole block
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{self._label_text(key)} {_number(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: count per bucket (last is +Inf), sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            values = self._values.get(self._key(labels))
+            return sum(values[0]) if values else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = {
+                key: (list(counts), total[0])
+                for key, (counts, total) in self._values.items()
+            }
+        samples = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                samples.append(
+                    f"{self.name}_bucket{self._label_text(key, le)} {cumulative}"
+                )
+            samples.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            samples.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, label_names=()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names=()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+class MetricsServer:
+    """serves registry.render() at /metrics on a background thread"""
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 0
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._http_server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        if self._http_server is None:
+            raise RuntimeError("Server is not running")
+        host, port = self._http_server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._http_server.daemon_threads = True
+        threading.Thread(
+            target=self._http_server.serve_forever, name="metrics", daemon=True
+        ).start()
+        logger.info(f"Serving metrics on {self.url}")
+        return self
+
+    def stop(self):
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "searcher_phase_seconds", "Time spent per block phase", ["phase"]
+)
+TRACKED_PAIRS = REGISTRY.gauge(
+    "searcher_tracked_pairs", "Pairs whose reserves are fetched every block"
+)
+FILTERED_PAIRS = REGISTRY.gauge(
+    "searcher_filtered_pairs", "Pairs grouped by token for evaluation"
+)
+CROSSED_MARKETS = REGISTRY.gauge(
+    "searcher_crossed_markets", "Profitable crossed markets found in the last block"
+)
+POOL_CROSSED_MARKETS = REGISTRY.gauge(
+    "searcher_pool_crossed_markets",
+    "Profitable crossed markets through a concentrated liquidity pool in the last "
+    "block, reported only",
+)
+CROSSED_MARKETS_TOTAL = REGISTRY.counter(
+    "searcher_crossed_markets_total", "Profitable crossed markets found"
+)
+SOLVER_CALLS = REGISTRY.counter(
+    "searcher_solver_calls_total", "Optimal trade size calculations"
+)
+SIMULATIONS = REGISTRY.counter(
+    "searcher_simulations_total", "Relay bundle simulations by result", ["result"]
+)
+REMOTE_CALLS_AVOIDED = REGISTRY.counter(
+    "searcher_remote_calls_avoided_total",
+    "estimate_gas and relay simulation calls skipped for candidates bound to fail",
+    ["reason"],
+)
+PENDING_SWAPS = REGISTRY.counter(
+    "searcher_pending_swaps_total", "Pending transactions decoded as tracked swaps"
+)
+PREDICTED_TOKENS = REGISTRY.counter(
+    "searcher_predicted_tokens_total",
+    "Tokens evaluated ahead from pending swaps, by whether the block confirmed them",
+    ["outcome"],
+)
+BACKRUN_BUNDLES = REGISTRY.counter(
+    "searcher_backrun_bundles_total",
+    "Bundles submitted behind the pending swaps of a predicted crossed market",
+)
+BUNDLES_SUBMITTED = REGISTRY.counter(
+    "searcher_bundles_submitted_total", "Bundles submitted to relays"
+)
+HEAD_BLOCK = REGISTRY.gauge("searcher_head_block", "Latest head seen")
+BLOCK_LAG = REGISTRY.gauge(
+    "searcher_block_lag", "Heads behind the latest when a block's work started"
+)
+RPC_REQUESTS = REGISTRY.counter(
+    "searcher_rpc_requests_total",
+    "JSON-RPC requests sent to the node",
+    ["method", "caller"],
+)
+RPC_ERRORS = REGISTRY.counter(
+    "searcher_rpc_errors_total",
+    "JSON-RPC requests that failed or returned an error",
+    ["method", "caller"],
+)
+RPC_SECONDS = REGISTRY.histogram(
+    "searcher_rpc_seconds", "JSON-RPC request latency", ["method"]
+)
+RPC_REQUEST_BYTES = REGISTRY.counter(
+    "searcher_rpc_request_bytes_total", "Encoded JSON-RPC request bytes", ["method"]
+)
+RPC_RESPONSE_BYTES = REGISTRY.counter(
+    "searcher_rpc_response_bytes_total", "JSON-RPC response bytes", ["method"]
+)
+RELAY_ACK_SECONDS = REGISTRY.histogram(
+    "searcher_relay_ack_seconds", "Bundle acknowledgement latency", ["relay"]
+)
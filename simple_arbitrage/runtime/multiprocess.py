@@ -0,0 +1,535 @@
+"""multi-process searching over a shared-memory reserve table
+
+Evaluation is pure Python and holds the GIL, so threads cannot spread it over
+cores. In this mode a fetcher process runs fetch_reserves and writes every pair's
+reserves into a SharedReserveTable, and evaluator processes, each owning a slice of
+markets_by_token, read them in place: the snapshot they pin looks a pair's
+reserves up in the table the first time it is priced, nothing is copied or
+pickled per block. The coordinator, MultiprocessSearcher in the main process,
+hands block numbers out over pipes, merges the evaluators' candidates by profit
+and executes them against the same table.
+
+The table holds `banks` copies of the reserves, one per block in flight, so the
+fetcher fills one while earlier blocks are still evaluated and executed from theirs.
+"""
+import logging
+import multiprocessing
+import time
+import traceback
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    CrossedMarketDetails,
+    evaluate_markets,
+)
+from simple_arbitrage.arbitrage.funnel import SELECTED, FunnelTrace, FunnelTracer
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.backtest.recorder import ReserveRecorder
+from simple_arbitrage.markets.market_loaders.market_state import MarketStateWriter
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import fetch_reserves
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot, pinned
+from simple_arbitrage.markets.types.EthMarket import EthMarket
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import (
+    GroupedMarkets,
+    UniswappyV2EthPair,
+)
+from simple_arbitrage.runtime.metrics import PHASE_SECONDS
+from simple_arbitrage.runtime.providers import provider_for_url
+from simple_arbitrage.runtime.rpc_accounting import (
+    ACCOUNTING,
+    RequestLog,
+    RpcAccounting,
+    instrument_provider,
+)
+from simple_arbitrage.runtime.scheduler import (
+    DEADLINE,
+    BlockDeadline,
+    BlockScheduler,
+    StaleBlockError,
+)
+from simple_arbitrage.runtime.searcher import Searcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVALUATORS = 2
+# fetch, evaluate and execute each hold a block
+DEFAULT_BANKS = 3
+
+# reserves are uint112, each is stored as two 64 bit words, low word first
+_WORD_MASK = (1 << 64) - 1
+_WORDS_PER_PAIR = 4
+
+# spawned children do not inherit the coordinator's threads, locks or sockets
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+@dataclass(frozen=True)
+class SharedReserveSnapshot(ReserveSnapshot):
+    bank: int = 0
+
+
+class SharedReserveTable:
+    """every pair's reserves for `banks` blocks, in shared memory
+
+    Created by the coordinator, attached by name in the children. Each bank starts
+    with its block number in the header, readers rely on the coordinator never
+    handing out a bank that is being rewritten.
+    """
+
+    def __init__(self, pair_count: int, banks: int, name: Optional[str] = None):
+        self.pair_count = pair_count
+        self.banks = banks
+        self.owner = name is None
+        size = 8 * (banks + banks * pair_count * _WORDS_PER_PAIR)
+        self._memory = SharedMemory(name=name, create=self.owner, size=size)
+        self._words = self._memory.buf.cast("Q")
+
+    @property
+    def spec(self) -> tuple[str, int, int]:
+        """what a child needs to attach()"""
+        return self._memory.name, self.pair_count, self.banks
+
+    @classmethod
+    def attach(cls, spec: tuple[str, int, int]) -> "SharedReserveTable":
+        name, pair_count, banks = spec
+        return cls(pair_count, banks, name)
+
+    def block_number(self, bank: int) -> int:
+        return self._words[bank]
+
+    def write(self, bank: int, block_number: int, reserves: Iterable[list]):
+        words = array("Q")
+        for reserve in reserves:
+            reserve0, reserve1 = int(reserve[0]), int(reserve[1])
+            words.extend(
+                (
+                    reserve0 & _WORD_MASK,
+                    reserve0 >> 64,
+                    reserve1 & _WORD_MASK,
+                    reserve1 >> 64,
+                )
+            )
+        start = self._offset(bank, 0)
+        self._words[start : start + len(words)] = words
+        self._words[bank] = block_number
+
+    def reserve(self, bank: int, index: int) -> tuple[int, int]:
+        offset = self._offset(bank, index)
+        words = self._words
+        return (
+            words[offset] | words[offset + 1] << 64,
+            words[offset + 2] | words[offset + 3] << 64,
+        )
+
+    def read(self, bank: int) -> list[list[int]]:
+        return [list(self.reserve(bank, index)) for index in range(self.pair_count)]
+
+    def snapshot(
+        self, bank: int, index_by_pair: Mapping[EthMarket, int]
+    ) -> SharedReserveSnapshot:
+        return SharedReserveSnapshot(
+            self.block_number(bank), _SharedBalances(self, bank, index_by_pair), bank
+        )
+
+    def close(self):
+        self._words.release()
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+
+    def _offset(self, bank: int, index: int) -> int:
+        return self.banks + (bank * self.pair_count + index) * _WORDS_PER_PAIR
+
+
+class _SharedBalances(Mapping):
+    """a bank of the table as ReserveSnapshot.balances, read pair by pair on first use"""
+
+    def __init__(
+        self,
+        table: SharedReserveTable,
+        bank: int,
+        index_by_pair: Mapping[EthMarket, int],
+    ):
+        self._table = table
+        self._bank = bank
+        self._index_by_pair = index_by_pair
+        self._balances: dict[EthMarket, dict[str, float]] = {}
+
+    def get(self, pair, default=None):
+        balances = self._balances.get(pair)
+        if balances is None:
+            index = self._index_by_pair.get(pair)
+            if index is None:
+                return default
+            reserve0, reserve1 = self._table.reserve(self._bank, index)
+            balances = self._balances[pair] = {
+                pair.tokens[0]: reserve0,
+                pair.tokens[1]: reserve1,
+            }
+        return balances
+
+    def __getitem__(self, pair) -> dict[str, float]:
+        balances = self.get(pair)
+        if balances is None:
+            raise KeyError(pair)
+        return balances
+
+    def __iter__(self) -> Iterator[EthMarket]:
+        return iter(self._index_by_pair)
+
+    def __len__(self) -> int:
+        return len(self._index_by_pair)
+
+
+def partition_tokens(
+    markets_by_token: Mapping[str, list[EthMarket]], slices: int
+) -> list[dict[str, list[EthMarket]]]:
+    """split markets_by_token into slices of about equal evaluation cost
+
+    A token's cost grows with the square of its market count, every pair of its
+    markets is compared; the costliest tokens are placed first, each on the
+    cheapest slice so far.
+    """
+    partitions: list[dict[str, list[EthMarket]]] = [{} for _ in range(slices)]
+    costs = [0] * slices
+    for token_address, markets in sorted(
+        markets_by_token.items(), key=lambda item: len(item[1]), reverse=True
+    ):
+        cheapest = costs.index(min(costs))
+        partitions[cheapest][token_address] = markets
+        costs[cheapest] += len(markets) ** 2
+    return partitions
+
+
+class _ChildProcess:
+    """a process serving requests from its end of a pipe until it receives None"""
+
+    def __init__(self, name: str, child_type: type, *args):
+        self.connection, child_connection = _CONTEXT.Pipe()
+        self.process = _CONTEXT.Process(
+            target=_serve,
+            args=(child_connection, child_type, *args),
+            name=name,
+            daemon=True,
+        )
+
+    def start(self):
+        self.process.start()
+
+    def request(self, message: Any):
+        self.connection.send(message)
+
+    def reply(self) -> Any:
+        ok, result = self.connection.recv()
+        if not ok:
+            raise RuntimeError(f"{self.process.name} failed: {result}")
+        return result
+
+    def stop(self, timeout: float = 5.0):
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.connection.close()
+
+
+def _serve(connection: Connection, child_type: type, *args):
+    """runs in the child, child_type(*args).handle answers each request"""
+    child = child_type(*args)
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            try:
+                connection.send((True, child.handle(*message)))
+            except Exception:
+                connection.send((False, traceback.format_exc()))
+    finally:
+        child.close()
+
+
+class _ReserveFetcherChild:
+    def __init__(
+        self, table_spec: tuple[str, int, int], rpc_url: str, pair_addresses: list[str]
+    ):
+        self.table = SharedReserveTable.attach(table_spec)
+        self.requests = RequestLog()
+        self.provider = instrument_provider(provider_for_url(rpc_url), self.requests)
+        self.pairs = [UniswappyV2EthPair(address, [], "") for address in pair_addresses]
+
+    def handle(self, block_number: int, bank: int) -> list[tuple]:
+        """fetches into bank, returns the requests it made for the coordinator"""
+        self.table.write(bank, block_number, fetch_reserves(self.provider, self.pairs))
+        return self.requests.take()
+
+    def close(self):
+        self.table.close()
+
+
+class _EvaluatorChild:
+    def __init__(
+        self,
+        table_spec: tuple[str, int, int],
+        pair_specs: list[tuple[int, str, list[str], str]],
+        indexes_by_token: dict[str, list[int]],
+    ):
+        self.table = SharedReserveTable.attach(table_spec)
+        pairs_by_index = {
+            index: UniswappyV2EthPair(address, tokens, protocol)
+            for index, address, tokens, protocol in pair_specs
+        }
+        self.index_by_pair = {pair: index for index, pair in pairs_by_index.items()}
+        self.markets_by_token = {
+            token_address: [pairs_by_index[index] for index in indexes]
+            for token_address, indexes in indexes_by_token.items()
+        }
+        # only counts this process' cutoffs, the coordinator reports its own
+        self.scheduler = BlockScheduler()
+
+    def handle(
+        self, block_number: int, bank: int, expires_at: Optional[float] = None
+    ) -> Optional[list[tuple]]:
+        """best crossed markets as (profit, volume, token, buy index, sell index), None
+        if the block's deadline, expires_at in time.time() seconds, passes first"""
+        deadline = None
+        if expires_at is not None:
+            deadline = BlockDeadline(
+                self.scheduler, block_number, expires_at - time.time()
+            )
+        try:
+            with pinned(self.table.snapshot(bank, self.index_by_pair)):
+                best_crossed_markets = evaluate_markets(self.markets_by_token, deadline)
+        except StaleBlockError:
+            return None
+        return [
+            (
+                crossed_market.profit,
+                crossed_market.volume,
+                crossed_market.token_address,
+                self.index_by_pair[crossed_market.buy_from_market],
+                self.index_by_pair[crossed_market.sell_to_market],
+            )
+            for crossed_market in best_crossed_markets
+        ]
+
+    def close(self):
+        self.table.close()
+
+
+class ReserveFetcher:
+    """a process running fetch_reserves into a bank of the table on request"""
+
+    def __init__(
+        self,
+        table: SharedReserveTable,
+        rpc_url: str,
+        pairs: Iterable[EthMarket],
+        accounting: RpcAccounting = ACCOUNTING,
+    ):
+        self.accounting = accounting
+        self._process = _ChildProcess(
+            "reserve-fetcher",
+            _ReserveFetcherChild,
+            table.spec,
+            rpc_url,
+            [pair.market_address for pair in pairs],
+        )
+
+    def start(self) -> "ReserveFetcher":
+        self._process.start()
+        return self
+
+    def fetch(self, block_number: int, bank: int):
+        self._process.request((block_number, bank))
+        # the child's requests are accounted here, in the block being worked on
+        for request in self._process.reply():
+            self.accounting.record(*request)
+
+    def close(self):
+        self._process.stop()
+
+
+class EvaluatorPool:
+    """evaluator processes, each running evaluate_markets on its slice of tokens"""
+
+    def __init__(
+        self,
+        table: SharedReserveTable,
+        pairs: list[EthMarket],
+        markets_by_token: Mapping[str, list[EthMarket]],
+        processes: int = DEFAULT_EVALUATORS,
+    ):
+        self.pairs = pairs
+        index_by_pair = {pair: index for index, pair in enumerate(pairs)}
+        self._processes = []
+        for number, partition in enumerate(
+            partition_tokens(markets_by_token, processes)
+        ):
+            # only pairs in the table can be evaluated in a child
+            indexes_by_token = {
+                token_address: [index_by_pair[market] for market in markets]
+                for token_address, markets in partition.items()
+            }
+            indexes = sorted(
+                {index for indexes in indexes_by_token.values() for index in indexes}
+            )
+            pair_specs = [
+                (
+                    index,
+                    pairs[index].market_address,
+                    pairs[index].tokens,
+                    pairs[index].protocol,
+                )
+                for index in indexes
+            ]
+            self._processes.append(
+                _ChildProcess(
+                    f"evaluator-{number}",
+                    _EvaluatorChild,
+                    table.spec,
+                    pair_specs,
+                    indexes_by_token,
+                )
+            )
+
+    def start(self) -> "EvaluatorPool":
+        for process in self._processes:
+            process.start()
+        return self
+
+    def evaluate(
+        self, block_number: int, bank: int, expires_at: Optional[float] = None
+    ) -> Optional[list[CrossedMarketDetails]]:
+        """every slice's best crossed markets, sorted by profit desc, None if a slice
+        ran past expires_at, in time.time() seconds"""
+        for process in self._processes:
+            process.request((block_number, bank, expires_at))
+        # every reply is read, so the pipes stay in step for the next block
+        replies = [process.reply() for process in self._processes]
+        if any(reply is None for reply in replies):
+            return None
+        best_crossed_markets = [
+            CrossedMarketDetails(
+                profit, volume, token_address, self.pairs[buy], self.pairs[sell]
+            )
+            for reply in replies
+            for profit, volume, token_address, buy, sell in reply
+        ]
+        best_crossed_markets.sort(key=lambda x: x.profit, reverse=True)
+        return best_crossed_markets
+
+    def close(self):
+        for process in self._processes:
+            process.stop()
+
+
+class MultiprocessSearcher(Searcher):
+    """a Searcher whose fetching and evaluation run in their own processes
+
+    Execution stays in this process and reads the bank its block was fetched into.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str,
+        markets: GroupedMarkets,
+        arbitrage: Arbitrage,
+        miner_reward_percentage: int,
+        transaction_contexts: Optional[TransactionContextProvider] = None,
+        recorder: Optional[ReserveRecorder] = None,
+        funnel: Optional[FunnelTracer] = None,
+        evaluators: int = DEFAULT_EVALUATORS,
+        banks: int = DEFAULT_BANKS,
+        state_writer: Optional[MarketStateWriter] = None,
+    ):
+        super().__init__(
+            None,
+            markets,
+            arbitrage,
+            miner_reward_percentage,
+            transaction_contexts,
+            recorder,
+            funnel,
+            state_writer=state_writer,
+        )
+        pairs = list(markets.all_market_pairs)
+        self._index_by_pair = {pair: index for index, pair in enumerate(pairs)}
+        self.table = SharedReserveTable(len(pairs), banks)
+        self.fetcher = ReserveFetcher(self.table, rpc_url, pairs)
+        self.evaluators = EvaluatorPool(
+            self.table, pairs, markets.markets_by_token, evaluators
+        )
+        self._next_bank = 0
+
+    def start(self) -> "MultiprocessSearcher":
+        self.fetcher.start()
+        self.evaluators.start()
+        return self
+
+    def close(self):
+        self.fetcher.close()
+        self.evaluators.close()
+        self.table.close()
+
+    def fetch_reserves(self, deadline: BlockDeadline) -> ReserveSnapshot:
+        deadline.check("update_reserves")
+        start = time.perf_counter()
+        bank = self._next_bank
+        self._next_bank = (bank + 1) % self.table.banks
+        self.fetcher.fetch(deadline.block_number, bank)
+        if self.recorder is not None:
+            self.recorder.record(deadline.block_number, self.table.read(bank))
+        if self.state_writer is not None and self.state_writer.due(
+            deadline.block_number
+        ):
+            self.state_writer.write(deadline.block_number, self.table.read(bank))
+        snapshot = self.table.snapshot(bank, self._index_by_pair)
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase="update_reserves")
+        return snapshot
+
+    def _evaluate_markets(
+        self,
+        deadline: BlockDeadline,
+        snapshot: ReserveSnapshot,
+        trace: Optional[FunnelTrace],
+    ) -> list[CrossedMarketDetails]:
+        assert isinstance(snapshot, SharedReserveSnapshot)
+        best_crossed_markets = self.evaluators.evaluate(
+            deadline.block_number,
+            snapshot.bank,
+            time.time() + deadline.remaining(),
+        )
+        if best_crossed_markets is None:
+            # an evaluator ran out of the block's time budget
+            deadline.scheduler.record_cutoff("evaluate_markets", DEADLINE)
+            raise StaleBlockError(deadline.block_number, "evaluate_markets", DEADLINE)
+        if trace is not None:
+            # the evaluators' funnels stay in their processes, selections start here
+            record_selected(trace, best_crossed_markets)
+        return best_crossed_markets
+
+
+def record_selected(
+    trace: FunnelTrace, best_crossed_markets: list[CrossedMarketDetails]
+):
+    """opens a candidate for each crossed market evaluated out of this process"""
+    for crossed_market in best_crossed_markets:
+        crossed_market.candidate_id = trace.open(
+            crossed_market.token_address,
+            crossed_market.buy_from_market.market_address,
+            crossed_market.sell_to_market.market_address,
+        )
+        trace.record(
+            crossed_market.candidate_id, SELECTED, profit=crossed_market.profit
+        )
@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot
+from simple_arbitrage.runtime.scheduler import BlockDeadline, StaleBlockError
+from simple_arbitrage.runtime.searcher import Searcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1
+
+_STOP = object()
+
+
+@dataclass()
+class StageStats:
+    name: str
+    queue_depth: int
+    items: int
+    stale: int
+    utilization: float  # share of wall time spent working since the stage started
+
+
+class Stage(threading.Thread):
+    """takes (deadline, payload) items off inbox, works on them, puts results on outbox
+
+    A full outbox blocks the stage, so a slow downstream stage holds back the
+    upstream ones instead of letting work pile up. Work for a stale block is
+    dropped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work: Callable[[BlockDeadline, Any], Any],
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue] = None,
+    ):
+        super().__init__(name=f"stage-{name}", daemon=True)
+        self.stage_name = name
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.items = 0
+        self.stale = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                if self.outbox is not None:
+                    self.outbox.put(_STOP)
+                return
+            deadline, payload = item
+
+            start = time.monotonic()
+            try:
+                result = self.work(deadline, payload)
+            except StaleBlockError as e:
+                self.stale += 1
+                logger.warning(f"Abandoned stale work: {e}")
+                continue
+            except Exception:
+                logger.exception(
+                    f"Stage {self.stage_name} failed on block {deadline.block_number}"
+                )
+                continue
+            finally:
+                self.busy_seconds += time.monotonic() - start
+                self.items += 1
+
+            if self.outbox is not None and result is not None:
+                self.outbox.put((deadline, result))
+
+    def stats(self) -> StageStats:
+        elapsed = time.monotonic() - self.started_at
+        return StageStats(
+            name=self.stage_name,
+            queue_depth=self.inbox.qsize(),
+            items=self.items,
+            stale=self.stale,
+            utilization=self.busy_seconds / elapsed if elapsed > 0 else 0.0,
+        )
+
+
+class BlockPipeline:
+    """fetch -> evaluate -> execute on separate threads with bounded queues between
+
+    Reserve fetching for a new head starts as soon as the head is submitted, while
+    the previous block may still be evaluating or sending bundles. A newer head
+    abandons a block's fetch and evaluation, its execution only runs out of time.
+    """
+
+    def __init__(self, searcher: Searcher, queue_size: int = DEFAULT_QUEUE_SIZE):
+        if getattr(searcher, "pool_follower", None) is not None:
+            # the fetch stage would move the pools' ticks in place while the evaluate
+            # stage simulates swaps across them
+            raise ValueError("Concentrated liquidity pools cannot be pipelined")
+        self.searcher = searcher
+        self.fetch_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.evaluate_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.execute_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stages = [
+            Stage("fetch", self._fetch, self.fetch_queue, self.evaluate_queue),
+            Stage("evaluate", self._evaluate, self.evaluate_queue, self.execute_queue),
+            Stage("execute", self._execute, self.execute_queue),
+        ]
+        self.dropped_heads = 0
+
+    def start(self) -> "BlockPipeline":
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self.fetch_queue.put(_STOP)
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def submit(self, deadline: BlockDeadline):
+        """queue a new head, replacing a queued older head that never started"""
+        while True:
+            try:
+                self.fetch_queue.put_nowait((deadline, None))
+                return
+            except queue.Full:
+                try:
+                    self.fetch_queue.get_nowait()
+                    self.dropped_heads += 1
+                except queue.Empty:
+                    pass
+
+    def stats(self) -> list[StageStats]:
+        return [stage.stats() for stage in self.stages]
+
+    def stats_summary(self) -> str:
+        return ", ".join(
+            f"{stats.name}: depth {stats.queue_depth} "
+            f"utilization {stats.utilization:.0%} stale {stats.stale}"
+            for stats in self.stats()
+        )
+
+    def _fetch(self, deadline: BlockDeadline, _payload) -> ReserveSnapshot:
+        return self.searcher.fetch_reserves(deadline)
+
+    def _evaluate(self, deadline: BlockDeadline, snapshot: ReserveSnapshot):
+        best_crossed_markets = self.searcher.evaluate(deadline, snapshot)
+        if not best_crossed_markets:
+            return None
+        return snapshot, best_crossed_markets
+
+    def _execute(self, deadline: BlockDeadline, evaluated_block):
+        snapshot, best_crossed_markets = evaluated_block
+        self.searcher.execute(deadline.for_execution(), snapshot, best_crossed_markets)
@@ -0,0 +1,46 @@
+"""web3 providers shared by the threads of the bot
+
+web3's WebsocketProvider sends every request of every instance over one event loop,
+and two threads waiting on the same connection fail with "cannot call recv while
+another coroutine is already waiting". ThreadLocalProvider gives each thread its
+own connection instead, so concurrent candidates, the pipeline stages and the main
+loop can all use one Web3 without serializing their node calls.
+"""
+import threading
+from typing import Any, Callable
+
+from web3 import Web3
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+
+def provider_for_url(rpc_url: str) -> BaseProvider:
+    """a websocket provider for ws:// and wss:// urls, an HTTP one otherwise"""
+    if rpc_url.startswith("ws"):
+        return Web3.WebsocketProvider(rpc_url)
+    return Web3.HTTPProvider(rpc_url)
+
+
+class ThreadLocalProvider(BaseProvider):
+    """one provider per calling thread, built by factory on the thread's first use"""
+
+    def __init__(self, factory: Callable[[], BaseProvider]):
+        self.factory = factory
+        self._local = threading.local()
+
+    @property
+    def provider(self) -> BaseProvider:
+        provider = getattr(self._local, "provider", None)
+        if provider is None:
+            provider = self._local.provider = self.factory()
+        return provider
+
+    def request_func(self, web3, outer_middlewares) -> Callable[..., RPCResponse]:
+        # the thread's provider adds its own middlewares and caches the chain
+        return self.provider.request_func(web3, outer_middlewares)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self.provider.make_request(method, params)
+
+    def isConnected(self) -> bool:
+        return self.provider.isConnected()
@@ -0,0 +1,298 @@
+"""accounting for every JSON-RPC request the bot makes to its node and relay
+
+instrument_provider() adds an accounting middleware to a web3 provider's own
+middlewares, so every Web3 built on it is covered: the loader builds a fresh Web3 per
+call, Arbitrage and app.py share the main one. Request and response sizes are taken
+from the provider's encode_rpc_request and decode_rpc_response; WebsocketProvider
+parses responses on its event loop without the latter, so over websockets only
+request sizes are counted. flashbot() wires up the Flashbots module with its relay's
+requests accounted the same way. Each request is recorded with its method, the module
+that made it, its latency, request and response size and whether it failed, into
+running totals, the Prometheus metrics and a rollup for the block being worked on.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Union
+
+from eth_account.signers.local import LocalAccount
+from flashbots import Flashbots
+from flashbots.middleware import FLASHBOTS_METHODS, construct_flashbots_middleware
+from flashbots.provider import FlashbotProvider
+from web3 import Web3
+from web3.middleware import Middleware, geth_poa_middleware
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from simple_arbitrage.runtime.metrics import (
+    RPC_ERRORS,
+    RPC_REQUEST_BYTES,
+    RPC_REQUESTS,
+    RPC_RESPONSE_BYTES,
+    RPC_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# per-block rollups kept for inspection
+ROLLUP_HISTORY = 64
+
+# frames from these packages are the plumbing between a caller and the provider
+_PLUMBING_PREFIXES = (
+    __name__,
+    "web3",
+    "eth_",
+    "flashbots",
+    "asyncio",
+    "toolz",
+    "cytoolz",
+    "concurrent",
+    "threading",
+    "functools",
+    "contextlib",
+)
+
+
+@dataclass()
+class RpcCallStats:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    request_bytes: int = 0
+    response_bytes: int = 0
+
+    def add(self, seconds: float, request_bytes: int, response_bytes: int, error: bool):
+        self.calls += 1
+        self.errors += error
+        self.seconds += seconds
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+
+    def merge(self, other: "RpcCallStats"):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.seconds += other.seconds
+        self.request_bytes += other.request_bytes
+        self.response_bytes += other.response_bytes
+
+
+@dataclass()
+class BlockRpcRollup:
+    block_number: int
+    by_method: dict[str, RpcCallStats] = field(
+        default_factory=lambda: defaultdict(RpcCallStats)
+    )
+
+    @property
+    def total(self) -> RpcCallStats:
+        total = RpcCallStats()
+        for stats in self.by_method.values():
+            total.merge(stats)
+        return total
+
+    def summary(self) -> str:
+        total = self.total
+        methods = ", ".join(
+            f"{method} x{stats.calls}"
+            for method, stats in sorted(
+                self.by_method.items(), key=lambda item: -item[1].calls
+            )
+        )
+        return (
+            f"block {self.block_number}: {total.calls} calls, {total.errors} errors, "
+            f"{total.seconds * 1000:.0f} ms, {total.request_bytes} B out, "
+            f"{total.response_bytes} B in ({methods})"
+        )
+
+
+class RpcAccounting:
+    """running totals per (method, caller module) and rollups per block
+
+    Requests are attributed to the block most recently passed to start_block, so
+    with the pipeline a block's rollup also holds the tail of the previous one.
+    """
+
+    def __init__(self):
+        self.totals: dict[tuple[str, str], RpcCallStats] = defaultdict(RpcCallStats)
+        self.rollups: deque[BlockRpcRollup] = deque(maxlen=ROLLUP_HISTORY)
+        self._current: Optional[BlockRpcRollup] = None
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        caller: str,
+        seconds: float,
+        request_bytes: int,
+        response_bytes: int,
+        error: bool,
+    ):
+        with self._lock:
+            self.totals[(method, caller)].add(
+                seconds, request_bytes, response_bytes, error
+            )
+            if self._current is not None:
+                self._current.by_method[method].add(
+                    seconds, request_bytes, response_bytes, error
+                )
+        RPC_REQUESTS.inc(method=method, caller=caller)
+        RPC_SECONDS.observe(seconds, method=method)
+        RPC_REQUEST_BYTES.inc(request_bytes, method=method)
+        RPC_RESPONSE_BYTES.inc(response_bytes, method=method)
+        if error:
+            RPC_ERRORS.inc(method=method, caller=caller)
+
+    def start_block(self, block_number: int) -> Optional[BlockRpcRollup]:
+        """open the rollup for block_number, returns the one it closes"""
+        with self._lock:
+            finished = self._current
+            self._current = BlockRpcRollup(block_number)
+            self.rollups.append(self._current)
+        return finished
+
+    def by_caller(self) -> dict[str, RpcCallStats]:
+        with self._lock:
+            totals = list(self.totals.items())
+        by_caller: dict[str, RpcCallStats] = defaultdict(RpcCallStats)
+        for (_, caller), stats in totals:
+            by_caller[caller].merge(stats)
+        return dict(by_caller)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{caller}: {stats.calls} calls {stats.errors} errors "
+            f"{stats.seconds * 1000:.0f} ms"
+            for caller, stats in sorted(self.by_caller().items())
+        )
+
+
+ACCOUNTING = RpcAccounting()
+
+
+class RequestLog:
+    """requests kept as RpcAccounting.record arguments, for a child process to send
+    to the coordinator, whose accounting replays them"""
+
+    def __init__(self):
+        self._requests: list[tuple] = []
+        self._lock = threading.Lock()
+
+    def record(self, *request):
+        with self._lock:
+            self._requests.append(request)
+
+    def take(self) -> list[tuple]:
+        with self._lock:
+            requests, self._requests = self._requests, []
+        return requests
+
+
+class _Sizes(threading.local):
+    request_bytes = 0
+    response_bytes = 0
+
+
+def instrument_provider(
+    provider: JSONBaseProvider,
+    accounting: Union[RpcAccounting, RequestLog] = ACCOUNTING,
+) -> JSONBaseProvider:
+    """record every request through provider, for every Web3 built on it"""
+    sizes = _measure_sizes(provider)
+    # innermost, so every retry of http_retry_request_middleware is one request
+    provider.middlewares = (
+        *provider.middlewares,
+        _accounting_middleware(accounting, sizes),
+    )
+    return provider
+
+
+def flashbot(
+    w3: Web3,
+    signature_account: LocalAccount,
+    endpoint_uri: Optional[str] = None,
+    accounting: Union[RpcAccounting, RequestLog] = ACCOUNTING,
+):
+    """flashbots.flashbot, with the relay's requests accounted
+
+    The flashbots middleware posts its methods through FlashbotProvider.make_request
+    directly, past the provider's middlewares, so they are accounted by a middleware
+    of w3 around it instead.
+    """
+    flashbots_provider = FlashbotProvider(signature_account, endpoint_uri)
+    sizes = _measure_sizes(flashbots_provider)
+    # goerli connection requires extra PoA middleware
+    if endpoint_uri is not None and "goerli" in endpoint_uri:
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    w3.middleware_onion.add(construct_flashbots_middleware(flashbots_provider))
+    w3.middleware_onion.add(
+        _accounting_middleware(accounting, sizes, frozenset(FLASHBOTS_METHODS))
+    )
+    w3.attach_modules({"flashbots": (Flashbots,)})
+
+
+def _measure_sizes(provider: JSONBaseProvider) -> _Sizes:
+    encode_rpc_request = provider.encode_rpc_request
+    decode_rpc_response = provider.decode_rpc_response
+    sizes = _Sizes()
+
+    def measured_encode_rpc_request(method: RPCEndpoint, params: Any) -> bytes:
+        request_data = encode_rpc_request(method, params)
+        sizes.request_bytes = len(request_data)
+        return request_data
+
+    def measured_decode_rpc_response(raw_response: bytes) -> RPCResponse:
+        sizes.response_bytes = len(raw_response)
+        return decode_rpc_response(raw_response)
+
+    provider.encode_rpc_request = measured_encode_rpc_request
+    provider.decode_rpc_response = measured_decode_rpc_response
+    return sizes
+
+
+def _accounting_middleware(
+    accounting: Union[RpcAccounting, RequestLog],
+    sizes: _Sizes,
+    methods: Optional[frozenset[str]] = None,
+) -> Middleware:
+    """records the requests for methods, or every request if None"""
+
+    def middleware(
+        make_request: Callable[[RPCEndpoint, Any], RPCResponse], w3: Web3
+    ) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+        def accounted_make_request(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if methods is not None and method not in methods:
+                return make_request(method, params)
+            sizes.request_bytes = sizes.response_bytes = 0
+            caller = _caller_module()
+            start = time.perf_counter()
+            error = True
+            try:
+                response = make_request(method, params)
+                error = "error" in response
+                return response
+            finally:
+                accounting.record(
+                    method,
+                    caller,
+                    time.perf_counter() - start,
+                    sizes.request_bytes,
+                    sizes.response_bytes,
+                    error,
+                )
+
+        return accounted_make_request
+
+    return middleware
+
+
+def _caller_module() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_PLUMBING_PREFIXES):
+            return module
+        frame = frame.f_back
+    return "unknown"
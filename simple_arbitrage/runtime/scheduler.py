@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Optional
+
+from simple_arbitrage.runtime.metrics import BLOCK_LAG, HEAD_BLOCK
+
+logger = logging.getLogger(__name__)
+
+# slot time minus headroom for the bundle to reach the relay before the next block
+DEFAULT_BLOCK_BUDGET = 10.0
+
+NEW_HEAD = "new_head"
+DEADLINE = "deadline"
+
+
+class StaleBlockError(Exception):
+    def __init__(self, block_number: int, phase: str, reason: str):
+        super().__init__(f"block {block_number} abandoned in {phase}: {reason}")
+        self.block_number = block_number
+        self.phase = phase
+        self.reason = reason
+
+
+class BlockDeadline:
+    """time budget for the work on one block
+
+    cancel_event is set as soon as a newer head is observed, so threads waiting on
+    relays or the node can stop without polling the clock.
+    """
+
+    def __init__(self, scheduler: "BlockScheduler", block_number: int, budget: float):
+        self.scheduler = scheduler
+        self.block_number = block_number
+        self.budget = budget
+        self.started = time.monotonic()
+        self.cancel_event = threading.Event()
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self.started)
+
+    def stale_reason(self) -> Optional[str]:
+        if self.cancel_event.is_set():
+            return NEW_HEAD
+        if self.remaining() <= 0:
+            return DEADLINE
+        return None
+
+    def for_execution(self) -> "BlockDeadline":
+        """the same time budget, without the cancellation by a newer head
+
+        The pipeline sends a block's bundles while the next head is already fetched,
+        and those bundles target the blocks after this one anyway.
+        """
+        deadline = BlockDeadline(self.scheduler, self.block_number, self.budget)
+        deadline.started = self.started
+        return deadline
+
+    def check(self, phase: str):
+        """raise StaleBlockError if the block is superseded or out of time"""
+        reason = self.stale_reason()
+        if reason is not None:
+            self.scheduler.record_cutoff(phase, reason)
+            raise StaleBlockError(self.block_number, phase, reason)
+
+
+class BlockScheduler:
+    def __init__(self, budget: float = DEFAULT_BLOCK_BUDGET):
+        self.budget = budget
+        self.latest_head = 0
+        self.blocks_started = 0
+        self.cutoffs: Counter = Counter()
+        self._current: Optional[BlockDeadline] = None
+        self._condition = threading.Condition()
+
+    def observe_head(self, block_number: int):
+        with self._condition:
+            if block_number <= self.latest_head:
+                return
+            self.latest_head = block_number
+            HEAD_BLOCK.set(block_number)
+            current = self._current
+            if current is not None and current.block_number < block_number:
+                current.cancel_event.set()
+            self._condition.notify_all()
+
+    def wait_for_head(
+        self, after: int, timeout: Optional[float] = None
+    ) -> Optional[int]:
+        """latest head once it is newer than after, None on timeout"""
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self.latest_head > after, timeout=timeout
+            ):
+                return None
+            return self.latest_head
+
+    def start_block(self, block_number: int) -> BlockDeadline:
+        deadline = BlockDeadline(self, block_number, self.budget)
+        with self._condition:
+            self._current = deadline
+            self.blocks_started += 1
+            BLOCK_LAG.set(max(self.latest_head - block_number, 0))
+            if self.latest_head > block_number:
+                deadline.cancel_event.set()
+        return deadline
+
+    def record_cutoff(self, phase: str, reason: str):
+        with self._condition:
+            self.cutoffs[(phase, reason)] += 1
+
+    def cutoff_summary(self) -> str:
+        with self._condition:
+            cut = sum(self.cutoffs.values())
+            detail = ", ".join(
+                f"{phase}/{reason}: {count}"
+                for (phase, reason), count in self.cutoffs.most_common()
+            )
+        return f"{cut}/{self.blocks_started} blocks cut off ({detail})"
+
+
+class HeadWatcher(threading.Thread):
+    """polls for new heads in the background and reports them to the scheduler
+
+    poll returns the new head's block number, or None when nothing changed.
+    """
+
+    def __init__(
+        self,
+        scheduler: BlockScheduler,
+        poll: Callable[[], Optional[int]],
+        poll_interval: float = 0.1,
+    ):
+        super().__init__(name="head-watcher", daemon=True)
+        self.scheduler = scheduler
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                block_number = self.poll()
+                if block_number is not None:
+                    self.scheduler.observe_head(block_number)
+            except Exception:
+                logger.exception("Failed to fetch block number")
+            self._stopped.wait(self.poll_interval)
+
+    def stop(self):
+        self._stopped.set()
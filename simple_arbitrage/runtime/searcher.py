@@ -0,0 +1,207 @@
+import logging
+import time
+from typing import Optional
+
+from web3 import HTTPProvider
+
+from simple_arbitrage.arbitrage.arbitrage import (
+    Arbitrage,
+    CrossedMarketDetails,
+    evaluate_markets,
+    evaluate_pool_crossings,
+)
+from simple_arbitrage.arbitrage.funnel import FunnelTrace, FunnelTracer
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.backtest.recorder import ReserveRecorder
+from simple_arbitrage.markets.market_loaders.market_state import MarketStateWriter
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import fetch_reserves
+from simple_arbitrage.markets.market_loaders.uniswappy_v3_loader import (
+    PoolLogFollower,
+    group_pools_by_token,
+)
+from simple_arbitrage.markets.reserve_snapshots import (
+    DoubleBufferedReserves,
+    ReserveSnapshot,
+    pinned,
+)
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import GroupedMarkets
+from simple_arbitrage.runtime.mempool import MempoolPredictor, merge_confirmed
+from simple_arbitrage.runtime.metrics import (
+    CROSSED_MARKETS,
+    CROSSED_MARKETS_TOTAL,
+    FILTERED_PAIRS,
+    PHASE_SECONDS,
+    POOL_CROSSED_MARKETS,
+    TRACKED_PAIRS,
+)
+from simple_arbitrage.runtime.scheduler import BlockDeadline, StaleBlockError
+
+logger = logging.getLogger(__name__)
+
+
+class Searcher:
+    """the per-block body of the bot: refresh reserves, evaluate, take crossed markets
+
+    The phases are separate methods so the staged pipeline can run them on their
+    own threads. Fetching publishes a new reserve snapshot, evaluation and execution
+    read the snapshot of their own block, so the next block can load meanwhile.
+    """
+
+    def __init__(
+        self,
+        provider: HTTPProvider,
+        markets: GroupedMarkets,
+        arbitrage: Arbitrage,
+        miner_reward_percentage: int,
+        transaction_contexts: Optional[TransactionContextProvider] = None,
+        recorder: Optional[ReserveRecorder] = None,
+        funnel: Optional[FunnelTracer] = None,
+        pool_follower: Optional[PoolLogFollower] = None,
+        state_writer: Optional[MarketStateWriter] = None,
+        mempool: Optional[MempoolPredictor] = None,
+    ):
+        self.provider = provider
+        self.markets = markets
+        self.arbitrage = arbitrage
+        self.miner_reward_percentage = miner_reward_percentage
+        self.transaction_contexts = transaction_contexts
+        self.reserves = DoubleBufferedReserves(markets.all_market_pairs)
+        self.recorder = recorder
+        self.funnel = funnel
+        self.pool_follower = pool_follower
+        self.state_writer = state_writer
+        self.mempool = mempool
+        self.markets_by_token = markets.markets_by_token
+        # concentrated liquidity pools are priced against the pairs and their crossings
+        # reported, the executor cannot pay them
+        self.pools_by_token = (
+            group_pools_by_token(pool_follower.pools)
+            if pool_follower is not None
+            else {}
+        )
+        TRACKED_PAIRS.set(len(markets.all_market_pairs))
+        FILTERED_PAIRS.set(
+            sum(len(pairs) for pairs in markets.markets_by_token.values())
+        )
+        if recorder is not None:
+            recorder.write_markets(markets)
+
+    def process_block(self, deadline: BlockDeadline) -> bool:
+        """returns False when the block was abandoned for a newer head or the deadline"""
+        try:
+            snapshot = self.fetch_reserves(deadline)
+            best_crossed_markets = self.evaluate(deadline, snapshot)
+            if best_crossed_markets:
+                self.execute(deadline, snapshot, best_crossed_markets)
+            return True
+        except StaleBlockError as e:
+            logger.warning(f"Abandoned stale work: {e}")
+            return False
+
+    def fetch_reserves(self, deadline: BlockDeadline) -> ReserveSnapshot:
+        deadline.check("update_reserves")
+        start = time.perf_counter()
+        reserves = fetch_reserves(self.provider, self.markets.all_market_pairs)
+        if self.recorder is not None:
+            self.recorder.record(deadline.block_number, reserves)
+        if self.state_writer is not None and self.state_writer.due(
+            deadline.block_number
+        ):
+            self.state_writer.write(deadline.block_number, reserves)
+        snapshot = self.reserves.publish(deadline.block_number, reserves)
+        if self.pool_follower is not None:
+            # pools are updated in place, they are not part of the snapshot
+            self.pool_follower.update(deadline.block_number)
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase="update_reserves")
+        return snapshot
+
+    def evaluate(
+        self, deadline: BlockDeadline, snapshot: ReserveSnapshot
+    ) -> list[CrossedMarketDetails]:
+        deadline.check("evaluate_markets")
+        start = time.perf_counter()
+        trace = None
+        if self.funnel is not None:
+            trace = self.funnel.start_block(deadline.block_number)
+        best_crossed_markets = self._evaluate_markets(deadline, snapshot, trace)
+        if self.mempool is not None:
+            # predictions from here on build on this block
+            self.mempool.publish(snapshot)
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase="evaluate_markets")
+        CROSSED_MARKETS.set(len(best_crossed_markets))
+        CROSSED_MARKETS_TOTAL.inc(len(best_crossed_markets))
+        if len(best_crossed_markets) == 0:
+            logger.info("No crossed markets")
+            if self.funnel is not None:
+                self.funnel.finish(deadline.block_number)
+        return best_crossed_markets
+
+    def _evaluate_markets(
+        self,
+        deadline: BlockDeadline,
+        snapshot: ReserveSnapshot,
+        trace: Optional[FunnelTrace],
+    ) -> list[CrossedMarketDetails]:
+        quarantined: frozenset[str] = frozenset()
+        if self.arbitrage is not None and self.arbitrage.failure_cache is not None:
+            quarantined = self.arbitrage.failure_cache.quarantined()
+        confirmed: dict[str, Optional[CrossedMarketDetails]] = {}
+        if self.mempool is not None:
+            confirmed = self.mempool.confirmed(
+                snapshot, self.markets_by_token, quarantined
+            )
+        with pinned(snapshot):
+            best_crossed_markets = evaluate_markets(
+                self.markets_by_token,
+                deadline,
+                trace,
+                skip=frozenset(confirmed),
+                quarantined=quarantined,
+            )
+            if self.pools_by_token:
+                self._report_pool_crossings(deadline)
+        if confirmed:
+            best_crossed_markets = merge_confirmed(
+                best_crossed_markets, confirmed, trace
+            )
+        return best_crossed_markets
+
+    def _report_pool_crossings(self, deadline: BlockDeadline):
+        pool_crossed_markets = evaluate_pool_crossings(
+            self.markets_by_token, self.pools_by_token, deadline
+        )
+        POOL_CROSSED_MARKETS.set(len(pool_crossed_markets))
+        for crossed_market in pool_crossed_markets:
+            logger.info(
+                f"Crossed market through a pool, not executable: {crossed_market}"
+            )
+
+    def execute(
+        self,
+        deadline: BlockDeadline,
+        snapshot: ReserveSnapshot,
+        best_crossed_markets: list[CrossedMarketDetails],
+    ):
+        deadline.check("take_crossed_markets")
+        start = time.perf_counter()
+        block_number = deadline.block_number
+        transaction_context = None
+        if self.transaction_contexts is not None:
+            transaction_context = self.transaction_contexts.refresh(block_number)
+        trace = None
+        if self.funnel is not None:
+            trace = self.funnel.trace(block_number)
+        try:
+            with pinned(snapshot):
+                self.arbitrage.take_crossed_markets(
+                    best_crossed_markets,
+                    block_number,
+                    self.miner_reward_percentage,
+                    deadline=deadline,
+                    transaction_context=transaction_context,
+                    trace=trace,
+                )
+        finally:
+            if self.funnel is not None:
+                self.funnel.finish(block_number)
+        PHASE_SECONDS.observe(time.perf_counter() - start, phase="take_crossed_markets")
@@ -0,0 +1,205 @@
+import io
+import socket
+import unittest
+from unittest import mock
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime import distributed
+from simple_arbitrage.runtime.distributed import (
+    CANDIDATES,
+    DistributedEvaluator,
+    EvaluationWorker,
+    parse_worker_addresses,
+    read_frame,
+    send_frame,
+    start_worker_process,
+)
+from simple_arbitrage.runtime.scheduler import DEADLINE, BlockScheduler, StaleBlockError
+from simple_arbitrage.utils.addresses import WETH_ADDRESS
+
+
+def _summary(crossed_markets) -> list[tuple]:
+    return [
+        (
+            crossed_market.profit,
+            crossed_market.volume,
+            crossed_market.token_address,
+            crossed_market.buy_from_market.market_address,
+            crossed_market.sell_to_market.market_address,
+        )
+        for crossed_market in crossed_markets
+    ]
+
+
+class TestFrames(unittest.TestCase):
+    def test_frames_round_trip(self):
+        left, right = socket.socketpair()
+        with left, right:
+            send_frame(left, CANDIDATES, b"{}")
+            send_frame(left, CANDIDATES, b"")
+            left.close()
+            reader = right.makefile("rb")
+
+            self.assertEqual(read_frame(reader), (CANDIDATES, b"{}"))
+            self.assertEqual(read_frame(reader), (CANDIDATES, b""))
+            with self.assertRaises(ConnectionError):
+                read_frame(reader)
+
+    def test_truncated_frame_is_a_closed_connection(self):
+        with self.assertRaises(ConnectionError):
+            read_frame(io.BytesIO(b"\x08\x00\x00\x00\x03{}"))
+
+    def test_parse_worker_addresses(self):
+        self.assertEqual(
+            parse_worker_addresses("10.0.0.1:9100, worker-2:9101,"),
+            [("10.0.0.1", 9100), ("worker-2", 9101)],
+        )
+        self.assertEqual(parse_worker_addresses(None), [])
+
+
+class TestDistributedEvaluation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.universe = SyntheticUniverse.generate(30, markets_per_token=3, spread=0.2)
+        self.pairs = []
+        self.markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+        for pair in self.universe.pairs:
+            market = UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+            token_address = pair.token1 if pair.token0 == WETH_ADDRESS else pair.token0
+            self.markets_by_token.setdefault(token_address, []).append(market)
+            self.pairs.append(market)
+        self.reserves = DoubleBufferedReserves(self.pairs)
+
+    def _next_block(self, block_number: int, quarantined=frozenset()):
+        self.universe.advance(changed_fraction=0.3)
+        snapshot = self.reserves.publish(
+            block_number,
+            [[pair.reserve0, pair.reserve1] for pair in self.universe.pairs],
+        )
+        with pinned(snapshot):
+            expected = _summary(
+                evaluate_markets(self.markets_by_token, quarantined=quarantined)
+            )
+        return snapshot, expected
+
+    def test_worker_processes_match_single_process(self):
+        processes, addresses = zip(*(start_worker_process() for _ in range(2)))
+        evaluator = DistributedEvaluator(
+            self.pairs, self.markets_by_token, list(addresses)
+        ).connect()
+        try:
+            for block_number in range(1, 5):
+                snapshot, expected = self._next_block(block_number)
+                self.assertTrue(expected)
+                self.assertEqual(
+                    _summary(evaluator.evaluate(block_number, snapshot)), expected
+                )
+        finally:
+            evaluator.close()
+            for process in processes:
+                process.terminate()
+                process.join()
+
+        first, *rest = evaluator.stats
+        # after the keyframe only the changed pairs are sent
+        self.assertTrue(all(stats.bytes_sent < first.bytes_sent for stats in rest))
+        self.assertTrue(all(stats.overhead >= 0 for stats in evaluator.stats))
+
+    def test_lost_worker_shard_evaluated_locally(self):
+        workers = [EvaluationWorker(port=0).start() for _ in range(2)]
+        evaluator = DistributedEvaluator(
+            self.pairs,
+            self.markets_by_token,
+            [worker.address for worker in workers],
+            timeout=5,
+        ).connect()
+        try:
+            snapshot, expected = self._next_block(1)
+            self.assertEqual(_summary(evaluator.evaluate(1, snapshot)), expected)
+
+            workers[1].stop()
+            snapshot, expected = self._next_block(2)
+            with self.assertLogs("simple_arbitrage.runtime.distributed", "WARNING"):
+                self.assertEqual(_summary(evaluator.evaluate(2, snapshot)), expected)
+
+            snapshot, expected = self._next_block(3)
+            self.assertEqual(_summary(evaluator.evaluate(3, snapshot)), expected)
+        finally:
+            evaluator.close()
+            workers[0].stop()
+
+    def test_unreachable_worker_shard_evaluated_locally(self):
+        with socket.create_server(("127.0.0.1", 0)) as unused:
+            address = unused.getsockname()[:2]
+        with self.assertLogs("simple_arbitrage.runtime.distributed", "WARNING"):
+            evaluator = DistributedEvaluator(
+                self.pairs, self.markets_by_token, [address]
+            ).connect()
+
+        snapshot, expected = self._next_block(1)
+        self.assertEqual(_summary(evaluator.evaluate(1, snapshot)), expected)
+        self.assertEqual(evaluator.stats[-1].bytes_sent, 0)
+
+    def test_dropped_worker_reconnects_after_the_backoff(self):
+        with socket.create_server(("127.0.0.1", 0)) as unused:
+            address = unused.getsockname()[:2]
+        with self.assertLogs("simple_arbitrage.runtime.distributed", "WARNING"):
+            evaluator = DistributedEvaluator(
+                self.pairs, self.markets_by_token, [address], reconnect_backoff=0
+            ).connect()
+        worker = EvaluationWorker(*address).start()
+        try:
+            snapshot, expected = self._next_block(1)
+            self.assertEqual(_summary(evaluator.evaluate(1, snapshot)), expected)
+            # the shard and a keyframe went to the worker again
+            self.assertGreater(evaluator.stats[-1].bytes_sent, 0)
+        finally:
+            evaluator.close()
+            worker.stop()
+
+    def test_quarantined_skipped_by_workers_and_leader(self):
+        workers = [EvaluationWorker(port=0).start() for _ in range(2)]
+        with socket.create_server(("127.0.0.1", 0)) as unused:
+            unreachable = unused.getsockname()[:2]
+        with self.assertLogs("simple_arbitrage.runtime.distributed", "WARNING"):
+            evaluator = DistributedEvaluator(
+                self.pairs,
+                self.markets_by_token,
+                [worker.address for worker in workers] + [unreachable],
+            ).connect()
+        try:
+            snapshot, expected = self._next_block(1)
+            quarantined = frozenset(token for _, _, token, _, _ in expected[:3])
+            expected = [entry for entry in expected if entry[2] not in quarantined]
+            self.assertEqual(
+                _summary(evaluator.evaluate(1, snapshot, quarantined=quarantined)),
+                expected,
+            )
+        finally:
+            evaluator.close()
+            for worker in workers:
+                worker.stop()
+
+    @mock.patch.object(distributed, "EXPIRY_GRACE", 5.0)
+    def test_expired_workers_abandon_the_block(self):
+        workers = [EvaluationWorker(port=0).start() for _ in range(2)]
+        evaluator = DistributedEvaluator(
+            self.pairs, self.markets_by_token, [worker.address for worker in workers]
+        ).connect()
+        scheduler = BlockScheduler(0)
+        try:
+            snapshot, _ = self._next_block(1)
+            with self.assertRaises(StaleBlockError):
+                evaluator.evaluate(1, snapshot, scheduler.start_block(1))
+            self.assertEqual(scheduler.cutoffs[("evaluate_markets", DEADLINE)], 1)
+
+            # the workers stay connected and in step for the next block
+            snapshot, expected = self._next_block(2)
+            self.assertEqual(_summary(evaluator.evaluate(2, snapshot)), expected)
+            self.assertGreater(evaluator.stats[-1].bytes_sent, 0)
+        finally:
+            evaluator.close()
+            for worker in workers:
+                worker.stop()
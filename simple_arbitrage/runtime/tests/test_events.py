@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+import threading
+import unittest
+
+from simple_arbitrage.runtime.events import EventLogger, format_event
+
+
+class TestEventLogger(unittest.TestCase):
+    def tearDown(self) -> None:
+        if hasattr(self, "events"):
+            self.events.close()
+
+    def test_records_written_as_json_lines(self):
+        output = io.StringIO()
+        self.events = EventLogger(output)
+
+        self.events.emit("bundle_calls", token="0xa", targets=["0x1", "0x2"])
+        self.events.emit("bundle_built", token="0xa", gas=300000)
+        self.events.flush()
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(
+            [record["event"] for record in records], ["bundle_calls", "bundle_built"]
+        )
+        self.assertEqual(records[0]["targets"], ["0x1", "0x2"])
+        self.assertEqual(records[1]["gas"], 300000)
+
+    def test_formatting_happens_off_the_calling_thread(self):
+        formatted_on = []
+
+        class Field:
+            def __str__(self):
+                formatted_on.append(threading.current_thread().name)
+                return "field"
+
+        output = io.StringIO()
+        self.events = EventLogger(output)
+
+        self.events.emit("candidate", value=Field())
+        self.events.flush()
+
+        self.assertEqual(formatted_on, ["events"])
+        self.assertIn('"value":"field"', output.getvalue())
+
+    def test_high_frequency_events_sampled(self):
+        output = io.StringIO()
+        self.events = EventLogger(output, sample_every={"crossed_markets": 10})
+
+        for index in range(25):
+            self.events.emit("crossed_markets", token=index, count=1)
+        self.events.flush()
+
+        tokens = [json.loads(line)["token"] for line in output.getvalue().splitlines()]
+        self.assertEqual(tokens, [0, 10, 20])
+        self.assertEqual(self.events.sampled_out, 22)
+
+    def test_nothing_queued_when_info_disabled(self):
+        record_logger = logging.getLogger("test_events.disabled")
+        record_logger.setLevel(logging.WARNING)
+        self.events = EventLogger(record_logger=record_logger)
+
+        self.events.emit("bundle_built", token="0xa")
+
+        self.assertEqual(self.events.emitted, 0)
+
+    def test_compact_text_format(self):
+        self.assertEqual(
+            format_event("candidate", {"token": "0xa", "targets": ["0x1", "0x2"]}),
+            "candidate token=0xa targets=[0x1,0x2]",
+        )
@@ -0,0 +1,182 @@
+import unittest
+
+from eth_account import Account
+from flashbots import flashbot
+from hexbytes import HexBytes
+from web3 import Web3
+
+from simple_arbitrage.arbitrage.arbitrage import Arbitrage, evaluate_markets
+from simple_arbitrage.arbitrage.price_cache import PRICE_CACHE
+from simple_arbitrage.arbitrage.transaction_context import TransactionContextProvider
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.relay import FakeRelay
+from simple_arbitrage.fakes.universe import SyntheticUniverse, synthetic_address
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    get_uniswap_markets_by_token,
+)
+from simple_arbitrage.markets.reserve_snapshots import pinned
+from simple_arbitrage.runtime.mempool import (
+    Backrunner,
+    MempoolPredictor,
+    PendingTransactionFeed,
+)
+from simple_arbitrage.runtime.scheduler import BlockScheduler
+from simple_arbitrage.runtime.searcher import Searcher
+from simple_arbitrage.utils.abi import BUNDLE_EXECUTOR_ABI
+from simple_arbitrage.utils.addresses import (
+    CRO_FACTORY_ADDRESS,
+    FACTORY_ADDRESSES,
+    UNISWAP_FACTORY_ADDRESS,
+    WETH_ADDRESS,
+)
+
+EXECUTOR_KEY = "0x" + "11" * 32
+RELAY_SIGNING_KEY = "0x" + "22" * 32
+
+
+def _summary(crossed_markets) -> list[tuple]:
+    return [
+        (
+            crossed_market.profit,
+            crossed_market.token_address,
+            crossed_market.buy_from_market.market_address,
+            crossed_market.sell_to_market.market_address,
+        )
+        for crossed_market in crossed_markets
+    ]
+
+
+class TestMempoolPredictor(unittest.TestCase):
+    def setUp(self) -> None:
+        # the first market of every token is a Uniswap pair the router swaps through
+        self.universe = SyntheticUniverse.generate(
+            8,
+            markets_per_token=2,
+            factory_addresses=[UNISWAP_FACTORY_ADDRESS, CRO_FACTORY_ADDRESS],
+        )
+        self.node = FakeNode(self.universe).start()
+        provider = Web3.HTTPProvider(self.node.url)
+        self.markets = get_uniswap_markets_by_token(provider, FACTORY_ADDRESSES)
+        self.predictor = MempoolPredictor(
+            PendingTransactionFeed(provider), self.markets, predict_interval=0
+        )
+        self.searcher = Searcher(
+            provider, self.markets, None, 80, mempool=self.predictor
+        )
+        self.scheduler = BlockScheduler()
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    def _process(self, block_number: int):
+        deadline = self.scheduler.start_block(block_number)
+        snapshot = self.searcher.fetch_reserves(deadline)
+        return snapshot, self.searcher.evaluate(deadline, snapshot)
+
+    def _swap(self, pair_index: int, weth_in: bool, share: float, **kwargs) -> str:
+        pair = self.universe.pairs[pair_index]
+        token_in = (
+            WETH_ADDRESS
+            if weth_in
+            else (pair.token1 if pair.token0 == WETH_ADDRESS else pair.token0)
+        )
+        reserve_in = pair.reserve0 if token_in == pair.token0 else pair.reserve1
+        return self.node.send_swap(
+            pair.address, token_in, int(reserve_in * share), **kwargs
+        )
+
+    def test_prediction_matches_the_mined_block(self):
+        self._process(self.universe.block_number)
+        self._swap(0, weth_in=True, share=0.2)
+        self._swap(2, weth_in=False, share=0.2)
+        self._swap(5, weth_in=True, share=0.2, via_router=False)
+        self._swap(6, weth_in=True, share=0.2, min_amount_out=2**200)
+
+        prediction = self.predictor.poll()
+        self.assertEqual(prediction.swaps, 3)
+
+        block_number = self.node.mine(changed_fraction=0)
+        deadline = self.scheduler.start_block(block_number)
+        snapshot = self.searcher.fetch_reserves(deadline)
+        for pair in self.markets.all_market_pairs:
+            self.assertEqual(
+                prediction.snapshot.balances[pair], snapshot.balances[pair]
+            )
+        with pinned(snapshot):
+            expected = _summary(evaluate_markets(self.markets.markets_by_token))
+
+        confirmed = self.predictor.confirmed(snapshot, self.markets.markets_by_token)
+        self.assertEqual(len(confirmed), 3)
+        self.assertTrue(any(confirmed.values()))
+        self.assertEqual(_summary(self.searcher.evaluate(deadline, snapshot)), expected)
+
+    def test_included_swaps_dropped(self):
+        self._process(self.universe.block_number)
+        self._swap(0, weth_in=True, share=0.1)
+        self.assertEqual(self.predictor.poll().swaps, 1)
+
+        self._process(self.node.mine(changed_fraction=0))
+
+        self.assertEqual(self.predictor.poll().swaps, 0)
+
+    def test_predictions_rate_limited(self):
+        self._process(self.universe.block_number)
+        self.predictor.predict_interval = 60
+        self._swap(0, weth_in=True, share=0.1)
+        self.assertEqual(self.predictor.poll().swaps, 1)
+
+        self._swap(2, weth_in=True, share=0.1)
+
+        self.assertEqual(self.predictor.poll().swaps, 1)
+        self.predictor.predict_interval = 0
+        self.assertEqual(self.predictor.poll().swaps, 2)
+
+    def test_predictions_priced_apart_from_the_shared_cache(self):
+        self._process(self.universe.block_number)
+        self._swap(0, weth_in=True, share=0.1)
+        shared = (PRICE_CACHE.hits, PRICE_CACHE.misses)
+
+        self.assertEqual(self.predictor.poll().swaps, 1)
+
+        self.assertEqual((PRICE_CACHE.hits, PRICE_CACHE.misses), shared)
+        self.assertGreater(self.predictor.price_cache.misses, 0)
+
+    def test_backrun_bundles_lead_with_the_pending_swaps(self):
+        relay = FakeRelay().start()
+        self.addCleanup(relay.stop)
+        w3 = Web3(Web3.HTTPProvider(self.node.url))
+        flashbot(w3, Account.from_key(RELAY_SIGNING_KEY), relay.url)
+        executor_wallet = Account.from_key(EXECUTOR_KEY)
+        arbitrage = Arbitrage(
+            executor_wallet,
+            w3.flashbots,
+            w3.eth.contract(
+                synthetic_address("bundle_executor"), abi=BUNDLE_EXECUTOR_ABI
+            ),
+        )
+        self.predictor.backrunner = Backrunner(
+            arbitrage, 80, TransactionContextProvider(w3, executor_wallet.address)
+        )
+        block_number = self.universe.block_number
+        self._process(block_number)
+        transaction_hash = self._swap(0, weth_in=True, share=0.2)
+        self._swap(2, weth_in=True, share=0.2)
+
+        prediction = self.predictor.poll()
+        self.predictor.poll()
+
+        pair = self.universe.pairs[0]
+        token_address = pair.token1 if pair.token0 == WETH_ADDRESS else pair.token0
+        self.assertIsNotNone(prediction.crossed_markets[token_address])
+        bundles = relay.bundles_by_block[block_number + 1]
+        self.assertGreaterEqual(len(bundles), 1)
+        # one bundle per predicted crossed market
+        self.assertEqual(len(bundles), len(set(map(tuple, bundles))))
+        leading = [bundle for bundle in bundles if len(bundle) == 2]
+        self.assertTrue(
+            any(
+                Web3.keccak(HexBytes(bundle[0])).hex() == transaction_hash
+                for bundle in leading
+            ),
+            bundles,
+        )
@@ -0,0 +1,51 @@
+import unittest
+import urllib.request
+
+from simple_arbitrage.runtime.metrics import MetricsRegistry, MetricsServer
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = MetricsRegistry()
+
+    def test_counter_and_gauge_render(self):
+        counter = self.registry.counter("calls_total", "Calls", ["method"])
+        gauge = self.registry.gauge("head", "Head")
+        counter.inc(method="eth_call")
+        counter.inc(2, method="eth_call")
+        gauge.set(17)
+
+        text = self.registry.render()
+
+        self.assertIn("# TYPE calls_total counter", text)
+        self.assertIn('calls_total{method="eth_call"} 3', text)
+        self.assertIn("head 17", text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("seconds", "Seconds", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        text = self.registry.render()
+
+        self.assertIn('seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("seconds_count 3", text)
+        self.assertEqual(histogram.count(), 3)
+
+    def test_duplicate_name_rejected(self):
+        self.registry.counter("calls_total", "Calls")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("calls_total", "Calls")
+
+    def test_server_serves_metrics(self):
+        self.registry.counter("calls_total", "Calls").inc()
+        server = MetricsServer(self.registry).start()
+        try:
+            with urllib.request.urlopen(server.url) as response:
+                body = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn("calls_total 1", body)
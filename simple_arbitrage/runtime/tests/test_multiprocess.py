@@ -0,0 +1,201 @@
+import time
+import unittest
+
+from web3 import Web3
+
+from simple_arbitrage.arbitrage.arbitrage import evaluate_markets
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.markets.market_loaders.uniswappy_loader import (
+    fetch_reserves,
+    get_uniswap_markets_by_token,
+)
+from simple_arbitrage.markets.reserve_snapshots import DoubleBufferedReserves, pinned
+from simple_arbitrage.markets.types.uniswappy_v2_eth_pair import UniswappyV2EthPair
+from simple_arbitrage.runtime.multiprocess import (
+    EvaluatorPool,
+    MultiprocessSearcher,
+    ReserveFetcher,
+    SharedReserveTable,
+    partition_tokens,
+)
+from simple_arbitrage.runtime.rpc_accounting import RpcAccounting
+from simple_arbitrage.runtime.scheduler import BlockScheduler
+from simple_arbitrage.utils.addresses import FACTORY_ADDRESSES, WETH_ADDRESS
+from simple_arbitrage.utils.util import ETHER
+
+TOKEN_ADDRESS = "0x000000000000000000000000000000000000000a"
+
+
+def _summary(crossed_markets) -> list[tuple]:
+    return [
+        (
+            crossed_market.profit,
+            crossed_market.volume,
+            crossed_market.token_address,
+            crossed_market.buy_from_market.market_address,
+            crossed_market.sell_to_market.market_address,
+        )
+        for crossed_market in crossed_markets
+    ]
+
+
+class TestSharedReserveTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pairs = [
+            UniswappyV2EthPair(f"0x{index:040x}", [TOKEN_ADDRESS, WETH_ADDRESS], "")
+            for index in range(3)
+        ]
+        self.table = SharedReserveTable(len(self.pairs), 2)
+
+    def tearDown(self) -> None:
+        self.table.close()
+
+    def test_reserves_round_trip_exactly(self):
+        reserves = [[2**111 + 7, 1], [ETHER, 2**64], [0, 2**64 - 1]]
+        self.table.write(1, 15000001, reserves)
+
+        self.assertEqual(self.table.read(1), reserves)
+        self.assertEqual(self.table.block_number(1), 15000001)
+        self.assertEqual(self.table.block_number(0), 0)
+
+        attached = SharedReserveTable.attach(self.table.spec)
+        self.assertEqual(attached.reserve(1, 0), (2**111 + 7, 1))
+        attached.close()
+
+    def test_snapshot_reads_its_bank(self):
+        self.table.write(0, 1, [[1, 2], [3, 4], [5, 6]])
+        self.table.write(1, 2, [[10, 20], [30, 40], [50, 60]])
+        snapshot = self.table.snapshot(
+            1, {pair: index for index, pair in enumerate(self.pairs)}
+        )
+        stranger = UniswappyV2EthPair("0x" + "ff" * 20, self.pairs[0].tokens, "")
+
+        self.assertEqual(snapshot.block_number, 2)
+        self.assertEqual(snapshot.bank, 1)
+        with pinned(snapshot):
+            self.assertEqual(self.pairs[1].get_balance(TOKEN_ADDRESS), 30)
+        self.assertIsNone(snapshot.balances.get(stranger))
+        self.assertEqual(len(snapshot.balances), 3)
+
+
+class TestMultiprocessEvaluation(unittest.TestCase):
+    def setUp(self) -> None:
+        universe = SyntheticUniverse.generate(30, markets_per_token=3, spread=0.2)
+        self.pairs = []
+        self.markets_by_token: dict[str, list[UniswappyV2EthPair]] = {}
+        for pair in universe.pairs:
+            market = UniswappyV2EthPair(pair.address, [pair.token0, pair.token1], "")
+            token_address = pair.token1 if pair.token0 == WETH_ADDRESS else pair.token0
+            self.markets_by_token.setdefault(token_address, []).append(market)
+            self.pairs.append(market)
+        self.reserves = [[pair.reserve0, pair.reserve1] for pair in universe.pairs]
+
+    def test_partition_covers_every_token_evenly(self):
+        self.markets_by_token[TOKEN_ADDRESS] = self.pairs[:9]
+
+        partitions = partition_tokens(self.markets_by_token, 3)
+
+        tokens = [token for partition in partitions for token in partition]
+        self.assertCountEqual(tokens, self.markets_by_token)
+        costs = sorted(
+            sum(len(markets) ** 2 for markets in partition.values())
+            for partition in partitions
+        )
+        self.assertLessEqual(costs[-1] - costs[0], 81)
+
+    def test_evaluators_match_single_process(self):
+        snapshot = DoubleBufferedReserves(self.pairs).publish(1, self.reserves)
+        with pinned(snapshot):
+            expected = _summary(evaluate_markets(self.markets_by_token))
+        self.assertTrue(expected)
+
+        table = SharedReserveTable(len(self.pairs), 1)
+        table.write(0, 1, self.reserves)
+        pool = EvaluatorPool(table, self.pairs, self.markets_by_token, 2).start()
+        try:
+            self.assertEqual(_summary(pool.evaluate(1, 0)), expected)
+        finally:
+            pool.close()
+            table.close()
+
+    def test_evaluators_stop_at_the_block_deadline(self):
+        table = SharedReserveTable(len(self.pairs), 1)
+        table.write(0, 1, self.reserves)
+        pool = EvaluatorPool(table, self.pairs, self.markets_by_token, 2).start()
+        try:
+            self.assertIsNone(pool.evaluate(1, 0, expires_at=time.time() - 1))
+            # the replies of the abandoned block do not leak into the next one
+            self.assertTrue(pool.evaluate(1, 0, expires_at=time.time() + 60))
+        finally:
+            pool.close()
+            table.close()
+
+
+class TestMultiprocessSearcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.universe = SyntheticUniverse.generate(10, markets_per_token=2)
+        self.node = FakeNode(self.universe).start()
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    def test_blocks_fetched_into_rotating_banks(self):
+        provider = Web3.HTTPProvider(self.node.url)
+        markets = get_uniswap_markets_by_token(provider, FACTORY_ADDRESSES)
+        searcher = MultiprocessSearcher(
+            self.node.url, markets, None, 80, evaluators=2, banks=2
+        ).start()
+        scheduler = BlockScheduler()
+        try:
+            banks = []
+            for _ in range(3):
+                block_number = self.node.mine(changed_fraction=0.5)
+                deadline = scheduler.start_block(block_number)
+                snapshot = searcher.fetch_reserves(deadline)
+                banks.append(snapshot.bank)
+
+                self.assertEqual(snapshot.block_number, block_number)
+                self.assertEqual(
+                    searcher.table.read(snapshot.bank),
+                    [
+                        reserve[:2]
+                        for reserve in fetch_reserves(
+                            provider, markets.all_market_pairs
+                        )
+                    ],
+                )
+                with pinned(snapshot):
+                    expected = _summary(evaluate_markets(markets.markets_by_token))
+                self.assertEqual(
+                    _summary(searcher.evaluate(deadline, snapshot)), expected
+                )
+            self.assertEqual(banks, [0, 1, 0])
+        finally:
+            searcher.close()
+
+    def test_fetcher_requests_accounted_in_the_coordinator(self):
+        markets = get_uniswap_markets_by_token(
+            Web3.HTTPProvider(self.node.url), FACTORY_ADDRESSES
+        )
+        pairs = markets.all_market_pairs
+        table = SharedReserveTable(len(pairs), 1)
+        accounting = RpcAccounting()
+        fetcher = ReserveFetcher(table, self.node.url, pairs, accounting).start()
+        try:
+            accounting.start_block(1)
+            fetcher.fetch(1, 0)
+        finally:
+            fetcher.close()
+            table.close()
+
+        stats = accounting.totals[
+            ("eth_call", "simple_arbitrage.markets.market_loaders.uniswappy_loader")
+        ]
+        self.assertGreaterEqual(stats.calls, 1)
+        self.assertGreater(stats.response_bytes, 0)
+        # replayed into the block being worked on as well
+        self.assertEqual(
+            accounting.rollups[-1].total.calls,
+            sum(stats.calls for stats in accounting.totals.values()),
+        )
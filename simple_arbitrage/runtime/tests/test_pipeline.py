@@ -0,0 +1,118 @@
+import threading
+import time
+import unittest
+
+from simple_arbitrage.markets.reserve_snapshots import ReserveSnapshot
+from simple_arbitrage.runtime.pipeline import BlockPipeline
+from simple_arbitrage.runtime.scheduler import BlockScheduler
+
+
+class FakeSearcher:
+    """records when each phase of each block ran"""
+
+    def __init__(self, fetch_seconds: float, execute_seconds: float):
+        self.fetch_seconds = fetch_seconds
+        self.execute_seconds = execute_seconds
+        self.spans: dict[tuple[str, int], tuple[float, float]] = {}
+        self.executed_blocks: list[int] = []
+        self.executed = threading.Event()
+
+    def _record(self, phase: str, block_number: int, seconds: float):
+        start = time.monotonic()
+        time.sleep(seconds)
+        self.spans[(phase, block_number)] = (start, time.monotonic())
+
+    def fetch_reserves(self, deadline):
+        deadline.check("update_reserves")
+        self._record("fetch", deadline.block_number, self.fetch_seconds)
+        return ReserveSnapshot(deadline.block_number, {})
+
+    def evaluate(self, deadline, snapshot):
+        self._record("evaluate", deadline.block_number, 0)
+        return ["crossed market"]
+
+    def execute(self, deadline, snapshot, best_crossed_markets):
+        deadline.check("take_crossed_markets")
+        self._record("execute", deadline.block_number, self.execute_seconds)
+        deadline.check("submit_bundle")
+        self.executed_blocks.append(deadline.block_number)
+        if deadline.block_number == 2:
+            self.executed.set()
+
+
+class TestBlockPipeline(unittest.TestCase):
+    def test_next_fetch_overlaps_previous_execute(self):
+        searcher = FakeSearcher(fetch_seconds=0.05, execute_seconds=0.3)
+        scheduler = BlockScheduler()
+        pipeline = BlockPipeline(searcher).start()
+
+        pipeline.submit(scheduler.start_block(1))
+        time.sleep(0.1)
+        pipeline.submit(scheduler.start_block(2))
+
+        self.assertTrue(searcher.executed.wait(timeout=3.0))
+        pipeline.stop(timeout=1.0)
+
+        fetch_2_start = searcher.spans[("fetch", 2)][0]
+        execute_1_start, execute_1_end = searcher.spans[("execute", 1)]
+        self.assertGreater(fetch_2_start, execute_1_start)
+        self.assertLess(fetch_2_start, execute_1_end)
+
+        stats = {stats.name: stats for stats in pipeline.stats()}
+        self.assertEqual(stats["execute"].items, 2)
+        self.assertGreater(stats["execute"].utilization, stats["fetch"].utilization)
+
+    def test_pools_followed_in_place_refused(self):
+        searcher = FakeSearcher(fetch_seconds=0.0, execute_seconds=0.0)
+        searcher.pool_follower = object()
+
+        with self.assertRaises(ValueError):
+            BlockPipeline(searcher)
+
+    def test_stale_head_dropped(self):
+        searcher = FakeSearcher(fetch_seconds=0.0, execute_seconds=0.0)
+        scheduler = BlockScheduler()
+        pipeline = BlockPipeline(searcher).start()
+
+        stale_deadline = scheduler.start_block(1)
+        scheduler.observe_head(2)
+        pipeline.submit(stale_deadline)
+        pipeline.submit(scheduler.start_block(2))
+
+        self.assertTrue(searcher.executed.wait(timeout=3.0))
+        pipeline.stop(timeout=1.0)
+
+        self.assertNotIn(("execute", 1), searcher.spans)
+        # replaced in the queue before the fetch stage took it, or cut off by the stage
+        self.assertEqual(
+            pipeline.dropped_heads + scheduler.cutoffs[("update_reserves", "new_head")],
+            1,
+        )
+
+    def test_new_head_does_not_abandon_execution(self):
+        searcher = FakeSearcher(fetch_seconds=0.0, execute_seconds=0.3)
+        scheduler = BlockScheduler()
+        pipeline = BlockPipeline(searcher).start()
+
+        pipeline.submit(scheduler.start_block(1))
+        time.sleep(0.1)
+        scheduler.observe_head(2)
+        pipeline.submit(scheduler.start_block(2))
+
+        self.assertTrue(searcher.executed.wait(timeout=3.0))
+        pipeline.stop(timeout=1.0)
+
+        self.assertEqual(searcher.executed_blocks, [1, 2])
+        self.assertEqual(scheduler.cutoffs, {})
+
+    def test_execution_keeps_the_block_budget(self):
+        searcher = FakeSearcher(fetch_seconds=0.0, execute_seconds=0.3)
+        scheduler = BlockScheduler(budget=0.2)
+        pipeline = BlockPipeline(searcher).start()
+
+        pipeline.submit(scheduler.start_block(1))
+        time.sleep(0.5)
+        pipeline.stop(timeout=1.0)
+
+        self.assertEqual(searcher.executed_blocks, [])
+        self.assertEqual(scheduler.cutoffs, {("submit_bundle", "deadline"): 1})
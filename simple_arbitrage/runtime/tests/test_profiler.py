@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+import unittest
+
+from simple_arbitrage.runtime.profiler import SlowBlockProfiler
+
+
+def _slow_evaluation(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestSlowBlockProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = SlowBlockProfiler(
+            self.directory.name, threshold=0.05, interval=0.001
+        ).start()
+
+    def tearDown(self) -> None:
+        self.profiler.stop()
+        self.directory.cleanup()
+
+    def test_slow_block_profile_written(self):
+        with self.profiler.block(100, 42):
+            _slow_evaluation(0.1)
+
+        self.assertEqual(len(self.profiler.dumps), 1)
+        path = self.profiler.dumps[0]
+        self.assertTrue(os.path.basename(path).startswith("block-100-42pairs-"))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any("_slow_evaluation" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+
+    def test_fast_block_not_written(self):
+        with self.profiler.block(100, 42):
+            pass
+
+        self.assertEqual(self.profiler.dumps, [])
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_relative_threshold_waits_for_history(self):
+        profiler = SlowBlockProfiler(self.directory.name)
+        for block_number in range(8):
+            profiler.start_block(block_number, 1)
+            self.assertIsNone(profiler.finish_block(block_number))
+
+        self.assertIsNotNone(profiler._slow_threshold())
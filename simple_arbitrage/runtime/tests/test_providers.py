@@ -0,0 +1,139 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import unittest
+
+import websockets
+from web3 import Web3
+
+from simple_arbitrage.fakes.node import FakeNode
+from simple_arbitrage.fakes.universe import SyntheticUniverse
+from simple_arbitrage.runtime.providers import ThreadLocalProvider
+
+ESTIMATE_SECONDS = 0.3
+# websockets 9, which web3 5 requires, passes loop= to asyncio and fails from 3.10 on
+WEBSOCKETS_UNSUPPORTED = (
+    sys.version_info >= (3, 10) and int(websockets.__version__.split(".")[0]) < 10
+)
+TRANSACTION = {
+    "from": "0x0000000000000000000000000000000000000001",
+    "to": "0x0000000000000000000000000000000000000002",
+}
+
+
+class SlowWebsocketNode(threading.Thread):
+    """answers eth_estimateGas after ESTIMATE_SECONDS, one request at a time per
+    connection, like a node working through an estimate"""
+
+    def __init__(self):
+        super().__init__(name="slow-websocket-node", daemon=True)
+        self.loop = asyncio.new_event_loop()
+        self.connections = 0
+        self._started = threading.Event()
+
+    def start(self) -> "SlowWebsocketNode":
+        super().start()
+        self._started.wait()
+        return self
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(
+            websockets.serve(self._serve, "127.0.0.1", 0)
+        )
+        self.url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        self._started.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _serve(self, websocket, path):
+        self.connections += 1
+        async for message in websocket:
+            request = json.loads(message)
+            if request["method"] == "eth_estimateGas":
+                await asyncio.sleep(ESTIMATE_SECONDS)
+                result = hex(21000)
+            else:
+                result = hex(1)
+            await websocket.send(
+                json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result})
+            )
+
+
+def _estimate_concurrently(w3: Web3, count: int) -> list:
+    """the estimates, or the exceptions they raised, in thread order"""
+    outcomes: list = [None] * count
+
+    def estimate(index: int):
+        try:
+            outcomes[index] = w3.eth.estimate_gas(TRANSACTION)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=estimate, args=[i]) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+class TestThreadLocalProvider(unittest.TestCase):
+    def test_provider_per_thread(self):
+        node = FakeNode(SyntheticUniverse.generate(1)).start()
+        self.addCleanup(node.stop)
+        providers = []
+
+        def factory():
+            providers.append(Web3.HTTPProvider(node.url))
+            return providers[-1]
+
+        w3 = Web3(ThreadLocalProvider(factory))
+        block_number = w3.eth.block_number
+        blocks: list = []
+        thread = threading.Thread(target=lambda: blocks.append(w3.eth.block_number))
+        thread.start()
+        thread.join()
+        w3.eth.block_number
+
+        self.assertEqual(blocks, [block_number])
+        self.assertEqual(len(providers), 2)
+
+
+@unittest.skipIf(WEBSOCKETS_UNSUPPORTED, "websockets 9 needs Python < 3.10")
+class TestThreadLocalWebsocketProvider(unittest.TestCase):
+    def setUp(self) -> None:
+        self.node = SlowWebsocketNode().start()
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    def test_shared_websocket_fails_concurrent_estimates(self):
+        w3 = Web3(Web3.WebsocketProvider(self.node.url))
+        w3.eth.estimate_gas(TRANSACTION)
+
+        outcomes = _estimate_concurrently(w3, 2)
+
+        self.assertTrue(
+            any(
+                isinstance(outcome, RuntimeError) and "recv" in str(outcome)
+                for outcome in outcomes
+            ),
+            outcomes,
+        )
+
+    def test_concurrent_estimates_through_one_provider(self):
+        w3 = Web3(ThreadLocalProvider(lambda: Web3.WebsocketProvider(self.node.url)))
+        w3.eth.estimate_gas(TRANSACTION)
+
+        start = time.monotonic()
+        outcomes = _estimate_concurrently(w3, 2)
+
+        self.assertEqual(outcomes, [21000, 21000])
+        # both waited on the node at once, over a connection of their own
+        self.assertLess(time.monotonic() - start, 2 * ESTIMATE_SECONDS)
+        self.assertEqual(self.node.connections, 3)
@@ -0,0 +1,85 @@
+import unittest
+
+from eth_account import Account
+from web3 import Web3
+from web3.types import RPCEndpoint
+
+from simple_arbitrage.fakes.json_rpc_server import JsonRpcError, JsonRpcServer
+from simple_arbitrage.runtime.metrics import RPC_REQUESTS
+from simple_arbitrage.runtime.rpc_accounting import (
+    RpcAccounting,
+    flashbot,
+    instrument_provider,
+)
+
+
+class TestRpcAccounting(unittest.TestCase):
+    def setUp(self) -> None:
+        self.node = JsonRpcServer().start()
+        self.node.register("eth_blockNumber", lambda params: "0x10")
+        self.node.register("eth_chainId", self._fail)
+        self.accounting = RpcAccounting()
+        self.w3 = Web3(
+            instrument_provider(Web3.HTTPProvider(self.node.url), self.accounting)
+        )
+
+    def tearDown(self) -> None:
+        self.node.stop()
+
+    @staticmethod
+    def _fail(params):
+        raise JsonRpcError(-32000, "unavailable")
+
+    def test_records_method_caller_and_sizes(self):
+        self.w3.eth.block_number
+
+        stats = self.accounting.totals[("eth_blockNumber", __name__)]
+        self.assertEqual(stats.calls, 1)
+        self.assertEqual(stats.errors, 0)
+        self.assertGreater(stats.request_bytes, 0)
+        self.assertGreater(stats.response_bytes, 0)
+        self.assertGreater(stats.seconds, 0)
+        self.assertGreaterEqual(
+            RPC_REQUESTS.value(method="eth_blockNumber", caller=__name__), 1
+        )
+
+    def test_error_responses_counted(self):
+        with self.assertRaises(ValueError):
+            self.w3.eth.chain_id
+
+        self.assertEqual(self.accounting.totals[("eth_chainId", __name__)].errors, 1)
+
+    def test_rollup_per_block(self):
+        self.assertIsNone(self.accounting.start_block(100))
+        self.w3.eth.block_number
+        self.w3.eth.block_number
+
+        finished = self.accounting.start_block(101)
+        self.w3.eth.block_number
+
+        self.assertEqual(finished.block_number, 100)
+        self.assertEqual(finished.total.calls, 2)
+        self.assertEqual(self.accounting.rollups[-1].total.calls, 1)
+        self.assertIn("eth_blockNumber x2", finished.summary())
+
+    def test_every_web3_on_the_provider_covered(self):
+        Web3(self.w3.provider).eth.block_number
+
+        self.assertEqual(self.accounting.totals[("eth_blockNumber", __name__)].calls, 1)
+
+    def test_relay_requests_counted_once(self):
+        relay = JsonRpcServer().start()
+        self.addCleanup(relay.stop)
+        relay.register("eth_callBundle", lambda params: {"results": []})
+        flashbot(
+            self.w3, Account.from_key("0x" + "22" * 32), relay.url, self.accounting
+        )
+
+        self.w3.manager.request_blocking(RPCEndpoint("eth_callBundle"), [{}])
+        self.w3.eth.block_number
+
+        stats = self.accounting.totals[("eth_callBundle", __name__)]
+        self.assertEqual(stats.calls, 1)
+        self.assertGreater(stats.request_bytes, 0)
+        self.assertGreater(stats.response_bytes, 0)
+        self.assertEqual(self.accounting.totals[("eth_blockNumber", __name__)].calls, 1)
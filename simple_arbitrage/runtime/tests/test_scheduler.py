@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from simple_arbitrage.runtime.scheduler import (
+    BlockScheduler,
+    HeadWatcher,
+    StaleBlockError,
+)
+
+
+class TestBlockScheduler(unittest.TestCase):
+    def test_newer_head_cancels_current_block(self):
+        scheduler = BlockScheduler()
+        deadline = scheduler.start_block(10)
+        deadline.check("update_reserves")
+
+        scheduler.observe_head(11)
+
+        self.assertTrue(deadline.cancel_event.is_set())
+        with self.assertRaises(StaleBlockError) as context:
+            deadline.check("evaluate_markets")
+        self.assertEqual(context.exception.reason, "new_head")
+        self.assertEqual(scheduler.cutoffs, {("evaluate_markets", "new_head"): 1})
+
+    def test_old_head_does_not_cancel(self):
+        scheduler = BlockScheduler()
+        scheduler.observe_head(10)
+        deadline = scheduler.start_block(10)
+
+        scheduler.observe_head(10)
+        scheduler.observe_head(9)
+
+        deadline.check("evaluate_markets")
+
+    def test_budget_exhausted(self):
+        scheduler = BlockScheduler(budget=0.0)
+        deadline = scheduler.start_block(10)
+
+        with self.assertRaises(StaleBlockError) as context:
+            deadline.check("take_crossed_markets")
+        self.assertEqual(context.exception.reason, "deadline")
+
+    def test_block_started_behind_head_is_already_stale(self):
+        scheduler = BlockScheduler()
+        scheduler.observe_head(12)
+
+        deadline = scheduler.start_block(11)
+
+        self.assertEqual(deadline.stale_reason(), "new_head")
+
+    def test_wait_for_head_from_watcher(self):
+        scheduler = BlockScheduler()
+        heads = iter([None, 5, None, 6])
+        watcher = HeadWatcher(scheduler, lambda: next(heads, None), poll_interval=0.01)
+        watcher.start()
+
+        self.assertEqual(scheduler.wait_for_head(5, timeout=2.0), 6)
+        watcher.stop()
+
+    def test_wait_for_head_timeout(self):
+        scheduler = BlockScheduler()
+        scheduler.observe_head(5)
+        start = time.monotonic()
+
+        self.assertIsNone(scheduler.wait_for_head(5, timeout=0.05))
+        self.assertLess(time.monotonic() - start, 1.0)
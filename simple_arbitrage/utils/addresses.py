@@ -26,4 +26,13 @@ FACTORY_ADDRESSES = [
 UNISWAP_ROUTER_ADDRESS = Web3.toChecksumAddress(
     "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D",
 )
+# keccak256 of each factory's pair creation code, pairs are deployed with CREATE2
+PAIR_INIT_CODE_HASHES = {
+    UNISWAP_FACTORY_ADDRESS: "0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f",
+}
+
+# the factory whose pairs each router swaps through
+ROUTER_FACTORIES = {
+    UNISWAP_ROUTER_ADDRESS: UNISWAP_FACTORY_ADDRESS,
+}
 GOERLI_WETH_ADDRESS = "0xB4FBF271143F4FBf7B91A5ded31805e42b2208d6"
@@ -1 +1,10 @@
 ETHER = 10**18
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """nearest-rank percentile, pct in 0 -> 100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]